@@ -0,0 +1,215 @@
+# %% CUBO AGREGADO ANO x UF x SETOR (DESEMBOLSOS, PIB E VALOR ADICIONADO)
+# Importando as bibliotecas necessárias
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# O cubo guarda as somas por (ano, UF, setor) em um array denso valores[ano, uf, setor, medida], montado com um groupby
+# por fonte (PIB/VA dos municípios e desembolsos do BNDES). Qualquer recorte agregado (Brasil, UF, região, setor) é uma
+# soma sobre eixos do array (regiões via matriz indicadora UF x região), sem voltar às linhas municipais.
+# Os desembolsos vêm da base do BNDES inteira (inclusive os não localizáveis, código 999999, e os sem UF, agrupados em
+# UF_NAO_IDENTIFICADA), como nos gráficos 1-3; PIB e VA vêm da base municipal do IBGE.
+# Para o setor 'total', va_* é o próprio PIB e desembolsos_real_va é o desembolso deflacionado pelo deflator do PIB.
+# Atualização incremental: só os anos informados e os anos sem dados de alguma das fontes no cubo (ausentes, ou presentes
+# só pela outra fonte, ex.: ano novo do PIB que já tinha desembolsos) são agregados de novo; os demais são mantidos.
+
+SETORES = ("total", "industria", "agropecuaria")
+MEDIDAS = ("desembolsos_corrente", "desembolsos_real_pib", "desembolsos_real_va", "pib_corrente", "pib_real", "va_corrente", "va_real", "n_municipios")
+UF_NAO_IDENTIFICADA = "NI"
+
+# Colunas de origem de cada medida, por setor
+COLUNAS_BNDES = {
+    "total": {"desembolsos_corrente": "desembolsos_corrente", "desembolsos_real_pib": "desembolsos_real_pib", "desembolsos_real_va": "desembolsos_real_pib"},
+    "industria": {"desembolsos_corrente": "desembolsos_industria_corrente", "desembolsos_real_pib": "desembolsos_industria_real_pib", "desembolsos_real_va": "desembolsos_industria_real_va"},
+    "agropecuaria": {"desembolsos_corrente": "desembolsos_agropecuaria_corrente", "desembolsos_real_pib": "desembolsos_agropecuaria_real_pib", "desembolsos_real_va": "desembolsos_agropecuaria_real_va"},
+}
+COLUNAS_PIB = {
+    "total": {"pib_corrente": "pib_corrente", "pib_real": "pib_real", "va_corrente": "pib_corrente", "va_real": "pib_real"},
+    "industria": {"pib_corrente": "pib_corrente", "pib_real": "pib_real", "va_corrente": "va_industria_corrente", "va_real": "va_industria_real"},
+    "agropecuaria": {"pib_corrente": "pib_corrente", "pib_real": "pib_real", "va_corrente": "va_agropecuaria_corrente", "va_real": "va_agropecuaria_real"},
+}
+
+REGIOES = {
+    "RO": "Norte", "AC": "Norte", "AM": "Norte", "RR": "Norte", "PA": "Norte", "AP": "Norte", "TO": "Norte",
+    "MA": "Nordeste", "PI": "Nordeste", "CE": "Nordeste", "RN": "Nordeste", "PB": "Nordeste", "PE": "Nordeste", "AL": "Nordeste", "SE": "Nordeste", "BA": "Nordeste",
+    "MG": "Sudeste", "ES": "Sudeste", "RJ": "Sudeste", "SP": "Sudeste",
+    "PR": "Sul", "SC": "Sul", "RS": "Sul",
+    "MS": "Centro-Oeste", "MT": "Centro-Oeste", "GO": "Centro-Oeste", "DF": "Centro-Oeste",
+}
+REGIAO_NAO_IDENTIFICADA = "Não identificada"
+DIMENSOES = ("ano", "uf", "regiao", "setor")
+
+
+def _somar_por_ano_uf(df: pd.DataFrame, coluna_uf: str, colunas: list[str]) -> pd.DataFrame:
+    """Somas por (ano, uf) das colunas pedidas e contagem de linhas (um único groupby)."""
+    chaves = pd.DataFrame({
+        "ano": pd.to_numeric(df["ano"]).astype(np.int64).to_numpy(),
+        "uf": df[coluna_uf].fillna(UF_NAO_IDENTIFICADA).astype(str).to_numpy(),
+    })
+    valores = df[colunas].apply(pd.to_numeric, errors="coerce").reset_index(drop=True)
+    g = pd.concat([chaves, valores], axis=1).groupby(["ano", "uf"], sort=True)
+    return g[colunas].sum().assign(n_linhas=g.size())
+
+
+@dataclass
+class CuboAgregado:
+    """
+    Somas por ano x UF x setor.
+    ----------
+    anos : np.ndarray -> Anos (ordenados)
+    ufs : np.ndarray -> Siglas das UFs (ordenadas; inclui UF_NAO_IDENTIFICADA se houver desembolsos sem UF)
+    valores : np.ndarray -> Array (anos x ufs x SETORES x MEDIDAS)
+    """
+    anos: np.ndarray
+    ufs: np.ndarray
+    valores: np.ndarray
+
+    @classmethod
+    def construir(cls, df_pib: pd.DataFrame, df_bndes: pd.DataFrame, *, coluna_uf_pib: str = "estado", coluna_uf_bndes: str = "uf") -> "CuboAgregado":
+        """
+        Agrega as bases municipais no cubo.
+        ----------
+        df_pib : pd.DataFrame -> Base município-ano do IBGE (ano, UF, pib_*, va_industria_*, va_agropecuaria_*)
+        df_bndes : pd.DataFrame -> Desembolsos do BNDES (ano, UF em sigla, desembolsos_* por setor)
+        coluna_uf_pib, coluna_uf_bndes : str -> Colunas com a sigla da UF em cada base
+        ----------
+        Retorna
+        CuboAgregado
+        """
+        colunas_pib = sorted({c for m in COLUNAS_PIB.values() for c in m.values()})
+        colunas_bndes = sorted({c for m in COLUNAS_BNDES.values() for c in m.values()})
+        soma_pib = _somar_por_ano_uf(df_pib, coluna_uf_pib, colunas_pib)
+        soma_bndes = _somar_por_ano_uf(df_bndes, coluna_uf_bndes, colunas_bndes)
+
+        anos = np.union1d(soma_pib.index.get_level_values("ano"), soma_bndes.index.get_level_values("ano"))
+        ufs = np.union1d(soma_pib.index.get_level_values("uf").astype(str), soma_bndes.index.get_level_values("uf").astype(str))
+        valores = np.zeros((len(anos), len(ufs), len(SETORES), len(MEDIDAS)))
+        m = {nome: i for i, nome in enumerate(MEDIDAS)}
+
+        for soma, mapa in ((soma_pib, COLUNAS_PIB), (soma_bndes, COLUNAS_BNDES)):
+            ia = np.searchsorted(anos, soma.index.get_level_values("ano"))
+            iu = np.searchsorted(ufs, soma.index.get_level_values("uf").astype(str))
+            for s, setor in enumerate(SETORES):
+                for medida, coluna in mapa[setor].items():
+                    valores[ia, iu, s, m[medida]] = soma[coluna].to_numpy()
+        ia = np.searchsorted(anos, soma_pib.index.get_level_values("ano"))
+        iu = np.searchsorted(ufs, soma_pib.index.get_level_values("uf").astype(str))
+        valores[ia, iu, :, m["n_municipios"]] = soma_pib["n_linhas"].to_numpy()[:, None]
+        return cls(anos, ufs, valores)
+
+    def anos_sem_dados(self, anos_fonte, medidas: list[str]) -> np.ndarray:
+        """Anos com linhas na fonte e sem nenhum valor dela no cubo (ausentes do cubo ou com as medidas da fonte zeradas)."""
+        idx = [MEDIDAS.index(m) for m in medidas]
+        com_dados = self.anos[np.any(self.valores[:, :, :, idx] != 0, axis=(1, 2, 3))]
+        return np.setdiff1d(np.unique(np.asarray(anos_fonte, dtype=np.int64)), com_dados)
+
+    def atualizar(self, df_pib: pd.DataFrame, df_bndes: pd.DataFrame, *, anos=None, coluna_uf_pib: str = "estado", coluna_uf_bndes: str = "uf") -> "CuboAgregado":
+        """
+        Reagrega os anos informados (ex.: novos ou revisados) e os anos sem dados de alguma fonte no cubo; mantém os demais.
+        O cubo cobre a união dos anos do BNDES e do IBGE: um ano novo do PIB já está no cubo com PIB e VA zerados, então a
+        detecção é feita por fonte (anos_sem_dados), e não só pelos anos ausentes do cubo.
+        ----------
+        anos : list[int] | None -> Anos a recalcular além dos detectados (ex.: relatório de incremental_update.atualizar_painel)
+        ----------
+        Retorna
+        CuboAgregado novo (o atual não é alterado)
+        """
+        ano_pib = pd.to_numeric(df_pib["ano"]).to_numpy()
+        ano_bndes = pd.to_numeric(df_bndes["ano"]).to_numpy()
+        medidas_pib = sorted({m for mapa in COLUNAS_PIB.values() for m in mapa} | {"n_municipios"})
+        medidas_bndes = sorted({m for mapa in COLUNAS_BNDES.values() for m in mapa})
+        detectados = np.union1d(self.anos_sem_dados(ano_pib, medidas_pib), self.anos_sem_dados(ano_bndes, medidas_bndes))
+        anos = np.union1d(detectados, np.asarray(list(anos) if anos is not None else [], dtype=np.int64))
+        anos = np.asarray(sorted(anos), dtype=np.int64)
+        if anos.size == 0:
+            return self
+        parcial = CuboAgregado.construir(df_pib[np.isin(ano_pib, anos)], df_bndes[np.isin(ano_bndes, anos)],
+                                         coluna_uf_pib=coluna_uf_pib, coluna_uf_bndes=coluna_uf_bndes)
+
+        todos_anos = np.union1d(self.anos, anos)
+        todas_ufs = np.union1d(self.ufs, parcial.ufs)
+        valores = np.zeros((len(todos_anos), len(todas_ufs), len(SETORES), len(MEDIDAS)))
+        manter = ~np.isin(self.anos, anos)
+        valores[np.ix_(np.searchsorted(todos_anos, self.anos[manter]), np.searchsorted(todas_ufs, self.ufs))] = self.valores[manter]
+        valores[np.ix_(np.searchsorted(todos_anos, parcial.anos), np.searchsorted(todas_ufs, parcial.ufs))] = parcial.valores
+        return CuboAgregado(todos_anos, todas_ufs, valores)
+
+    def somar(self, por=("ano",), *, setor: str | None = "total", medidas=None, anos=None, ufs=None) -> pd.DataFrame:
+        """
+        Soma o cubo nas dimensões fora de `por`.
+        ----------
+        por : tuple[str, ...] -> Dimensões mantidas (subconjunto de DIMENSOES: 'ano', 'uf', 'regiao', 'setor')
+        setor : str | None -> Setor (None mantém todos; some-os só com medidas aditivas entre setores)
+        medidas : list[str] | None -> Medidas (padrão: todas)
+        anos, ufs : list | None -> Filtros
+        ----------
+        Retorna
+        pd.DataFrame indexado pelas dimensões de `por`, uma coluna por medida
+        """
+        por = tuple(por)
+        invalidas = set(por) - set(DIMENSOES)
+        if invalidas:
+            raise ValueError(f"Dimensões inválidas: {sorted(invalidas)} (use {DIMENSOES})")
+        if "uf" in por and "regiao" in por:
+            raise ValueError("Use 'uf' ou 'regiao', não ambos")
+        medidas = list(medidas) if medidas is not None else list(MEDIDAS)
+
+        ia = np.flatnonzero(np.isin(self.anos, anos)) if anos is not None else np.arange(len(self.anos))
+        iu = np.flatnonzero(np.isin(self.ufs, ufs)) if ufs is not None else np.arange(len(self.ufs))
+        setores = list(SETORES) if setor is None else [setor]
+        V = self.valores[np.ix_(ia, iu, [SETORES.index(s) for s in setores], [MEDIDAS.index(x) for x in medidas])]
+        rotulos = {"ano": self.anos[ia], "uf": self.ufs[iu], "setor": np.array(setores)}
+        eixos = ("ano", "uf", "setor")
+
+        if "regiao" in por:
+            regiao_uf = np.array([REGIOES.get(u, REGIAO_NAO_IDENTIFICADA) for u in self.ufs[iu]])
+            regioes, codigo = np.unique(regiao_uf, return_inverse=True)
+            indicadora = np.zeros((len(iu), len(regioes)))
+            indicadora[np.arange(len(iu)), codigo] = 1.0
+            V = np.einsum("ausm,ur->arsm", V, indicadora)
+            rotulos["regiao"] = regioes
+            eixos = ("ano", "regiao", "setor")
+
+        V = V.sum(axis=tuple(i for i, d in enumerate(eixos) if d not in por))
+        if not por:
+            return pd.DataFrame(V.reshape(1, -1), columns=medidas)
+        # Ordem das dimensões no resultado segue `por`
+        mantidos = [d for d in eixos if d in por]
+        V = np.moveaxis(V, [mantidos.index(d) for d in por], range(len(por)))
+        if len(por) == 1:
+            indice = pd.Index(rotulos[por[0]], name=por[0])
+        else:
+            indice = pd.MultiIndex.from_product([rotulos[d] for d in por], names=list(por))
+        return pd.DataFrame(V.reshape(-1, len(medidas)), index=indice, columns=medidas)
+
+    def razao(self, numerador: str, denominador: str, por=("ano",), *, setor: str = "total", escala: float = 100.0, **filtros) -> pd.Series:
+        """Razão entre somas (ex.: desembolsos/PIB em %) por célula de `por`; células com denominador zero são descartadas."""
+        somas = self.somar(por, setor=setor, medidas=[numerador, denominador], **filtros)
+        validas = somas[denominador] != 0
+        return (escala * somas.loc[validas, numerador] / somas.loc[validas, denominador]).rename(f"{numerador}/{denominador}")
+
+    def tabela(self) -> pd.DataFrame:
+        """Formato longo (ano, uf, regiao, setor, medidas...)."""
+        indice = pd.MultiIndex.from_product([self.anos, self.ufs, list(SETORES)], names=["ano", "uf", "setor"])
+        df = pd.DataFrame(self.valores.reshape(-1, len(MEDIDAS)), index=indice, columns=list(MEDIDAS)).reset_index()
+        df.insert(2, "regiao", df["uf"].map(REGIOES).fillna(REGIAO_NAO_IDENTIFICADA))
+        return df
+
+    def salvar(self, caminho) -> None:
+        pq.write_table(pa.Table.from_pandas(self.tabela(), preserve_index=False), Path(caminho), compression="snappy")
+
+    @classmethod
+    def carregar(cls, caminho) -> "CuboAgregado":
+        df = pq.read_table(Path(caminho)).to_pandas()
+        anos = np.unique(df["ano"].to_numpy(dtype=np.int64))
+        ufs = np.unique(df["uf"].astype(str).to_numpy())
+        valores = np.zeros((len(anos), len(ufs), len(SETORES), len(MEDIDAS)))
+        ia = np.searchsorted(anos, df["ano"].to_numpy(dtype=np.int64))
+        iu = np.searchsorted(ufs, df["uf"].astype(str).to_numpy())
+        iset = pd.Index(SETORES).get_indexer(df["setor"])
+        valores[ia, iu, iset] = df[list(MEDIDAS)].to_numpy(dtype=float)
+        return cls(anos, ufs, valores)
@@ -0,0 +1,161 @@
+# %% MATRIZES DE CORRELAÇÃO (PEARSON E SPEARMAN) COM P-VALORES VETORIZADOS
+# Importando as bibliotecas necessárias
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Com V a máscara de valores válidos (n x k) e X as colunas padronizadas com zero nos ausentes, todas as somas
+# pairwise-complete saem de três produtos matriciais: N = V'V (pares válidos), S = X'V (soma de x_i onde x_j é válido),
+# Q = (X²)'V e P = X'X. Daí cov_ij = P_ij - S_ij S_ji / N_ij e var_i|j = Q_ij - S_ij² / N_ij, sem laço sobre pares.
+# Os p-valores vêm de t = r sqrt((n - 2) / (1 - r²)) com n - 2 graus de liberdade (o mesmo de scipy.stats.pearsonr).
+
+METODOS_CORRELACAO = ("pearson", "spearman")
+
+
+@dataclass
+class MatrizCorrelacao:
+    """
+    Correlações, p-valores e número de pares válidos de um conjunto de variáveis.
+    ----------
+    r : pd.DataFrame -> Correlações (k x k)
+    p : pd.DataFrame -> P-valores bicaudais (H0: correlação nula)
+    n : pd.DataFrame -> Pares válidos usados em cada correlação
+    metodo : str -> 'pearson' ou 'spearman'
+    """
+    r: pd.DataFrame
+    p: pd.DataFrame
+    n: pd.DataFrame
+    metodo: str = "pearson"
+
+    def longa(self, *, triangulo: bool = True) -> pd.DataFrame:
+        """Formato longo (var_i, var_j, r, p, n); com triangulo=True só os pares i > j."""
+        k = self.r.shape[0]
+        i, j = np.tril_indices(k, -1) if triangulo else np.indices((k, k)).reshape(2, -1)
+        cols = self.r.columns
+        return pd.DataFrame({"var_i": cols[i], "var_j": cols[j], "r": self.r.to_numpy()[i, j],
+                             "p": self.p.to_numpy()[i, j], "n": self.n.to_numpy()[i, j], "metodo": self.metodo})
+
+
+def _pearson_pareado(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Correlações pairwise-complete (k x k) e contagens de pares, a partir de produtos matriciais."""
+    V = ~np.isnan(X)
+    # Padronização global (só condicionamento numérico: a correlação é invariante a posição e escala)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.nanmean(np.where(V, X, np.nan), axis=0) if X.shape[0] else np.zeros(X.shape[1])
+        escala = np.nanstd(np.where(V, X, np.nan), axis=0) if X.shape[0] else np.ones(X.shape[1])
+    escala = np.where((escala > 0) & np.isfinite(escala), escala, 1.0)
+    Z = np.where(V, (X - np.nan_to_num(media)) / escala, 0.0)
+    Vf = V.astype(float)
+
+    N = Vf.T @ Vf
+    S = Z.T @ Vf
+    Q = (Z * Z).T @ Vf
+    P = Z.T @ Z
+    with np.errstate(invalid="ignore", divide="ignore"):
+        Nn = np.where(N > 0, N, np.nan)
+        cov = P - S * S.T / Nn
+        var_i = Q - S * S / Nn
+        r = cov / np.sqrt(var_i * var_i.T)
+    r = np.clip(r, -1.0, 1.0)
+    np.fill_diagonal(r, np.where(np.diag(var_i) > 0, 1.0, np.nan))
+    return r, N
+
+
+def _p_valores(r: np.ndarray, n: np.ndarray) -> np.ndarray:
+    gl = n - 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.abs(r) * np.sqrt(gl / np.maximum(1.0 - r * r, 0.0))
+        p = 2 * stats.t.sf(t, gl)
+    p = np.where(np.abs(r) >= 1.0, 0.0, p)
+    return np.where((gl > 0) & ~np.isnan(r), p, np.nan)
+
+
+def correlacoes(df: pd.DataFrame, colunas: list[str] | None = None, *, metodo: str = "pearson") -> MatrizCorrelacao:
+    """
+    Matriz de correlação com pares completos (pairwise) e p-valores analíticos.
+    ----------
+    df : pd.DataFrame -> Dados (uma linha por observação)
+    colunas : list[str] | None -> Variáveis (padrão: todas as numéricas)
+    metodo : str -> 'pearson' ou 'spearman' (Pearson sobre os postos)
+    ----------
+    Retorna
+    MatrizCorrelacao
+    """
+    if metodo not in METODOS_CORRELACAO:
+        raise ValueError(f"metodo deve ser um de {METODOS_CORRELACAO}: {metodo}")
+    colunas = list(colunas) if colunas is not None else list(df.select_dtypes(include="number").columns)
+    X = df[colunas].to_numpy(dtype=float, na_value=np.nan)
+    if metodo == "pearson":
+        r, n = _pearson_pareado(X)
+    else:
+        r, n = _spearman_pareado(X)
+    p = _p_valores(r, n)
+    idx = pd.Index(colunas)
+    return MatrizCorrelacao(pd.DataFrame(r, index=idx, columns=idx), pd.DataFrame(p, index=idx, columns=idx),
+                            pd.DataFrame(n.astype(np.int64), index=idx, columns=idx), metodo)
+
+
+def _spearman_pareado(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Spearman pairwise-complete. Com postos da coluna inteira, o resultado é exato para os pares cujas linhas válidas
+    coincidem com as de ambas as colunas; nos demais (ausências em posições diferentes) os postos são refeitos na
+    interseção a partir da ordenação já feita de cada coluna (contagens por grupo de empates, O(n) por par).
+    """
+    V = ~np.isnan(X)
+    n_obs, k = X.shape
+    ordens, grupos, inicios = [], [], []
+    for c in range(k):
+        ordem = np.argsort(X[:, c], kind="stable")[:V[:, c].sum()]
+        ordenados = X[ordem, c]
+        novo = np.r_[True, ordenados[1:] != ordenados[:-1]] if ordenados.size else np.zeros(0, dtype=bool)
+        ordens.append(ordem)
+        grupos.append(np.cumsum(novo) - 1)
+        inicios.append(np.flatnonzero(novo))
+
+    def postos_na_intersecao(c: int, ok: np.ndarray) -> np.ndarray:
+        m = ok[ordens[c]].astype(float)
+        cnt = np.add.reduceat(m, inicios[c]) if m.size else m
+        posto = (np.cumsum(cnt) - cnt) + (cnt + 1) / 2
+        R = np.empty(n_obs)
+        R[ordens[c]] = posto[grupos[c]]
+        return R[ok]
+
+    R = np.full(X.shape, np.nan)
+    for c in range(k):
+        R[V[:, c], c] = postos_na_intersecao(c, V[:, c])
+    r, n = _pearson_pareado(R)
+    validos = V.sum(axis=0)
+    i, j = np.nonzero(np.triu((n != validos[:, None]) | (n != validos[None, :]), 1))
+    for a, b in zip(i, j):
+        ok = V[:, a] & V[:, b]
+        if ok.sum() > 1:
+            ra, rb = postos_na_intersecao(a, ok), postos_na_intersecao(b, ok)
+            ra, rb = ra - ra.mean(), rb - rb.mean()
+            den = np.sqrt((ra @ ra) * (rb @ rb))
+            r[a, b] = r[b, a] = np.clip(ra @ rb / den, -1.0, 1.0) if den > 0 else np.nan
+    return r, n
+
+
+def correlacoes_por_grupo(df: pd.DataFrame, colunas: list[str], por: str, *, metodo: str = "pearson") -> pd.DataFrame:
+    """
+    Correlações por grupo (ex.: por='estado' ou por='ano'), em formato longo.
+    As linhas são ordenadas uma vez por grupo e cada grupo é uma fatia contígua da mesma matriz.
+    ----------
+    por : str -> Coluna (ou nível do índice) que define os grupos
+    ----------
+    Retorna
+    pd.DataFrame com grupo, var_i, var_j, r, p, n e metodo
+    """
+    chave = df[por].to_numpy() if por in df.columns else df.index.get_level_values(por).to_numpy()
+    ordem = np.argsort(chave, kind="stable")
+    rotulos, inicio = np.unique(chave[ordem], return_index=True)
+    limites = np.append(inicio, len(ordem))
+    dados = df[colunas].iloc[ordem]
+    saidas = []
+    for g, rotulo in enumerate(rotulos):
+        res = correlacoes(dados.iloc[limites[g]:limites[g + 1]], colunas, metodo=metodo)
+        saidas.append(res.longa().assign(grupo=rotulo))
+    out = pd.concat(saidas, ignore_index=True)
+    return out[["grupo", "var_i", "var_j", "r", "p", "n", "metodo"]].rename(columns={"grupo": por})
@@ -0,0 +1,181 @@
+# %% ESTIMADORES DE COVARIÂNCIA PARA MODELOS DE EFEITOS FIXOS
+# Importando as bibliotecas necessárias
+import numpy as np
+import scipy.sparse as sp
+
+
+def codificar_grupos(valores) -> tuple[np.ndarray, int]:
+    """
+    Converte um vetor de rótulos (códigos de município, UF, ano...) em inteiros 0..G-1.
+    ----------
+    valores : array-like -> Rótulos dos grupos (uma posição por observação)
+    ----------
+    Retorna
+    tuple (codigos, n_grupos)
+    """
+    _, codigos = np.unique(np.asarray(valores), return_inverse=True)
+    codigos = codigos.astype(np.int64).ravel()
+    n_grupos = int(codigos.max()) + 1 if codigos.size else 0
+    return codigos, n_grupos
+
+
+def matriz_indicadora(codigos: np.ndarray, n_grupos: int | None = None) -> sp.csr_matrix:
+    """
+    Matriz esparsa G x n que soma as linhas de cada grupo (S @ M = somas por grupo).
+    """
+    codigos = np.asarray(codigos, dtype=np.int64)
+    n = codigos.shape[0]
+    if n_grupos is None:
+        n_grupos = int(codigos.max()) + 1 if n else 0
+    return sp.csr_matrix((np.ones(n), (codigos, np.arange(n))), shape=(n_grupos, n))
+
+
+def interseccao_grupos(codigos_a: np.ndarray, codigos_b: np.ndarray) -> np.ndarray:
+    """
+    Códigos da interseção de dois agrupamentos (ex.: município x ano), usada no cluster duplo.
+    """
+    par = np.asarray(codigos_a, dtype=np.int64) * (int(np.max(codigos_b)) + 1) + np.asarray(codigos_b, dtype=np.int64)
+    return codificar_grupos(par)[0]
+
+
+def meat_cluster(scores: np.ndarray, codigos: np.ndarray) -> np.ndarray:
+    """
+    "Meat" do sanduíche clusterizado: soma por cluster dos scores (X * e) e produto externo.
+    ----------
+    scores : np.ndarray -> n x k, scores da observação (X_i * e_i)
+    codigos : np.ndarray -> n, código inteiro do cluster de cada observação
+    ----------
+    Retorna
+    np.ndarray k x k com sum_g (sum_i s_i)(sum_i s_i)'
+    """
+    somas = matriz_indicadora(codigos) @ scores
+    return somas.T @ somas
+
+
+def cov_clusterizada(X: np.ndarray, residuos: np.ndarray, clusters: list[np.ndarray], *, xtx_inv: np.ndarray | None = None, extra_df: int = 0, debiased: bool = True) -> np.ndarray:
+    """
+    Covariância clusterizada (1 ou 2 vias) no mesmo formato do linearmodels (ClusteredCovariance).
+    ----------
+    X : np.ndarray -> n x k, regressores já livres dos efeitos fixos (demeaned)
+    residuos : np.ndarray -> n, resíduos do modelo
+    clusters : list[np.ndarray] -> 1 ou 2 vetores de códigos de cluster
+    xtx_inv : np.ndarray | None -> (X'X)^-1 já calculado, se disponível
+    extra_df : int -> graus de liberdade absorvidos pelos efeitos fixos
+    debiased : bool -> Se True aplica o fator n / (n - k - extra_df), igual ao PanelOLS
+    ----------
+    Retorna
+    np.ndarray k x k
+    """
+    n, k = X.shape
+    if xtx_inv is None:
+        xtx_inv = np.linalg.inv(X.T @ X)
+    scores = X * np.asarray(residuos).reshape(-1, 1)
+
+    if len(clusters) == 1:
+        meat = meat_cluster(scores, clusters[0])
+    elif len(clusters) == 2:
+        # Inclusão-exclusão de Cameron, Gelbach e Miller (2011)
+        meat = (
+            meat_cluster(scores, clusters[0])
+            + meat_cluster(scores, clusters[1])
+            - meat_cluster(scores, interseccao_grupos(clusters[0], clusters[1]))
+        )
+    else:
+        raise ValueError("Apenas cluster de 1 ou 2 vias é suportado.")
+
+    escala = n / (n - extra_df - (k if debiased else 0))
+    cov = escala * (xtx_inv @ meat @ xtx_inv)
+    return (cov + cov.T) / 2
+
+
+def cov_robusta(X: np.ndarray, residuos: np.ndarray, *, xtx_inv: np.ndarray | None = None, extra_df: int = 0, debiased: bool = True) -> np.ndarray:
+    """
+    Covariância robusta à heterocedasticidade (White), equivalente ao cluster por observação.
+    """
+    n = X.shape[0]
+    return cov_clusterizada(X, residuos, [np.arange(n)], xtx_inv=xtx_inv, extra_df=extra_df, debiased=debiased)
+
+
+# Estimadores HAC: os scores são somados por período (Driscoll-Kraay) ou posicionados por entidade x período
+# (Newey-West por entidade) com somas por grupo vetorizadas; a autocorrelação entra com pesos de kernel até a banda.
+def banda_padrao(n_periodos: int) -> int:
+    """Banda da regra de Newey-West, floor(4 (T/100)^(2/9)), a mesma do linearmodels."""
+    return int(np.floor(4 * (n_periodos / 100) ** (2 / 9)))
+
+
+def pesos_kernel(banda: int, kernel: str = "bartlett") -> np.ndarray:
+    """
+    Pesos w_0..w_banda do kernel ('bartlett' ou 'parzen'), no mesmo padrão do linearmodels.
+    """
+    z = np.arange(int(banda) + 1) / (int(banda) + 1)
+    if kernel in ("bartlett", "newey-west"):
+        return 1 - z
+    if kernel in ("parzen", "gallant"):
+        w = 1 - 6 * z**2 + 6 * z**3
+        w[z > 0.5] = 2 * (1 - z[z > 0.5]) ** 3
+        return w
+    raise ValueError(f"kernel não suportado: {kernel}")
+
+
+def meat_kernel(S: np.ndarray, pesos: np.ndarray) -> np.ndarray:
+    """
+    sum_l w_l (Gamma_l + Gamma_l') com Gamma_l = sum_t S_t S_{t-l}' ao longo do eixo do tempo (penúltimo eixo de S).
+    S pode ser T x k (uma série) ou N x T x k (uma série por entidade, somadas).
+    """
+    S = S if S.ndim == 3 else S[None]
+    meat = np.einsum("ntk,ntl->kl", S, S)
+    for l in range(1, min(len(pesos), S.shape[1])):
+        cruz = np.einsum("ntk,ntl->kl", S[:, l:], S[:, :-l])
+        meat += pesos[l] * (cruz + cruz.T)
+    return meat
+
+
+def _sanduiche(X: np.ndarray, meat: np.ndarray, xtx_inv: np.ndarray | None, extra_df: int, debiased: bool) -> np.ndarray:
+    n, k = X.shape
+    if xtx_inv is None:
+        xtx_inv = np.linalg.inv(X.T @ X)
+    escala = n / (n - extra_df - (k if debiased else 0))
+    cov = escala * (xtx_inv @ meat @ xtx_inv)
+    return (cov + cov.T) / 2
+
+
+def cov_driscoll_kraay(X: np.ndarray, residuos: np.ndarray, tempo: np.ndarray, *, banda: int | None = None, kernel: str = "bartlett", xtx_inv: np.ndarray | None = None, extra_df: int = 0, debiased: bool = True) -> np.ndarray:
+    """
+    Covariância de Driscoll-Kraay (1998): HAC sobre a série temporal dos scores somados por período,
+    robusta a dependência cross-section arbitrária (choques macro comuns) e autocorrelação até a banda.
+    ----------
+    X : np.ndarray -> n x k, regressores já livres dos efeitos fixos (demeaned)
+    residuos : np.ndarray -> n, resíduos do modelo
+    tempo : np.ndarray -> n, código inteiro do período (0..T-1, em ordem cronológica)
+    banda : int | None -> Defasagens com peso > 0 (padrão banda_padrao(T))
+    kernel : str -> 'bartlett' ou 'parzen'
+    xtx_inv, extra_df, debiased : -> Como em cov_clusterizada
+    ----------
+    Retorna
+    np.ndarray k x k (igual ao cov_type='kernel' do PanelOLS)
+    """
+    tempo = np.asarray(tempo, dtype=np.int64)
+    S = matriz_indicadora(tempo) @ (X * np.asarray(residuos).reshape(-1, 1))
+    banda = banda_padrao(S.shape[0]) if banda is None else banda
+    return _sanduiche(X, meat_kernel(S, pesos_kernel(banda, kernel)), xtx_inv, extra_df, debiased)
+
+
+def cov_newey_west_entidade(X: np.ndarray, residuos: np.ndarray, entidade: np.ndarray, tempo: np.ndarray, *, banda: int | None = None, kernel: str = "bartlett", xtx_inv: np.ndarray | None = None, extra_df: int = 0, debiased: bool = True) -> np.ndarray:
+    """
+    Covariância de Newey-West dentro de cada entidade (HAC por município, sem correlação entre municípios).
+    Os scores vão para um arranjo entidade x período (zeros nos anos ausentes), então as defasagens seguem o calendário.
+    ----------
+    entidade : np.ndarray -> n, código inteiro da entidade
+    tempo : np.ndarray -> n, código inteiro do período (0..T-1, em ordem cronológica)
+    demais : -> Como em cov_driscoll_kraay
+    ----------
+    Retorna
+    np.ndarray k x k (igual ao cov_type='autocorrelation' do PanelOLS em painel balanceado)
+    """
+    entidade = np.asarray(entidade, dtype=np.int64)
+    tempo = np.asarray(tempo, dtype=np.int64)
+    n_periodos = int(tempo.max()) + 1
+    S = np.zeros((int(entidade.max()) + 1, n_periodos, X.shape[1]))
+    np.add.at(S, (entidade, tempo), X * np.asarray(residuos).reshape(-1, 1))
+    banda = banda_padrao(n_periodos) if banda is None else banda
+    return _sanduiche(X, meat_kernel(S, pesos_kernel(banda, kernel)), xtx_inv, extra_df, debiased)
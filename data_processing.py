@@ -12,6 +12,8 @@ import gc
 # Importanto variáveis de paths
 # ! Importante que os diretórios já existam, caso contrário: execute paths.py.
 from paths import RAW_DATA_PATH, PROCESSED_DATA_PATH, FINAL_DATA_PATH
+from incremental_update import derivar_variaveis_painel, atualizar_painel
+from aggregate_cube import CuboAgregado, UF_NAO_IDENTIFICADA
 # %% DADOS DE POPULAÇÃO DOS MUNICÍPIOS BRASILEIROS
 # INGESTÃO DE DADOS 1 DE 4 - POPULAÇÃO DOS MUNICÍPIOS BRASILEIROS - DATASUS
 
@@ -731,73 +733,16 @@ print(f'\nTotal de PIB real no DataFrame de análise: {total_pib_real_analise:,.
 print(f'Total de PIB real na base do IBGE: {total_pib_real_ibge:,.2f} (Mil Reais)')
 print(f'Diferença (análise - IBGE): {total_pib_real_analise - total_pib_real_ibge:,.2f} (Mil Reais)')
 
-# Garantir ordenação por código, estado e ano para cálculo correto de diferenças
-df_painel1['ano'] = pd.to_numeric(df_painel1['ano'], errors='coerce')
-df_painel1 = df_painel1.sort_values(by=['codigo', 'estado', 'ano'])
-
-# Calcular variável em função do PIB, além de suas diferenças (delta) ano a ano
-df_painel1['log_pib_real'] = np.log(df_painel1['pib_real'])
-df_painel1['asinh_va_industria_real_pib'] = np.arcsinh(df_painel1['va_industria_real_pib'])
-df_painel1['asinh_va_agropecuaria_real_pib'] = np.arcsinh(df_painel1['va_agropecuaria_real_pib'])
-df_painel1['delta_log_pib_real'] = df_painel1.groupby(['codigo', 'estado'])['log_pib_real'].diff(1)
-df_painel1['delta_asinh_va_industria_real_pib'] = (df_painel1.groupby(['codigo', 'estado'])['asinh_va_industria_real_pib'].diff())
-df_painel1['delta_asinh_va_agropecuaria_real_pib'] = (df_painel1.groupby(['codigo', 'estado'])['asinh_va_agropecuaria_real_pib'].diff())
-df_painel1['pibpc_real'] = df_painel1['pib_real'] / df_painel1['populacao']
-df_painel1['log_pibpc_real'] = np.log(df_painel1['pibpc_real'])
-df_painel1['delta_log_pibpc_real'] = df_painel1.groupby(['codigo', 'estado'])['log_pibpc_real'].diff(1)
-
-# Calcular variável em função do VA de cada setor, além de suas diferenças (delta) ano a ano
-df_painel1['asinh_va_industria_real'] = np.arcsinh(df_painel1['va_industria_real'])
-df_painel1['asinh_va_agropecuaria_real'] = np.arcsinh(df_painel1['va_agropecuaria_real'])
-df_painel1['delta_asinh_va_industria_real'] = (df_painel1.groupby(['codigo', 'estado'])['asinh_va_industria_real'].diff())
-df_painel1['delta_asinh_va_agropecuaria_real'] = (df_painel1.groupby(['codigo', 'estado'])['asinh_va_agropecuaria_real'].diff())
-
-# Calcular variáveis lag 1--3 das variáveis acima
-for lag in range(1, 4):
-    df_painel1[f'delta_asinh_va_industria_real_lag{lag}'] = df_painel1.groupby(['codigo','estado'])['delta_asinh_va_industria_real'].shift(lag)
-    df_painel1[f'delta_asinh_va_agropecuaria_real_lag{lag}'] = df_painel1.groupby(['codigo','estado'])['delta_asinh_va_agropecuaria_real'].shift(lag)
-
-# Calcular pib_real com lag
-pib_lag1 = df_painel1.groupby(['codigo','estado'])['pib_real'].shift(1)
-pib_lag2 = df_painel1.groupby(['codigo','estado'])['pib_real'].shift(2)
-
-# Calcular delta_log_pib_real e log_pib_real com lag
-delta_log_pib_real_lag1 = df_painel1.groupby(['codigo','estado'])['delta_log_pib_real'].shift(1)
-delta_log_pib_real_lag2 = df_painel1.groupby(['codigo','estado'])['delta_log_pib_real'].shift(2)
-log_pibpc_real_lag1 = df_painel1.groupby(['codigo','estado'])['log_pibpc_real'].shift(1)
-
-# Adicionar lag1 e lag2 do delta_log_pib_real ao dataframe
-df_painel1['delta_log_pib_real_lag1'] = delta_log_pib_real_lag1
-df_painel1['delta_log_pib_real_lag2'] = delta_log_pib_real_lag2
-
-# ! Usar t-1 como padrão, mas quando t-1 for NaN ou zero, usar t-2 (ocorre apenas em 1 caso, GUAMARE (RN) com PIB NEGATIVO em 2012)
-pib_lag = pib_lag1.copy()
-mask_usar_lag2 = (pib_lag1.isna()) | (pib_lag1 == 0)
-pib_lag[mask_usar_lag2] = pib_lag2[mask_usar_lag2]
-
-# Calcular variáveis de share_desembolso_real em relação aos pib_real_ano_anterior
-df_painel1['share_desembolso_real_pib_real_ano_anterior'] = (df_painel1['desembolsos_real_pib'] / pib_lag)
-df_painel1['share_desembolso_industria_real_ano_anterior'] = (df_painel1['desembolsos_industria_real_pib'] / pib_lag)
-df_painel1['share_desembolso_agropecuaria_real_ano_anterior'] = (df_painel1['desembolsos_agropecuaria_real_pib'] / pib_lag)
-df_painel1['share_desembolso_pc_real_pib_real_ano_anterior'] = (df_painel1['desembolsos_real_pib'] / df_painel1['populacao'] / pib_lag) # desembolso per capita
-
-# Calcular variáveis lag 1--3 das variáveis acima
-for lag in range(1, 4):
-    df_painel1[f'share_desembolso_real_pib_real_ano_anterior_lag{lag}'] = df_painel1.groupby(['codigo','estado'])['share_desembolso_real_pib_real_ano_anterior'].shift(lag)
-    df_painel1[f'share_desembolso_industria_real_ano_anterior_lag{lag}'] = df_painel1.groupby(['codigo','estado'])['share_desembolso_industria_real_ano_anterior'].shift(lag)
-    df_painel1[f'share_desembolso_agropecuaria_real_ano_anterior_lag{lag}'] = df_painel1.groupby(['codigo','estado'])['share_desembolso_agropecuaria_real_ano_anterior'].shift(lag)
-    df_painel1[f'share_desembolso_pc_real_pib_real_ano_anterior_lag{lag}'] = df_painel1.groupby(['codigo','estado'])['share_desembolso_pc_real_pib_real_ano_anterior'].shift(lag)
-
-# Calcular variáveis de controle: log_populacao_lag1, log_pibpc_real_lag1 e share_industria_lag1 (ou seja, em t-1)
-df_painel1['log_populacao'] = np.log(df_painel1['populacao'])
-df_painel1['log_populacao_lag1'] = df_painel1.groupby(['codigo','estado'])['log_populacao'].shift(1)
-df_painel1['pibpc_real'] = df_painel1['pib_real'] / df_painel1['populacao']
-df_painel1['log_pibpc_real'] = np.log(df_painel1['pibpc_real'])
-df_painel1['log_pibpc_real_lag1'] = df_painel1.groupby(['codigo','estado'])['log_pibpc_real'].shift(1)
-df_painel1['share_industria'] = df_painel1['va_industria_real'] / df_painel1['pib_real']
-df_painel1['share_industria_lag1'] = df_painel1.groupby(['codigo','estado'])['share_industria'].shift(1)
-df_painel1['share_agropecuaria'] = df_painel1['va_agropecuaria_real'] / df_painel1['pib_real']
-df_painel1['share_agropecuaria_lag1'] = df_painel1.groupby(['codigo','estado'])['share_agropecuaria'].shift(1)
+# Calcular as variáveis derivadas (deltas, shares, lags, leads e controles); ver incremental_update.derivar_variaveis_painel
+# Se painel1.parquet já existe e a base só acrescenta anos (sem revisões nos anteriores), apenas as linhas do ano novo e as
+# que dependem dele (lags e leads) são recalculadas; caso contrário o painel é derivado do zero
+caminho_painel1 = Path(FINAL_DATA_PATH) / 'painel1.parquet'
+if caminho_painel1.exists():
+    df_painel1, relatorio_atualizacao = atualizar_painel(pq.read_table(caminho_painel1).to_pandas(), df_painel1)
+else:
+    df_painel1 = derivar_variaveis_painel(df_painel1)
+    relatorio_atualizacao = {'modo': 'completo', 'anos_novos': [], 'revisoes': 0, 'linhas_recalculadas': len(df_painel1)}
+print(f'\nAtualização do painel: {relatorio_atualizacao}')
 
 # TODO Verificações opcionais
 # Verificar se todos os 5570 municipios possuem informações de PIB real e desembolsos do BNDES para todos os anos entre 2002 e 2023
@@ -819,25 +764,6 @@ for index, row in municipios_incompletos.iterrows():
     print(f'Código: {row["codigo"]}, Município: {row["municipio"]}, Estado: {row["estado"]}, Anos disponíveis: {row["ano"]}')
 # NOTA: Municípios com menos de 22 anos de dados correspondem a municípios criados ao longo da série histórica
 
-# Calcular variável independente lead (Xt+1) e (Xt+2)
-# ! variável sem log, shift no numerador para ano futuro
-df_painel1.loc[df_painel1['pib_real'] <= 0, 'pib_real'] = np.nan  # Substituir valores de PIB real menores ou iguais a zero por NaN para evitar problemas de divisão e log
-pib_t = df_painel1['pib_real']  # PIB_t
-pib_tp1 = df_painel1.groupby(['codigo','estado'])['pib_real'].shift(-1) # PIB_{t+1}
-desemb_tp1 = df_painel1.groupby(['codigo','estado'])['desembolsos_real_pib'].shift(-1) # Desemb_{t+1}
-desemb_tp2 = df_painel1.groupby(['codigo','estado'])['desembolsos_real_pib'].shift(-2) # Desemb_{t+2}
-desemb_tp1_ind = df_painel1.groupby(['codigo','estado'])['desembolsos_industria_real_pib'].shift(-1) # Desemb_{t+1}
-desemb_tp2_ind = df_painel1.groupby(['codigo','estado'])['desembolsos_industria_real_pib'].shift(-2) # Desemb_{t+2}
-desemb_tp1_agro = df_painel1.groupby(['codigo','estado'])['desembolsos_agropecuaria_real_pib'].shift(-1) # Desemb_{t+1}
-desemb_tp2_agro = df_painel1.groupby(['codigo','estado'])['desembolsos_agropecuaria_real_pib'].shift(-2) # Desemb_{t+2}
-
-df_painel1['share_desembolso_real_pib_real_ano_anterior_lead1'] = desemb_tp1 / pib_t
-df_painel1['share_desembolso_real_pib_real_ano_anterior_lead2'] = desemb_tp2 / pib_tp1
-df_painel1['share_desembolso_industria_real_pib_real_ano_anterior_lead1'] = desemb_tp1_ind / pib_t
-df_painel1['share_desembolso_industria_real_pib_real_ano_anterior_lead2'] = desemb_tp2_ind / pib_tp1
-df_painel1['share_desembolso_agropecuaria_real_pib_real_ano_anterior_lead1'] = desemb_tp1_agro / pib_t
-df_painel1['share_desembolso_agropecuaria_real_pib_real_ano_anterior_lead2'] = desemb_tp2_agro / pib_tp1
-
 # Verificação final do DataFrame de análise com tipos de dados
 print(f'\nDataFrame Painel (sem drop de NA):')
 print(f'Número de linhas e colunas: {df_painel1.shape}')
@@ -846,6 +772,19 @@ print(f'Menor e maior ano disponíveis após drop de NA: {df_painel1["ano"].min(
 tabela_analise_final = pa.Table.from_pandas(df_painel1)
 pq.write_table(tabela_analise_final, Path(FINAL_DATA_PATH) / 'painel1.parquet', compression='snappy')
 
+# Cubo agregado ano x UF x setor (somas de desembolsos correntes/reais, PIB e VA setorial) para gráficos e consultas agregadas
+# Desembolsos de toda a base do BNDES (UF sem correspondência vira UF_NAO_IDENTIFICADA); PIB e VA da base municipal do IBGE
+# Se o cubo já existe e o painel só ganhou anos novos, apenas esses anos (e os que ainda não têm dados de alguma das bases)
+# são agregados; com revisões o cubo é refeito
+caminho_cubo = Path(FINAL_DATA_PATH) / 'cubo_agregado.parquet'
+df_bndes_cubo = df_bndes.assign(uf=df_bndes['uf'].map(estado_map).fillna(UF_NAO_IDENTIFICADA))
+if caminho_cubo.exists() and relatorio_atualizacao['modo'] != 'completo':
+    cubo_agregado = CuboAgregado.carregar(caminho_cubo).atualizar(df_pib_merge, df_bndes_cubo, anos=relatorio_atualizacao['anos_novos'])
+else:
+    cubo_agregado = CuboAgregado.construir(df_pib_merge, df_bndes_cubo)
+cubo_agregado.salvar(caminho_cubo)
+print(f'\nCubo agregado: {len(cubo_agregado.anos)} anos x {len(cubo_agregado.ufs)} UFs x 3 setores')
+
 #_ ## CONCLUSÃO SOBRE PAINEL ###
 #_ Variável dependente, independente, lags, leads e controles criadas e consolidadas agrupadas por cada município-estado-ano.
 #_ Período entre 2006-2021. Valores financeiros em MIL REAIS na base 2021 (inclui PIB em mil reais e PIB per capita em mil reais também).
@@ -854,6 +793,6 @@ pq.write_table(tabela_analise_final, Path(FINAL_DATA_PATH) / 'painel1.parquet',
 #_ ##-------------------------------###
 
 # Liberação de memória
-del tabela_pib_hab, df_pib_hab, tabela_bndes, df_bndes, df_pib_merge, df_bndes_merge, estado_map, df_painel1, total_desembolsos_ajustados_analise, total_desembolsos_ajustados_bndes, total_desembolsos_ajustados_bndes_999999, total_pib_real_analise, total_pib_real_ibge, pib_lag1, pib_lag2, pib_lag, mask_usar_lag2, municipios_anos, municipios_anos_completo, municipios_incompletos, pib_t, pib_tp1, desemb_tp1, desemb_tp2, desemb_tp1_ind, desemb_tp2_ind, desemb_tp1_agro, desemb_tp2_agro, tabela_analise_final
+del tabela_pib_hab, df_pib_hab, tabela_bndes, df_bndes, df_pib_merge, df_bndes_merge, estado_map, df_painel1, total_desembolsos_ajustados_analise, total_desembolsos_ajustados_bndes, total_desembolsos_ajustados_bndes_999999, total_pib_real_analise, total_pib_real_ibge, caminho_painel1, relatorio_atualizacao, municipios_anos, municipios_anos_completo, municipios_incompletos, tabela_analise_final, caminho_cubo, df_bndes_cubo, cubo_agregado
 gc.collect()
 # %%
@@ -0,0 +1,281 @@
+# %% ESTATÍSTICAS DESCRITIVAS EM PASSADA ÚNICA (STREAMING), POR GRUPO E PONDERADAS
+# Importando as bibliotecas necessárias
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Cada lote do painel vira, por (grupo, variável): contagem, soma dos pesos, média, M2 = sum w (x - média)², mínimo e máximo.
+# Lotes, partições e workers se combinam pela fórmula de Chan (a versão paralela de Welford):
+#   média = m_A + δ W_B / W,  M2 = M2_A + M2_B + δ² W_A W_B / W,  δ = m_B - m_A.
+# Os quantis vêm de um t-digest por (grupo, variável): centroides (média, peso) guardados em arrays longos e comprimidos
+# todos de uma vez (ordenação por chave + média, escala k1 = δ/(2π) asin(2q - 1)). Enquanto uma chave tem até
+# `compressao` centroides, ela guarda os próprios valores e o quantil é exato (mesma interpolação linear do pandas).
+
+COLUNAS_DESCRITIVAS = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+
+class EstatisticasDescritivas:
+    """
+    Acumulador de estatísticas descritivas em passada única, combinável entre lotes, partições e workers.
+    ----------
+    colunas : list[str] -> Variáveis descritas
+    por : list[str] | str | None -> Chaves de agrupamento (ex.: 'estado', 'ano' ou ['estado', 'ano'])
+    peso : str | None -> Coluna de pesos (ex.: 'populacao'); pesos de frequência, DP com W - 1 no denominador
+    compressao : int -> Parâmetro δ do t-digest (centroides por chave, aproximadamente)
+    """
+
+    def __init__(self, colunas: list[str], *, por: list[str] | str | None = None, peso: str | None = None, compressao: int = 500):
+        self.colunas = list(colunas)
+        self.por = [por] if isinstance(por, str) else list(por or [])
+        self.peso = peso
+        self.compressao = int(compressao)
+        k = len(self.colunas)
+        self.grupos = pd.Index([], dtype=object)
+        self.n = np.zeros((0, k))
+        self.W = np.zeros((0, k))
+        self.media = np.zeros((0, k))
+        self.M2 = np.zeros((0, k))
+        self.minimo = np.zeros((0, k))
+        self.maximo = np.zeros((0, k))
+        # t-digest: chave = grupo * k + variável
+        self._chave = np.zeros(0, dtype=np.int64)
+        self._centro = np.zeros(0)
+        self._massa = np.zeros(0)
+
+    # ------------------------------------------------------------------ acumulação
+    def _codigos_grupo(self, df: pd.DataFrame) -> np.ndarray:
+        if not self.por:
+            rotulos = pd.Index([("total",)], dtype=object)
+            codigos = np.zeros(len(df), dtype=np.int64)
+        else:
+            codigos, rotulos = pd.MultiIndex.from_frame(df[self.por]).factorize()
+            rotulos = pd.Index(list(rotulos), dtype=object)
+        # Grupos novos entram no fim do estado; os códigos do lote passam a ser os globais
+        novos = rotulos[self.grupos.get_indexer(rotulos) < 0]
+        if len(novos):
+            self._crescer(len(novos))
+            self.grupos = self.grupos.append(novos)
+        return self.grupos.get_indexer(rotulos)[codigos]
+
+    def _crescer(self, extra: int) -> None:
+        k = len(self.colunas)
+        for nome, valor in (("n", 0.0), ("W", 0.0), ("media", 0.0), ("M2", 0.0), ("minimo", np.inf), ("maximo", -np.inf)):
+            setattr(self, nome, np.vstack([getattr(self, nome), np.full((extra, k), valor)]))
+
+    def atualizar(self, df: pd.DataFrame) -> "EstatisticasDescritivas":
+        """Acumula um lote (DataFrame com colunas, chaves de grupo e peso)."""
+        if len(df) == 0:
+            return self
+        g = self._codigos_grupo(df)
+        G, k = len(self.grupos), len(self.colunas)
+        w_lote = df[self.peso].to_numpy(dtype=float, na_value=np.nan) if self.peso else np.ones(len(df))
+        chaves, centros, massas = [self._chave], [self._centro], [self._massa]
+        for v, col in enumerate(self.colunas):
+            x = df[col].to_numpy(dtype=float, na_value=np.nan)
+            ok = ~np.isnan(x) & ~np.isnan(w_lote) & (w_lote > 0)
+            xg, wg, gg = x[ok], w_lote[ok], g[ok]
+            if xg.size == 0:
+                continue
+            n_b = np.bincount(gg, minlength=G).astype(float)
+            W_b = np.bincount(gg, weights=wg, minlength=G)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                m_b = np.bincount(gg, weights=wg * xg, minlength=G) / W_b
+            M2_b = np.bincount(gg, weights=wg * (xg - m_b[gg]) ** 2, minlength=G)
+            self._combinar_momentos(v, n_b, W_b, np.nan_to_num(m_b), M2_b)
+            np.minimum.at(self.minimo[:, v], gg, xg)
+            np.maximum.at(self.maximo[:, v], gg, xg)
+            chaves.append(gg.astype(np.int64) * k + v)
+            centros.append(xg)
+            massas.append(wg)
+        self._chave, self._centro, self._massa = np.concatenate(chaves), np.concatenate(centros), np.concatenate(massas)
+        self._comprimir()
+        return self
+
+    def _combinar_momentos(self, v: int, n_b, W_b, m_b, M2_b) -> None:
+        W_a, m_a = self.W[:, v], self.media[:, v]
+        W = W_a + W_b
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = m_b - m_a
+            media = np.where(W > 0, m_a + delta * W_b / W, 0.0)
+            M2 = self.M2[:, v] + M2_b + np.where(W > 0, delta ** 2 * W_a * W_b / W, 0.0)
+        self.n[:, v] += n_b
+        self.W[:, v], self.media[:, v], self.M2[:, v] = W, media, M2
+
+    def combinar(self, outro: "EstatisticasDescritivas") -> "EstatisticasDescritivas":
+        """Incorpora o estado de outro acumulador (outra partição ou worker) com as mesmas colunas, chaves e pesos."""
+        if outro.colunas != self.colunas or outro.por != self.por or outro.peso != self.peso:
+            raise ValueError("Acumuladores com colunas, chaves ou pesos diferentes não podem ser combinados.")
+        novos = outro.grupos[self.grupos.get_indexer(outro.grupos) < 0]
+        if len(novos):
+            self._crescer(len(novos))
+            self.grupos = self.grupos.append(novos)
+        mapa = self.grupos.get_indexer(outro.grupos)
+        G, k = len(self.grupos), len(self.colunas)
+        for v in range(k):
+            n_b, W_b, m_b, M2_b = (np.zeros(G) for _ in range(4))
+            n_b[mapa], W_b[mapa], m_b[mapa], M2_b[mapa] = outro.n[:, v], outro.W[:, v], outro.media[:, v], outro.M2[:, v]
+            self._combinar_momentos(v, n_b, W_b, m_b, M2_b)
+            self.minimo[mapa, v] = np.minimum(self.minimo[mapa, v], outro.minimo[:, v])
+            self.maximo[mapa, v] = np.maximum(self.maximo[mapa, v], outro.maximo[:, v])
+        chave_outro = mapa[outro._chave // k].astype(np.int64) * k + outro._chave % k
+        self._chave = np.concatenate([self._chave, chave_outro])
+        self._centro = np.concatenate([self._centro, outro._centro])
+        self._massa = np.concatenate([self._massa, outro._massa])
+        self._comprimir()
+        return self
+
+    # ------------------------------------------------------------------ t-digest
+    def _comprimir(self) -> None:
+        """Ordena os centroides por (chave, média) e funde, nas chaves com mais de `compressao` centroides, os vizinhos
+        que caem na mesma unidade da escala k1."""
+        ordem = np.lexsort((self._centro, self._chave))
+        chave, centro, massa = self._chave[ordem], self._centro[ordem], self._massa[ordem]
+        if chave.size == 0:
+            return
+        inicio = np.r_[True, chave[1:] != chave[:-1]]
+        seg = np.cumsum(inicio) - 1
+        n_seg = np.bincount(seg)
+        grandes = n_seg[seg] > self.compressao
+        if not grandes.any():
+            self._chave, self._centro, self._massa = chave, centro, massa
+            return
+
+        acumulado = np.cumsum(massa)
+        antes = acumulado - massa - (acumulado - massa)[np.flatnonzero(inicio)][seg]
+        total = np.bincount(seg, weights=massa)[seg]
+        q = np.clip(antes / total, 0.0, 1.0)
+        delta = self.compressao
+        cluster = np.floor(delta * (np.arcsin(2 * q - 1) / np.pi + 0.5)).astype(np.int64)
+        # Chaves pequenas: cada valor é o seu próprio "cluster" (posição dentro da chave)
+        posicao = np.arange(chave.size) - np.flatnonzero(inicio)[seg]
+        cluster = np.where(grandes, cluster, posicao)
+        # Primeiro e último centroides de cada chave ficam isolados (caudas)
+        fim = np.r_[inicio[1:], True]
+        largura = max(delta, int(n_seg.max())) + 3
+        cluster = np.where(inicio & grandes, -1, np.where(fim & grandes, largura - 2, cluster)) + 1
+        codigo = seg.astype(np.int64) * largura + cluster
+        novo, inv = np.unique(codigo, return_inverse=True)
+        massa_n = np.bincount(inv, weights=massa)
+        centro_n = np.bincount(inv, weights=massa * centro) / massa_n
+        self._chave, self._centro, self._massa = chave[np.flatnonzero(inicio)][novo // largura], centro_n, massa_n
+
+    def _quantis(self, percentis) -> np.ndarray:
+        """Quantis (G*k x p) por chave: exatos (interpolação linear do pandas) em chaves com os próprios valores e pesos
+        unitários; caso contrário, interpolação entre os pontos médios dos centroides, com mínimo e máximo nas pontas."""
+        G, k = len(self.grupos), len(self.colunas)
+        out = np.full((G * k, len(percentis)), np.nan)
+        chave, centro, massa = self._chave, self._centro, self._massa
+        if chave.size == 0:
+            return out
+        inicio = np.r_[True, chave[1:] != chave[:-1]]
+        seg = np.cumsum(inicio) - 1
+        pos0 = np.flatnonzero(inicio)
+        chaves_seg = chave[pos0]
+        total = np.bincount(seg, weights=massa)
+        n_seg = np.bincount(seg)
+        antes = np.cumsum(massa) - massa
+        antes = antes - antes[pos0][seg]
+        exato = np.bincount(seg, weights=(massa != 1.0).astype(float)) == 0
+
+        # Posição de cada ponto em [0, 1] dentro da chave
+        with np.errstate(invalid="ignore", divide="ignore"):
+            u_exato = np.where(n_seg[seg] > 1, antes / (total[seg] - 1), 0.0)
+            u_medio = (antes + massa / 2) / total[seg]
+        u = np.where(exato[seg], u_exato, u_medio)
+
+        # Pontas (0 -> mínimo, 1 -> máximo) nas chaves aproximadas
+        aprox = np.flatnonzero(~exato)
+        vmin = self.minimo.ravel()[chaves_seg[aprox]]
+        vmax = self.maximo.ravel()[chaves_seg[aprox]]
+        seg_all = np.concatenate([seg, aprox, aprox])
+        u_all = np.concatenate([u, np.zeros(aprox.size), np.ones(aprox.size)])
+        x_all = np.concatenate([centro, vmin, vmax])
+        ordem = np.lexsort((u_all, seg_all))
+        eixo = seg_all[ordem] * 2.0 + u_all[ordem]
+        x_all = x_all[ordem]
+
+        for j, q in enumerate(percentis):
+            alvo = np.arange(len(pos0)) * 2.0 + q
+            out[chaves_seg, j] = np.interp(alvo, eixo, x_all)
+        # Chaves com um único valor
+        unico = n_seg == 1
+        out[chaves_seg[unico]] = centro[pos0[unico]][:, None]
+        return out
+
+    # ------------------------------------------------------------------ resultado
+    def resultado(self, percentis=(0.25, 0.5, 0.75)) -> pd.DataFrame:
+        """
+        Tabela no formato de DataFrame.describe().T (count, mean, std, min, percentis, max) por grupo e variável.
+        ----------
+        Retorna
+        pd.DataFrame indexado por (chaves de grupo..., variavel); sem grupos, indexado pela variável.
+        Com pesos, 'count' é o número de observações e 'peso_total' a soma dos pesos.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.M2 / (self.W - 1))
+        std = np.where(self.W > 1, std, np.nan)
+        vazio = self.n == 0
+        dados = {
+            "count": self.n.ravel(), "mean": np.where(vazio, np.nan, self.media).ravel(), "std": std.ravel(),
+            "min": np.where(vazio, np.nan, self.minimo).ravel(),
+        }
+        qs = self._quantis(percentis)
+        for j, q in enumerate(percentis):
+            dados[f"{q * 100:g}%"] = qs[:, j]
+        dados["max"] = np.where(vazio, np.nan, self.maximo).ravel()
+        if self.peso:
+            dados["peso_total"] = self.W.ravel()
+        if self.por:
+            rotulos = [tuple(g) + (c,) for g in self.grupos for c in self.colunas]
+            indice = pd.MultiIndex.from_tuples(rotulos, names=self.por + ["variavel"])
+        else:
+            indice = pd.Index(self.colunas, name="variavel")
+        out = pd.DataFrame(dados, index=indice)
+        return out.sort_index() if self.por else out
+
+
+def _descrever_arquivo(arquivo, colunas, por, peso, compressao, tamanho_lote) -> EstatisticasDescritivas:
+    acumulador = EstatisticasDescritivas(colunas, por=por, peso=peso, compressao=compressao)
+    leitura = list(dict.fromkeys(list(colunas) + acumulador.por + ([peso] if peso else [])))
+    for lote in pq.ParquetFile(arquivo).iter_batches(batch_size=tamanho_lote, columns=leitura):
+        acumulador.atualizar(lote.to_pandas())
+    return acumulador
+
+
+def descrever_arquivos(arquivos, colunas: list[str], *, por=None, peso: str | None = None, compressao: int = 500, tamanho_lote: int = 500_000, n_workers: int = 4) -> pd.DataFrame:
+    """
+    Estatísticas descritivas de um painel particionado em arquivos parquet, sem carregá-lo inteiro em memória.
+    Cada arquivo é lido em lotes (só as colunas necessárias) por um worker; os acumuladores são combinados no fim.
+    ----------
+    arquivos : list | str | Path -> Arquivos parquet (ou um diretório com *.parquet)
+    colunas, por, peso, compressao -> Ver EstatisticasDescritivas
+    tamanho_lote : int -> Linhas por lote de leitura
+    n_workers : int -> Número de threads
+    ----------
+    Retorna
+    pd.DataFrame de EstatisticasDescritivas.resultado()
+    """
+    if isinstance(arquivos, (str, Path)) and Path(arquivos).is_dir():
+        arquivos = sorted(Path(arquivos).glob("*.parquet"))
+    elif isinstance(arquivos, (str, Path)):
+        arquivos = [arquivos]
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        parciais = list(executor.map(lambda a: _descrever_arquivo(a, colunas, por, peso, compressao, tamanho_lote), arquivos))
+    total = EstatisticasDescritivas(colunas, por=por, peso=peso, compressao=compressao)
+    for parcial in parciais:
+        total.combinar(parcial)
+    return total.resultado()
+
+
+def descrever(df: pd.DataFrame, colunas: list[str] | None = None, *, por=None, peso: str | None = None, compressao: int = 500, tamanho_lote: int = 500_000) -> pd.DataFrame:
+    """Versão em memória: o DataFrame é percorrido em lotes pelo mesmo acumulador."""
+    chaves = [por] if isinstance(por, str) else list(por or [])
+    if colunas is None:
+        colunas = [c for c in df.select_dtypes(include="number").columns if c not in chaves + ([peso] if peso else [])]
+    acumulador = EstatisticasDescritivas(colunas, por=por, peso=peso, compressao=compressao)
+    for inicio in range(0, len(df), tamanho_lote):
+        acumulador.atualizar(df.iloc[inicio:inicio + tamanho_lote])
+    return acumulador.resultado()
@@ -0,0 +1,201 @@
+# %% EVENT STUDY DO PRIMEIRO DESEMBOLSO RELEVANTE (TWFE E INTERACTION-WEIGHTED)
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from covariance import codificar_grupos
+from fixed_effects import Absorvedor, ResultadoFE, ajustar_fe
+from sample_masks import MapaValidade
+
+# Evento = primeiro ano em que o desembolso do município passa de um limiar (0 -> >0, ou acima de um percentil).
+# Dois estimadores sobre a mesma amostra:
+#   'twfe' -> event study clássico FE 2-way com dummies de tempo relativo (extremos agrupados)
+#   'iw'   -> Sun & Abraham (2021): dummies coorte x tempo relativo, agregadas com pesos = participação
+#             de cada coorte no tempo relativo; controle = nunca tratados (ou última coorte, se não houver; aí a
+#             amostra toda fica restrita aos anos anteriores ao evento dessa coorte)
+# A covariância do 'iw' é A V A' (pesos tratados como fixos).
+
+# Estruturas de cluster (colunas de df_model ou níveis do índice)
+CLUSTERS_EVENTO = {
+    "municipio_ano": ("municipio_id", "ano"),
+    "uf_ano": ("estado", "ano"),
+    "municipio": ("municipio_id",),
+    "uf": ("estado",),
+}
+
+
+def coortes_evento(df_model: pd.DataFrame, coluna: str, *, criterio: str = "positivo", quantil: float = 0.75) -> pd.DataFrame:
+    """
+    Ano do primeiro desembolso relevante de cada município.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano)
+    coluna : str -> Série de desembolso (ex.: share_desembolso_real_pib_real_ano_anterior)
+    criterio : str -> 'positivo' (sair de 0 para >0) ou 'quantil' (ultrapassar o percentil `quantil` da série)
+    quantil : float -> Percentil usado quando criterio='quantil'
+    ----------
+    Retorna
+    pd.DataFrame por município com 'coorte' (ano do evento; NaN = nunca tratado), 'primeiro_ano' e 'sempre_tratado'
+    """
+    x = df_model[coluna]
+    if criterio == "positivo":
+        limiar = 0.0
+    elif criterio == "quantil":
+        limiar = float(x.quantile(quantil))
+    else:
+        raise ValueError(f"criterio não suportado: {criterio}")
+
+    ent = df_model.index.get_level_values(0)
+    ano = df_model.index.get_level_values(1).to_numpy(dtype=float)
+    observado = x.notna().to_numpy()
+    acima = (x > limiar).to_numpy()
+
+    coorte = pd.Series(np.where(acima, ano, np.nan), index=ent).groupby(level=0).min()
+    primeiro = pd.Series(np.where(observado, ano, np.nan), index=ent).groupby(level=0).min()
+    out = pd.DataFrame({"coorte": coorte, "primeiro_ano": primeiro})
+    # Tratado já no primeiro ano observado: sem pré-período, não identifica o evento
+    out["sempre_tratado"] = out["coorte"] == out["primeiro_ano"]
+    out.attrs["limiar"] = limiar
+    return out
+
+
+def tempo_relativo(df_model: pd.DataFrame, coortes: pd.DataFrame, janela: tuple[int, int] = (-4, 5)) -> pd.Series:
+    """
+    Tempo relativo ao evento (ano - coorte) com os extremos agrupados em janela[0] e janela[1]; NaN para nunca tratados.
+    """
+    ent = df_model.index.get_level_values(0)
+    coorte = coortes["coorte"].reindex(ent).to_numpy()
+    rel = df_model.index.get_level_values(1).to_numpy(dtype=float) - coorte
+    return pd.Series(np.clip(rel, janela[0], janela[1]), index=df_model.index, name="tempo_relativo")
+
+
+def _codigos_cluster(dados: pd.DataFrame, estrutura: tuple[str, ...]) -> list[np.ndarray]:
+    codigos = []
+    for c in estrutura:
+        valores = dados[c].astype(str).to_numpy() if c in dados.columns else dados.index.get_level_values(c).to_numpy()
+        codigos.append(codificar_grupos(valores)[0])
+    return codigos
+
+
+def estudo_evento(df_model: pd.DataFrame, lhs: str, coluna_evento: str, *, estimador: str = "twfe", janela: tuple[int, int] = (-4, 5), referencia: int = -1, criterio: str = "positivo", quantil: float = 0.75, controles: list[str] | None = None, cluster: str = "municipio_ano", controle: str = "nunca", mapa: MapaValidade | None = None) -> ResultadoFE:
+    """
+    Event study em torno do primeiro desembolso relevante, com FE de município e ano.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano)
+    lhs : str -> Variável de resultado (ex.: delta_log_pib_real)
+    coluna_evento : str -> Série de desembolso que define o evento
+    estimador : str -> 'twfe' (clássico) ou 'iw' (interaction-weighted, Sun & Abraham)
+    janela : tuple[int, int] -> Tempos relativos reportados; fora dela os extremos são agrupados
+    referencia : int -> Tempo relativo omitido (normalizado em zero)
+    criterio, quantil : -> Definição do evento (ver coortes_evento)
+    controles : list[str] | None -> Controles adicionais
+    cluster : str -> Estrutura de cluster (chave de CLUSTERS_EVENTO)
+    controle : str -> Grupo de controle do 'iw': 'nunca' ou 'ultimo' (última coorte tratada)
+    mapa : MapaValidade | None -> Bitmaps de validade de df_model (padrão: calculados sob demanda)
+    ----------
+    Retorna
+    ResultadoFE com um parâmetro por tempo relativo (info['h'] mapeia nome -> tempo relativo)
+    """
+    controles = list(controles or [])
+    coortes = coortes_evento(df_model, coluna_evento, criterio=criterio, quantil=quantil)
+    extras = [c for c in CLUSTERS_EVENTO[cluster] if c in df_model.columns]
+    colunas = [lhs] + controles + extras
+    mapa = mapa if mapa is not None else MapaValidade(df_model, colunas=[])
+    ent = df_model.index.get_level_values(0)
+    coorte_linha = coortes["coorte"].reindex(ent).to_numpy()
+
+    # Sempre tratados não têm pré-período e saem da amostra
+    restricao = ~coortes["sempre_tratado"].reindex(ent).to_numpy(dtype=bool)
+    ultima = None
+    if estimador == "iw":
+        validas = mapa.mascara(colunas, restricao=restricao)
+        if controle == "ultimo" or not np.isnan(coorte_linha[validas]).any():
+            if np.isnan(coorte_linha[validas]).all():
+                raise ValueError("Nenhum município tratado na amostra do event study.")
+            # Última coorte vira controle: a partir do seu evento não há mais unidade não tratada para comparação,
+            # então todos os municípios (não só os da última coorte) ficam restritos aos anos anteriores
+            ultima = np.nanmax(coorte_linha[validas])
+            restricao &= df_model.index.get_level_values(1).to_numpy() < ultima
+
+    # Mesma construção de amostra dos modelos principais: AND dos bitmaps, sem singletons de município/ano
+    amostra = mapa.amostra(lhs, controles + extras, restricao=restricao).podar()
+    dados = pd.DataFrame({c: amostra.coluna(c) for c in colunas}, index=amostra.indice)
+    dados["coorte"] = coorte_linha[amostra.idx]
+    dados["tempo_relativo"] = tempo_relativo(dados, coortes, janela).to_numpy()
+    if ultima is not None:
+        dados.loc[dados["coorte"] == ultima, ["coorte", "tempo_relativo"]] = np.nan
+
+    tempos = [h for h in range(janela[0], janela[1] + 1) if h != referencia]
+    rel = dados["tempo_relativo"].to_numpy()
+    if estimador == "twfe":
+        celulas = [(None, h) for h in tempos]
+        D = np.column_stack([(rel == h) for h in tempos]).astype(float)
+    elif estimador == "iw":
+        coorte = dados["coorte"].to_numpy()
+        celulas = [(c, h) for c in np.unique(coorte[~np.isnan(coorte)]) for h in tempos]
+        D = np.column_stack([(coorte == c) & (rel == h) for c, h in celulas]).astype(float)
+    else:
+        raise ValueError(f"estimador não suportado: {estimador}")
+
+    # Células sem observações não são identificadas
+    ocupadas = D.sum(axis=0) > 0
+    celulas = [cel for cel, ok in zip(celulas, ocupadas) if ok]
+    D = D[:, ocupadas]
+    nomes_d = [f"evento_{h:+d}" if c is None else f"evento_{int(c)}_{h:+d}" for c, h in celulas]
+
+    absorvedor = Absorvedor([dados.index.get_level_values(0).to_numpy(), dados.index.get_level_values(1).to_numpy()])
+    M = absorvedor.demean(np.hstack([D, dados[[lhs] + controles].to_numpy(dtype=float)]))
+    X_dm = np.delete(M, D.shape[1], axis=1)
+    info = {"estimador": estimador, "lhs": lhs, "coluna_evento": coluna_evento, "criterio": criterio,
+            "limiar": coortes.attrs["limiar"], "janela": list(janela), "referencia": referencia,
+            "n_tratados": int(dados["coorte"].notna().groupby(level=0).first().sum())}
+    res = ajustar_fe(M[:, D.shape[1]], X_dm, nomes_d + controles, clusters=_codigos_cluster(dados, CLUSTERS_EVENTO[cluster]),
+                     n_efeitos=absorvedor.n_efeitos, info=info)
+
+    if estimador == "twfe":
+        res.info["h"] = {n: h for n, (_, h) in zip(nomes_d, celulas)}
+        return res
+
+    # Agregação IW: theta_h = sum_c w_{c,h} beta_{c,h}, com w = participação da coorte c no tempo relativo h
+    n_cel = D.sum(axis=0)
+    A = np.zeros((len(tempos), len(res.params)))
+    for j, (_, h) in enumerate(celulas):
+        A[tempos.index(h), j] = n_cel[j]
+    identificados = A.sum(axis=1) > 0
+    A = A[identificados] / A[identificados].sum(axis=1, keepdims=True)
+    nomes = [f"evento_{h:+d}" for h, ok in zip(tempos, identificados) if ok]
+    theta = A @ res.params.to_numpy()
+    V = A @ res.cov.to_numpy() @ A.T
+    res.info["h"] = {n: h for n, h in zip(nomes, [h for h, ok in zip(tempos, identificados) if ok])}
+    res.info["coortes"] = sorted({int(c) for c, _ in celulas})
+    return ResultadoFE(
+        params=pd.Series(theta, index=nomes, name="parameter"),
+        cov=pd.DataFrame(V, index=nomes, columns=nomes),
+        nobs=res.nobs, df_resid=res.df_resid, cov_type=res.cov_type, rsquared=res.rsquared,
+        residuos=res.residuos, n_efeitos=res.n_efeitos, info=res.info,
+    )
+
+
+def tabela_evento(res: ResultadoFE, *, model_name: str) -> pd.DataFrame:
+    """
+    Tabela longa de coeficientes do event study (mesmas colunas de salvar_resultados_panelols + 'h' e 'estimador').
+    Inclui a categoria de referência com coeficiente 0, como nos gráficos de event study.
+    """
+    h = res.info["h"]
+    ci = res.conf_int()
+    df_coef = pd.DataFrame({
+        "model": model_name,
+        "var": list(h),
+        "coef": res.params[list(h)].to_numpy(),
+        "std_err": res.std_errors[list(h)].to_numpy(),
+        "t": res.tstats[list(h)].to_numpy(),
+        "p": res.pvalues[list(h)].to_numpy(),
+        "ci_low": ci.loc[list(h), "lower"].to_numpy(),
+        "ci_high": ci.loc[list(h), "upper"].to_numpy(),
+        "h": list(h.values()),
+    })
+    ref = res.info["referencia"]
+    linha_ref = {"model": model_name, "var": f"evento_{ref:+d}", "coef": 0.0, "std_err": 0.0, "t": np.nan, "p": np.nan, "ci_low": 0.0, "ci_high": 0.0, "h": ref}
+    df_coef = pd.concat([df_coef, pd.DataFrame([linha_ref])], ignore_index=True)
+    df_coef["estimador"] = res.info["estimador"]
+    df_coef["nobs"] = res.nobs
+    return df_coef.sort_values("h").reset_index(drop=True)
@@ -0,0 +1,197 @@
+# %% MOTOR DE GRÁFICOS DE COEFICIENTES (PARAMETRIZADO, EM CACHE E EM PARALELO)
+# Importando as bibliotecas necessárias
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+# Cada gráfico de coeficientes por horizonte é descrito por uma EspecGrafico (modelo, família de regressores, textos e
+# arquivo de saída) e desenhado por uma única função. A renderização não usa pyplot: cada figura é um
+# matplotlib.figure.Figure com canvas Agg, então roda sem display (servidor) e em processos separados.
+# Cache: a chave de cada figura é o hash dos dados plotados + especificação + estilo + VERSAO_DESENHO, guardada em um
+# manifesto JSON no diretório de saída; figuras cuja chave não mudou (e cujo arquivo existe) não são redesenhadas.
+# Os processos são criados por fork, para não reexecutar o script chamador (graphic_analysis.py) em cada um; onde fork
+# não existe (Windows) a renderização é serial, já que spawn reimportaria o script sem guarda __main__.
+
+# Incrementar quando o código de desenho mudar (invalida o cache de todas as figuras)
+VERSAO_DESENHO = 1
+MANIFESTO_CACHE = ".cache_figuras.json"
+
+# Mesmo tema do graphic_analysis.py (argumentos de seaborn.set_theme) e cores dos elementos do gráfico
+ESTILO_PADRAO = {
+    "tema": {
+        "style": "white",
+        "context": "paper",
+        "palette": "colorblind",
+        "font": "serif",
+        "font_scale": 1.0,
+        "rc": {
+            "figure.figsize": (12, 6),
+            "axes.titlesize": 11,
+            "axes.labelsize": 10,
+            "axes.titleweight": "bold",
+            "lines.linewidth": 1.2,
+            "lines.markersize": 4,
+            "legend.fontsize": 9,
+            "xtick.labelsize": 9,
+            "ytick.labelsize": 9,
+            "axes.spines.top": False,
+            "axes.spines.right": False,
+        },
+    },
+    "cor": "blue",
+    "cor_zero": "red",
+    "cor_contemporaneo": "orange",
+}
+
+
+@dataclass(frozen=True)
+class EspecGrafico:
+    """
+    Um gráfico de coeficientes por horizonte (leads/lags) com IC 95%.
+    ----------
+    arquivo : str -> Nome do arquivo de saída (ex.: 'grafico4.svg')
+    model : str -> Nome do modelo no repositório de resultados
+    titulo : str -> Título do gráfico
+    rotulo_serie : str -> Legenda da linha de coeficientes (ex.: 'Coeficiente Δlog estimado')
+    familia : str -> Prefixo das variáveis plotadas
+    rotulo_x, rotulo_y : str -> Rótulos dos eixos
+    contemporaneo : bool -> Sombrear o horizonte t
+    """
+    arquivo: str
+    model: str
+    titulo: str
+    rotulo_serie: str = "Coeficiente estimado"
+    familia: str = "share_desembolso"
+    rotulo_x: str = "Horizonte"
+    rotulo_y: str = "Coeficiente (IC 95%)"
+    contemporaneo: bool = True
+
+
+def preparar_coeficientes(df_coef: pd.DataFrame, familia: str) -> pd.DataFrame:
+    """
+    Filtra a família de regressores e atribui o horizonte h (lead k -> +k, lag k -> -k, contemporâneo -> 0) e o rótulo.
+    ----------
+    Retorna
+    pd.DataFrame com var, coef, ci_low, ci_high, h e h_label, ordenado por h
+    """
+    df = df_coef.loc[df_coef["var"].astype(str).str.startswith(familia), ["var", "coef", "ci_low", "ci_high"]]
+    partes = df["var"].astype(str).str.extract(r"_(lag|lead)(\d+)$")
+    k = pd.to_numeric(partes[1]).fillna(0).astype(int).to_numpy()
+    h = np.where(partes[0].to_numpy() == "lag", -k, k)
+    df = df.assign(h=h).sort_values("h", kind="stable").reset_index(drop=True)
+    df["h_label"] = np.where(df["h"] == 0, "t", np.where(df["h"] < 0, "t" + df["h"].astype(str), "t+" + df["h"].astype(str)))
+    return df
+
+
+def desenhar_coeficientes(ax, df: pd.DataFrame, espec: EspecGrafico, estilo: dict) -> None:
+    """Desenha em `ax` os coeficientes (marcadores cheios se >= 0, vazios se < 0), a linha zero e o IC 95%."""
+    import seaborn as sns
+
+    cor = estilo["cor"]
+    if espec.contemporaneo:
+        ax.axvspan(-0.3, 0.3, alpha=0.15, color=estilo["cor_contemporaneo"], label="Período Contemporâneo (t)")
+
+    positivo = df["coef"].to_numpy() >= 0
+    for mascara, preenchimento in ((positivo, "full"), (~positivo, "none")):
+        if mascara.any():
+            ax.plot(df["h"][mascara], df["coef"][mascara], linestyle="none", marker="o", fillstyle=preenchimento,
+                    markersize=8, color=cor, markeredgewidth=1.5, markeredgecolor=cor)
+
+    ax.plot(df["h"], df["coef"], linewidth=1.5, color=cor, label=espec.rotulo_serie)
+    ax.axhline(0, linewidth=1.5, color=estilo["cor_zero"], linestyle=":")
+    ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]],
+                fmt="none", capsize=4, linewidth=2.5, color=cor, alpha=0.3)
+
+    ax.set_title(espec.titulo)
+    ax.set_xlabel(espec.rotulo_x)
+    ax.set_ylabel(espec.rotulo_y)
+    ax.set_xticks(df["h"])
+    ax.set_xticklabels(df["h_label"])
+    ax.legend(loc="upper left")
+    sns.despine(ax=ax)
+
+
+def _renderizar(tarefa: tuple) -> str:
+    """Renderiza uma figura em Agg (sem pyplot) dentro de um rc_context com o tema do estilo."""
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    espec, dados, estilo, destino = tarefa
+    with matplotlib.rc_context():
+        sns.set_theme(**estilo["tema"])
+        fig = Figure()
+        ax = fig.subplots()
+        desenhar_coeficientes(ax, dados, espec, estilo)
+        fig.tight_layout()
+        fig.savefig(destino, bbox_inches="tight")
+    return destino
+
+
+def chave_figura(dados: pd.DataFrame, espec: EspecGrafico, estilo: dict) -> str:
+    """Hash dos dados plotados, da especificação, do estilo e da versão do desenho."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(dados, index=False).to_numpy().tobytes())
+    h.update(json.dumps([asdict(espec), estilo, VERSAO_DESENHO], sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def renderizar_graficos(especs: list[EspecGrafico], df_coefs: pd.DataFrame, diretorio, *, estilo: dict | None = None,
+                        n_workers: int | None = None, forcar: bool = False) -> pd.DataFrame:
+    """
+    Renderiza os gráficos de coeficientes, redesenhando só os que mudaram.
+    ----------
+    especs : list[EspecGrafico] -> Gráficos desejados (arquivos únicos)
+    df_coefs : pd.DataFrame -> Coeficientes em formato longo com coluna 'model' (ex.: RepositorioResultados.coeficientes)
+    diretorio : str | Path -> Pasta de saída (ex.: paths.IMAGES_PATH)
+    estilo : dict | None -> Tema e cores (padrão: ESTILO_PADRAO)
+    n_workers : int | None -> Processos (padrão: os.cpu_count(); 1, ou sistema sem fork, renderiza no processo atual)
+    forcar : bool -> Ignora o cache e redesenha todos
+    ----------
+    Retorna
+    pd.DataFrame com arquivo, model, chave e status ('renderizado', 'cache' ou 'sem_dados')
+    """
+    estilo = estilo if estilo is not None else ESTILO_PADRAO
+    arquivos = [e.arquivo for e in especs]
+    repetidos = sorted({a for a in arquivos if arquivos.count(a) > 1})
+    if repetidos:
+        raise ValueError(f"Arquivos de saída repetidos nas especificações: {repetidos}")
+
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    caminho_manifesto = diretorio / MANIFESTO_CACHE
+    manifesto = json.loads(caminho_manifesto.read_text(encoding="utf-8")) if caminho_manifesto.exists() else {}
+
+    por_modelo = dict(tuple(df_coefs.groupby("model", sort=False)))
+    linhas, tarefas = [], []
+    for espec in especs:
+        dados = preparar_coeficientes(por_modelo[espec.model], espec.familia) if espec.model in por_modelo else None
+        if dados is None or dados.empty:
+            linhas.append({"arquivo": espec.arquivo, "model": espec.model, "chave": None, "status": "sem_dados"})
+            continue
+        chave = chave_figura(dados, espec, estilo)
+        destino = diretorio / espec.arquivo
+        em_cache = not forcar and manifesto.get(espec.arquivo) == chave and destino.exists()
+        linhas.append({"arquivo": espec.arquivo, "model": espec.model, "chave": chave, "status": "cache" if em_cache else "renderizado"})
+        if not em_cache:
+            tarefas.append((espec, dados, estilo, str(destino)))
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tarefas))
+    if n_workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for tarefa in tarefas:
+            _renderizar(tarefa)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            list(executor.map(_renderizar, tarefas))
+
+    resultado = pd.DataFrame(linhas)
+    manifesto.update({r["arquivo"]: r["chave"] for r in linhas if r["chave"] is not None})
+    caminho_manifesto.write_text(json.dumps(manifesto, indent=2, sort_keys=True), encoding="utf-8")
+    return resultado
@@ -0,0 +1,223 @@
+# %% CACHE EM DISCO DE MODELOS AJUSTADOS (CHAVE = AMOSTRA + ESPECIFICAÇÃO)
+# Importando as bibliotecas necessárias
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from linearmodels.panel import PanelOLS
+from scipy import stats
+
+from covariance import codificar_grupos
+from fixed_effects import Absorvedor, ajustar_fe
+from hypothesis_tests import TesteWald, restricoes_formula
+from results_store import estatisticas_resultado
+
+# Cada ajuste é guardado em {raiz}/{chave}.npz (params, covariância, SE, t, p e estatísticas do ajuste).
+# A chave combina o hash das colunas da amostra de estimação (valores + índice) com lhs/rhs, efeitos e covariância;
+# se nem o painel nem a especificação mudaram, o resultado volta do disco sem reajustar.
+# Despejo LRU: cada acerto atualiza o mtime do arquivo; acima de max_entradas/max_bytes saem os menos usados.
+
+
+def hash_dados(obj) -> str:
+    """Hash de Series/DataFrame (valores e índice) ou de qualquer objeto serializável em JSON."""
+    h = hashlib.sha1()
+    if isinstance(obj, (pd.Series, pd.DataFrame)):
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        h.update(json.dumps([str(c) for c in (obj.columns if isinstance(obj, pd.DataFrame) else [obj.name])]).encode("utf-8"))
+    else:
+        h.update(json.dumps(obj, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+@dataclass
+class ResultadoEmCache:
+    """
+    Resultado recuperado do cache: mesmos atributos usados do PanelEffectsResults
+    (params, std_errors, tstats, pvalues, cov, conf_int, wald_test, summary, nobs).
+    """
+    params: pd.Series
+    std_errors: pd.Series
+    tstats: pd.Series
+    pvalues: pd.Series
+    cov: pd.DataFrame
+    nobs: int
+    df_resid: int
+    cov_type: str
+    debiased: bool
+    estatisticas: dict = field(default_factory=dict)
+    chave: str = ""
+
+    def conf_int(self, level: float = 0.95) -> pd.DataFrame:
+        quantis = np.array([(1 - level) / 2, 1 - (1 - level) / 2])
+        q = stats.t.ppf(quantis, self.df_resid) if self.debiased else stats.norm.ppf(quantis)
+        ci = self.params.to_numpy()[:, None] + self.std_errors.to_numpy()[:, None] * q[None, :]
+        return pd.DataFrame(ci, index=self.params.index, columns=["lower", "upper"])
+
+    def wald_test(self, restriction=None, value=None, *, formula=None) -> TesteWald:
+        """Teste de Wald a partir da covariância em cache (sem reajustar o modelo)."""
+        nomes = list(self.params.index)
+        if formula is not None:
+            R, q = restricoes_formula(formula, nomes)
+            null = formula if isinstance(formula, str) else ", ".join(formula)
+        else:
+            R = np.atleast_2d(np.asarray(restriction, dtype=float))
+            q = np.zeros(R.shape[0]) if value is None else np.asarray(value, dtype=float)
+            null = "R b = q"
+        d = R @ self.params.to_numpy() - q
+        stat = float(d @ np.linalg.solve(R @ self.cov.to_numpy() @ R.T, d))
+        return TesteWald(stat=stat, pval=float(stats.chi2.sf(stat, R.shape[0])), df=int(R.shape[0]), null=null)
+
+    @property
+    def summary(self) -> str:
+        ci = self.conf_int()
+        tabela = pd.DataFrame({"Parameter": self.params, "Std. Err.": self.std_errors, "T-stat": self.tstats,
+                               "P-value": self.pvalues, "Lower CI": ci["lower"], "Upper CI": ci["upper"]})
+        cabecalho = (f"Resultado em cache ({self.chave[:12]}) | Dep. Variable: {self.estatisticas.get('depvar')} | "
+                     f"No. Observations: {self.nobs} | Cov. Estimator: {self.cov_type} | "
+                     f"R-squared (within): {self.estatisticas.get('rsq_within')}")
+        return f"{cabecalho}\n{tabela.to_string(float_format=lambda v: f'{v:.4f}')}"
+
+
+def _resultado_em_cache(chave: str, arrays: dict) -> ResultadoEmCache:
+    """ResultadoEmCache a partir dos arrays gravados no .npz (nomes, params, std_errors, tstats, pvalues, cov, meta)."""
+    nomes = [str(v) for v in arrays["nomes"]]
+    meta = json.loads(str(arrays["meta"]))
+    serie = lambda k, nome: pd.Series(np.asarray(arrays[k], dtype=float), index=nomes, name=nome)
+    return ResultadoEmCache(
+        params=serie("params", "parameter"), std_errors=serie("std_errors", "std_error"),
+        tstats=serie("tstats", "tstat"), pvalues=serie("pvalues", "pvalue"),
+        cov=pd.DataFrame(np.asarray(arrays["cov"], dtype=float), index=nomes, columns=nomes),
+        nobs=meta["nobs"], df_resid=meta["df_resid"], cov_type=meta["cov_type"], debiased=meta["debiased"],
+        estatisticas=meta["estatisticas"], chave=chave,
+    )
+
+
+class CacheAjustes:
+    """
+    Cache em disco de ajustes PanelOLS.
+    ----------
+    raiz : str | Path -> Diretório do cache (ex.: paths.FIT_CACHE_PATH)
+    max_entradas : int -> Número máximo de ajustes guardados
+    max_bytes : int -> Tamanho máximo do diretório em bytes
+    """
+
+    def __init__(self, raiz, *, max_entradas: int = 500, max_bytes: int = 500 * 2**20):
+        self.raiz = Path(raiz)
+        self.raiz.mkdir(parents=True, exist_ok=True)
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.acertos = 0
+        self.falhas = 0
+
+    def chave(self, y: pd.Series, X: pd.DataFrame, *, modelo: dict, ajuste: dict) -> str:
+        """Chave do ajuste: hash da amostra (y, X e índice) + especificação (efeitos, covariância, clusters)."""
+        ajuste = {k: (hash_dados(v) if isinstance(v, (pd.Series, pd.DataFrame)) else v) for k, v in ajuste.items()}
+        espec = {"lhs": str(y.name), "rhs": [str(c) for c in X.columns], "modelo": modelo, "ajuste": ajuste}
+        return hashlib.sha1((hash_dados(pd.concat([y, X], axis=1)) + hash_dados(espec)).encode("utf-8")).hexdigest()
+
+    def _arquivo(self, chave: str) -> Path:
+        return self.raiz / f"{chave}.npz"
+
+    def obter(self, chave: str) -> ResultadoEmCache | None:
+        arquivo = self._arquivo(chave)
+        if not arquivo.exists():
+            return None
+        with np.load(arquivo, allow_pickle=False) as arq:
+            res = _resultado_em_cache(chave, {k: arq[k] for k in arq.files})
+        os.utime(arquivo)
+        return res
+
+    def guardar(self, chave: str, res, estatisticas: dict) -> ResultadoEmCache:
+        """Guarda o ajuste e o devolve como ResultadoEmCache (o mesmo tipo de um acerto)."""
+        meta = {
+            "nobs": int(res.nobs), "df_resid": int(res.df_resid),
+            "cov_type": str(getattr(res, "_cov_type", getattr(res, "cov_type", ""))),
+            "debiased": bool(getattr(res, "_debiased", getattr(res, "debiased", True))),
+            "estatisticas": estatisticas,
+        }
+        arrays = {
+            "nomes": np.asarray(res.params.index, dtype=str), "params": res.params.to_numpy(),
+            "std_errors": res.std_errors.to_numpy(), "tstats": res.tstats.to_numpy(), "pvalues": res.pvalues.to_numpy(),
+            "cov": np.asarray(res.cov), "meta": np.array(json.dumps(meta, default=str)),
+        }
+        np.savez(self._arquivo(chave), **arrays)
+        self.despejar()
+        return _resultado_em_cache(chave, arrays)
+
+    def despejar(self) -> int:
+        """Remove os ajustes menos usados (mtime mais antigo) até respeitar max_entradas e max_bytes."""
+        arquivos = sorted(self.raiz.glob("*.npz"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in arquivos)
+        removidos = 0
+        while arquivos and (len(arquivos) > self.max_entradas or total > self.max_bytes):
+            p = arquivos.pop(0)
+            total -= p.stat().st_size
+            p.unlink()
+            removidos += 1
+        return removidos
+
+    def ajustar_panelols(self, y: pd.Series, X: pd.DataFrame, *, entity_effects: bool = True, time_effects: bool = True, tendencias_entidade: bool = False, **fit_kwargs):
+        """
+        PanelOLS(y, X, entity_effects, time_effects).fit(**fit_kwargs) com memoização em disco.
+        Retorna sempre ResultadoEmCache: no acerto lido do disco; na falha ajusta, guarda e devolve o que foi guardado
+        (o mesmo tipo e os mesmos números nas duas situações).
+        Com tendencias_entidade=True o município também tem tendência linear própria, absorvida (ajustar_tendencias)
+        sem colunas de dummy x tendência.
+        """
+        modelo = {"estimador": "PanelOLS", "entity_effects": entity_effects, "time_effects": time_effects}
+        if tendencias_entidade:
+            modelo["tendencias_entidade"] = True
+        chave = self.chave(y, X, modelo=modelo, ajuste=fit_kwargs)
+        res = self.obter(chave)
+        if res is not None:
+            self.acertos += 1
+            return res
+        self.falhas += 1
+        if tendencias_entidade:
+            if not entity_effects:
+                raise ValueError("tendencias_entidade=True requer entity_effects=True.")
+            res = ajustar_tendencias(y, X, time_effects=time_effects, **fit_kwargs)
+            return self.guardar(chave, res, {**estatisticas_resultado(res), "rsq_within": res.rsquared, "entity_effects": True, "time_effects": time_effects, "tendencias_entidade": True})
+        res = PanelOLS(y, X, entity_effects=entity_effects, time_effects=time_effects).fit(**fit_kwargs)
+        return self.guardar(chave, res, estatisticas_resultado(res))
+
+
+def ajustar_tendencias(y: pd.Series, X: pd.DataFrame, *, time_effects: bool = True, cov_type: str = "clustered", cluster_entity: bool = False, cluster_time: bool = False, clusters: pd.DataFrame | None = None, debiased: bool = True, **kwargs):
+    """
+    FE de município com tendência linear por município (+ FE de ano), com os mesmos argumentos de fit do PanelOLS.
+    Intercepto e inclinação de cada município são projetados em forma fechada (Absorvedor(tendencia=ano)).
+    ----------
+    y : pd.Series -> Variável dependente indexada por (entidade, ano)
+    X : pd.DataFrame -> Regressores com o mesmo índice
+    time_effects : bool -> Incluir FE de ano
+    cov_type : str -> 'clustered' ou 'robust'
+    cluster_entity, cluster_time, clusters : -> Estrutura de cluster no padrão do PanelOLS (até 2 vias)
+    debiased : bool -> Correção de pequenas amostras
+    ----------
+    Retorna
+    ResultadoFE
+    """
+    if kwargs:
+        raise ValueError(f"Argumentos de fit não suportados com tendências por município: {sorted(kwargs)}")
+    entidade = y.index.get_level_values(0).to_numpy()
+    ano = y.index.get_level_values(1).to_numpy()
+    absorvedor = Absorvedor([entidade, ano] if time_effects else [entidade], tendencia=ano)
+    M = absorvedor.demean(np.column_stack([y.to_numpy(dtype=float), X.to_numpy(dtype=float)]))
+
+    lista_clusters = []
+    if cov_type == "clustered":
+        if clusters is not None:
+            lista_clusters = [codificar_grupos(clusters[c].to_numpy())[0] for c in clusters.columns]
+        if cluster_entity:
+            lista_clusters.append(codificar_grupos(entidade)[0])
+        if cluster_time:
+            lista_clusters.append(codificar_grupos(ano)[0])
+    elif cov_type not in ("robust", "heteroskedastic"):
+        raise ValueError(f"cov_type não suportado com tendências por município: {cov_type}")
+    return ajustar_fe(M[:, 0], M[:, 1:], list(X.columns), clusters=lista_clusters, n_efeitos=absorvedor.n_efeitos,
+                      cov_type="clustered" if cov_type == "clustered" else "robust", debiased=debiased,
+                      info={"lhs": str(y.name), "tendencias_entidade": True, "n_inclinacoes": absorvedor.n_inclinacoes})
@@ -0,0 +1,375 @@
+# %% NÚCLEO DE ESTIMAÇÃO COM EFEITOS FIXOS (FE 2-way)
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from scipy import stats
+from covariance import codificar_grupos, matriz_indicadora, cov_clusterizada, cov_robusta, cov_driscoll_kraay, cov_newey_west_entidade
+
+
+def _raizes(pai: np.ndarray) -> np.ndarray:
+    # Compressão de caminho completa (pointer jumping) até cada nó apontar para a raiz
+    while True:
+        avo = pai[pai]
+        if np.array_equal(avo, pai):
+            return pai
+        pai = avo
+
+
+def componentes_conexos(codigos_a: np.ndarray, codigos_b: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Componentes conexos do grafo bipartido efeito A x efeito B (ex.: município x ano), por union-find vetorizado:
+    cada observação une seu município ao seu ano; a cada rodada as raízes maiores são penduradas nas menores.
+    ----------
+    codigos_a, codigos_b : np.ndarray -> Códigos inteiros (0..G-1) dos dois efeitos, um por observação
+    ----------
+    Retorna
+    tuple (componente de cada observação (0..C-1), C)
+    """
+    codigos_a = np.asarray(codigos_a, dtype=np.int64)
+    codigos_b = np.asarray(codigos_b, dtype=np.int64)
+    if codigos_a.size == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    n_a = int(codigos_a.max()) + 1
+    u, v = codigos_a, codigos_b + n_a
+    pai = np.arange(n_a + int(codigos_b.max()) + 1)
+    while True:
+        pai = _raizes(pai)
+        ru, rv = pai[u], pai[v]
+        distintas = ru != rv
+        if not distintas.any():
+            break
+        np.minimum.at(pai, np.maximum(ru, rv)[distintas], np.minimum(ru, rv)[distintas])
+    componente, n_componentes = codificar_grupos(pai[u])
+    return componente, n_componentes
+
+
+def podar_amostra(codigos: list[np.ndarray], *, singletons: bool = True, maior_componente: bool = False) -> tuple[np.ndarray, dict]:
+    """
+    Pré-passo de estimação FE: remove iterativamente observações em grupos com uma única observação (singletons,
+    que não contribuem para os coeficientes mas contam como graus de liberdade) e verifica a conexão município x ano.
+    ----------
+    codigos : list[np.ndarray] -> Rótulos de cada efeito fixo (ex.: [municipio_id, ano]), um por observação
+    singletons : bool -> Remover singletons (repetido até não restar nenhum)
+    maior_componente : bool -> Manter apenas o maior componente conexo (efeitos comparáveis entre todos os municípios)
+    ----------
+    Retorna
+    tuple (máscara booleana das observações mantidas, relatório com o que foi removido)
+    """
+    codigos = [codificar_grupos(c)[0] for c in codigos]
+    n = codigos[0].shape[0] if codigos else 0
+    manter = np.ones(n, dtype=bool)
+    relatorio = {"nobs_inicial": n, "singletons": 0, "rodadas_singletons": 0, "componentes": 1, "fora_maior_componente": 0}
+
+    while singletons and codigos:
+        removidas = np.zeros(n, dtype=bool)
+        for c in codigos:
+            contagem = np.bincount(c[manter], minlength=int(c.max()) + 1)
+            removidas |= manter & (contagem[c] == 1)
+        if not removidas.any():
+            break
+        manter &= ~removidas
+        relatorio["singletons"] += int(removidas.sum())
+        relatorio["rodadas_singletons"] += 1
+
+    if len(codigos) >= 2 and manter.any():
+        componente, n_componentes = componentes_conexos(codificar_grupos(codigos[0][manter])[0], codificar_grupos(codigos[1][manter])[0])
+        relatorio["componentes"] = n_componentes
+        if maior_componente and n_componentes > 1:
+            fora = componente != np.argmax(np.bincount(componente))
+            relatorio["fora_maior_componente"] = int(fora.sum())
+            posicoes = np.flatnonzero(manter)
+            manter[posicoes[fora]] = False
+            relatorio["componentes"] = 1
+    relatorio["nobs"] = int(manter.sum())
+    return manter, relatorio
+
+
+class Absorvedor:
+    """
+    Remove efeitos fixos (município, ano, ...) por projeções alternadas (método MAP).
+    A estrutura de grupos é montada uma única vez por amostra e reutilizada para todas as colunas.
+    ----------
+    grupos : list[array-like] -> Um vetor de rótulos por efeito fixo (ex.: [municipio_id, ano])
+    tol : float -> Tolerância de convergência (variação máxima entre iterações)
+    max_iter : int -> Número máximo de varreduras sobre os efeitos
+    tendencia : array-like | None -> Variável de tempo (ex.: ano); se informada, o primeiro efeito passa a ter intercepto
+        e inclinação próprios (tendência linear por município), projetados por soluções 2 x 2 em forma fechada
+    """
+
+    def __init__(self, grupos: list, *, tol: float = 1e-10, max_iter: int = 10_000, tendencia=None):
+        self.tol = tol
+        self.max_iter = max_iter
+        self._grupos = grupos
+        self._rotulos = [None] * len(grupos)
+        self.codigos = []
+        self.n_grupos = []
+        self._somadores = []
+        self._contagens = []
+        for g in grupos:
+            codigos, n_grupos = codificar_grupos(g)
+            self.codigos.append(codigos)
+            self.n_grupos.append(n_grupos)
+            self._somadores.append(matriz_indicadora(codigos, n_grupos))
+            self._contagens.append(np.bincount(codigos, minlength=n_grupos).astype(float))
+        self.nobs = self.codigos[0].shape[0] if self.codigos else 0
+        self._n_componentes = None
+        self.tendencia = None
+        if tendencia is not None:
+            # Tempo centrado (condicionamento das somas de t²)
+            t = np.asarray(tendencia, dtype=float)
+            self.tendencia = t - t.mean()
+
+    @property
+    def n_inclinacoes(self) -> int:
+        """Número de tendências identificadas (municípios com ao menos dois períodos distintos)."""
+        if self.tendencia is None:
+            return 0
+        S0, S1, S2 = self._momentos_tempo()
+        return int(np.sum(S0 * S2 - S1 * S1 > 1e-9 * np.maximum(S0 * S2, 1.0)))
+
+    def _momentos_tempo(self, pesos: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        S, t = self._somadores[0], self.tendencia
+        w = np.ones_like(t) if pesos is None else pesos
+        return S @ w, S @ (w * t), S @ (w * t * t)
+
+    @property
+    def n_efeitos(self) -> int:
+        """
+        Graus de liberdade absorvidos. Com dois efeitos o posto é G1 + G2 - C, com C o número de componentes conexos
+        (C = 1 em painel conexo, como no PanelOLS); com mais efeitos, G1 + G2 + ... - (n_efeitos - 1).
+        Com tendência por município somam-se as inclinações, menos uma por componente quando há efeito de ano
+        (a tendência comum é combinação das dummies de ano).
+        """
+        if not self.n_grupos:
+            return 0
+        if len(self.n_grupos) == 2:
+            if self._n_componentes is None:
+                self._n_componentes = componentes_conexos(self.codigos[0], self.codigos[1])[1]
+            if self.tendencia is not None:
+                return int(sum(self.n_grupos) + self.n_inclinacoes - 2 * self._n_componentes)
+            return int(sum(self.n_grupos) - self._n_componentes)
+        return int(sum(self.n_grupos) + self.n_inclinacoes - (len(self.n_grupos) - 1))
+
+    def rotulos(self, j: int) -> np.ndarray:
+        """Rótulos do efeito j na ordem dos códigos (0..G-1)."""
+        if self._rotulos[j] is None:
+            self._rotulos[j] = np.unique(np.asarray(self._grupos[j]))
+        return self._rotulos[j]
+
+    def _projetar(self, M: np.ndarray, j: int, pesos: np.ndarray | None = None, massas: np.ndarray | None = None, acumulado: list | None = None) -> np.ndarray:
+        if j == 0 and self.tendencia is not None:
+            return self._projetar_tendencia(M, pesos)
+        if pesos is None:
+            medias = (self._somadores[j] @ M) / self._contagens[j][:, None]
+        else:
+            medias = (self._somadores[j] @ (M * pesos[:, None])) / massas[:, None]
+        if acumulado is not None:
+            acumulado[j] += medias
+        return M - medias[self.codigos[j]]
+
+    def _projetar_tendencia(self, M: np.ndarray, pesos: np.ndarray | None = None) -> np.ndarray:
+        # Por município: MQO de cada coluna em [1, t] (sistema 2 x 2 em forma fechada); sem variação em t, só a média
+        S, t, c = self._somadores[0], self.tendencia, self.codigos[0]
+        Mw = M if pesos is None else M * pesos[:, None]
+        S0, S1, S2 = self._momentos_tempo(pesos)
+        Sm, Stm = S @ Mw, S @ (Mw * t[:, None])
+        det = S0 * S2 - S1 * S1
+        ok = det > 1e-9 * np.maximum(S0 * S2, 1.0)
+        S0 = np.maximum(S0, np.finfo(float).tiny)
+        b = np.where(ok[:, None], (S0[:, None] * Stm - S1[:, None] * Sm) / np.where(ok, det, 1.0)[:, None], 0.0)
+        a = (Sm - b * S1[:, None]) / S0[:, None]
+        return M - a[c] - b[c] * t[:, None]
+
+    def demean(self, M, *, pesos=None, tol: float | None = None, inicial: list[pd.DataFrame] | None = None, efeitos: bool = False):
+        """
+        Retorna M (n x k ou n) livre dos efeitos fixos.
+        ----------
+        M : array-like -> n x k ou n
+        pesos : array-like | None -> Pesos por observação (médias ponderadas, ex.: IRLS do PPML)
+        tol : float | None -> Tolerância desta chamada (padrão self.tol)
+        inicial : list[pd.DataFrame] | None -> Partida quente: efeitos de um ajuste anterior (um DataFrame G x k por efeito,
+            indexado pelos rótulos; rótulos novos partem de zero). Como a partida é combinação de dummies, o resultado é o mesmo
+            da partida a frio, só que em menos varreduras
+        efeitos : bool -> Se True retorna também os efeitos acumulados (no formato de `inicial`, para a próxima atualização)
+        ----------
+        Retorna
+        np.ndarray, ou (np.ndarray, list[pd.DataFrame]) com efeitos=True
+        """
+        M = np.array(M, dtype=float, copy=True)
+        vetor = M.ndim == 1
+        if vetor:
+            M = M[:, None]
+        tol = self.tol if tol is None else tol
+        massas = [None] * len(self.codigos)
+        if pesos is not None:
+            pesos = np.asarray(pesos, dtype=float)
+            massas = [np.maximum(S @ pesos, np.finfo(float).tiny) for S in self._somadores]
+        acumulado = None
+        if inicial is not None or efeitos:
+            if self.tendencia is not None:
+                raise ValueError("Partida quente e efeitos acumulados não estão disponíveis com tendência por município.")
+            acumulado = [np.zeros((g, M.shape[1])) for g in self.n_grupos]
+            for j, ef in enumerate(inicial or []):
+                valores = ef.reindex(self.rotulos(j)).fillna(0.0).to_numpy(dtype=float).reshape(self.n_grupos[j], -1)
+                acumulado[j] = np.broadcast_to(valores, acumulado[j].shape).copy()
+                M -= acumulado[j][self.codigos[j]]
+            if inicial is not None:
+                # Rótulos novos (ex.: o ano acrescentado) partem de zero: uma projeção prévia nos demais efeitos, com o
+                # primeiro já aproximado, evita que esse erro contamine os efeitos de município na primeira varredura
+                for j in range(len(self.codigos) - 1, 0, -1):
+                    M = self._projetar(M, j, pesos, massas[j], acumulado)
+        if len(self.codigos) == 1:
+            M = self._projetar(M, 0, pesos, massas[0], acumulado)
+        elif len(self.codigos) > 1:
+            for _ in range(self.max_iter):
+                anterior = M
+                for j in range(len(self.codigos)):
+                    M = self._projetar(M, j, pesos, massas[j], acumulado)
+                if np.max(np.abs(M - anterior), initial=0.0) < tol:
+                    break
+        M = M[:, 0] if vetor else M
+        if efeitos:
+            return M, [pd.DataFrame(a, index=self.rotulos(j)) for j, a in enumerate(acumulado)]
+        return M
+
+
+@dataclass
+class ResultadoFE:
+    """
+    Resultado de uma regressão com efeitos fixos absorvidos.
+    Usa os mesmos nomes de atributos do linearmodels (params, std_errors, tstats, pvalues, cov)
+    para que possa ser salvo e consultado da mesma forma que um PanelEffectsResults.
+    """
+    params: pd.Series
+    cov: pd.DataFrame
+    nobs: int
+    df_resid: int
+    cov_type: str
+    rsquared: float
+    residuos: np.ndarray = field(repr=False)
+    n_efeitos: int = 0
+    info: dict = field(default_factory=dict)
+
+    @property
+    def std_errors(self) -> pd.Series:
+        return pd.Series(np.sqrt(np.diag(self.cov.to_numpy())), index=self.params.index, name="std_error")
+
+    @property
+    def tstats(self) -> pd.Series:
+        return (self.params / self.std_errors).rename("tstat")
+
+    @property
+    def pvalues(self) -> pd.Series:
+        t = np.abs(self.tstats.to_numpy())
+        return pd.Series(2 * stats.t.sf(t, self.df_resid), index=self.params.index, name="pvalue")
+
+    def conf_int(self, level: float = 0.95) -> pd.DataFrame:
+        q = stats.t.ppf(1 - (1 - level) / 2, self.df_resid)
+        se = self.std_errors
+        return pd.DataFrame({"lower": self.params - q * se, "upper": self.params + q * se})
+
+
+def ajustar_fe(y_dm: np.ndarray, X_dm: np.ndarray, nomes: list[str], *, clusters: list[np.ndarray] | None = None, n_efeitos: int = 0, cov_type: str = "clustered", debiased: bool = True, entidade: np.ndarray | None = None, tempo: np.ndarray | None = None, banda: int | None = None, kernel: str = "bartlett", info: dict | None = None) -> ResultadoFE:
+    """
+    OLS sobre variáveis já livres de efeitos fixos (within), com covariância clusterizada ou robusta.
+    ----------
+    y_dm : np.ndarray -> n, variável dependente demeaned
+    X_dm : np.ndarray -> n x k, regressores demeaned
+    nomes : list[str] -> Nomes dos regressores (ordem das colunas de X_dm)
+    clusters : list[np.ndarray] | None -> 1 ou 2 vetores de códigos de cluster (obrigatório se cov_type='clustered')
+    n_efeitos : int -> Graus de liberdade absorvidos pelos efeitos fixos (Absorvedor.n_efeitos)
+    cov_type : str -> 'clustered', 'robust', 'driscoll_kraay' ou 'newey_west' (HAC dentro do município)
+    debiased : bool -> Correção de pequenas amostras no mesmo padrão do PanelOLS
+    entidade, tempo : np.ndarray | None -> Códigos de entidade e período (obrigatórios nos estimadores HAC)
+    banda : int | None -> Banda dos estimadores HAC (padrão covariance.banda_padrao)
+    kernel : str -> Kernel dos estimadores HAC ('bartlett' ou 'parzen')
+    info : dict | None -> Metadados livres anexados ao resultado
+    ----------
+    Retorna
+    ResultadoFE
+    """
+    y_dm = np.asarray(y_dm, dtype=float).ravel()
+    X_dm = np.asarray(X_dm, dtype=float)
+    nobs, k = X_dm.shape
+
+    xtx = X_dm.T @ X_dm
+    xtx_inv = np.linalg.inv(xtx)
+    beta = xtx_inv @ (X_dm.T @ y_dm)
+    residuos = y_dm - X_dm @ beta
+
+    if cov_type == "clustered":
+        if not clusters:
+            raise ValueError("cov_type='clustered' requer ao menos um vetor de clusters.")
+        cov = cov_clusterizada(X_dm, residuos, clusters, xtx_inv=xtx_inv, extra_df=n_efeitos, debiased=debiased)
+    elif cov_type == "robust":
+        cov = cov_robusta(X_dm, residuos, xtx_inv=xtx_inv, extra_df=n_efeitos, debiased=debiased)
+    elif cov_type == "driscoll_kraay":
+        if tempo is None:
+            raise ValueError("cov_type='driscoll_kraay' requer os códigos de período (tempo).")
+        cov = cov_driscoll_kraay(X_dm, residuos, tempo, banda=banda, kernel=kernel, xtx_inv=xtx_inv, extra_df=n_efeitos, debiased=debiased)
+    elif cov_type == "newey_west":
+        if tempo is None or entidade is None:
+            raise ValueError("cov_type='newey_west' requer os códigos de entidade e de período.")
+        cov = cov_newey_west_entidade(X_dm, residuos, entidade, tempo, banda=banda, kernel=kernel, xtx_inv=xtx_inv, extra_df=n_efeitos, debiased=debiased)
+    else:
+        raise ValueError(f"cov_type não suportado: {cov_type}")
+
+    tss = float(y_dm @ y_dm)
+    rss = float(residuos @ residuos)
+    return ResultadoFE(
+        params=pd.Series(beta, index=nomes, name="parameter"),
+        cov=pd.DataFrame(cov, index=nomes, columns=nomes),
+        nobs=int(nobs),
+        df_resid=int(nobs - k - n_efeitos),
+        cov_type=cov_type,
+        rsquared=1 - rss / tss if tss > 0 else 0.0,
+        residuos=residuos,
+        n_efeitos=int(n_efeitos),
+        info=dict(info or {}),
+    )
+
+
+def montar_W(X: np.ndarray, y: np.ndarray, codigos_tempo: np.ndarray, n_tempo: int, *, centro: np.ndarray | None = None) -> np.ndarray:
+    """
+    Monta W = [X, y, dummies de ano] com X e y centralizados (a constante é absorvida pelos efeitos fixos).
+    Base comum das rotinas que trabalham com produtos cruzados por blocos (jackknife, janelas, atualização incremental).
+    centro : np.ndarray | None -> Vetor subtraído de [X, y] (padrão: a média da própria amostra; informado para que
+        linhas anexadas depois usem o mesmo centro das já existentes)
+    """
+    Z = np.hstack([np.asarray(X, dtype=float), np.asarray(y, dtype=float).reshape(-1, 1)])
+    Z = Z - (Z.mean(axis=0) if centro is None else centro)
+    D = np.zeros((Z.shape[0], n_tempo))
+    D[np.arange(Z.shape[0]), codigos_tempo] = 1.0
+    return np.hstack([Z, D])
+
+
+def resolver_concentrado(WtW: np.ndarray, EW: np.ndarray, cnt: np.ndarray, k: int, *, efeitos_tempo: bool = False):
+    """
+    Resolve o FE 2-way a partir de produtos cruzados somados: W'W (m x m), E'W (N x m) e contagens por município (N).
+    O efeito de município é concentrado analiticamente (E'E diagonal) e os efeitos de ano entram como dummies.
+    ----------
+    WtW : np.ndarray -> W'W com W = montar_W(...)
+    EW : np.ndarray -> Somas de W por município
+    cnt : np.ndarray -> Número de observações por município (0 = município fora da amostra)
+    k : int -> Número de regressores (as k primeiras colunas de W; a coluna k é y)
+    efeitos_tempo : bool -> Se True retorna também os efeitos de ano de cada coluna de [X, y]
+    ----------
+    Retorna
+    beta (k,) ou (beta, lam, anos) com lam (n_anos_usados x k+1) e os índices de ano correspondentes
+    """
+    ativos = cnt > 0
+    EWa = EW[ativos]
+    # Concentrar o efeito de município: W'M_E W = W'W - W'E (E'E)^-1 E'W
+    Q = WtW - EWa.T @ (EWa / cnt[ativos][:, None])
+    z = np.arange(k + 1)
+    # Dummies de ano sem observações têm diagonal nula; entre as demais,
+    # a primeira é a categoria de referência (a soma das dummies é colinear com o FE de município)
+    anos = np.flatnonzero(np.diag(Q)[k + 1:] > 1e-9)[1:]
+    t = k + 1 + anos
+    lam = np.linalg.solve(Q[np.ix_(t, t)], Q[np.ix_(t, z)])
+    Q_zz = Q[np.ix_(z, z)] - Q[np.ix_(z, t)] @ lam
+    beta = np.linalg.solve(Q_zz[:k, :k], Q_zz[:k, k])
+    if efeitos_tempo:
+        return beta, lam, anos
+    return beta
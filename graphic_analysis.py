@@ -4,9 +4,10 @@ import re
 from pathlib import Path
 import matplotlib.pyplot as plt
 import seaborn as sns
-import pandas as pd
-import pyarrow.parquet as pq
-from paths import OUTPUTS_PATH, REGRESSION_MODELS_PATH, IMAGES_PATH, REGRESSION_TABLES_PATH, REGRESSION_TESTS_PATH, RAW_DATA_PATH, PROCESSED_DATA_PATH, FINAL_DATA_PATH
+from paths import OUTPUTS_PATH, REGRESSION_MODELS_PATH, IMAGES_PATH, REGRESSION_TESTS_PATH, RAW_DATA_PATH, FINAL_DATA_PATH, RESULTS_STORE_PATH
+from results_store import RepositorioResultados
+from aggregate_cube import CuboAgregado
+from figure_engine import EspecGrafico, renderizar_graficos
 
 # Configurando o estilo dos gráficos
 sns.set_theme(
@@ -32,26 +33,11 @@ sns.set_theme(
 
 #%% GRÁFICO 1
 # Gráfico com a proporção dos Desembolsos do BNDES vis a vis PIB Real
-# Carregando os dados
-df_pib_hab = pq.read_table(Path(FINAL_DATA_PATH) / 'painel1.parquet').to_pandas()
-df_bndes_total = pq.read_table(Path(PROCESSED_DATA_PATH) / 'base_bndes_total.parquet').to_pandas()
+# Cubo agregado ano x UF x setor (somas de desembolsos, PIB e VA); os gráficos 1-3 e recortes por UF/região saem dele
+cubo = CuboAgregado.carregar(Path(FINAL_DATA_PATH) / 'cubo_agregado.parquet')
 
-# Agrupando os dados por ano
-df_pib_hab = df_pib_hab.groupby('ano')['pib_corrente'].sum().reset_index()
-df_bndes_total = df_bndes_total.groupby('ano')['desembolsos_corrente'].sum().reset_index()
-
-# Garantir compatibilidade de tipos para merge
-df_pib_hab['ano'] = df_pib_hab['ano'].astype(str)
-df_bndes_total['ano'] = df_bndes_total['ano'].astype(str)
-
-# Unir os dados
-df_merged = pd.merge(df_pib_hab, df_bndes_total, left_on='ano', right_on='ano', how='inner')
-
-# Calcular proporção BNDES/PIB em percentual
-df_merged['BNDES_pct_PIB'] = (df_merged['desembolsos_corrente'] / df_merged['pib_corrente']) * 100
-
-# Converter ano para inteiro para facilitar visualização
-df_merged['ano'] = pd.to_numeric(df_merged['ano'], errors='coerce').astype('int64')
+# Razão nacional por ano a partir do cubo agregado (ano x UF x setor) gerado em data_processing.py
+df_merged = cubo.razao('desembolsos_corrente', 'pib_corrente', setor='total').rename('BNDES_pct_PIB').reset_index()
 
 # Criar o gráfico de proporção BNDES/PIB
 plt.plot(df_merged['ano'], df_merged['BNDES_pct_PIB'], 
@@ -85,26 +71,8 @@ plt.show()
 # %% GRÁFICO 2
 # Gráfico com a proporção dos Desembolsos do BNDES para Indústria vis a vis Valor Adicionado da Indústria
 
-# Carregando os dados
-df_pib_hab = pq.read_table(Path(FINAL_DATA_PATH) / 'painel1.parquet').to_pandas()
-df_bndes_industria = pq.read_table(Path(PROCESSED_DATA_PATH) / 'base_bndes_industria.parquet').to_pandas()
-
-# Agrupando os dados por ano
-va_industria_ano = df_pib_hab.groupby('ano')['va_industria_corrente'].sum().reset_index()
-bndes_industria_ano = df_bndes_industria.groupby('ano')['desembolsos_industria_corrente'].sum().reset_index()
-
-# Garantir compatibilidade de tipos para merge
-va_industria_ano['ano'] = va_industria_ano['ano'].astype(str)
-bndes_industria_ano['ano'] = bndes_industria_ano['ano'].astype(str)
-
-# Unir os dados
-df_merged = pd.merge(va_industria_ano, bndes_industria_ano, left_on='ano', right_on='ano', how='inner')
-
-# Calcular proporção BNDES/PIB em percentual
-df_merged['BNDES_pct_va_Industria'] = (df_merged['desembolsos_industria_corrente'] / df_merged['va_industria_corrente']) * 100
-
-# Converter ano para inteiro para facilitar visualização
-df_merged['ano'] = pd.to_numeric(df_merged['ano'], errors='coerce').astype('int64')
+# Razão nacional por ano a partir do cubo agregado (setor indústria: desembolsos / VA da indústria)
+df_merged = cubo.razao('desembolsos_corrente', 'va_corrente', setor='industria').rename('BNDES_pct_va_Industria').reset_index()
 
 # Criar o gráfico de proporção BNDES/PIB
 plt.plot(df_merged['ano'], df_merged['BNDES_pct_va_Industria'], 
@@ -138,26 +106,8 @@ plt.show()
 # %% GRÁFICO 3
 # Gráfico com a proporção dos Desembolsos do BNDES para Agropecuária vis a vis Valor Adicionado da Agropecuária
 
-# Carregando os dados
-df_pib_hab = pq.read_table(Path(FINAL_DATA_PATH) / 'painel1.parquet').to_pandas()
-df_bndes_agropecuaria = pq.read_table(Path(PROCESSED_DATA_PATH) / 'base_bndes_agropecuaria.parquet').to_pandas()
-
-# Agrupando os dados por ano
-va_agropecuaria_ano = df_pib_hab.groupby('ano')['va_agropecuaria_corrente'].sum().reset_index()
-bndes_agropecuaria_ano = df_bndes_agropecuaria.groupby('ano')['desembolsos_agropecuaria_corrente'].sum().reset_index()
-
-# Garantir compatibilidade de tipos para merge
-va_agropecuaria_ano['ano'] = va_agropecuaria_ano['ano'].astype(str)
-bndes_agropecuaria_ano['ano'] = bndes_agropecuaria_ano['ano'].astype(str)
-
-# Unir os dados
-df_merged = pd.merge(va_agropecuaria_ano, bndes_agropecuaria_ano, left_on='ano', right_on='ano', how='inner')
-
-# Calcular proporção BNDES/PIB em percentual
-df_merged['BNDES_pct_va_agropecuaria'] = (df_merged['desembolsos_agropecuaria_corrente'] / df_merged['va_agropecuaria_corrente']) * 100
-
-# Converter ano para inteiro para facilitar visualização
-df_merged['ano'] = pd.to_numeric(df_merged['ano'], errors='coerce').astype('int64')
+# Razão nacional por ano a partir do cubo agregado (setor agropecuária: desembolsos / VA da agropecuária)
+df_merged = cubo.razao('desembolsos_corrente', 'va_corrente', setor='agropecuaria').rename('BNDES_pct_va_agropecuaria').reset_index()
 
 # Criar o gráfico de proporção BNDES/PIB
 plt.plot(df_merged['ano'], df_merged['BNDES_pct_va_agropecuaria'], 
@@ -191,425 +141,79 @@ plt.show()
 
 # %% GRÁFICO 4 ATÉ 11
 # Gráficos de coeficientes por lag com IC 95% para os modelos principais e de robustez, tanto para indústria quanto para agropecuária
-# Gráfico de coeficientes por lag com IC 95% - MODELO 1 - PIB real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model1_pib_principal_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
-
-# PLOT
-fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δlog estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δlog(PIB)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
-plt.legend(loc='upper left')
-sns.despine()
-plt.tight_layout()
-
-# Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico4.svg', bbox_inches='tight')
-
-plt.show()
-
-# Gráfico de coeficientes por lag com IC 95% - MODELO 1 Complementar - PIB real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model1_pib_complementar_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
-
-# PLOT
-fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δlog estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δlog(PIB)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
-plt.legend(loc='upper left')
-sns.despine()
-plt.tight_layout()
-
-# Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico5.svg', bbox_inches='tight')
-
-plt.show()
-# Gráfico de coeficientes por lag com IC 95% - MODELO 2  - Valor Adicionado Indústria real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model2_va_industria_principal_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
-
-# PLOT
-fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δasinh estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Indústria)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
-plt.legend(loc='upper left')
-sns.despine()
-plt.tight_layout()
-
-# Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico6.svg', bbox_inches='tight')
-
-plt.show()
-
-# Gráfico de coeficientes por lag com IC 95% - MODELO 2 Complementar - Valor Adicionado Indústria real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model2_va_industria_complementar_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
 
-# PLOT
-fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δasinh estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Indústria)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
-plt.legend(loc='upper left')
-sns.despine()
-plt.tight_layout()
+TITULO_FE = "FE: Município+Ano | SE: Cluster UF"
+especs_coeficientes = [
+    EspecGrafico("grafico4.svg", "model1_pib_principal_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δlog(PIB)\n{TITULO_FE}", "Coeficiente Δlog estimado"),
+    EspecGrafico("grafico5.svg", "model1_pib_complementar_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δlog(PIB)\n{TITULO_FE}", "Coeficiente Δlog estimado"),
+    EspecGrafico("grafico6.svg", "model2_va_industria_principal_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Indústria)\n{TITULO_FE}", "Coeficiente Δasinh estimado"),
+    EspecGrafico("grafico7.svg", "model2_va_industria_complementar_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Indústria)\n{TITULO_FE}", "Coeficiente Δasinh estimado"),
+    EspecGrafico("grafico8.svg", "model3_va_agropecuaria_principal_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Agropecuária)\n{TITULO_FE}", "Coeficiente Δasinh estimado"),
+    EspecGrafico("grafico9.svg", "model3_va_agropecuaria_complementar_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Agropecuária)\n{TITULO_FE}", "Coeficiente Δasinh estimado"),
+    EspecGrafico("grafico10.svg", "model4_pibpc_principal_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δlog(PIBpc)\n{TITULO_FE}", "Coeficiente Δlog estimado"),
+    EspecGrafico("grafico11.svg", "model4c_pibpc_complementar_uf_cluster", f"Dinâmica do efeito dos desembolsos sobre Δlog(PIBpc)\n{TITULO_FE}", "Coeficiente Δlog estimado"),
+]
+
+# Uma única consulta ao repositório de resultados traz os coeficientes de todos os modelos dos gráficos 4 a 11;
+# as figuras são renderizadas sem display em processos separados (por fork; sem fork, em série) e só as que mudaram são redesenhadas
+repo_resultados = RepositorioResultados(RESULTS_STORE_PATH)
+df_coefs = repo_resultados.coeficientes([e.model for e in especs_coeficientes])
+status_graficos = renderizar_graficos(especs_coeficientes, df_coefs, IMAGES_PATH)
+print(status_graficos)
+
+# %% GRÁFICO 12 - EVENT STUDY DO PRIMEIRO DESEMBOLSO (TWFE x INTERACTION-WEIGHTED)
+# Coeficientes por tempo relativo ao evento (t-1 = referência) para Δlog(PIB), evento = primeiro desembolso > 0
+
+df_evento = repo_resultados.coeficientes(['event_pib_positivo_twfe', 'event_pib_positivo_iw'])
 
-# Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico7.svg', bbox_inches='tight')
-
-plt.show()
-
-# Gráfico de coeficientes por lag com IC 95% - MODELO 3 - Valor Adicionado Agropecuária real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model3_va_agropecuaria_principal_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
-
-# PLOT
 fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δasinh estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Agropecuária)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
+for estimador, cor, desloc in [('twfe', 'gray', -0.1), ('iw', 'blue', 0.1)]:
+    df = df_evento[df_evento['model'] == f'event_pib_positivo_{estimador}'].sort_values('h')
+    ax.plot(df['h'] + desloc, df['coef'], marker='o', markersize=6, linewidth=1.5, color=cor, label=f'Coeficiente ({estimador.upper()})')
+    ax.errorbar(df['h'] + desloc, df['coef'], yerr=[df['coef'] - df['ci_low'], df['ci_high'] - df['coef']],
+                fmt='none', capsize=4, linewidth=2.5, color=cor, alpha=0.3)
+
+# Linha zero e início do evento
+ax.axhline(0, linewidth=1.5, color='red', linestyle=':')
+ax.axvline(-0.5, linewidth=1, color='orange', linestyle='--')
+
+ax.set_title('Event study do primeiro desembolso sobre Δlog(PIB)\nFE: Município+Ano | SE: Cluster UF')
+ax.set_xlabel('Anos em relação ao primeiro desembolso')
+ax.set_ylabel('Coeficiente (IC 95%)')
+ax.set_xticks(df['h'])
+ax.set_xticklabels(['t' if h == 0 else (f't{h}' if h < 0 else f't+{h}') for h in df['h']])
 plt.legend(loc='upper left')
 sns.despine()
 plt.tight_layout()
 
 # Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico8.svg', bbox_inches='tight')
+plt.savefig(Path(IMAGES_PATH) / 'grafico12.svg', bbox_inches='tight')
 
 plt.show()
 
-# Gráfico de coeficientes por lag com IC 95% - MODELO 3 Complementar - Valor Adicionado Agropecuária real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model3_va_agropecuaria_complementar_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
-
-# PLOT
-fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δasinh estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δasinh(Valor Adicionado Agropecuária)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
-plt.legend(loc='upper left')
+# %% GRÁFICO 13 - PROJEÇÕES LOCAIS (IMPULSO-RESPOSTA ACUMULADA)
+# Resposta acumulada ao desembolso corrente por horizonte, com IC 95% (SE: Cluster UF+Ano)
+
+titulos_lp = {'lp_pib': 'Δlog(PIB)', 'lp_pibpc': 'Δlog(PIBpc)', 'lp_va_industria': 'Δasinh(VA Indústria)', 'lp_va_agropecuaria': 'Δasinh(VA Agropecuária)'}
+df = repo_resultados.coeficientes(list(titulos_lp))
+
+fig, axes = plt.subplots(2, 2, sharex=True)
+for ax, (modelo, titulo) in zip(axes.ravel(), titulos_lp.items()):
+    dfm = df[df['model'] == modelo].sort_values('h')
+    ax.fill_between(dfm['h'], dfm['ci_low'], dfm['ci_high'], color='blue', alpha=0.15)
+    ax.plot(dfm['h'], dfm['coef'], marker='o', markersize=6, linewidth=1.5, color='blue')
+    ax.axhline(0, linewidth=1.5, color='red', linestyle=':')
+    ax.set_title(titulo)
+    ax.set_xticks(dfm['h'])
+    ax.set_xticklabels(['t' if h == 0 else f't+{h}' for h in dfm['h']])
+
+fig.suptitle('Projeções locais: resposta acumulada ao desembolso\nFE: Município+Ano | SE: Cluster UF+Ano', fontweight='bold')
+fig.supxlabel('Horizonte')
+fig.supylabel('Coeficiente (IC 95%)')
 sns.despine()
 plt.tight_layout()
 
 # Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico9.svg', bbox_inches='tight')
+plt.savefig(Path(IMAGES_PATH) / 'grafico13.svg', bbox_inches='tight')
 
 plt.show()
-
-# Gráfico de coeficientes por lag com IC 95% - MODELO 4 - PIBpc real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model4_pibpc_principal_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
-
-# PLOT
-fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δlog estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δlog(PIBpc)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
-plt.legend(loc='upper left')
-sns.despine()
-plt.tight_layout()
-
-# Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico10.svg', bbox_inches='tight')
-
-plt.show()
-
-# Gráfico de coeficientes por lag com IC 95% - MODELO 4 Complementar - PIBpc real
-
-df = pd.read_parquet(Path(REGRESSION_TABLES_PATH) / 'model4c_pibpc_complementar_uf_cluster_coef.parquet')
-
-# Manter apenas variáveis de desembolso
-df = df[df["var"].astype(str).str.startswith("share_desembolso")].copy()
-
-# Identificar horizonte temporal
-df["h"] = 0
-df.loc[df["var"].str.contains("_lag"), "h"] = (df.loc[df["var"].str.contains("_lag"), "var"].str.extract(r"_lag(\d+)")[0].astype(int)* -1)
-df.loc[df["var"].str.contains("_lead"), "h"] = (df.loc[df["var"].str.contains("_lead"), "var"].str.extract(r"_lead(\d+)")[0].astype(int))
-df = df.sort_values("h")
-
-# Criar labels do eixo x
-df["h_label"] = df["h"].apply(lambda x: "t" if x == 0 else (f"t{x}" if x < 0 else f"t+{x}"))
-
-# PLOT
-fig, ax = plt.subplots()
-
-# Sombreado laranja no horizonte t (contemporâneo)
-ax.axvspan(-0.3, 0.3, alpha=0.15, color='orange', label='Período Contemporâneo (t)')
-
-# Marcadores: sólidos para coef > 0, vazios para coef < 0
-for idx, row in df.iterrows():
-    marker = 'o' if row['coef'] >= 0 else 'o'
-    fillstyle = 'full' if row['coef'] >= 0 else 'none'
-    ax.plot(row['h'], row['coef'], marker=marker, fillstyle=fillstyle, 
-            markersize=8, color='blue', markeredgewidth=1.5, markeredgecolor='blue')
-
-# Linha conectando os pontos
-ax.plot(df["h"], df["coef"], linewidth=1.5, color="blue", label="Coeficiente Δlog estimado")
-
-# Linha zero
-ax.axhline(0, linewidth=1.5, color="red", linestyle=":")
-
-# Intervalo de confiança 95%
-ax.errorbar(df["h"], df["coef"], yerr=[df["coef"] - df["ci_low"], df["ci_high"] - df["coef"]], 
-            fmt="none", capsize=4, linewidth=2.5, color="blue", alpha=0.3)
-
-ax.set_title("Dinâmica do efeito dos desembolsos sobre Δlog(PIBpc)\nFE: Município+Ano | SE: Cluster UF")
-ax.set_xlabel("Horizonte")
-ax.set_ylabel("Coeficiente (IC 95%)")
-ax.set_xticks(df["h"])
-ax.set_xticklabels(df["h_label"])
-plt.legend(loc='upper left')
-sns.despine()
-plt.tight_layout()
-
-# Salvar
-plt.savefig(Path(IMAGES_PATH) / 'grafico5.svg', bbox_inches='tight')
-
-plt.show()
\ No newline at end of file
@@ -0,0 +1,276 @@
+# %% EFEITOS HETEROGÊNEOS POR UF / MACRORREGIÃO EM UM ÚNICO AJUSTE (REGRESSORES INTERAGIDOS POR BLOCOS)
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.linalg import block_diag
+
+from covariance import codificar_grupos, matriz_indicadora, interseccao_grupos
+from fixed_effects import ResultadoFE
+from hypothesis_tests import Restricao, avaliar_restricoes
+from sample_masks import MapaValidade
+
+# Modelo: y(it) = sum_g 1[g(i) = g] x(it)' β(g) + z(it)' γ + α(i) + λ(t) + ε(it), com λ(t) comum a todos os grupos.
+# Como o município está aninhado na UF (e na região), o within por município preserva a estrutura: a coluna x(j) · 1[g]
+# só é não nula nas linhas do grupo g, e X(g)'X(h) = 0 para g != h. As equações normais ficam
+#   [ diag(A_g)  B ] [β] = [c]      A_g = X̃_g'X̃_g (k x k), B = [X̃_g'Z̃, X̃_g'D̃] e C = [Z̃, D̃]'[Z̃, D̃]
+#   [ B'         C ] [δ]   [r]      (D̃ = dummies de ano livres do efeito de município, δ = (γ, λ))
+# e são resolvidas pelo complemento de Schur S = C - sum_g B_g' A_g^-1 B_g: só há inversões k x k por grupo e uma
+# inversão (p + T - 1) x (p + T - 1). Todos os blocos saem de somas por grupo / grupo x ano sobre o within por município
+# (exato, sem iteração), sem montar a matriz n x (G k) de interações nem as dummies de ano.
+
+# Macrorregiões do IBGE por UF
+REGIOES_UF = {
+    "RO": "N", "AC": "N", "AM": "N", "RR": "N", "PA": "N", "AP": "N", "TO": "N",
+    "MA": "NE", "PI": "NE", "CE": "NE", "RN": "NE", "PB": "NE", "PE": "NE", "AL": "NE", "SE": "NE", "BA": "NE",
+    "MG": "SE", "ES": "SE", "RJ": "SE", "SP": "SE",
+    "PR": "S", "SC": "S", "RS": "S",
+    "MS": "CO", "MT": "CO", "GO": "CO", "DF": "CO",
+}
+
+CLUSTERS_HETEROGENEOS = {
+    "municipio": ("municipio_id",),
+    "municipio_ano": ("municipio_id", "ano"),
+    "uf_ano": ("estado", "ano"),
+}
+
+SEPARADOR = ":"
+
+
+def nome_interacao(variavel: str, grupo) -> str:
+    """Nome do coeficiente de `variavel` no grupo (ex.: 'delta_log_pib_real:SP')."""
+    return f"{variavel}{SEPARADOR}{grupo}"
+
+
+def _somas_por_grupo(codigos: np.ndarray, n_grupos: int, M: np.ndarray) -> np.ndarray:
+    return np.asarray(matriz_indicadora(codigos, n_grupos) @ M)
+
+
+def ajustar_heterogeneo(y: np.ndarray, X: np.ndarray, Z: np.ndarray | None, entidade: np.ndarray, tempo: np.ndarray, grupo: np.ndarray, *, clusters: list[np.ndarray] | None = None, cov_type: str = "clustered", debiased: bool = True) -> dict:
+    """
+    Ajuste conjunto dos coeficientes por grupo (X interagido com o grupo) e comuns (Z), com FE de entidade e de período.
+    ----------
+    y : np.ndarray -> n, variável dependente
+    X : np.ndarray -> n x k, regressores com coeficiente específico de cada grupo
+    Z : np.ndarray | None -> n x p, regressores com coeficiente comum
+    entidade, tempo : np.ndarray -> Códigos 0..N-1 e 0..T-1 (entidade aninhada no grupo)
+    grupo : np.ndarray -> Códigos 0..G-1 do grupo de cada observação
+    clusters : list[np.ndarray] | None -> 1 ou 2 vetores de códigos de cluster (cov_type='clustered')
+    cov_type : str -> 'clustered' ou 'robust'
+    debiased : bool -> Fator n / (n - k - n_efeitos), como no PanelOLS
+    ----------
+    Retorna
+    dict com beta (G x k, NaN onde o regressor não varia no grupo), gamma (p), cov (G k + p, ordem grupo-major),
+    residuos, n_efeitos, rsquared e nobs por grupo
+    """
+    y = np.asarray(y, dtype=float)
+    X = np.asarray(X, dtype=float)
+    n, k = X.shape
+    Z = np.zeros((n, 0)) if Z is None else np.asarray(Z, dtype=float)
+    p = Z.shape[1]
+    N, T, G = int(entidade.max()) + 1, int(tempo.max()) + 1, int(grupo.max()) + 1
+    grupo_ent = np.zeros(N, dtype=np.int64)
+    grupo_ent[entidade] = grupo
+    if np.any(grupo_ent[entidade] != grupo):
+        raise ValueError("Cada entidade deve pertencer a um único grupo (entidade aninhada no grupo).")
+
+    # Within por município (exato) de [y, X, Z]
+    S_ent = matriz_indicadora(entidade, N)
+    cnt_ent = np.bincount(entidade, minlength=N).astype(float)
+    M = np.column_stack([y, X, Z])
+    M = M - (np.asarray(S_ent @ M) / cnt_ent[:, None])[entidade]
+    y_w, X_w, Z_w = M[:, 0], M[:, 1:1 + k], M[:, 1 + k:]
+
+    # Regressores sem variação dentro do grupo (após o within) ficam fora do sistema
+    diag = _somas_por_grupo(grupo, G, X_w ** 2)                                  # G x k
+    ativo = diag > 1e-12 * np.maximum(diag.sum(axis=0), np.finfo(float).tiny)
+    X_w = X_w * ativo[grupo]
+
+    # Blocos por grupo: A_g, c_g, X̃_g'Z̃ e X̃_g'D̃ (= somas de X̃_g por ano, pois X̃ tem média zero no município)
+    A = _somas_por_grupo(grupo, G, (X_w[:, :, None] * X_w[:, None, :]).reshape(n, k * k)).reshape(G, k, k)
+    A[~ativo] = 0.0
+    A[:, np.arange(k), np.arange(k)] += ~ativo
+    c = _somas_por_grupo(grupo, G, X_w * y_w[:, None])                          # G x k
+    XZ = _somas_por_grupo(grupo, G, (X_w[:, :, None] * Z_w[:, None, :]).reshape(n, k * p)).reshape(G, k, p)
+    XD = _somas_por_grupo(grupo * T + tempo, G * T, X_w).reshape(G, T, k).transpose(0, 2, 1)[:, :, 1:]
+
+    # Bloco comum: Z̃'Z̃, Z̃'D̃ e D̃'D̃ = diag(n_t) - C' diag(1/n_i) C (C = contagens município x ano); 1º ano = referência
+    cont = sp.csr_matrix((np.ones(n), (entidade, tempo)), shape=(N, T))
+    DD = np.diag(np.bincount(tempo, minlength=T).astype(float)) - np.asarray((cont.T @ sp.diags(1 / cnt_ent) @ cont).todense())
+    ZD = _somas_por_grupo(tempo, T, Z_w).T[:, 1:]
+    C = np.block([[Z_w.T @ Z_w, ZD], [ZD.T, DD[1:, 1:]]])
+    r = np.concatenate([Z_w.T @ y_w, _somas_por_grupo(tempo, T, y_w[:, None])[1:, 0]])
+    B = np.concatenate([XZ, XD], axis=2)                                          # G x k x m
+
+    # Complemento de Schur
+    A_inv = np.linalg.inv(A)
+    F = A_inv @ B                                                                 # G x k x m
+    S_inv = np.linalg.inv(C - np.einsum("gkm,gkl->ml", B, F))
+    delta = S_inv @ (r - np.einsum("gkm,gk->m", F, c))
+    beta = np.einsum("gkl,gl->gk", A_inv, c - B @ delta)
+
+    # Resíduos: D̃ λ = λ(t) - média de λ no município
+    lam = np.concatenate([[0.0], delta[p:]])
+    efeito_ano = lam[tempo] - (np.asarray(S_ent @ lam[tempo]) / cnt_ent)[entidade]
+    residuos = y_w - np.einsum("nk,nk->n", X_w, beta[grupo]) - Z_w @ delta[:p] - efeito_ano
+
+    # Colunas de Q^-1 dos parâmetros reportados (β por grupo e γ); as dummies de ano entram só nos scores
+    Gk = G * k
+    F_bloco = F.reshape(Gk, -1)
+    FS = F_bloco @ S_inv
+    Q_inv_cols = np.hstack([
+        np.vstack([block_diag(*A_inv) + FS @ F_bloco.T, -FS.T]),
+        np.vstack([-FS[:, :p], S_inv[:, :p]]),
+    ])                                                                            # (G k + p + T - 1) x (G k + p)
+
+    # Scores: parte interagida esparsa (k não nulos por linha, no bloco do grupo) e parte comum densa
+    D_w = np.zeros((n, T))
+    D_w[np.arange(n), tempo] = 1.0
+    D_w = (D_w - (np.asarray(S_ent @ D_w) / cnt_ent[:, None])[entidade])[:, 1:]
+    linhas = np.repeat(np.arange(n), k)
+    colunas = (grupo[:, None] * k + np.arange(k)).ravel()
+    scores_int = sp.csr_matrix(((X_w * residuos[:, None]).ravel(), (linhas, colunas)), shape=(n, Gk))
+    scores_com = np.column_stack([Z_w, D_w]) * residuos[:, None]
+
+    def meat(codigos: np.ndarray) -> np.ndarray:
+        S = matriz_indicadora(codigos)
+        U = np.asarray((S @ scores_int) @ Q_inv_cols[:Gk]) + (S @ scores_com) @ Q_inv_cols[Gk:]
+        return U.T @ U
+
+    if cov_type == "clustered":
+        if not clusters:
+            raise ValueError("cov_type='clustered' requer ao menos um vetor de clusters.")
+        if len(clusters) == 1:
+            V = meat(clusters[0])
+        elif len(clusters) == 2:
+            V = meat(clusters[0]) + meat(clusters[1]) - meat(interseccao_grupos(clusters[0], clusters[1]))
+        else:
+            raise ValueError("Apenas cluster de 1 ou 2 vias é suportado.")
+    elif cov_type == "robust":
+        V = meat(np.arange(n))
+    else:
+        raise ValueError(f"cov_type não suportado: {cov_type}")
+
+    n_params = int(ativo.sum()) + p
+    n_efeitos = N + T - 1
+    escala = n / (n - n_efeitos - (n_params if debiased else 0))
+    V = escala * (V + V.T) / 2
+    r_D = r[p:]
+    tss = float(y_w @ y_w) - float(r_D @ np.linalg.solve(DD[1:, 1:], r_D))
+    omitidos = np.concatenate([~ativo.ravel(), np.zeros(p, dtype=bool)])
+    V[omitidos, :] = np.nan
+    V[:, omitidos] = np.nan
+    beta[~ativo] = np.nan
+
+    return {"beta": beta, "gamma": delta[:p], "cov": V, "residuos": residuos, "n_efeitos": n_efeitos, "n_params": n_params,
+            "rsquared": 1 - float(residuos @ residuos) / tss if tss > 0 else 0.0,
+            "nobs_grupo": np.bincount(grupo, minlength=G)}
+
+
+def efeitos_heterogeneos(df_model: pd.DataFrame, lhs: str, rhs: list[str], *, grupo: str = "estado", comuns: list[str] | None = None, cluster: str = "municipio_ano", cov_type: str = "clustered", debiased: bool = True, mapa: MapaValidade | None = None) -> ResultadoFE:
+    """
+    Coeficientes de `rhs` por UF ou macrorregião, com controles, FE de município e FE de ano comuns, em um único ajuste.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com coluna 'estado'
+    lhs : str -> Variável dependente
+    rhs : list[str] -> Regressores com coeficiente por grupo (ex.: delta_log_pib_real e defasagens)
+    grupo : str -> 'estado', 'regiao' (macrorregião via REGIOES_UF) ou outra coluna constante no município
+    comuns : list[str] | None -> Controles com coeficiente comum a todos os grupos
+    cluster : str -> Estrutura de cluster (chave de CLUSTERS_HETEROGENEOS)
+    cov_type : str -> 'clustered' ou 'robust'
+    debiased : bool -> Correção de pequenas amostras no mesmo padrão do PanelOLS
+    mapa : MapaValidade | None -> Bitmaps de validade de df_model (padrão: calculados sob demanda)
+    ----------
+    Retorna
+    ResultadoFE com parâmetros '{var}:{grupo}' (ordem grupo-major) seguidos dos controles comuns; singletons e municípios
+    fora do maior componente conexo município x ano são removidos antes do ajuste (relatório em info['poda'])
+    """
+    comuns = list(comuns or [])
+    if grupo == "regiao" and "regiao" not in df_model.columns:
+        rotulo_grupo = df_model["estado"].map(REGIOES_UF)
+    else:
+        rotulo_grupo = df_model[grupo]
+    estrutura = CLUSTERS_HETEROGENEOS[cluster]
+    extras = [c for c in estrutura if c in df_model.columns]
+
+    # Mesma construção de amostra dos modelos principais (AND dos bitmaps, sem singletons), restrita ao maior componente
+    mapa = mapa if mapa is not None else MapaValidade(df_model, colunas=[])
+    amostra = mapa.amostra(lhs, list(rhs) + comuns + extras, restricao=rotulo_grupo.notna().to_numpy()).podar(maior_componente=True)
+    indice = amostra.indice
+
+    entidade = codificar_grupos(indice.get_level_values(0).to_numpy())[0]
+    tempo = codificar_grupos(indice.get_level_values(1).to_numpy())[0]
+    rotulos, codigos_grupo = np.unique(rotulo_grupo.to_numpy()[amostra.idx].astype(str), return_inverse=True)
+    clusters = [codificar_grupos(amostra.coluna(c).astype(str) if c in extras else indice.get_level_values(c).to_numpy())[0] for c in estrutura]
+
+    ajuste = ajustar_heterogeneo(amostra.coluna(lhs).astype(float), amostra.matriz(list(rhs)), amostra.matriz(comuns) if comuns else None,
+                                 entidade, tempo, codigos_grupo.ravel(), clusters=clusters, cov_type=cov_type, debiased=debiased)
+
+    nomes = [nome_interacao(v, g) for g in rotulos for v in rhs] + comuns
+    nobs = amostra.nobs
+    return ResultadoFE(
+        params=pd.Series(np.concatenate([ajuste["beta"].ravel(), ajuste["gamma"]]), index=nomes, name="parameter"),
+        cov=pd.DataFrame(ajuste["cov"], index=nomes, columns=nomes),
+        nobs=int(nobs),
+        df_resid=int(nobs - ajuste["n_params"] - ajuste["n_efeitos"]),
+        cov_type=cov_type,
+        rsquared=ajuste["rsquared"],
+        residuos=ajuste["residuos"],
+        n_efeitos=int(ajuste["n_efeitos"]),
+        info={"lhs": lhs, "grupo": grupo, "variaveis": list(rhs), "comuns": comuns, "grupos": [str(g) for g in rotulos],
+              "nobs_grupo": dict(zip([str(g) for g in rotulos], ajuste["nobs_grupo"].tolist())), "cluster": cluster, "poda": amostra.relatorio},
+    )
+
+
+def coeficientes_por_grupo(res: ResultadoFE) -> pd.DataFrame:
+    """
+    Tabela longa dos coeficientes por grupo.
+    ----------
+    Retorna
+    pd.DataFrame com grupo, var, coef, std_err, tstat, p e nobs (observações do grupo)
+    """
+    linhas = []
+    for g in res.info["grupos"]:
+        for v in res.info["variaveis"]:
+            nome = nome_interacao(v, g)
+            linhas.append({"grupo": g, "var": v, "coef": res.params[nome], "std_err": res.std_errors[nome],
+                           "tstat": res.tstats[nome], "p": res.pvalues[nome], "nobs": res.info["nobs_grupo"][g]})
+    return pd.DataFrame(linhas)
+
+
+def covariancias_por_grupo(res: ResultadoFE) -> dict:
+    """Bloco k x k da covariância de cada grupo ({grupo: pd.DataFrame} indexado pelas variáveis)."""
+    variaveis = res.info["variaveis"]
+    blocos = {}
+    for g in res.info["grupos"]:
+        nomes = [nome_interacao(v, g) for v in variaveis]
+        blocos[g] = pd.DataFrame(res.cov.loc[nomes, nomes].to_numpy(), index=variaveis, columns=variaveis)
+    return blocos
+
+
+def restricoes_igualdade_grupos(res: ResultadoFE, *, referencia: str | None = None) -> list[Restricao]:
+    """
+    H0: coeficiente igual em todos os grupos, por variável ('igualdade_grupos_{var}', G - 1 graus de liberdade)
+    e para todas as variáveis em conjunto ('igualdade_grupos'). Grupos em que a variável foi omitida ficam de fora.
+    ----------
+    referencia : str | None -> Grupo de referência das diferenças (padrão: o primeiro disponível); não altera o teste
+    """
+    restricoes, todas = [], []
+    for v in res.info["variaveis"]:
+        grupos = [g for g in res.info["grupos"] if np.isfinite(res.params[nome_interacao(v, g)])]
+        if len(grupos) < 2:
+            continue
+        ref = referencia if referencia in grupos else grupos[0]
+        linhas = tuple(((nome_interacao(v, g), 1.0), (nome_interacao(v, ref), -1.0)) for g in grupos if g != ref)
+        restricoes.append(Restricao(f"igualdade_grupos_{v}", linhas, (0.0,) * len(linhas)))
+        todas.extend(linhas)
+    if len(restricoes) > 1:
+        restricoes.append(Restricao("igualdade_grupos", tuple(todas), (0.0,) * len(todas)))
+    return restricoes
+
+
+def testes_igualdade(res: ResultadoFE, model_name: str) -> pd.DataFrame:
+    """Testes de Wald de igualdade entre grupos (restricoes_igualdade_grupos) no formato de avaliar_restricoes."""
+    # Parâmetros omitidos (NaN) saem da covariância para não contaminar R V R'
+    params = res.params.dropna()
+    return avaliar_restricoes({model_name: (params, res.cov.loc[params.index, params.index])}, restricoes_igualdade_grupos(res))
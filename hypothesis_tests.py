@@ -0,0 +1,201 @@
+# %% MOTOR VETORIZADO DE HIPÓTESES LINEARES (WALD CONJUNTO, SOMAS, IGUALDADES E UNILATERAIS)
+# Importando as bibliotecas necessárias
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Cada hipótese é H0: R b = q. As restrições de um modelo são agrupadas pelo número de linhas de R e avaliadas
+# de uma vez: d = R b - q e S = R V R' saem de einsum sobre a pilha de matrizes (m x q x k), e a estatística
+# d' S^-1 d de um solve em lote. A distribuição segue o wald_test do linearmodels (qui-quadrado; normal nos unilaterais).
+
+
+@dataclass
+class TesteWald:
+    """Teste de Wald (qui-quadrado), com os mesmos atributos do WaldTestStatistic do linearmodels."""
+    stat: float
+    pval: float
+    df: int
+    null: str = ""
+
+    def __str__(self) -> str:
+        return f"Linear Equality Hypothesis Test\nH0: {self.null}\nStatistic: {self.stat:.4f}\nP-value: {self.pval:.4f}\nDistributed: chi2({self.df})"
+
+
+def _termos(expr: str) -> tuple[dict, float]:
+    """Converte 'a + 2*b - c + 1' em ({var: coeficiente}, constante)."""
+    coefs, const = {}, 0.0
+    for sinal, termo in re.findall(r"([+-]?)\s*([^+-]+)", expr.replace(" ", "")):
+        s = -1.0 if sinal == "-" else 1.0
+        fator, var = 1.0, termo
+        if "*" in termo:
+            a, b = termo.split("*", 1)
+            try:
+                fator, var = float(a), b
+            except ValueError:
+                fator, var = float(b), a
+        try:
+            const += s * fator * float(var)
+        except ValueError:
+            coefs[var] = coefs.get(var, 0.0) + s * fator
+    return coefs, const
+
+
+def _linhas_formula(formula) -> tuple[list[dict], list[float]]:
+    formulas = [formula] if isinstance(formula, str) else list(formula)
+    linhas, valores = [], []
+    for f in formulas:
+        lados = [_termos(lado) for lado in f.split("=")]
+        # 'a = b = 0' gera as linhas a - b = 0 e b = 0
+        for (ca, ka), (cb, kb) in zip(lados[:-1], lados[1:]):
+            linha = dict(ca)
+            for v, c in cb.items():
+                linha[v] = linha.get(v, 0.0) - c
+            linhas.append(linha)
+            valores.append(kb - ka)
+    return linhas, valores
+
+
+def restricoes_formula(formula, nomes: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Monta (R, q) de H0: R b = q a partir de fórmulas no padrão do wald_test do linearmodels.
+    """
+    return Restricao.de_formula("", formula).matriz(nomes)
+
+
+@dataclass(frozen=True)
+class Restricao:
+    """
+    Uma hipótese linear H0: R b = q sobre coeficientes nomeados.
+    ----------
+    nome : str -> Identificador do teste (vai para a coluna 'test' do repositório)
+    linhas : tuple -> Uma tupla de pares (variável, coeficiente) por linha de R
+    valores : tuple -> q (um valor por linha)
+    alternativa : str -> 'bilateral', 'maior' (H1: R b > q) ou 'menor' (H1: R b < q); unilaterais exigem 1 linha
+    """
+    nome: str
+    linhas: tuple
+    valores: tuple
+    alternativa: str = "bilateral"
+
+    @classmethod
+    def de_formula(cls, nome: str, formula, alternativa: str = "bilateral") -> "Restricao":
+        linhas, valores = _linhas_formula(formula)
+        return cls(nome, tuple(tuple(l.items()) for l in linhas), tuple(valores), alternativa)
+
+    @property
+    def variaveis(self) -> set:
+        return {v for linha in self.linhas for v, _ in linha}
+
+    def matriz(self, nomes: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        pos = {n: i for i, n in enumerate(nomes)}
+        R = np.zeros((len(self.linhas), len(nomes)))
+        for i, linha in enumerate(self.linhas):
+            for v, c in linha:
+                R[i, pos[v]] += c
+        return R, np.asarray(self.valores, dtype=float)
+
+
+# Construtores das famílias de hipóteses usadas nos modelos A e B
+def zero_conjunto(variaveis: list[str], nome: str | None = None) -> Restricao:
+    """H0: todos os coeficientes = 0."""
+    return Restricao(nome or "zero_" + "+".join(variaveis), tuple(((v, 1.0),) for v in variaveis), (0.0,) * len(variaveis))
+
+
+def soma(variaveis: list[str], valor: float = 0.0, *, nome: str | None = None, alternativa: str = "bilateral") -> Restricao:
+    """H0: soma dos coeficientes = valor (bilateral ou unilateral)."""
+    return Restricao(nome or "soma_" + "+".join(variaveis), (tuple((v, 1.0) for v in variaveis),), (float(valor),), alternativa)
+
+
+def igualdade(a: str, b: str, *, nome: str | None = None) -> Restricao:
+    """H0: coef(a) = coef(b)."""
+    return Restricao(nome or f"igual_{a}={b}", (((a, 1.0), (b, -1.0)),), (0.0,))
+
+
+def igualdades_par_a_par(variaveis: list[str]) -> list[Restricao]:
+    """Todas as igualdades a = b entre pares de variáveis."""
+    return [igualdade(a, b) for i, a in enumerate(variaveis) for b in variaveis[i + 1:]]
+
+
+def janelas_de_soma(base: str, max_lag: int, *, alternativa: str = "bilateral") -> list[Restricao]:
+    """Somas acumuladas base + base_lag1 + ... + base_lagK para K = 0..max_lag (efeito acumulado por janela)."""
+    termos = [base] + [f"{base}_lag{k}" for k in range(1, max_lag + 1)]
+    sufixo = "" if alternativa == "bilateral" else f"_{alternativa}"
+    return [soma(termos[:k + 1], nome=f"acumulado_0_{k}{sufixo}", alternativa=alternativa) for k in range(max_lag + 1)]
+
+
+def bloco_leads(base: str, n_leads: int) -> Restricao:
+    """H0: leads 1..n conjuntamente nulos (pré-tendência)."""
+    return zero_conjunto([f"{base}_lead{k}" for k in range(1, n_leads + 1)], nome=f"leads_1_{n_leads}")
+
+
+def _params_cov(res) -> tuple[pd.Series, pd.DataFrame]:
+    if isinstance(res, tuple):
+        return res
+    return res.params, pd.DataFrame(res.cov)
+
+
+def avaliar_restricoes(modelos: dict, restricoes: list[Restricao]) -> pd.DataFrame:
+    """
+    Avalia todas as restrições em todos os modelos (restrições com variáveis ausentes no modelo são ignoradas).
+    ----------
+    modelos : dict -> {nome: resultado (params/cov) ou tupla (params, cov)}
+    restricoes : list[Restricao] -> Hipóteses a testar
+    ----------
+    Retorna
+    pd.DataFrame com model, test, df, estimativa, std_err, stat, pval, alternativa.
+    Para 1 linha: estimativa = R b, std_err = sqrt(R V R'); stat = z nos unilaterais e qui-quadrado nos bilaterais.
+    """
+    linhas = []
+    for modelo, res in modelos.items():
+        params, cov = _params_cov(res)
+        nomes = [str(v) for v in params.index]
+        b = params.to_numpy(dtype=float)
+        V = cov.loc[params.index, params.index].to_numpy(dtype=float)
+        disponiveis = set(nomes)
+
+        por_tamanho = {}
+        for r in restricoes:
+            if r.variaveis <= disponiveis:
+                por_tamanho.setdefault(len(r.linhas), []).append(r)
+
+        for q, grupo in por_tamanho.items():
+            mats = [r.matriz(nomes) for r in grupo]
+            R = np.stack([m[0] for m in mats])             # m x q x k
+            valores = np.stack([m[1] for m in mats])       # m x q
+            est = np.einsum("mqk,k->mq", R, b)
+            d = est - valores
+            S = np.einsum("mqk,kl,mpl->mqp", R, V, R)      # m x q x q
+            wald = np.einsum("mq,mq->m", d, np.linalg.solve(S, d[..., None])[..., 0])
+            p_bi = stats.chi2.sf(wald, q)
+
+            for i, r in enumerate(grupo):
+                linha = {"model": modelo, "test": r.nome, "df": q, "estimativa": np.nan, "std_err": np.nan,
+                         "stat": float(wald[i]), "pval": float(p_bi[i]), "alternativa": r.alternativa}
+                if q == 1:
+                    se = float(np.sqrt(S[i, 0, 0]))
+                    z = float(d[i, 0]) / se
+                    linha.update(estimativa=float(est[i, 0]), std_err=se)
+                    if r.alternativa == "maior":
+                        linha.update(stat=z, pval=float(stats.norm.sf(z)))
+                    elif r.alternativa == "menor":
+                        linha.update(stat=z, pval=float(stats.norm.cdf(z)))
+                linhas.append(linha)
+    return pd.DataFrame(linhas, columns=["model", "test", "df", "estimativa", "std_err", "stat", "pval", "alternativa"])
+
+
+def bateria_padrao(base: str, *, max_lag: int = 3, n_leads: int = 0, alternativa_acumulado: str = "maior") -> list[Restricao]:
+    """
+    Conjunto padrão de hipóteses de uma família de regressores: lags conjuntamente nulos, somas por janela
+    (bilaterais e unilaterais), leads conjuntamente nulos e igualdades par a par entre os lags.
+    """
+    termos = [base] + [f"{base}_lag{k}" for k in range(1, max_lag + 1)]
+    bateria = [zero_conjunto(termos, nome="betas_conjunto")]
+    bateria += janelas_de_soma(base, max_lag)
+    bateria += janelas_de_soma(base, max_lag, alternativa=alternativa_acumulado)
+    bateria += igualdades_par_a_par(termos)
+    if n_leads:
+        bateria.append(bloco_leads(base, n_leads))
+    return bateria
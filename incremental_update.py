@@ -0,0 +1,225 @@
+# %% ATUALIZAÇÃO INCREMENTAL DO PAINEL E DAS ESTIMAÇÕES QUANDO UM ANO NOVO É PUBLICADO
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+# Quando o IBGE publica mais um ano do PIB municipal, só as linhas do ano novo e as que dependem dele precisam ser
+# recalculadas: as variáveis derivadas de um ano usam no máximo 5 anos de histórico (lag3 do share com o PIB de t-2 como
+# fallback do denominador) e os leads alcançam 2 anos à frente. Basta, portanto, substituir as linhas de T_novo - 2 em
+# diante, derivando-as na janela [T_novo - 7, T_novo]. Anos antigos revisados (nova base de deflatores, revisão do IBGE)
+# invalidam o atalho e levam à reconstrução completa.
+# Do lado das estimações, ver sufficient_stats.EstoqueSuficiente.atualizar (só os blocos ano x UF alterados são refeitos)
+# e fixed_effects.Absorvedor.demean(inicial=...) (partida quente do MAP a partir dos efeitos do ajuste anterior).
+
+# Anos de histórico necessários para derivar um ano novo e anos anteriores cujos leads ele completa
+JANELA_HISTORICO = 5
+HORIZONTE_LEADS = 2
+
+# Colunas do painel antes da derivação (resultado do merge PIB x BNDES em data_processing.py)
+COLUNAS_BASE = [
+    'codigo', 'municipio', 'estado', 'ano', 'populacao', 'pib_corrente', 'pib_real',
+    'va_industria_corrente', 'va_industria_real', 'va_industria_real_pib',
+    'va_agropecuaria_corrente', 'va_agropecuaria_real', 'va_agropecuaria_real_pib',
+    'desembolsos_corrente', 'desembolsos_real_pib', 'desembolsos_industria_corrente', 'desembolsos_industria_real_pib',
+    'desembolsos_industria_real_va', 'desembolsos_agropecuaria_corrente', 'desembolsos_agropecuaria_real_pib',
+    'desembolsos_agropecuaria_real_va',
+]
+
+
+def _deslocar(valores: np.ndarray, grupo: np.ndarray, k: int) -> np.ndarray:
+    """Desloca `valores` k posições (k > 0: defasagem; k < 0: avanço) sem atravessar grupos (linhas ordenadas por grupo)."""
+    out = np.full(valores.shape[0], np.nan)
+    if k == 0:
+        return valores.copy()
+    if abs(k) >= valores.shape[0]:
+        return out
+    if k > 0:
+        mesmo = grupo[k:] == grupo[:-k]
+        out[k:] = np.where(mesmo, valores[:-k], np.nan)
+    else:
+        mesmo = grupo[:k] == grupo[-k:]
+        out[:k] = np.where(mesmo, valores[-k:], np.nan)
+    return out
+
+
+def derivar_variaveis_painel(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Variáveis do painel1 (deltas, shares sobre o PIB do ano anterior, lags, leads e controles) a partir das colunas base.
+    Usada tanto na construção completa (data_processing.py) quanto na janela da atualização incremental.
+    ----------
+    df : pd.DataFrame -> Painel município-ano com COLUNAS_BASE
+    ----------
+    Retorna
+    pd.DataFrame ordenado por código, estado e ano, com as variáveis derivadas
+    """
+    df = df.copy()
+    # Garantir ordenação por código, estado e ano para cálculo correto de diferenças
+    df['ano'] = pd.to_numeric(df['ano'], errors='coerce')
+    df = df.sort_values(by=['codigo', 'estado', 'ano'])
+
+    # Defasagens e avanços dentro do município (equivalem a groupby(['codigo', 'estado']).shift, com uma única fatoração)
+    grupo = df.groupby(['codigo', 'estado'], sort=False).ngroup().to_numpy()
+    deslocar = lambda coluna, k: pd.Series(_deslocar(df[coluna].to_numpy(dtype=float, na_value=np.nan), grupo, k), index=df.index)
+
+    # Calcular variável em função do PIB, além de suas diferenças (delta) ano a ano
+    df['log_pib_real'] = np.log(df['pib_real'])
+    df['asinh_va_industria_real_pib'] = np.arcsinh(df['va_industria_real_pib'])
+    df['asinh_va_agropecuaria_real_pib'] = np.arcsinh(df['va_agropecuaria_real_pib'])
+    df['delta_log_pib_real'] = df['log_pib_real'] - deslocar('log_pib_real', 1)
+    df['delta_asinh_va_industria_real_pib'] = df['asinh_va_industria_real_pib'] - deslocar('asinh_va_industria_real_pib', 1)
+    df['delta_asinh_va_agropecuaria_real_pib'] = df['asinh_va_agropecuaria_real_pib'] - deslocar('asinh_va_agropecuaria_real_pib', 1)
+    df['pibpc_real'] = df['pib_real'] / df['populacao']
+    df['log_pibpc_real'] = np.log(df['pibpc_real'])
+    df['delta_log_pibpc_real'] = df['log_pibpc_real'] - deslocar('log_pibpc_real', 1)
+
+    # Calcular variável em função do VA de cada setor, além de suas diferenças (delta) ano a ano
+    df['asinh_va_industria_real'] = np.arcsinh(df['va_industria_real'])
+    df['asinh_va_agropecuaria_real'] = np.arcsinh(df['va_agropecuaria_real'])
+    df['delta_asinh_va_industria_real'] = df['asinh_va_industria_real'] - deslocar('asinh_va_industria_real', 1)
+    df['delta_asinh_va_agropecuaria_real'] = df['asinh_va_agropecuaria_real'] - deslocar('asinh_va_agropecuaria_real', 1)
+
+    # Calcular variáveis lag 1--3 das variáveis acima
+    for lag in range(1, 4):
+        df[f'delta_asinh_va_industria_real_lag{lag}'] = deslocar('delta_asinh_va_industria_real', lag)
+        df[f'delta_asinh_va_agropecuaria_real_lag{lag}'] = deslocar('delta_asinh_va_agropecuaria_real', lag)
+
+    # Calcular pib_real com lag
+    pib_lag1 = deslocar('pib_real', 1)
+    pib_lag2 = deslocar('pib_real', 2)
+
+    # Calcular delta_log_pib_real e log_pib_real com lag
+    delta_log_pib_real_lag1 = deslocar('delta_log_pib_real', 1)
+    delta_log_pib_real_lag2 = deslocar('delta_log_pib_real', 2)
+
+    # Adicionar lag1 e lag2 do delta_log_pib_real ao dataframe
+    df['delta_log_pib_real_lag1'] = delta_log_pib_real_lag1
+    df['delta_log_pib_real_lag2'] = delta_log_pib_real_lag2
+
+    # ! Usar t-1 como padrão, mas quando t-1 for NaN ou zero, usar t-2 (ocorre apenas em 1 caso, GUAMARE (RN) com PIB NEGATIVO em 2012)
+    pib_lag = pib_lag1.copy()
+    mask_usar_lag2 = (pib_lag1.isna()) | (pib_lag1 == 0)
+    pib_lag[mask_usar_lag2] = pib_lag2[mask_usar_lag2]
+
+    # Calcular variáveis de share_desembolso_real em relação aos pib_real_ano_anterior
+    df['share_desembolso_real_pib_real_ano_anterior'] = (df['desembolsos_real_pib'] / pib_lag)
+    df['share_desembolso_industria_real_ano_anterior'] = (df['desembolsos_industria_real_pib'] / pib_lag)
+    df['share_desembolso_agropecuaria_real_ano_anterior'] = (df['desembolsos_agropecuaria_real_pib'] / pib_lag)
+    df['share_desembolso_pc_real_pib_real_ano_anterior'] = (df['desembolsos_real_pib'] / df['populacao'] / pib_lag) # desembolso per capita
+
+    # Calcular variáveis lag 1--3 das variáveis acima
+    for lag in range(1, 4):
+        df[f'share_desembolso_real_pib_real_ano_anterior_lag{lag}'] = deslocar('share_desembolso_real_pib_real_ano_anterior', lag)
+        df[f'share_desembolso_industria_real_ano_anterior_lag{lag}'] = deslocar('share_desembolso_industria_real_ano_anterior', lag)
+        df[f'share_desembolso_agropecuaria_real_ano_anterior_lag{lag}'] = deslocar('share_desembolso_agropecuaria_real_ano_anterior', lag)
+        df[f'share_desembolso_pc_real_pib_real_ano_anterior_lag{lag}'] = deslocar('share_desembolso_pc_real_pib_real_ano_anterior', lag)
+
+    # Calcular variáveis de controle: log_populacao_lag1, log_pibpc_real_lag1 e share_industria_lag1 (ou seja, em t-1)
+    df['log_populacao'] = np.log(df['populacao'])
+    df['log_populacao_lag1'] = deslocar('log_populacao', 1)
+    df['pibpc_real'] = df['pib_real'] / df['populacao']
+    df['log_pibpc_real'] = np.log(df['pibpc_real'])
+    df['log_pibpc_real_lag1'] = deslocar('log_pibpc_real', 1)
+    df['share_industria'] = df['va_industria_real'] / df['pib_real']
+    df['share_industria_lag1'] = deslocar('share_industria', 1)
+    df['share_agropecuaria'] = df['va_agropecuaria_real'] / df['pib_real']
+    df['share_agropecuaria_lag1'] = deslocar('share_agropecuaria', 1)
+
+    # Calcular variável independente lead (Xt+1) e (Xt+2)
+    # ! variável sem log, shift no numerador para ano futuro
+    df.loc[df['pib_real'] <= 0, 'pib_real'] = np.nan  # Substituir valores de PIB real menores ou iguais a zero por NaN para evitar problemas de divisão e log
+    pib_t = df['pib_real']  # PIB_t
+    pib_tp1 = deslocar('pib_real', -1) # PIB_{t+1}
+    desemb_tp1 = deslocar('desembolsos_real_pib', -1) # Desemb_{t+1}
+    desemb_tp2 = deslocar('desembolsos_real_pib', -2) # Desemb_{t+2}
+    desemb_tp1_ind = deslocar('desembolsos_industria_real_pib', -1) # Desemb_{t+1}
+    desemb_tp2_ind = deslocar('desembolsos_industria_real_pib', -2) # Desemb_{t+2}
+    desemb_tp1_agro = deslocar('desembolsos_agropecuaria_real_pib', -1) # Desemb_{t+1}
+    desemb_tp2_agro = deslocar('desembolsos_agropecuaria_real_pib', -2) # Desemb_{t+2}
+
+    df['share_desembolso_real_pib_real_ano_anterior_lead1'] = desemb_tp1 / pib_t
+    df['share_desembolso_real_pib_real_ano_anterior_lead2'] = desemb_tp2 / pib_tp1
+    df['share_desembolso_industria_real_pib_real_ano_anterior_lead1'] = desemb_tp1_ind / pib_t
+    df['share_desembolso_industria_real_pib_real_ano_anterior_lead2'] = desemb_tp2_ind / pib_tp1
+    df['share_desembolso_agropecuaria_real_pib_real_ano_anterior_lead1'] = desemb_tp1_agro / pib_t
+    df['share_desembolso_agropecuaria_real_pib_real_ano_anterior_lead2'] = desemb_tp2_agro / pib_tp1
+    return df
+
+
+def anos_novos(df_antigo: pd.DataFrame, df_base: pd.DataFrame) -> list[int]:
+    """Anos presentes na base e ausentes do painel já derivado."""
+    antigos = set(pd.to_numeric(df_antigo['ano']).astype(int))
+    return sorted(set(pd.to_numeric(df_base['ano']).astype(int)) - antigos)
+
+
+def verificar_revisoes(df_antigo: pd.DataFrame, df_base: pd.DataFrame, *, rtol: float = 1e-9) -> pd.DataFrame:
+    """
+    Células das colunas base que mudaram entre o painel derivado e a nova base, nos anos em comum.
+    ----------
+    Retorna
+    pd.DataFrame com codigo, estado, ano, coluna, antigo e novo (vazio quando não há revisões)
+    """
+    chaves = ['codigo', 'estado', 'ano']
+    numericas = [c for c in COLUNAS_BASE if c not in chaves + ['municipio']]
+    a = _normalizar_chaves(df_antigo[COLUNAS_BASE]).set_index(chaves)[numericas]
+    b = _normalizar_chaves(df_base[COLUNAS_BASE]).set_index(chaves)[numericas]
+    # O painel derivado guarda pib_real <= 0 como NaN (ver derivar_variaveis_painel); a base bruta recebe o mesmo
+    # tratamento antes da comparação, senão todo PIB não positivo contaria como revisão
+    b['pib_real'] = b['pib_real'].where(~(b['pib_real'] <= 0))
+    comuns = a.index.intersection(b.index)
+    va = a.loc[comuns].to_numpy(dtype=float)
+    vb = b.loc[comuns].to_numpy(dtype=float)
+    # Municípios-ano que entram ou saem dos anos antigos também contam como revisão
+    anos_comuns = set(a.index.get_level_values('ano')) & set(b.index.get_level_values('ano'))
+    fora = a.index.symmetric_difference(b.index)
+    fora = fora[fora.get_level_values('ano').isin(anos_comuns)]
+
+    ambos_nan = np.isnan(va) & np.isnan(vb)
+    diferente = ~ambos_nan & ~(np.abs(va - vb) <= rtol * np.maximum(np.abs(va), np.abs(vb)))
+    i, j = np.nonzero(diferente)
+    out = pd.DataFrame({'coluna': np.asarray(numericas)[j], 'antigo': va[i, j], 'novo': vb[i, j]}, index=comuns[i]).reset_index()
+    if len(fora):
+        out = pd.concat([out, pd.DataFrame({'coluna': 'linha', 'antigo': np.nan, 'novo': np.nan}, index=fora).reset_index()], ignore_index=True)
+    return out
+
+
+def _normalizar_chaves(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df['codigo'] = df['codigo'].astype('string')
+    df['estado'] = df['estado'].astype('string')
+    df['ano'] = pd.to_numeric(df['ano'], errors='coerce').astype(int)
+    return df
+
+
+def atualizar_painel(df_antigo: pd.DataFrame, df_base: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Atualiza o painel derivado com os anos novos da base, recalculando só a janela afetada.
+    ----------
+    df_antigo : pd.DataFrame -> Painel já derivado (painel1.parquet)
+    df_base : pd.DataFrame -> Colunas base de todos os anos ou só dos anos novos
+    ----------
+    Retorna
+    tuple (painel atualizado, relatório com 'modo' = 'sem_alteracao' | 'incremental' | 'completo', anos novos e linhas recalculadas)
+    """
+    antigo = _normalizar_chaves(df_antigo[COLUNAS_BASE])
+    base = _normalizar_chaves(df_base[COLUNAS_BASE])
+    novos = anos_novos(antigo, base)
+    revisoes = verificar_revisoes(antigo, base)
+    if len(revisoes):
+        # Revisão de anos antigos: o atalho não vale; reconstrução completa se a base cobrir todos os anos
+        if not set(antigo['ano']) <= set(base['ano']):
+            raise ValueError(f"A base revisa {len(revisoes)} células de anos antigos, mas não cobre todos os anos do painel; informe a base completa.")
+        return derivar_variaveis_painel(df_base), {'modo': 'completo', 'anos_novos': novos, 'revisoes': len(revisoes), 'linhas_recalculadas': len(df_base)}
+    if not novos:
+        return df_antigo, {'modo': 'sem_alteracao', 'anos_novos': [], 'revisoes': 0, 'linhas_recalculadas': 0}
+
+    # Janela: histórico suficiente para as linhas substituídas (T_novo - 2 em diante) + anos novos. As linhas vêm da base
+    # quando ela as contém (valores brutos, como na construção completa); as do painel antigo têm pib_real <= 0 já como NaN
+    primeiro = min(novos)
+    janela = pd.concat([antigo[antigo['ano'] >= primeiro - HORIZONTE_LEADS - JANELA_HISTORICO], base[base['ano'] >= primeiro - HORIZONTE_LEADS - JANELA_HISTORICO]], ignore_index=True)
+    janela = janela.drop_duplicates(subset=['codigo', 'estado', 'ano'], keep='last')
+    derivada = derivar_variaveis_painel(janela)
+    derivada = derivada[derivada['ano'] >= primeiro - HORIZONTE_LEADS]
+
+    mantidas = df_antigo[antigo['ano'].to_numpy() < primeiro - HORIZONTE_LEADS]
+    df_novo = pd.concat([mantidas, derivada[df_antigo.columns]], ignore_index=True).sort_values(by=['codigo', 'estado', 'ano'])
+    return df_novo, {'modo': 'incremental', 'anos_novos': novos, 'revisoes': 0, 'linhas_recalculadas': len(derivada)}
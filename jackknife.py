@@ -0,0 +1,145 @@
+# %% JACKKNIFE LEAVE-ONE-CLUSTER-OUT POR DOWNDATING DAS EQUAÇÕES NORMAIS
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+from covariance import codificar_grupos, matriz_indicadora
+from fixed_effects import montar_W, resolver_concentrado
+from sample_masks import MapaValidade
+
+# Um único cálculo das contribuições por cluster permite obter cada estimativa "deixando um cluster de fora"
+# sem refazer o PanelOLS. O efeito fixo de município é concentrado analiticamente (E'E é diagonal) e os
+# efeitos de ano entram como dummies explícitas; assim a estimativa delete-one é EXATA para FE 2-way,
+# qualquer que seja o cluster removido (UF, ano, município...).
+
+
+@dataclass
+class ResultadoJackknife:
+    """
+    estimativas : pd.DataFrame -> Uma linha por cluster removido (coeficientes + efeito acumulado)
+    completo : pd.Series -> Estimativa com a amostra completa
+    se_jackknife : pd.Series -> Erro-padrão jackknife sqrt((G-1)/G * sum (b_-g - b_medio)^2)
+    cov_jackknife : pd.DataFrame -> Matriz de covariância jackknife
+    influentes : pd.DataFrame -> Clusters ordenados pela variação absoluta da estatística-alvo
+    """
+    estimativas: pd.DataFrame
+    completo: pd.Series
+    se_jackknife: pd.Series
+    cov_jackknife: pd.DataFrame
+    influentes: pd.DataFrame
+
+
+class SistemaNormalFE:
+    """
+    Produtos cruzados de W = [X, y, dummies de ano] com as contribuições de cada cluster.
+    ----------
+    X : np.ndarray -> n x k regressores (em nível, sem demeaning)
+    y : np.ndarray -> n variável dependente
+    entidade : array-like -> rótulo do efeito fixo concentrado (município)
+    tempo : array-like -> rótulo do efeito fixo explícito (ano)
+    cluster : array-like -> rótulo do cluster a ser removido um a um
+    """
+
+    def __init__(self, X, y, entidade, tempo, cluster):
+        self.k = np.asarray(X).shape[1]
+        ent, self.n_ent = codificar_grupos(entidade)
+        tmp, self.n_tempo = codificar_grupos(tempo)
+        self.cl, self.n_cl = codificar_grupos(cluster)
+        self.rotulos_cluster = np.unique(np.asarray(cluster))
+
+        W = montar_W(X, y, tmp, self.n_tempo)
+        self.m = W.shape[1]
+
+        # Totais da amostra completa
+        self.WtW = W.T @ W
+        self.EW = matriz_indicadora(ent, self.n_ent) @ W
+        self.cnt = np.bincount(ent, minlength=self.n_ent).astype(float)
+
+        # Contribuições por cluster: W_g'W_g e somas por célula (entidade x cluster)
+        ordem = np.argsort(self.cl, kind="stable")
+        limites = np.searchsorted(self.cl[ordem], np.arange(self.n_cl + 1))
+        self.WtW_g = np.empty((self.n_cl, self.m, self.m))
+        for g in range(self.n_cl):
+            Wg = W[ordem[limites[g]:limites[g + 1]]]
+            self.WtW_g[g] = Wg.T @ Wg
+
+        celula = ent.astype(np.int64) * self.n_cl + self.cl
+        cel_cod, n_cel = codificar_grupos(celula)
+        # Qualquer observação da célula identifica sua entidade e seu cluster
+        primeiro = np.empty(n_cel, dtype=np.int64)
+        primeiro[cel_cod] = np.arange(len(cel_cod))
+        self.cel_ent = ent[primeiro]
+        self.cel_cl = self.cl[primeiro]
+        self.cel_W = matriz_indicadora(cel_cod, n_cel) @ W
+        self.cel_cnt = np.bincount(cel_cod, minlength=n_cel).astype(float)
+        self._cel_por_cluster = [np.flatnonzero(self.cel_cl == g) for g in range(self.n_cl)]
+
+    def _resolver(self, WtW, EW, cnt) -> np.ndarray:
+        return resolver_concentrado(WtW, EW, cnt, self.k)
+
+    def estimativa_completa(self) -> np.ndarray:
+        return self._resolver(self.WtW, self.EW, self.cnt)
+
+    def estimativa_sem(self, g: int) -> np.ndarray:
+        """Estimativa removendo o cluster g (downdating de W'W, E'W e E'E)."""
+        cel = self._cel_por_cluster[g]
+        EW = self.EW.copy()
+        cnt = self.cnt.copy()
+        np.subtract.at(EW, self.cel_ent[cel], self.cel_W[cel])
+        np.subtract.at(cnt, self.cel_ent[cel], self.cel_cnt[cel])
+        return self._resolver(self.WtW - self.WtW_g[g], EW, cnt)
+
+
+def jackknife_clusters(df_model: pd.DataFrame, lhs: str, rhs: list[str], *, cluster: str = "estado", vars_acumulado: list[str] | None = None, alvo: str | None = None, top: int = 5, mapa: MapaValidade | None = None) -> ResultadoJackknife:
+    """
+    Jackknife leave-one-cluster-out para um modelo FE 2-way (município + ano).
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano)
+    lhs : str -> Variável dependente
+    rhs : list[str] -> Regressores
+    cluster : str -> Coluna (ou nível do índice: 'municipio_id', 'ano') que define os clusters removidos
+    vars_acumulado : list[str] | None -> Coeficientes somados no efeito acumulado (ex.: β0..β3)
+    alvo : str | None -> Estatística usada para ordenar a influência (padrão: 'efeito_acumulado' ou rhs[0])
+    top : int -> Número de clusters mais influentes reportados
+    mapa : MapaValidade | None -> Bitmaps de validade de df_model (padrão: calculados sob demanda)
+    ----------
+    Retorna
+    ResultadoJackknife
+    """
+    # Mesma amostra do modelo completo: AND dos bitmaps de lhs, rhs e cluster, sem singletons de município/ano
+    mapa = mapa if mapa is not None else MapaValidade(df_model, colunas=[])
+    coluna_cluster = cluster in df_model.columns
+    amostra = mapa.amostra(lhs, rhs + ([cluster] if coluna_cluster else [])).podar()
+    indice = amostra.indice
+    rotulos = amostra.coluna(cluster).astype(str) if coluna_cluster else indice.get_level_values(cluster).to_numpy()
+
+    sistema = SistemaNormalFE(
+        amostra.matriz(rhs), amostra.coluna(lhs).astype(float),
+        indice.get_level_values(0).to_numpy(), indice.get_level_values(1).to_numpy(),
+        rotulos,
+    )
+
+    completo = pd.Series(sistema.estimativa_completa(), index=rhs)
+    estimativas = pd.DataFrame(
+        np.vstack([sistema.estimativa_sem(g) for g in range(sistema.n_cl)]),
+        index=pd.Index(sistema.rotulos_cluster, name=cluster), columns=rhs,
+    )
+    if vars_acumulado:
+        completo["efeito_acumulado"] = completo[vars_acumulado].sum()
+        estimativas["efeito_acumulado"] = estimativas[vars_acumulado].sum(axis=1)
+
+    G = sistema.n_cl
+    desvios = estimativas - estimativas.mean()
+    cov_jk = (G - 1) / G * (desvios.T @ desvios)
+    se_jk = pd.Series(np.sqrt(np.diag(cov_jk)), index=cov_jk.index, name="se_jackknife")
+
+    alvo = alvo or ("efeito_acumulado" if vars_acumulado else rhs[0])
+    influentes = pd.DataFrame({
+        "estimativa_sem_cluster": estimativas[alvo],
+        "variacao": estimativas[alvo] - completo[alvo],
+    })
+    influentes["variacao_em_se"] = influentes["variacao"] / se_jk[alvo]
+    influentes = influentes.reindex(influentes["variacao"].abs().sort_values(ascending=False).index).head(top)
+
+    return ResultadoJackknife(estimativas, completo, se_jk, cov_jk, influentes)
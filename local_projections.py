@@ -0,0 +1,86 @@
+# %% PROJEÇÕES LOCAIS (JORDÀ) EM LOTE PARA VÁRIOS HORIZONTES
+# Importando as bibliotecas necessárias
+import pandas as pd
+
+from specification_grid import CONTROLES_PADRAO, Especificacao, deslocar_por_ano, garantir_defasagens, rodar_grade
+
+# Para cada horizonte h, y_{t+h} - y_{t-1} = soma de Δy_{t..t+h} é regredido no choque em t (mesmos FE e controles).
+# Cada horizonte perde os h últimos anos; as regressões são montadas como especificações de specification_grid,
+# de modo que horizontes/resultados com a mesma amostra compartilham o demeaning e rodam em paralelo.
+
+HORIZONTES_PADRAO = range(0, 7)
+
+
+def construir_saidas_futuras(df_model: pd.DataFrame, lhs: str, horizontes=HORIZONTES_PADRAO, *, acumulado: bool = True) -> list[str]:
+    """
+    Cria (in place) as variáveis dependentes de cada horizonte: {lhs}_lp_h{h}.
+    O painel deve estar indexado por (municipio_id, ano); os avanços seguem o ano (deslocar_por_ano), então um ano
+    ausente dentro de t..t+h deixa a resposta em NaN.
+    ----------
+    lhs : str -> Variável em diferença (ex.: delta_log_pib_real)
+    horizontes : iterável -> Horizontes h >= 0
+    acumulado : bool -> Se True usa a resposta acumulada (soma de Δy de t a t+h); senão Δy_{t+h}
+    ----------
+    Retorna
+    list[str] com os nomes das colunas, na ordem dos horizontes
+    """
+    horizontes = sorted(horizontes)
+    futuros = {h: deslocar_por_ano(df_model, lhs, -h) if h else df_model[lhs] for h in range(max(horizontes) + 1)}
+    acumulada = None
+    nomes = []
+    for h in range(max(horizontes) + 1):
+        acumulada = futuros[h] if acumulada is None else acumulada + futuros[h]
+        if h in horizontes:
+            col = f"{lhs}_lp_h{h}"
+            df_model[col] = acumulada if acumulado else futuros[h]
+            nomes.append(col)
+    return nomes
+
+
+def projecoes_locais(df_model: pd.DataFrame, resultados: dict, choque: str, *, horizontes=HORIZONTES_PADRAO, n_lags_choque: int = 2, defasagens_y: int = 1, controles: str = "completo", cluster: str = "uf_ano", acumulado: bool = True, n_workers: int = 4, out_path=None) -> pd.DataFrame:
+    """
+    Funções impulso-resposta por projeções locais para vários resultados e horizontes.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com coluna 'estado'
+    resultados : dict -> {nome: lhs}, ex.: {'pib': 'delta_log_pib_real'}
+    choque : str -> Variável de choque (ex.: share_desembolso_real_pib_real_ano_anterior)
+    horizontes : iterável -> Horizontes h = 0..H
+    n_lags_choque : int -> Defasagens do choque incluídas como controles
+    defasagens_y : int -> Defasagens de Δy incluídas como controles
+    controles : str -> Conjunto de controles (chave de CONTROLES_PADRAO)
+    cluster : str -> Estrutura de cluster (chave de specification_grid.CLUSTERS_PADRAO)
+    acumulado : bool -> Resposta acumulada (padrão) ou Δy_{t+h}
+    n_workers : int -> Threads usadas por rodar_grade
+    out_path : str | Path | None -> Se informado, salva a IRF em Parquet
+    ----------
+    Retorna
+    pd.DataFrame longo (model, var, coef, std_err, t, p, ci_low, ci_high) + h, lhs, nobs
+    """
+    df_model = df_model.sort_index()
+    garantir_defasagens(df_model, choque, n_lags_choque, 0)
+
+    grade = []
+    conjuntos = {}
+    origem = {}
+    for nome, lhs in resultados.items():
+        garantir_defasagens(df_model, lhs, defasagens_y, 0)
+        conjuntos[f"lp_{nome}"] = list(CONTROLES_PADRAO[controles]) + [f"{lhs}_lag{k}" for k in range(1, defasagens_y + 1)]
+        for h, col in zip(sorted(horizontes), construir_saidas_futuras(df_model, lhs, horizontes, acumulado=acumulado)):
+            spec = Especificacao(f"lp_{nome}", col, choque, n_lags_choque, 0, f"lp_{nome}", cluster)
+            grade.append(spec)
+            origem[spec.spec_id] = (lhs, h)
+
+    df_grade = rodar_grade(df_model, grade, conjuntos_controles=conjuntos, n_workers=n_workers)
+
+    irf = df_grade[df_grade["var"] == choque].copy()
+    irf["lhs"] = irf["spec_id"].map(lambda s: origem[s][0])
+    irf["h"] = irf["spec_id"].map(lambda s: origem[s][1])
+    irf = (
+        irf.rename(columns={"modelo": "model"})
+        [["model", "var", "coef", "std_err", "t", "p", "ci_low", "ci_high", "h", "lhs", "cluster", "nobs"]]
+        .sort_values(["model", "h"])
+        .reset_index(drop=True)
+    )
+    if out_path is not None:
+        irf.to_parquet(out_path, index=False)
+    return irf
@@ -0,0 +1,144 @@
+# %% ALINHAMENTO DE PAINÉIS POR ÍNDICE ORDENADO (MUNICÍPIO, ANO)
+# Importando as bibliotecas necessárias
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Cada painel é lido uma vez só nas colunas-chave e indexado por uma chave inteira:
+#   chave = unidade * n_anos + (ano - ano_min),  com 'unidade' o código conjunto de (codigo, estado) compartilhado entre
+# os painéis. A chave é ordenada uma vez (arquivos já ordenados dispensam a ordenação) e guarda a linha de origem.
+# O alinhamento é a interseção das chaves ordenadas por busca binária (searchsorted), sem junção por hash, e cada painel
+# contribui só com as colunas pedidas, lidas do parquet e tomadas (take) nas posições da interseção.
+# O resultado equivale a merges internos sucessivos nas chaves, com as linhas em ordem crescente de (unidade, ano).
+
+CHAVES_PADRAO = ("codigo", "estado", "ano")
+
+
+@dataclass
+class PainelIndexado:
+    """
+    Painel indexado pela chave (unidade, ano).
+    ----------
+    fonte : Path | pd.DataFrame -> Arquivo parquet (lido por colunas) ou DataFrame já carregado
+    chave : np.ndarray -> Chaves inteiras em ordem crescente (únicas)
+    linhas : np.ndarray -> Linha da fonte correspondente a cada chave
+    colunas : list[str] -> Colunas disponíveis na fonte
+    """
+    fonte: Path | pd.DataFrame
+    chave: np.ndarray
+    linhas: np.ndarray
+    colunas: list[str]
+
+    def ler(self, colunas: list[str]) -> pa.Table:
+        """Lê apenas as colunas pedidas (na ordem original das linhas da fonte)."""
+        faltantes = [c for c in colunas if c not in self.colunas]
+        if faltantes:
+            raise KeyError(f"Colunas ausentes em {self.fonte if isinstance(self.fonte, Path) else 'DataFrame'}: {faltantes}")
+        if isinstance(self.fonte, pd.DataFrame):
+            return pa.Table.from_pandas(self.fonte[colunas], preserve_index=False)
+        return pq.read_table(self.fonte, columns=colunas)
+
+
+def _colunas_fonte(fonte) -> list[str]:
+    if isinstance(fonte, pd.DataFrame):
+        return list(fonte.columns)
+    return list(pq.read_schema(fonte).names)
+
+
+def _ler_chaves(fonte, chaves: tuple[str, ...]) -> pd.DataFrame:
+    if isinstance(fonte, pd.DataFrame):
+        return fonte[list(chaves)]
+    return pq.read_table(fonte, columns=list(chaves)).to_pandas()
+
+
+def indexar_paineis(fontes: list, chaves: tuple[str, ...] = CHAVES_PADRAO) -> list[PainelIndexado]:
+    """
+    Indexa vários painéis com uma codificação de chaves comum a todos.
+    ----------
+    fontes : list[str | Path | pd.DataFrame] -> Arquivos parquet ou DataFrames
+    chaves : tuple[str, ...] -> Colunas da unidade seguidas da coluna de tempo (ex.: ('codigo', 'estado', 'ano'))
+    ----------
+    Retorna
+    list[PainelIndexado] na ordem das fontes
+    """
+    fontes = [f if isinstance(f, pd.DataFrame) else Path(f) for f in fontes]
+    *chaves_unidade, chave_tempo = chaves
+    dados = [_ler_chaves(f, chaves) for f in fontes]
+    tamanhos = np.cumsum([0] + [len(d) for d in dados])
+
+    # Código da unidade: cada coluna fatorada uma vez sobre a concatenação de todos os painéis, combinada em base mista
+    unidade = np.zeros(tamanhos[-1], dtype=np.int64)
+    for c in chaves_unidade:
+        codigos, niveis = pd.factorize(pd.concat([d[c] for d in dados], ignore_index=True), use_na_sentinel=False)
+        unidade = unidade * len(niveis) + codigos
+    tempo = pd.to_numeric(pd.concat([d[chave_tempo] for d in dados], ignore_index=True)).to_numpy(dtype=np.int64)
+    t_min = tempo.min() if tempo.size else 0
+    n_tempo = (tempo.max() - t_min + 1) if tempo.size else 1
+    chave_total = unidade * n_tempo + (tempo - t_min)
+
+    paineis = []
+    for i, fonte in enumerate(fontes):
+        chave = chave_total[tamanhos[i]:tamanhos[i + 1]]
+        if chave.size > 1 and np.all(chave[1:] > chave[:-1]):
+            linhas = np.arange(chave.size)
+        else:
+            linhas = np.argsort(chave, kind="stable")
+            chave = chave[linhas]
+            if chave.size > 1 and np.any(chave[1:] == chave[:-1]):
+                raise ValueError(f"Chaves {list(chaves)} repetidas no painel {i} ({fonte if isinstance(fonte, Path) else 'DataFrame'})")
+        paineis.append(PainelIndexado(fonte, chave, linhas, _colunas_fonte(fonte)))
+    return paineis
+
+
+def intersecao(paineis: list[PainelIndexado]) -> list[np.ndarray]:
+    """
+    Linhas de cada painel presentes em todos os painéis (interseção das chaves ordenadas por busca binária).
+    ----------
+    Retorna
+    list[np.ndarray] com as linhas de cada fonte, alinhadas entre si e em ordem crescente de chave
+    """
+    chave = paineis[0].chave
+    posicoes = [paineis[0].linhas]
+    for p in paineis[1:]:
+        idx = np.searchsorted(p.chave, chave)
+        idx_ok = np.minimum(idx, max(p.chave.size - 1, 0))
+        achou = (idx < p.chave.size) & (p.chave[idx_ok] == chave) if p.chave.size else np.zeros(chave.size, dtype=bool)
+        chave = chave[achou]
+        posicoes = [q[achou] for q in posicoes] + [p.linhas[idx_ok[achou]]]
+    return posicoes
+
+
+def alinhar_paineis(paineis: list[PainelIndexado], colunas: list[list[str]], *, chaves: tuple[str, ...] = CHAVES_PADRAO) -> pd.DataFrame:
+    """
+    Combina colunas de vários painéis nas linhas (unidade, ano) comuns a todos (equivalente a merges internos).
+    ----------
+    paineis : list[PainelIndexado] -> Saída de indexar_paineis
+    colunas : list[list[str]] -> Colunas a trazer de cada painel (mesma ordem de paineis; sem as chaves)
+    chaves : tuple[str, ...] -> Colunas-chave incluídas no resultado (lidas do primeiro painel)
+    ----------
+    Retorna
+    pd.DataFrame com as chaves seguidas das colunas pedidas
+    """
+    if len(colunas) != len(paineis):
+        raise ValueError("Informe uma lista de colunas por painel")
+    vistas = set(chaves)
+    for cols in colunas:
+        repetidas = vistas.intersection(cols)
+        if repetidas:
+            raise ValueError(f"Colunas repetidas entre painéis: {sorted(repetidas)}")
+        vistas.update(cols)
+
+    posicoes = intersecao(paineis)
+    nomes, arrays = [], []
+    for i, (p, cols, pos) in enumerate(zip(paineis, colunas, posicoes)):
+        pedidas = (list(chaves) + list(cols)) if i == 0 else list(cols)
+        if not pedidas:
+            continue
+        tabela = p.ler(pedidas).take(pa.array(pos))
+        nomes.extend(tabela.column_names)
+        arrays.extend(tabela.columns)
+    return pa.Table.from_arrays(arrays, names=nomes).to_pandas()
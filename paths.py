@@ -17,6 +17,10 @@ FINAL_DATA_PATH = os.path.join(INPUTS_PATH, 'panels')
 REGRESSION_TABLES_PATH = os.path.join(OUTPUTS_PATH, 'tables')
 REGRESSION_MODELS_PATH = os.path.join(OUTPUTS_PATH, 'models')
 REGRESSION_TESTS_PATH = os.path.join(OUTPUTS_PATH, 'tests')
+REGRESSION_GRID_PATH = os.path.join(OUTPUTS_PATH, 'grid')
+REGRESSION_BLOCKS_PATH = os.path.join(OUTPUTS_PATH, 'blocks')
+RESULTS_STORE_PATH = os.path.join(OUTPUTS_PATH, 'store')
+FIT_CACHE_PATH = os.path.join(OUTPUTS_PATH, 'cache')
 
 # Definir o caminho para a pasta de imagens
 IMAGES_PATH = os.path.join(CURRENT_DIR, 'img')
@@ -31,4 +35,8 @@ os.makedirs(OUTPUTS_PATH, exist_ok=True)
 os.makedirs(REGRESSION_TABLES_PATH, exist_ok=True)
 os.makedirs(REGRESSION_MODELS_PATH, exist_ok=True)
 os.makedirs(REGRESSION_TESTS_PATH, exist_ok=True)
+os.makedirs(REGRESSION_GRID_PATH, exist_ok=True)
+os.makedirs(REGRESSION_BLOCKS_PATH, exist_ok=True)
+os.makedirs(RESULTS_STORE_PATH, exist_ok=True)
+os.makedirs(FIT_CACHE_PATH, exist_ok=True)
 # %%
@@ -0,0 +1,224 @@
+# %% SIMULAÇÃO DE PODER E EFEITO MÍNIMO DETECTÁVEL (MDE) SOBRE A ESTRUTURA REAL DO PAINEL
+# Importando as bibliotecas necessárias
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from covariance import codificar_grupos, matriz_indicadora, interseccao_grupos
+from fixed_effects import Absorvedor
+
+# Os regressores, a amostra (desbalanceamento) e os clusters são os reais; só o erro é simulado.
+# Como y = Xβ + α + λ + u e o within é linear, β̂ - β = (X̃'X̃)^-1 X̃'ũ e os resíduos não dependem de β: uma única rodada
+# de R sorteios de u dá a distribuição de (c'β̂ - c'β, se) e o poder para QUALQUER tamanho de efeito c'β = δ.
+# O design (X̃, (X̃'X̃)^-1, grupos do MAP) é calculado uma vez; os sorteios são processados em blocos de colunas
+# (demeaning de n x bloco em uma chamada) e os blocos são distribuídos entre threads, como em specification_grid e
+# synthetic_control: o grosso é álgebra matricial e esparsa do NumPy/SciPy, que libera o GIL, e o design é compartilhado.
+
+PROCESSOS_ERRO = ("normal", "ar1", "wild")
+CLUSTERS_PODER = {
+    "municipio_ano": ("municipio", "ano"),
+    "uf_ano": ("uf", "ano"),
+    "municipio": ("municipio",),
+}
+
+def _sortear_erros(d: dict, rng: np.random.Generator, n_sorteios: int, processo: str, sigma: float, rho: float, sigma_uf_ano: float) -> np.ndarray:
+    n = d["entidade"].shape[0]
+    if processo == "wild":
+        # Wild bootstrap dos resíduos reais com pesos de Rademacher por município (preserva heterocedasticidade e correlação serial)
+        v = rng.choice([-1.0, 1.0], size=(d["n_entidades"], n_sorteios))
+        U = d["residuos"][:, None] * v[d["entidade"]]
+    else:
+        U = sigma * rng.standard_normal((n, n_sorteios))
+        if processo == "ar1":
+            # AR(1) dentro do município na ordem dos anos observados, com variância estacionária sigma²
+            escala = np.sqrt(1 - rho * rho)
+            for linhas in d["linhas_por_ano"]:
+                anterior = d["anterior"][linhas]
+                tem = anterior >= 0
+                U[linhas[tem]] = rho * U[anterior[tem]] + escala * U[linhas[tem]]
+    if sigma_uf_ano > 0:
+        U += sigma_uf_ano * rng.standard_normal((d["n_uf_ano"], n_sorteios))[d["uf_ano"]]
+    return U
+
+
+def _simular_bloco(d: dict, tarefa: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """Um bloco de sorteios: ruído das combinações (m x b) e erros-padrão clusterizados (m x b)."""
+    semente, n_sorteios, processo, sigma, rho, sigma_uf_ano = tarefa
+    rng = np.random.default_rng(semente)
+    U = d["absorvedor"].demean(_sortear_erros(d, rng, n_sorteios, processo, sigma, rho, sigma_uf_ano))
+    desvio = d["xtx_inv"] @ (d["X"].T @ U)                       # k x b
+    E = U - d["X"] @ desvio                                      # resíduos n x b
+    ruido = d["C"] @ desvio                                      # m x b
+    var = np.zeros_like(ruido)
+    for j in range(d["H"].shape[1]):
+        scores = d["H"][:, [j]] * E
+        for sinal, S in d["somadores"]:
+            somas = S @ scores
+            var[j] += sinal * np.einsum("gb,gb->b", somas, somas)
+    return ruido, np.sqrt(np.maximum(d["escala"] * var, 0.0))
+
+
+class SimuladorPoder:
+    """
+    Poder e MDE de combinações lineares c'β de um modelo FE 2-way com cluster de 1 ou 2 vias.
+    ----------
+    amostra : sample_masks.AmostraModelo -> Amostra de estimação do modelo (y, X, índice (municipio_id, ano))
+    combinacoes : dict | None -> {nome: {variavel: peso}}; padrão: cada variável de interesse e o acumulado (soma)
+    vars_interesse : list[str] | None -> Variáveis de interesse (padrão: todos os regressores)
+    cluster : str -> Estrutura de cluster (chave de CLUSTERS_PODER)
+    """
+
+    def __init__(self, amostra, *, combinacoes: dict | None = None, vars_interesse: list[str] | None = None, cluster: str = "municipio_ano"):
+        self.amostra = amostra
+        self.nomes = list(amostra.rhs)
+        vars_interesse = list(vars_interesse or self.nomes)
+        if combinacoes is None:
+            combinacoes = {v: {v: 1.0} for v in vars_interesse}
+            if len(vars_interesse) > 1:
+                combinacoes["acumulado"] = {v: 1.0 for v in vars_interesse}
+        self.combinacoes = combinacoes
+        C = np.zeros((len(combinacoes), len(self.nomes)))
+        for i, pesos in enumerate(combinacoes.values()):
+            for v, p in pesos.items():
+                C[i, self.nomes.index(v)] = p
+
+        indice = amostra.indice
+        entidade, n_ent = codificar_grupos(indice.get_level_values(0).to_numpy())
+        ano, _ = codificar_grupos(indice.get_level_values(1).to_numpy())
+        uf = codificar_grupos(amostra.coluna("estado").astype(str))[0] if "estado" in amostra.mapa.df.columns else entidade
+        absorvedor = Absorvedor([entidade, ano])
+
+        M = absorvedor.demean(np.column_stack([amostra.matriz([amostra.lhs]), amostra.matriz(self.nomes)]))
+        X = M[:, 1:]
+        xtx_inv = np.linalg.inv(X.T @ X)
+        beta = xtx_inv @ (X.T @ M[:, 0])
+        residuos = M[:, 0] - X @ beta
+
+        codigos = {"municipio": entidade, "ano": ano, "uf": uf}
+        vias = [codigos[c] for c in CLUSTERS_PODER[cluster]]
+        somadores = [(1.0, matriz_indicadora(c)) for c in vias]
+        if len(vias) == 2:
+            somadores.append((-1.0, matriz_indicadora(interseccao_grupos(*vias))))
+
+        # Observação anterior do mesmo município (ordem dos anos) para o AR(1)
+        ordem = np.lexsort((ano, entidade))
+        anterior = np.full(entidade.shape[0], -1)
+        mesma = entidade[ordem[1:]] == entidade[ordem[:-1]]
+        anterior[ordem[1:][mesma]] = ordem[:-1][mesma]
+
+        n, k = X.shape
+        uf_ano = interseccao_grupos(uf, ano)
+        self.n_efeitos = absorvedor.n_efeitos
+        self.df_resid = n - k - self.n_efeitos
+        self.beta = pd.Series(beta, index=self.nomes)
+        self.estimativa = pd.Series(C @ beta, index=list(combinacoes))
+        self.sigma = float(np.sqrt(residuos @ residuos / self.df_resid))
+        self._desenho = {
+            "absorvedor": absorvedor, "X": X, "xtx_inv": xtx_inv, "C": C, "H": X @ xtx_inv @ C.T,
+            "somadores": somadores, "escala": n / (n - self.n_efeitos - k), "residuos": residuos,
+            "entidade": entidade, "n_entidades": n_ent, "anterior": anterior,
+            "linhas_por_ano": [np.flatnonzero(ano == t) for t in range(int(ano.max()) + 1)],
+            "uf_ano": uf_ano, "n_uf_ano": int(uf_ano.max()) + 1,
+        }
+        self.ruido = None
+        self.se = None
+        self.info = {}
+
+    def simular(self, n_sim: int = 2000, *, processo: str = "wild", sigma: float | None = None, rho: float = 0.0, sigma_uf_ano: float = 0.0, tamanho_bloco: int = 250, n_workers: int | None = None, seed: int = 0) -> "SimuladorPoder":
+        """
+        Sorteia n_sim erros e guarda a distribuição de (c'β̂ - c'β) e do erro-padrão clusterizado de cada combinação.
+        ----------
+        n_sim : int -> Número de sorteios
+        processo : str -> 'normal' (iid), 'ar1' (AR(1) dentro do município) ou 'wild' (resíduos reais x Rademacher por município)
+        sigma : float | None -> Desvio-padrão do erro em 'normal'/'ar1' (padrão: o dos resíduos do modelo real)
+        rho : float -> Autocorrelação do 'ar1'
+        sigma_uf_ano : float -> Desvio-padrão de um choque comum por UF x ano somado ao erro (dependência espacial)
+        tamanho_bloco : int -> Sorteios por bloco (memória ~ n x bloco)
+        n_workers : int | None -> Threads (padrão: os.cpu_count(); 1 roda na thread atual)
+        seed : int -> Semente; os blocos usam sementes filhas, então o resultado não depende de n_workers
+        """
+        if processo not in PROCESSOS_ERRO:
+            raise ValueError(f"processo deve ser um de {PROCESSOS_ERRO}: {processo}")
+        sigma = self.sigma if sigma is None else float(sigma)
+        tamanhos = [min(tamanho_bloco, n_sim - i) for i in range(0, n_sim, tamanho_bloco)]
+        sementes = np.random.SeedSequence(seed).spawn(len(tamanhos))
+        tarefas = [(s, b, processo, sigma, rho, sigma_uf_ano) for s, b in zip(sementes, tamanhos)]
+
+        n_workers = min(n_workers or os.cpu_count() or 1, len(tarefas))
+        simular_bloco = partial(_simular_bloco, self._desenho)
+        if n_workers <= 1:
+            saidas = [simular_bloco(t) for t in tarefas]
+        else:
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                saidas = list(executor.map(simular_bloco, tarefas))
+        self.ruido = np.hstack([r for r, _ in saidas])
+        self.se = np.hstack([s for _, s in saidas])
+        self.info = {"n_sim": n_sim, "processo": processo, "sigma": sigma, "rho": rho, "sigma_uf_ano": sigma_uf_ano, "seed": seed}
+        return self
+
+    def _critico(self, alpha: float, alternativa: str) -> float:
+        return float(stats.t.ppf(1 - alpha / 2 if alternativa == "bilateral" else 1 - alpha, self.df_resid))
+
+    def poder(self, efeitos, *, alpha: float = 0.05, alternativa: str = "bilateral") -> np.ndarray:
+        """Poder (m x len(efeitos)) do teste t de H0: c'β = 0 quando o verdadeiro c'β é cada valor de `efeitos`."""
+        if self.ruido is None:
+            raise RuntimeError("Rode simular() antes de calcular o poder.")
+        efeitos = np.atleast_1d(np.asarray(efeitos, dtype=float))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (efeitos[None, :, None] + self.ruido[:, None, :]) / self.se[:, None, :]  # m x e x R
+        critico = self._critico(alpha, alternativa)
+        if alternativa == "bilateral":
+            rejeita = np.abs(t) > critico
+        elif alternativa == "maior":
+            rejeita = t > critico
+        elif alternativa == "menor":
+            rejeita = t < -critico
+        else:
+            raise ValueError(f"alternativa não suportada: {alternativa}")
+        return rejeita.mean(axis=2)
+
+    def curva_poder(self, efeitos=None, *, alpha: float = 0.05, alternativa: str = "bilateral", n_pontos: int = 41) -> pd.DataFrame:
+        """
+        Curvas de poder por combinação.
+        ----------
+        efeitos : array-like | None -> Grade de efeitos (padrão: 0 a 4 x o erro-padrão mediano simulado de cada combinação)
+        ----------
+        Retorna
+        pd.DataFrame com alvo, efeito, efeito_em_se, poder, estimativa (valor no painel real), alpha e alternativa
+        """
+        linhas = []
+        se_mediano = np.median(self.se, axis=1)
+        for i, alvo in enumerate(self.combinacoes):
+            grade = np.linspace(0, 4 * se_mediano[i], n_pontos) if efeitos is None else np.asarray(efeitos, dtype=float)
+            if alternativa == "menor" and efeitos is None:
+                grade = -grade
+            p = self.poder(grade, alpha=alpha, alternativa=alternativa)[i]
+            linhas.append(pd.DataFrame({"alvo": alvo, "efeito": grade, "efeito_em_se": grade / se_mediano[i], "poder": p,
+                                        "estimativa": self.estimativa[alvo], "alpha": alpha, "alternativa": alternativa}))
+        return pd.concat(linhas, ignore_index=True)
+
+    def mde(self, *, poder: float = 0.8, alpha: float = 0.05, alternativa: str = "bilateral") -> pd.DataFrame:
+        """
+        Efeito mínimo detectável: menor |c'β| com poder simulado >= `poder` (bisseção sobre a curva simulada),
+        ao lado da aproximação analítica (t_crit + t_poder) x se mediano, do tamanho empírico do teste (poder em 0) e da estimativa real.
+        """
+        sinal = -1.0 if alternativa == "menor" else 1.0
+        linhas = []
+        for i, alvo in enumerate(self.combinacoes):
+            se_med = float(np.median(self.se[i]))
+            f = lambda d: self.poder([sinal * d], alpha=alpha, alternativa=alternativa)[i, 0]
+            lo, hi = 0.0, se_med
+            while f(hi) < poder and hi < 1e3 * se_med:
+                lo, hi = hi, 2 * hi
+            for _ in range(60):
+                meio = (lo + hi) / 2
+                lo, hi = (meio, hi) if f(meio) < poder else (lo, meio)
+            analitico = (self._critico(alpha, alternativa) + stats.t.ppf(poder, self.df_resid)) * se_med
+            linhas.append({"alvo": alvo, "mde": sinal * hi, "mde_analitico": sinal * analitico, "se_mediano": se_med,
+                           "tamanho_empirico": float(self.poder([0.0], alpha=alpha, alternativa=alternativa)[i, 0]),
+                           "estimativa": float(self.estimativa[alvo]), "poder": poder, "alpha": alpha, "alternativa": alternativa})
+        return pd.DataFrame(linhas)
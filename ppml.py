@@ -0,0 +1,239 @@
+# %% PPML (POISSON PSEUDO-MÁXIMA VEROSSIMILHANÇA) COM EFEITOS FIXOS DE ALTA DIMENSÃO
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from covariance import codificar_grupos, cov_clusterizada, cov_robusta, cov_driscoll_kraay, cov_newey_west_entidade
+from fixed_effects import Absorvedor, ResultadoFE
+from sample_masks import MapaValidade
+
+# Estimação em nível (desembolso em R$, com massa de zeros) no padrão de Correia, Guimarães e Zylkin (2020, ppmlhdfe):
+#   1. Separação: saem os municípios/anos só com zeros (FE separa) e as observações separadas por regressores (ReLU).
+#   2. IRLS: a cada iteração, variável de trabalho z = eta + (y - mu)/mu e pesos mu; os efeitos fixos são removidos
+#      por MAP ponderado partindo do resultado da iteração anterior (só a variação precisa ser projetada) e com
+#      tolerância adaptativa (frouxa no início, apertando até `tol` conforme a deviance converge).
+#   3. Covariância sanduíche com scores x_tilde * (y - mu) e bread (X_tilde' W X_tilde)^-1, clusterizada como no PanelOLS.
+# Os coeficientes são semielasticidades: 100 * b = variação % do desembolso esperado por unidade do regressor.
+
+# Estruturas de cluster (colunas de df_model ou níveis do índice), as mesmas de specification_grid.CLUSTERS_PADRAO
+CLUSTERS_PPML = {
+    "municipio_ano": ("municipio_id", "ano"),
+    "uf_ano": ("estado", "ano"),
+}
+
+
+def _deviance(y: np.ndarray, mu: np.ndarray) -> float:
+    termo = np.where(y > 0, y * np.log(np.where(y > 0, y, 1.0) / mu), 0.0)
+    return float(2 * np.sum(termo - (y - mu)))
+
+
+def separacao_fe(y: np.ndarray, codigos: list[np.ndarray]) -> np.ndarray:
+    """
+    Observações mantidas após remover, iterativamente, grupos de efeito fixo em que y é sempre zero
+    (o FE desses grupos iria a -infinito e as observações seriam perfeitamente previstas).
+    """
+    manter = np.ones(y.shape[0], dtype=bool)
+    while True:
+        removidas = 0
+        for c in codigos:
+            soma = np.bincount(c[manter], weights=y[manter], minlength=int(c.max()) + 1)
+            zerados = manter & (soma[c] <= 0)
+            removidas += int(zerados.sum())
+            manter &= ~zerados
+        if removidas == 0:
+            return manter
+
+
+def separacao_relu(y: np.ndarray, X: np.ndarray, absorvedor: Absorvedor, *, max_iter: int = 1000, tol: float = 1e-6, peso_positivos: float = 1e4) -> np.ndarray:
+    """
+    Detecção de separação por regressores (método ReLU de Correia, Guimarães e Zylkin, 2019).
+    Regride u (>= 0 nos zeros, 0 nos positivos) em X e nos FE, com peso alto nos positivos, e atualiza
+    u = max(ajustado, 0) nos zeros. Convergiu quando u é ponto fixo: resíduos ~0 nos positivos (o ajuste reproduz u = 0
+    neles) e ajustados >= 0 iguais a u nos zeros; aí os zeros com u estritamente positivo são as observações separadas.
+    Se u se anula em todos os zeros, não há separação.
+    ----------
+    Retorna
+    np.ndarray booleano com True nas observações separadas
+    """
+    zero = y <= 0
+    if not zero.any():
+        return np.zeros(y.shape[0], dtype=bool)
+    pesos = np.where(zero, 1.0, peso_positivos)
+    X_dm = absorvedor.demean(X, pesos=pesos)
+    XtWX = X_dm.T @ (X_dm * pesos[:, None])
+    u = zero.astype(float)
+    for _ in range(max_iter):
+        # Tolerâncias relativas à escala de u: sem separação u encolhe a cada iteração (até sumir) e, em termos
+        # absolutos, os resíduos dos positivos ficariam abaixo de `tol` antes de u chegar a zero
+        escala = u.max()
+        if escala < tol:
+            break
+        u_dm = absorvedor.demean(u, pesos=pesos)
+        b = np.linalg.lstsq(XtWX, X_dm.T @ (u_dm * pesos), rcond=None)[0] if X.shape[1] else np.zeros(0)
+        ajustado = u - (u_dm - X_dm @ b)
+        ajustado[np.abs(ajustado) < tol * escala] = 0.0
+        # Ponto fixo: nos positivos u = 0 e o resíduo é -ajustado (precisa ser ~0); nos zeros o ajuste reproduz u
+        if np.all(ajustado[~zero] == 0.0) and np.all(ajustado[zero] >= 0) and np.max(np.abs(ajustado - u)) <= tol * escala:
+            return zero & (ajustado > 0)
+        u = np.where(zero, np.maximum(ajustado, 0.0), 0.0)
+    return np.zeros(y.shape[0], dtype=bool)
+
+
+def regressores_colineares(X_dm: np.ndarray, *, tol: float = 1e-9) -> np.ndarray:
+    """
+    Colunas de X (já livre dos FE) colineares com os FE ou com as colunas anteriores (ex.: dummy que só variava
+    nas observações separadas). Retorna um vetor booleano com True nas colunas a omitir.
+    """
+    omitir = np.zeros(X_dm.shape[1], dtype=bool)
+    for j in range(X_dm.shape[1]):
+        norma = np.linalg.norm(X_dm[:, j])
+        mantidas = np.flatnonzero(~omitir[:j])
+        resid = X_dm[:, j]
+        if mantidas.size and norma > 0:
+            resid = resid - X_dm[:, mantidas] @ np.linalg.lstsq(X_dm[:, mantidas], resid, rcond=None)[0]
+        omitir[j] = norma == 0 or np.linalg.norm(resid) <= tol * max(norma, 1.0) * np.sqrt(X_dm.shape[0])
+    return omitir
+
+
+def ajustar_ppml(y, X, nomes: list[str], absorvedor: Absorvedor, *, clusters: list[np.ndarray] | None = None, cov_type: str = "clustered", debiased: bool = True, separacao: bool = True, tol: float = 1e-8, max_iter: int = 100, info: dict | None = None) -> ResultadoFE:
+    """
+    PPML com efeitos fixos absorvidos por IRLS.
+    ----------
+    y : array-like -> n, variável dependente em nível (>= 0)
+    X : array-like -> n x k, regressores (sem constante; ela é absorvida pelos FE)
+    nomes : list[str] -> Nomes dos regressores
+    absorvedor : Absorvedor -> Estrutura de FE da amostra (refeita internamente se houver observações separadas)
+    clusters : list[np.ndarray] | None -> 1 ou 2 vetores de códigos de cluster (obrigatório se cov_type='clustered')
+    cov_type : str -> 'clustered', 'robust', 'driscoll_kraay' ou 'newey_west' (FE na ordem [entidade, período])
+    debiased : bool -> Correção de pequenas amostras no mesmo padrão do PanelOLS
+    separacao : bool -> Se True remove observações separadas (FE e ReLU) antes de estimar
+    tol : float -> Tolerância da variação relativa da deviance
+    max_iter : int -> Máximo de iterações IRLS
+    info : dict | None -> Metadados livres anexados ao resultado
+    ----------
+    Retorna
+    ResultadoFE (rsquared = correlação ao quadrado entre y e mu; residuos = y - mu; info com deviance e iterações)
+    """
+    y = np.asarray(y, dtype=float).ravel()
+    X = np.asarray(X, dtype=float).reshape(y.shape[0], -1)
+    if np.any(y < 0):
+        raise ValueError("PPML requer variável dependente não negativa.")
+    clusters = list(clusters or [])
+
+    n_inicial = y.shape[0]
+    n_sep_fe = n_sep_relu = 0
+    if separacao:
+        manter = separacao_fe(y, absorvedor.codigos)
+        n_sep_fe = int((~manter).sum())
+        if n_sep_fe:
+            y, X = y[manter], X[manter]
+            clusters = [codificar_grupos(c[manter])[0] for c in clusters]
+            absorvedor = Absorvedor([c[manter] for c in absorvedor.codigos], tol=absorvedor.tol, max_iter=absorvedor.max_iter)
+        separadas = separacao_relu(y, X, absorvedor)
+        n_sep_relu = int(separadas.sum())
+        if n_sep_relu:
+            manter = ~separadas
+            y, X = y[manter], X[manter]
+            clusters = [codificar_grupos(c[manter])[0] for c in clusters]
+            absorvedor = Absorvedor([c[manter] for c in absorvedor.codigos], tol=absorvedor.tol, max_iter=absorvedor.max_iter)
+
+    # Regressores que ficaram colineares com os FE após a separação são omitidos (coeficiente NaN)
+    nomes_todos = list(nomes)
+    omitidas = regressores_colineares(absorvedor.demean(X)) if X.shape[1] else np.zeros(0, dtype=bool)
+    X = X[:, ~omitidas]
+    nomes = [n for n, o in zip(nomes_todos, omitidas) if not o]
+
+    nobs, k = X.shape
+    mu = (y + y.mean()) / 2
+    eta = np.log(mu)
+    z = eta + (y - mu) / mu
+    dev = _deviance(y, mu)
+    z_dm = X_dm = None
+    z_ant = None
+    tol_demean = 1e-4
+    convergiu = False
+
+    for iteracao in range(1, max_iter + 1):
+        if z_dm is None:
+            z_dm = absorvedor.demean(z, pesos=mu, tol=tol_demean)
+            X_dm = absorvedor.demean(X, pesos=mu, tol=tol_demean)
+        else:
+            # Aceleração: z - z_ant e z_ant - z_dm diferem de z_dm só por combinações dos FE, anuladas pela projeção
+            z_dm = absorvedor.demean(z_dm + (z - z_ant), pesos=mu, tol=tol_demean)
+            X_dm = absorvedor.demean(X_dm, pesos=mu, tol=tol_demean)
+
+        XtWX = X_dm.T @ (X_dm * mu[:, None])
+        beta = np.linalg.solve(XtWX, X_dm.T @ (z_dm * mu))
+        eta = np.minimum(z - (z_dm - X_dm @ beta), 700.0)
+        mu = np.exp(eta)
+        dev_ant, dev = dev, _deviance(y, mu)
+        variacao = abs(dev - dev_ant) / max(min(dev, dev_ant), 0.1)
+
+        if variacao < tol and tol_demean <= absorvedor.tol:
+            convergiu = True
+            break
+        # A tolerância do demeaning acompanha a convergência da deviance
+        tol_demean = max(min(tol_demean, variacao / 10), absorvedor.tol)
+        z_ant = z
+        z = eta + (y - mu) / mu
+
+    # Bread e scores com os pesos finais
+    X_dm = absorvedor.demean(X_dm, pesos=mu)
+    xtx_inv = np.linalg.inv(X_dm.T @ (X_dm * mu[:, None]))
+    residuos = y - mu
+    if cov_type == "clustered":
+        if not clusters:
+            raise ValueError("cov_type='clustered' requer ao menos um vetor de clusters.")
+        cov = cov_clusterizada(X_dm, residuos, clusters, xtx_inv=xtx_inv, extra_df=absorvedor.n_efeitos, debiased=debiased)
+    elif cov_type == "robust":
+        cov = cov_robusta(X_dm, residuos, xtx_inv=xtx_inv, extra_df=absorvedor.n_efeitos, debiased=debiased)
+    elif cov_type == "driscoll_kraay":
+        cov = cov_driscoll_kraay(X_dm, residuos, absorvedor.codigos[1], xtx_inv=xtx_inv, extra_df=absorvedor.n_efeitos, debiased=debiased)
+    elif cov_type == "newey_west":
+        cov = cov_newey_west_entidade(X_dm, residuos, absorvedor.codigos[0], absorvedor.codigos[1], xtx_inv=xtx_inv, extra_df=absorvedor.n_efeitos, debiased=debiased)
+    else:
+        raise ValueError(f"cov_type não suportado: {cov_type}")
+
+    info = {**(info or {}), "estimador": "ppml", "deviance": dev, "iteracoes": iteracao, "convergiu": convergiu,
+            "n_separadas_fe": n_sep_fe, "n_separadas_relu": n_sep_relu, "nobs_inicial": n_inicial,
+            "omitidas": [n for n, o in zip(nomes_todos, omitidas) if o]}
+    return ResultadoFE(
+        params=pd.Series(beta, index=nomes, name="parameter").reindex(nomes_todos),
+        cov=pd.DataFrame(cov, index=nomes, columns=nomes).reindex(index=nomes_todos, columns=nomes_todos),
+        nobs=int(nobs),
+        df_resid=int(nobs - k - absorvedor.n_efeitos),
+        cov_type=cov_type,
+        rsquared=float(np.corrcoef(y, mu)[0, 1] ** 2),
+        residuos=residuos,
+        n_efeitos=int(absorvedor.n_efeitos),
+        info=info,
+    )
+
+
+def ppml_painel(df_model: pd.DataFrame, lhs: str, rhs: list[str], *, mapa: MapaValidade | None = None, cluster: str = "municipio_ano",
+                cov_type: str = "clustered", **kwargs) -> ResultadoFE:
+    """
+    PPML com FE de município e ano sobre o painel do projeto.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com coluna 'estado'
+    lhs : str -> Desembolso em nível (ex.: desembolsos_real_pib)
+    rhs : list[str] -> Regressores
+    mapa : MapaValidade | None -> Bitmaps de validade de df_model (padrão: calculados sob demanda)
+    cluster : str -> Estrutura de cluster (chave de CLUSTERS_PPML)
+    cov_type : str -> 'clustered', 'robust', 'driscoll_kraay' ou 'newey_west'
+    kwargs : -> Repassados a ajustar_ppml (tol, max_iter, separacao, debiased)
+    ----------
+    Retorna
+    ResultadoFE
+    """
+    estrutura = CLUSTERS_PPML[cluster]
+    extras = [c for c in estrutura if c in df_model.columns]
+    # Mesma amostra dos modelos lineares: AND dos bitmaps de lhs, rhs e colunas de cluster, sem singletons de município/ano
+    mapa = mapa if mapa is not None else MapaValidade(df_model, colunas=[])
+    amostra = mapa.amostra(lhs, list(rhs) + extras).podar()
+    indice = amostra.indice
+    ent = indice.get_level_values(0).to_numpy()
+    ano = indice.get_level_values(1).to_numpy()
+    clusters = [codificar_grupos(amostra.coluna(c).astype(str) if c in extras else indice.get_level_values(c).to_numpy())[0] for c in estrutura]
+    return ajustar_ppml(amostra.coluna(lhs).astype(float), amostra.matriz(list(rhs)), list(rhs), Absorvedor([ent, ano]),
+                        clusters=clusters, cov_type=cov_type, info={"lhs": lhs, "cluster": cluster}, **kwargs)
@@ -2,11 +2,13 @@
 # Importando as bibliotecas necessárias
 import pandas as pd
 import numpy as np
-import json
 from pathlib import Path
 import pyarrow.parquet as pq
-from linearmodels.panel import PanelOLS
-from paths import FINAL_DATA_PATH, OUTPUTS_PATH, REGRESSION_TABLES_PATH, REGRESSION_MODELS_PATH, REGRESSION_TESTS_PATH
+from paths import FINAL_DATA_PATH, REGRESSION_TABLES_PATH, RESULTS_STORE_PATH, FIT_CACHE_PATH
+from results_store import RepositorioResultados
+from fit_cache import CacheAjustes
+from hypothesis_tests import avaliar_restricoes, soma
+from sample_masks import MapaValidade
 from dataclasses import dataclass
 
 @dataclass
@@ -15,124 +17,36 @@ class SimpleTest:
     pval: float | None
     df: int | None = 1
 
-def salvar_resultados_panelols(res, *, model_name: str, out_dir, wald_tests: dict | None = None, overwrite: bool = True,) -> dict:
+def salvar_resultados_panelols(res, *, model_name: str, out_dir=None, wald_tests: dict | None = None, overwrite: bool = True, spec=None) -> dict:
     """
-    Salva resultados do PanelOLS (linearmodels) de forma estruturada.
+    Registra resultados do PanelOLS (linearmodels) ou ResultadoFE no repositório colunar de resultados.
     ----------
-    res : linearmodels.panel.results.PanelEffectsResults -> Objeto retornado por PanelOLS(...).fit(...)
+    res : linearmodels.panel.results.PanelEffectsResults | ResultadoFE -> Objeto retornado por PanelOLS(...).fit(...)
     model_name : str -> Nome curto do modelo
-    out_dir : str | Path -> Diretório raiz onde os arquivos serão salvos.
+    out_dir : str | Path | None -> Raiz do repositório (padrão: RESULTS_STORE_PATH)
     wald_tests : dict | None -> Dicionário {nome_teste: wald_obj} onde wald_obj é retorno de res.wald_test(...)
-    overwrite : bool -> Se False, lança erro caso arquivos já existam.
+    overwrite : bool -> Se False, lança erro caso o modelo já tenha execuções registradas.
+    spec : dict | None -> Especificação usada no spec_hash (padrão: depvar, regressores e covariância)
     ----------
     Retorna
-    dict com paths dos arquivos salvos.
+    dict com run_id e raiz do repositório.
     """
-    out_dir = Path(out_dir)
-    coef_path = Path(REGRESSION_TABLES_PATH) / f"{model_name}_coef.parquet"
-    stats_path = Path(REGRESSION_MODELS_PATH) / f"{model_name}_stats.json"
-    tests_path = Path(REGRESSION_TESTS_PATH) / f"{model_name}_wald_tests.parquet"
-
-    if not overwrite:
-        for p in (coef_path, stats_path, tests_path):
-            if p.exists():
-                raise FileExistsError(f"Arquivo já existe: {p}")
-
-    # Coeficientes (tabela longa)
-    params = res.params
-    se = res.std_errors
-    tstats = res.tstats
-    pvals = res.pvalues
-
-    # CI: tenta usar res.conf_int() se existir; senão calcula por aproximação normal (1.96)
-    try:
-        ci = res.conf_int()
-        ci_low = ci.iloc[:, 0]
-        ci_high = ci.iloc[:, 1]
-    except Exception:
-        ci_low = params - 1.96 * se
-        ci_high = params + 1.96 * se
-
-    df_coef = (
-        pd.DataFrame(
-            {
-                "model": model_name,
-                "var": params.index.astype(str),
-                "coef": params.values,
-                "std_err": se.values,
-                "t": tstats.values,
-                "p": pvals.values,
-                "ci_low": ci_low.values,
-                "ci_high": ci_high.values,
-            }
-        )
-        .sort_values(["model", "var"])
-        .reset_index(drop=True)
-    )
-    df_coef.to_parquet(coef_path, index=False)
-
-    # Estatísticas globais
-    def _safe(getter, default=None):
-        try:
-            return getter()
-        except Exception:
-            return default
-
-    stats = {
-        "model": model_name,
-        "depvar": _safe(lambda: str(res.model.dependent.vars[0])),
-        "nobs": _safe(lambda: int(res.nobs)),
-        "entities": _safe(lambda: int(res.model.dependent.dataframe.index.levels[0].shape[0])),
-        "time_periods": _safe(lambda: int(res.model.dependent.dataframe.index.levels[1].shape[0])),
-        "rsq_within": _safe(lambda: float(res.rsquared_within)),
-        "rsq_between": _safe(lambda: float(res.rsquared_between)),
-        "rsq_overall": _safe(lambda: float(res.rsquared_overall)),
-        "cov_type": _safe(lambda: str(res.cov_type)),
-        "entity_effects": _safe(lambda: bool(getattr(res.model, "entity_effects", False))),
-        "time_effects": _safe(lambda: bool(getattr(res.model, "time_effects", False))),
-        "f_stat": _safe(lambda: float(res.f_statistic.stat)),
-        "f_pval": _safe(lambda: float(res.f_statistic.pval)),
-        "f_df_denom": _safe(lambda: int(res.f_statistic.df_denom)),
-        "f_df_num": _safe(lambda: int(res.f_statistic.df_num)),
-        "loglik": _safe(lambda: float(res.loglik)),
-    }
-    stats_path.write_text(json.dumps(stats, ensure_ascii=False, indent=2), encoding="utf-8")
-
-    # Wald tests - salva 1 linha por teste
-    saved_tests = False
-    if wald_tests:
-        rows = []
-        for name, wt in wald_tests.items():
-            if wt is None:
-                continue
-
-            df_val = getattr(wt, "df", None)
-            if df_val is not None and not isinstance(df_val, (int, float, str)):
-                try:
-                    df_val = str(df_val)
-                except Exception:
-                    df_val = None
-            
-            rows.append(
-                {
-                    "model": model_name,
-                    "test": name,
-                    "stat": getattr(wt, "stat", None),
-                    "pval": getattr(wt, "pval", None),
-                    "df": getattr(wt, "df", None),
-                }
-            )
-        if rows:
-            pd.DataFrame(rows).to_parquet(tests_path, index=False)
-            saved_tests = True
-
-    return {
-        "coef_parquet": str(coef_path),
-        "stats_json": str(stats_path),
-        "wald_parquet": str(tests_path) if saved_tests else None,
-    }
+    repo = RepositorioResultados(out_dir or RESULTS_STORE_PATH)
+    if not overwrite and repo.existe(model_name):
+        raise FileExistsError(f"Modelo já registrado no repositório: {model_name}")
+
+    # Coeficientes, covariância, estatísticas globais e testes de Wald em uma única execução (run_id)
+    run_id = repo.registrar(res, model_name=model_name, spec=spec, wald_tests=wald_tests)
+    return {"run_id": run_id, "store": str(repo.raiz)}
 # %% CONFIGURAÇÃO DOS MODELOS
 
+# Cache em disco dos ajustes PanelOLS (chave = hash da amostra + especificação), com despejo LRU por número de entradas e tamanho
+cache_ajustes = CacheAjustes(FIT_CACHE_PATH, max_entradas=500, max_bytes=500 * 2**20)
+
+# Robustez: tendência linear própria de cada município (absorvida com o FE de município, sem colunas dummy x tendência)
+# Quando True, todos os modelos abaixo são ajustados com α(i) + δ(i)·t + λ(t)
+TENDENCIAS_MUNICIPIO = False
+
 # MODELO A1.1 BASELINE
 lhs_modelo_a1_1 = ['delta_log_pib_real']
 rhs_modelo_a1_1 = [
@@ -225,7 +139,7 @@ rhs_modelo_b2_1_agro = [
 ]
 
 # MODELO B3 LINEAR PROBABILITY MODEL
-lhs_modelo_b3 = [None]  # placeholder, será definido depois
+lhs_modelo_b3 = ['D_recebeu_desembolso']  # dummy criada sobre o painel na carga dos dados (desembolsos_corrente > 0)
 rhs_modelo_b3 = [
     'delta_log_pib_real',
     'delta_log_pib_real_lag1',
@@ -283,24 +197,30 @@ df_model['municipio_id'] = df_model['codigo'].astype(str) + '-' + df_model['esta
 # Configurando o índice do painel com 2 níveis: (municipio_id, Ano)
 df_model = df_model.set_index(['municipio_id', 'ano'])
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_a1_1 = df_model[lhs_modelo_a1_1 + rhs_modelo_a1_1].copy().dropna()
+# Variável dependente do MODELO B3 (LPM): recebeu desembolso no ano
+df_model['D_recebeu_desembolso'] = (df_model['desembolsos_corrente'] > 0).astype(float)
+
+# Bitmaps de validade por coluna (calculados uma vez); a amostra de cada modelo é o AND dos bitmaps das suas colunas
+mapa_validade = MapaValidade(df_model)
+
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_a1_1 = mapa_validade.amostra(lhs_modelo_a1_1, rhs_modelo_a1_1).podar()
+print(amostra_a1_1.diagnostico())
+print(f'Pré-passo FE: {amostra_a1_1.relatorio}')
 
 # Variável dependente Y
-y = df_model_a1_1[lhs_modelo_a1_1[0]]
+y = amostra_a1_1.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_a1_1[rhs_modelo_a1_1]
+X = amostra_a1_1.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_a1_1 = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_a1_1 = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -334,8 +254,6 @@ print(f'Wald Test para o efeito acumulado (H0: ∑(K=0--3) β(k) = 0 bilateral)'
 print(wald_test_2)
 
 # TESTE 7 - Teste de efeito acumulado H0​:∑(K=0--3)​β(k)​=0 unilateral
-p_bilateral = float(wald_test_2.pval)
-
 # nomes dos coeficientes que entram na soma
 beta_names = [
     'share_desembolso_real_pib_real_ano_anterior',
@@ -344,37 +262,19 @@ beta_names = [
     'share_desembolso_real_pib_real_ano_anterior_lag3',
 ]
 
-# soma pontual (R*b)
-beta_sum = float(res_a1_1.params[beta_names].sum())
-
-# matriz de covariância dos estimadores
-V = res_a1_1.cov  # pandas DataFrame (p x p)
-
-# variância da soma: 1' V 1, restrita ao sub-bloco dos betas
-V_sub = V.loc[beta_names, beta_names].to_numpy()
-var_sum = float(np.ones(4) @ V_sub @ np.ones(4))
-se_sum = float(np.sqrt(var_sum))
-
-# t-stat do acumulado
-t_sum = beta_sum / se_sum
-
-# p-valor unilateral derivado do Wald bilateral (igualdade), usando sinal
-p_bilateral = float(wald_test_2.pval)
-if beta_sum > 0:
-    p_unilateral = p_bilateral / 2
-else:
-    p_unilateral = 1 - (p_bilateral / 2)
+# Motor de hipóteses: soma R*b, se = sqrt(R V R') e p unilateral (H1: soma > 0) em uma única avaliação
+teste_acumulado = avaliar_restricoes({'model_a1_1': res_a1_1}, [soma(beta_names, nome='wald_acumulado_uni', alternativa='maior')]).iloc[0]
 
 # empacotar para salvar
-wald_acumulado_t_uni = SimpleTest(stat=float(t_sum), pval=float(p_unilateral), df=1)
+wald_acumulado_t_uni = SimpleTest(stat=float(teste_acumulado['stat']), pval=float(teste_acumulado['pval']), df=1)
 
 print("Acumulado:")
-print("soma dos betas:", beta_sum)
-print("se(soma):", se_sum)
-print("t(soma):", t_sum)
-print("p unilateral (H1: soma > 0):", p_unilateral)
+print("soma dos betas:", teste_acumulado['estimativa'])
+print("se(soma):", teste_acumulado['std_err'])
+print("t(soma):", teste_acumulado['stat'])
+print("p unilateral (H1: soma > 0):", teste_acumulado['pval'])
 
-salvar_resultados_panelols(res_a1_1, model_name="model_a1_1", out_dir=OUTPUTS_PATH, wald_tests={"wald_betas": wald_test_1, "wald_acumulado_bi": wald_test_2, "wald_acumulado_uni": wald_acumulado_t_uni}, overwrite=True,)
+salvar_resultados_panelols(res_a1_1, model_name="model_a1_1", wald_tests={"wald_betas": wald_test_1, "wald_acumulado_bi": wald_test_2, "wald_acumulado_uni": wald_acumulado_t_uni}, overwrite=True,)
 
 # %% ANÁLISE 2 - MODELO A1.2
 # MODELO A1.2 COMPARATIVO - ΔlogPIBpc(it​)
@@ -410,24 +310,24 @@ salvar_resultados_panelols(res_a1_1, model_name="model_a1_1", out_dir=OUTPUTS_PA
 # H₀: O efeito acumulado dos desembolsos do BNDES sobre o crescimento do PIB per capita real ao longo dos quatro períodos considerados é estatisticamente nulo ou inferior a zero, após controle por efeitos fixos municipais e efeitos fixos de ano.
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------###
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_a1_2 = df_model[lhs_modelo_a1_2 + rhs_modelo_a1_2].copy().dropna()
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_a1_2 = mapa_validade.amostra(lhs_modelo_a1_2, rhs_modelo_a1_2).podar()
+print(amostra_a1_2.diagnostico())
+print(f'Pré-passo FE: {amostra_a1_2.relatorio}')
 
 # Variável dependente Y
-y = df_model_a1_2[lhs_modelo_a1_2[0]]
+y = amostra_a1_2.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_a1_2[rhs_modelo_a1_2]
+X = amostra_a1_2.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_a1_2 = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_a1_2 = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -461,8 +361,6 @@ print(f'Wald Test para o efeito acumulado (H0: ∑(K=0--3) β(k) = 0 bilateral)'
 print(wald_test_2)
 
 # TESTE 7 - Teste de efeito acumulado H0​:∑(K=0--3)​β(k)​=0 unilateral
-p_bilateral = float(wald_test_2.pval)
-
 # nomes dos coeficientes que entram na soma
 beta_names = [
     'share_desembolso_real_pib_real_ano_anterior',
@@ -471,37 +369,19 @@ beta_names = [
     'share_desembolso_real_pib_real_ano_anterior_lag3',
 ]
 
-# soma pontual (R*b)
-beta_sum = float(res_a1_2.params[beta_names].sum())
-
-# matriz de covariância dos estimadores
-V = res_a1_2.cov  # pandas DataFrame (p x p)
-
-# variância da soma: 1' V 1, restrita ao sub-bloco dos betas
-V_sub = V.loc[beta_names, beta_names].to_numpy()
-var_sum = float(np.ones(4) @ V_sub @ np.ones(4))
-se_sum = float(np.sqrt(var_sum))
-
-# t-stat do acumulado
-t_sum = beta_sum / se_sum
-
-# p-valor unilateral derivado do Wald bilateral (igualdade), usando sinal
-p_bilateral = float(wald_test_2.pval)
-if beta_sum > 0:
-    p_unilateral = p_bilateral / 2
-else:
-    p_unilateral = 1 - (p_bilateral / 2)
+# Motor de hipóteses: soma R*b, se = sqrt(R V R') e p unilateral (H1: soma > 0) em uma única avaliação
+teste_acumulado = avaliar_restricoes({'model_a1_2': res_a1_2}, [soma(beta_names, nome='wald_acumulado_uni', alternativa='maior')]).iloc[0]
 
 # empacotar para salvar
-wald_acumulado_t_uni = SimpleTest(stat=float(t_sum), pval=float(p_unilateral), df=1)
+wald_acumulado_t_uni = SimpleTest(stat=float(teste_acumulado['stat']), pval=float(teste_acumulado['pval']), df=1)
 
 print("Acumulado:")
-print("soma dos betas:", beta_sum)
-print("se(soma):", se_sum)
-print("t(soma):", t_sum)
-print("p unilateral (H1: soma > 0):", p_unilateral)
+print("soma dos betas:", teste_acumulado['estimativa'])
+print("se(soma):", teste_acumulado['std_err'])
+print("t(soma):", teste_acumulado['stat'])
+print("p unilateral (H1: soma > 0):", teste_acumulado['pval'])
 
-salvar_resultados_panelols(res_a1_2, model_name="model_a1_2", out_dir=OUTPUTS_PATH, wald_tests={"wald_betas": wald_test_1, "wald_acumulado_bi": wald_test_2, "wald_acumulado_uni": wald_acumulado_t_uni}, overwrite=True,)
+salvar_resultados_panelols(res_a1_2, model_name="model_a1_2", wald_tests={"wald_betas": wald_test_1, "wald_acumulado_bi": wald_test_2, "wald_acumulado_uni": wald_acumulado_t_uni}, overwrite=True,)
 # %% ANÁLISE 3 - MODELO A2.1 BASELINE COM LEADS (PRETREND)
 # MODELO A2.1 BASELINE - Evolução do PIB real ao longo do tempo em respeito aos desembolsos do BNDES para cada município (efeito regional) - FE 2-way (municípios e anos)
 # EQUAÇÃO DO MODELO: ΔlogPIB(it​) = β0​X(it) ​+ β1​X(i,t−1) ​+ β2​X(i,t−2) ​+ β3​X(i,t−3) ​+ θ1​X(i,t+1)​ + θ2​X(i,t+2)​ + γ1​logPIBpc(i,t−1​) + γ2​share_industria(i,t−1) ​+ γ3​share_agropecuaria(i,t−1) + γ4​logPOP(i,t−1​) + α(i) ​+ λ(t)​ + ε(it)​
@@ -515,24 +395,24 @@ salvar_resultados_panelols(res_a1_2, model_name="model_a1_2", out_dir=OUTPUTS_PA
 # H₀: Não há associação estatisticamente significativa entre o crescimento do PIB real no período 𝑡 e o desembolso do BNDES no período t+1, controlando por efeitos fixos municipais e efeitos fixos de ano.
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------###
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_a2_1 = df_model[lhs_modelo_a2_1 + rhs_modelo_a2_1].copy().dropna()
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_a2_1 = mapa_validade.amostra(lhs_modelo_a2_1, rhs_modelo_a2_1).podar()
+print(amostra_a2_1.diagnostico())
+print(f'Pré-passo FE: {amostra_a2_1.relatorio}')
 
 # Variável dependente Y
-y = df_model_a2_1[lhs_modelo_a2_1[0]]
+y = amostra_a2_1.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_a2_1[rhs_modelo_a2_1]
+X = amostra_a2_1.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_a2_1 = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_a2_1 = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -551,7 +431,7 @@ print(res_a2_1.summary)
 print('Wald Test para os leads (H0: θ1 = θ2 = 0)')
 print(wald_leads_pib)
 
-salvar_resultados_panelols(res_a2_1, model_name="model_a2_1", out_dir=OUTPUTS_PATH, wald_tests={"wald_leads": wald_leads_pib}, overwrite=True,)
+salvar_resultados_panelols(res_a2_1, model_name="model_a2_1", wald_tests={"wald_leads": wald_leads_pib}, overwrite=True,)
 # %% ANÁLISE 4 - MODELO A2.2 COMPARATIVO COM LEADS (PRETREND)
 # MODELO A2.2 COMPARATIVO - ΔlogPIBpc(it​)
 # EQUAÇÃO DO MODELO: ΔlogPIBpc(it​) = ∑(k=0--3)​βk​X(i,t−k) ​+ θ1​X(i,t+1)​ + θ2​X(i,t+2)​ + γ1​logPIBpc(i,t−1​) + γ2​share_industria(i,t−1) ​+ γ3​share_agropecuaria(i,t−1) + α(i) ​+ λ(t)​ + ε(it)​
@@ -562,24 +442,24 @@ salvar_resultados_panelols(res_a2_1, model_name="model_a2_1", out_dir=OUTPUTS_PA
 # H₀: Não há associação estatisticamente significativa entre o crescimento do PIB per capita real no período 𝑡 e o desembolso do BNDES no período t+1, controlando por efeitos fixos municipais e efeitos fixos de ano.
 #-------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_a2_2 = df_model[lhs_modelo_a2_2 + rhs_modelo_a2_2].copy().dropna()
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_a2_2 = mapa_validade.amostra(lhs_modelo_a2_2, rhs_modelo_a2_2).podar()
+print(amostra_a2_2.diagnostico())
+print(f'Pré-passo FE: {amostra_a2_2.relatorio}')
 
 # Variável dependente Y
-y = df_model_a2_2[lhs_modelo_a2_2[0]]
+y = amostra_a2_2.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_a2_2[rhs_modelo_a2_2]
+X = amostra_a2_2.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_a2_2 = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_a2_2 = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -598,7 +478,7 @@ print(res_a2_2.summary)
 print('Wald Test para os leads (H0: θ1 = θ2 = 0)')
 print(wald_leads_pibpc)
 
-salvar_resultados_panelols(res_a2_2, model_name="model_a2_2", out_dir=OUTPUTS_PATH, wald_tests={"wald_leads": wald_leads_pibpc}, overwrite=True,)
+salvar_resultados_panelols(res_a2_2, model_name="model_a2_2", wald_tests={"wald_leads": wald_leads_pibpc}, overwrite=True,)
 # %% ANÁLISE 5 - MODELO B1.1 DE CONTRACICLICIDADE COM PIB REAL
 # MODELO B1.1 DE CONTRACICLICIDADE COM PIB REAL - Evolução do PIB real ao longo do tempo em respeito aos desembolsos do BNDES para cada município (efeito regional) - FE 2-way (municípios e anos)
 # EQUAÇÃO DO MODELO: Xit ​= δ0​gPIB(it)​+δ1​gPIB(i,t−1)​+δ2​gPIB(i,t−2)​+Φ′Zi,t−1​+αi​+λt​+uit​
@@ -625,27 +505,24 @@ salvar_resultados_panelols(res_a2_2, model_name="model_a2_2", out_dir=OUTPUTS_PA
 # H₀: O ciclo econômico não influencia os desembolsos. Não há evidência de atuação contracíclica.
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------###
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_b1_1 = df_model[lhs_modelo_b1_1 + rhs_modelo_b1_1].copy()
-
-# Drop NA
-df_model_b1_1 = df_model_b1_1.dropna()
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_b1_1 = mapa_validade.amostra(lhs_modelo_b1_1, rhs_modelo_b1_1).podar()
+print(amostra_b1_1.diagnostico())
+print(f'Pré-passo FE: {amostra_b1_1.relatorio}')
 
 # Variável dependente Y
-y = df_model_b1_1[lhs_modelo_b1_1[0]]
+y = amostra_b1_1.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_b1_1[rhs_modelo_b1_1]
+X = amostra_b1_1.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_b1_1 = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_b1_1 = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -655,27 +532,15 @@ print(f'Resumo do MODELO B1.1 DE CONTRACICLICIDADE (PIB REAL) de regressão com
 print(res_b1_1.summary)
 
 # TESTE 1 - δ1​ >= ZERO
-coef_name = 'delta_log_pib_real_lag1'
-delta1_hat = float(res_b1_1.params[coef_name])
-t_delta1 = float(res_b1_1.tstats[coef_name])
-
-# p-valor bilateral do output padrão
-p_bi_delta1 = float(res_b1_1.pvalues[coef_name])
-
-# converter para unilateral à esquerda
-# Se t é negativo (efeito contracíclico), p_uni = p_bi/2
-# Se t é positivo, p_uni = 1 - p_bi/2
-if t_delta1 < 0:
-    p_uni_delta1 = p_bi_delta1 / 2
-else:
-    p_uni_delta1 = 1 - (p_bi_delta1 / 2)
+# Motor de hipóteses: δ1, se(δ1), t e p unilateral à esquerda (H1: δ1 < 0) em uma única avaliação
+teste_delta1 = avaliar_restricoes({'modelb1_1': res_b1_1}, [soma(['delta_log_pib_real_lag1'], nome='delta1_uni', alternativa='menor')]).iloc[0]
 
-teste_delta1_uni = SimpleTest(stat=t_delta1, pval=p_uni_delta1, df=1)
+teste_delta1_uni = SimpleTest(stat=float(teste_delta1['stat']), pval=float(teste_delta1['pval']), df=1)
 
 print('Teste unilateral contraciclicidade (H0: δ1 >= 0)')
-print('delta1_hat:', delta1_hat)
-print('t(delta1):', t_delta1)
-print('p unilateral:', p_uni_delta1)
+print('delta1_hat:', teste_delta1['estimativa'])
+print('t(delta1):', teste_delta1['stat'])
+print('p unilateral:', teste_delta1['pval'])
 
 # -------------------------
 # TESTE 2: Wald conjunto do ciclo H0: δ0 = δ1 =δ2 =0 (bilateral)
@@ -690,7 +555,7 @@ print('Wald (ciclo) H0: δ0 = δ1 = δ2 = 0')
 print(wald_ciclo)
 
 # Salvar
-salvar_resultados_panelols(res_b1_1, model_name="modelb1_1", out_dir=OUTPUTS_PATH, wald_tests={"delta1_uni": teste_delta1_uni, "wald_ciclo": wald_ciclo}, overwrite=True)
+salvar_resultados_panelols(res_b1_1, model_name="modelb1_1", wald_tests={"delta1_uni": teste_delta1_uni, "wald_ciclo": wald_ciclo}, overwrite=True)
 # %% ANÁLISE 6 - MODELO B2.1 DE CONTRACICLICIDADE SETORIAL COM PIB REAL
 # MODELO B2.1 DE CONTRACICLICIDADE SETORIAL COM PIB REAL - Evolução do PIB real ao longo do tempo em respeito aos desembolsos do BNDES para industria e para o agronegócio para cada município (efeito regional) - FE 2-way (municípios e anos)
 # EQUAÇÃO DO MODELO: Xind(it)​ = δ0ind​gind(it)​ + δ1ind​gind(i,t−1) +δ2ind​gind(i,t−2)​ + Φind′Z(i,t−1) ​+αi ​+ λt ​+ uind(it)
@@ -719,27 +584,24 @@ salvar_resultados_panelols(res_b1_1, model_name="modelb1_1", out_dir=OUTPUTS_PAT
 # H₀: O ciclo econômico não influencia os desembolsos. Não há evidência de atuação contracíclica.
 #----------------------------------------------------------------------------------------------------------------------------------------------------------------------------------###
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_b2_1_ind = df_model[lhs_modelo_b2_1_ind + rhs_modelo_b2_1_ind].copy()
-
-# Drop NA
-df_model_b2_1_ind = df_model_b2_1_ind.dropna()
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_b2_1_ind = mapa_validade.amostra(lhs_modelo_b2_1_ind, rhs_modelo_b2_1_ind).podar()
+print(amostra_b2_1_ind.diagnostico())
+print(f'Pré-passo FE: {amostra_b2_1_ind.relatorio}')
 
 # Variável dependente Y
-y = df_model_b2_1_ind[lhs_modelo_b2_1_ind[0]]
+y = amostra_b2_1_ind.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_b2_1_ind[rhs_modelo_b2_1_ind]
+X = amostra_b2_1_ind.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_b2_1_ind = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_b2_1_ind = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -749,27 +611,15 @@ print(f'Resumo do MODELO B2.1 DE CONTRACICLICIDADE (PIB REAL) SETOR INDÚSTRIA d
 print(res_b2_1_ind.summary)
 
 # TESTE 1 - δ1​ >= ZERO
-coef_name = 'delta_asinh_va_industria_real_lag1'
-delta1_hat = float(res_b2_1_ind.params[coef_name])
-t_delta1 = float(res_b2_1_ind.tstats[coef_name])
-
-# p-valor bilateral do output padrão
-p_bi_delta1 = float(res_b2_1_ind.pvalues[coef_name])
-
-# converter para unilateral à esquerda
-# Se t é negativo (efeito contracíclico), p_uni = p_bi/2
-# Se t é positivo, p_uni = 1 - p_bi/2
-if t_delta1 < 0:
-    p_uni_delta1 = p_bi_delta1 / 2
-else:
-    p_uni_delta1 = 1 - (p_bi_delta1 / 2)
+# Motor de hipóteses: δ1, se(δ1), t e p unilateral à esquerda (H1: δ1 < 0) em uma única avaliação
+teste_delta1 = avaliar_restricoes({'modelb2_1_ind': res_b2_1_ind}, [soma(['delta_asinh_va_industria_real_lag1'], nome='delta1_uni', alternativa='menor')]).iloc[0]
 
-teste_delta1_uni = SimpleTest(stat=t_delta1, pval=p_uni_delta1, df=1)
+teste_delta1_uni = SimpleTest(stat=float(teste_delta1['stat']), pval=float(teste_delta1['pval']), df=1)
 
 print('Teste unilateral contraciclicidade (H0: δ1 >= 0)')
-print('delta1_hat:', delta1_hat)
-print('t(delta1):', t_delta1)
-print('p unilateral:', p_uni_delta1)
+print('delta1_hat:', teste_delta1['estimativa'])
+print('t(delta1):', teste_delta1['stat'])
+print('p unilateral:', teste_delta1['pval'])
 
 # -------------------------
 # TESTE 2: Wald conjunto do ciclo H0: δ0 = δ1 =δ2 =0 (bilateral)
@@ -785,29 +635,26 @@ print('Wald (ciclo) H0: δ0 = δ1 = δ2 = 0')
 print(wald_ciclo)
 
 # Salvar
-salvar_resultados_panelols(res_b2_1_ind, model_name="modelb2_1_ind", out_dir=OUTPUTS_PATH, wald_tests={"delta1_uni": teste_delta1_uni, "wald_ciclo": wald_ciclo}, overwrite=True)
+salvar_resultados_panelols(res_b2_1_ind, model_name="modelb2_1_ind", wald_tests={"delta1_uni": teste_delta1_uni, "wald_ciclo": wald_ciclo}, overwrite=True)
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_b2_1_agro = df_model[lhs_modelo_b2_1_agro + rhs_modelo_b2_1_agro].copy()
-
-# Drop NA
-df_model_b2_1_agro = df_model_b2_1_agro.dropna()
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_b2_1_agro = mapa_validade.amostra(lhs_modelo_b2_1_agro, rhs_modelo_b2_1_agro).podar()
+print(amostra_b2_1_agro.diagnostico())
+print(f'Pré-passo FE: {amostra_b2_1_agro.relatorio}')
 
 # Variável dependente Y
-y = df_model_b2_1_agro[lhs_modelo_b2_1_agro[0]]
+y = amostra_b2_1_agro.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_b2_1_agro[rhs_modelo_b2_1_agro]
+X = amostra_b2_1_agro.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_b2_1_agro = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_b2_1_agro = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -817,27 +664,15 @@ print(f'Resumo do MODELO B2.1 DE CONTRACICLICIDADE (PIB REAL) SETOR AGROPECUÁRI
 print(res_b2_1_agro.summary)
 
 # TESTE 1 - δ1​ >= ZERO
-coef_name = 'delta_asinh_va_agropecuaria_real_lag1'
-delta1_hat = float(res_b2_1_agro.params[coef_name])
-t_delta1 = float(res_b2_1_agro.tstats[coef_name])
-
-# p-valor bilateral do output padrão
-p_bi_delta1 = float(res_b2_1_agro.pvalues[coef_name])
-
-# converter para unilateral à esquerda
-# Se t é negativo (efeito contracíclico), p_uni = p_bi/2
-# Se t é positivo, p_uni = 1 - p_bi/2
-if t_delta1 < 0:
-    p_uni_delta1 = p_bi_delta1 / 2
-else:
-    p_uni_delta1 = 1 - (p_bi_delta1 / 2)
+# Motor de hipóteses: δ1, se(δ1), t e p unilateral à esquerda (H1: δ1 < 0) em uma única avaliação
+teste_delta1 = avaliar_restricoes({'modelb2_1_agro': res_b2_1_agro}, [soma(['delta_asinh_va_agropecuaria_real_lag1'], nome='delta1_uni', alternativa='menor')]).iloc[0]
 
-teste_delta1_uni = SimpleTest(stat=t_delta1, pval=p_uni_delta1, df=1)
+teste_delta1_uni = SimpleTest(stat=float(teste_delta1['stat']), pval=float(teste_delta1['pval']), df=1)
 
 print('Teste unilateral contraciclicidade (H0: δ1 >= 0)')
-print('delta1_hat:', delta1_hat)
-print('t(delta1):', t_delta1)
-print('p unilateral:', p_uni_delta1)
+print('delta1_hat:', teste_delta1['estimativa'])
+print('t(delta1):', teste_delta1['stat'])
+print('p unilateral:', teste_delta1['pval'])
 
 # -------------------------
 # TESTE 2: Wald conjunto do ciclo H0: δ0 = δ1 =δ2 =0 (bilateral)
@@ -852,7 +687,7 @@ print('Wald (ciclo) H0: δ0 = δ1 = δ2 = 0')
 print(wald_ciclo)
 
 # Salvar
-salvar_resultados_panelols(res_b2_1_agro, model_name="modelb2_1_agro", out_dir=OUTPUTS_PATH, wald_tests={"delta1_uni": teste_delta1_uni, "wald_ciclo": wald_ciclo}, overwrite=True)
+salvar_resultados_panelols(res_b2_1_agro, model_name="modelb2_1_agro", wald_tests={"delta1_uni": teste_delta1_uni, "wald_ciclo": wald_ciclo}, overwrite=True)
 # %% ANÁLISE 7 - MODELO B3 PROBABILIDADE DE RECEBER DESBOLSO - FE 2-way (municípios e anos) (Linear Probability Model)
 # MODELO B3 PROBABILIDADE DE DESEMBOLSO - Efeito do crescimento na probabilidade de receber desembolso - FE 2-way (municípios e anos)
 # EQUAÇÃO DO MODELO: Dit ​= κ0​gPIB(i,t)​ + κ1​gPIB(i,t-1)​ + κ2​gPIB(i,t-2) ​+ Ω′Z(i,t−1) ​+ αi ​+λt ​+ eit​
@@ -881,28 +716,24 @@ salvar_resultados_panelols(res_b2_1_agro, model_name="modelb2_1_agro", out_dir=O
 # H₀: O ciclo econômico não influencia os desembolsos. Não há evidência de atuação contracíclica.
 #----------------------------------------------------------------------------------------------------------------------------------
 
-# Selecionar dados de interesse para a regressão antes de dropNA (para manter o máximo de observações possível)
-df_model_b3 = df_model[lhs_modelo_b3 + rhs_modelo_b3].copy().dropna()
-
-df_model_b3["D_recebeu_desembolso"] = (df_model_b3["desembolsos_corrente"] > 0).astype(float)
-
-lhs_model_b3 = ["D_recebeu_desembolso"]
+# Amostra de estimação: linhas com lhs e rhs válidos (AND dos bitmaps; sem cópia do painel), sem singletons de município/ano
+amostra_b3 = mapa_validade.amostra(lhs_modelo_b3, rhs_modelo_b3).podar()
+print(amostra_b3.diagnostico())
+print(f'Pré-passo FE: {amostra_b3.relatorio}')
 
 # Variável dependente Y
-y = df_model_b3[lhs_modelo_b3[0]]
+y = amostra_b3.y
 
 # Variáveis independentes X (modelo principal)
-X = df_model_b3[rhs_modelo_b3]
+X = amostra_b3.X
 
-# Rodar modelo com FE duplo
-mod = PanelOLS(
+# Rodar modelo com FE duplo (memoizado em disco: reaproveita o ajuste se amostra e especificação não mudaram)
+res_b3 = cache_ajustes.ajustar_panelols(
     y,
     X,
     entity_effects=True,
-    time_effects=True
-)
-
-res_b3 = mod.fit(
+    time_effects=True,
+    tendencias_entidade=TENDENCIAS_MUNICIPIO,
     cov_type='clustered',
     cluster_entity=True,
     cluster_time=True
@@ -912,20 +743,12 @@ print(f'Resumo do MODELO B3 Linear Probability Model - regressão com efeitos fi
 print(res_b3.summary)
 
 # TESTE 4: Unilateral contraciclo (principal) H0: k1 >= 0 vs H1: k1 < 0
-coef_name = "delta_log_pib_real_lag1"
-k1_hat = float(res_b3.params[coef_name])
-t_k1 = float(res_b3.tstats[coef_name])
-p_bi_k1 = float(res_b3.pvalues[coef_name])
+teste_k1 = avaliar_restricoes({"model_b3": res_b3}, [soma(["delta_log_pib_real_lag1"], nome="k1_uni", alternativa="menor")]).iloc[0]
 
-if t_k1 < 0:
-    p_uni_k1 = p_bi_k1 / 2
-else:
-    p_uni_k1 = 1 - (p_bi_k1 / 2)
-
-teste_k1_uni = SimpleTest(stat=t_k1, pval=p_uni_k1, df=1)
+teste_k1_uni = SimpleTest(stat=float(teste_k1["stat"]), pval=float(teste_k1["pval"]), df=1)
 
 print("Teste unilateral contraciclicidade (B3): H0 k1>=0 vs H1 k1<0")
-print("k1_hat:", k1_hat, " t:", t_k1, " p_uni:", p_uni_k1)
+print("k1_hat:", teste_k1["estimativa"], " t:", teste_k1["stat"], " p_uni:", teste_k1["pval"])
 
 # TESTE 5 - Wald Test para os coeficientes de interesse H0​: k0 ​= k1 ​= k2 ​= 0
 hyp_ciclo = [
@@ -937,6 +760,368 @@ wald_ciclo = res_b3.wald_test(formula=hyp_ciclo)  # type: ignore[arg-type]
 print("Wald conjunto (ciclo) H0: k0 = k1 = k2 = 0")
 print(wald_ciclo)
 
-salvar_resultados_panelols(res_b3, model_name="model_b3", out_dir=OUTPUTS_PATH, wald_tests={"wald_ciclo": wald_ciclo, "k1_uni": teste_k1_uni}, overwrite=True,)
+salvar_resultados_panelols(res_b3, model_name="model_b3", wald_tests={"wald_ciclo": wald_ciclo, "k1_uni": teste_k1_uni}, overwrite=True,)
+
+print(df_model.info())
+# %% ANÁLISE 8 - GRADE DE ESPECIFICAÇÕES (ROBUSTEZ)
+# Grade de robustez dos modelos A e B: profundidade de lags (1-5), leads (0-3), conjuntos de controles, estrutura de cluster/HAC, janelas amostrais e trimming do Y
+# Amostras idênticas compartilham máscara, demeaning e índices de cluster; amostras distintas rodam em paralelo
+# Saída: tabela longa (spec x variável) para gráficos de curva de especificação, com tempo por especificação
+from specification_grid import expandir_grade, rodar_grade, resumo_tempos
+from paths import REGRESSION_GRID_PATH
+
+modelos_grade = {
+    'a_pib': {'lhs': 'delta_log_pib_real', 'base': 'share_desembolso_real_pib_real_ano_anterior'},
+    'a_pibpc': {'lhs': 'delta_log_pibpc_real', 'base': 'share_desembolso_real_pib_real_ano_anterior'},
+    'b_pib': {'lhs': 'share_desembolso_real_pib_real_ano_anterior', 'base': 'delta_log_pib_real'},
+}
+
+grade = expandir_grade(
+    modelos_grade,
+    n_lags=range(1, 6),
+    n_leads=range(0, 4),
+    controles=('completo', 'sem_populacao'),
+    clusters=('municipio_ano', 'uf_ano', 'driscoll_kraay', 'newey_west'),
+    janelas=(None, (2006, 2014), (2010, 2021)),
+    trims=(None, 0.01),
+)
+
+df_grade = rodar_grade(df_model, grade, n_workers=4, out_path=Path(REGRESSION_GRID_PATH) / 'grade_especificacoes.parquet')
+
+print(df_grade[df_grade['var'] == 'efeito_acumulado'].sort_values('coef').head(20))
+print(resumo_tempos(df_grade).head(10))
+
+# %% ANÁLISE 9 - JACKKNIFE LEAVE-ONE-CLUSTER-OUT (INFLUÊNCIA POR UF E POR ANO)
+# Diagnóstico de influência do MODELO A1.1: remove cada UF (27) ou cada ano e reestima β0..β3 e o efeito acumulado
+# As contribuições de cada cluster às equações normais são calculadas uma vez; cada estimativa delete-one é obtida por downdating (sem refazer o PanelOLS)
+from jackknife import jackknife_clusters
+
+beta_names = [
+    'share_desembolso_real_pib_real_ano_anterior',
+    'share_desembolso_real_pib_real_ano_anterior_lag1',
+    'share_desembolso_real_pib_real_ano_anterior_lag2',
+    'share_desembolso_real_pib_real_ano_anterior_lag3',
+]
+
+for cluster_jk in ['estado', 'ano']:
+    jk_a1_1 = jackknife_clusters(df_model, lhs_modelo_a1_1[0], rhs_modelo_a1_1, cluster=cluster_jk, vars_acumulado=beta_names, mapa=mapa_validade)
+    print(f'Jackknife MODELO A1.1 - removendo um(a) {cluster_jk} por vez')
+    print('SE jackknife:')
+    print(jk_a1_1.se_jackknife)
+    print('Clusters mais influentes (efeito acumulado):')
+    print(jk_a1_1.influentes)
+    jk_a1_1.estimativas.reset_index().to_parquet(Path(REGRESSION_GRID_PATH) / f'jackknife_a1_1_{cluster_jk}.parquet', index=False)
+
+# %% ANÁLISE 10 - JANELAS MÓVEIS E SUBPERÍODOS (ESTATÍSTICAS SUFICIENTES POR BLOCO)
+# W'W por bloco (ano x UF) é calculado uma única vez por modelo e salvo em outputs/blocks; cada janela é resolvida somando blocos
+# Nas execuções seguintes os estoques salvos são reaproveitados e só os blocos dos anos alterados (ano novo do PIB municipal,
+# anos cujos leads ele completa, revisões) são refeitos
+# Janelas móveis de 8 anos e subperíodos (pré-crise, crise, pós-crise) para os modelos A1.1, A1.2, B1.1 e B2.1
+from sufficient_stats import atualizar_estoques
+from paths import REGRESSION_BLOCKS_PATH
+
+modelos_blocos = {
+    'model_a1_1': (lhs_modelo_a1_1[0], rhs_modelo_a1_1),
+    'model_a1_2': (lhs_modelo_a1_2[0], rhs_modelo_a1_2),
+    'model_b1_1': (lhs_modelo_b1_1[0], rhs_modelo_b1_1),
+    'model_b2_1_ind': (lhs_modelo_b2_1_ind[0], rhs_modelo_b2_1_ind),
+    'model_b2_1_agro': (lhs_modelo_b2_1_agro[0], rhs_modelo_b2_1_agro),
+}
+estoques = atualizar_estoques(df_model, modelos_blocos, out_dir=REGRESSION_BLOCKS_PATH, mapa=mapa_validade)
+print({nome: est.info['anos_refeitos'] for nome, est in estoques.items()})
+
+# Reportar apenas as variáveis de interesse (sem os controles)
+controles_blocos = ['log_pibpc_real_lag1', 'share_industria_lag1', 'share_agropecuaria_lag1', 'log_populacao_lag1']
+vars_blocos = {nome: [v for v in est.rhs if v not in controles_blocos] for nome, est in estoques.items()}
+
+subperiodos = [(2005, 2013), (2014, 2016), (2017, 2021)]
+df_janelas = pd.concat([est.janelas_moveis(8, vars_interesse=vars_blocos[nome]) for nome, est in estoques.items()], ignore_index=True)
+df_subperiodos = pd.concat([est.subperiodos(subperiodos, vars_interesse=vars_blocos[nome]) for nome, est in estoques.items()], ignore_index=True)
+df_janelas.to_parquet(Path(REGRESSION_BLOCKS_PATH) / 'janelas_moveis_8anos.parquet', index=False)
+df_subperiodos.to_parquet(Path(REGRESSION_BLOCKS_PATH) / 'subperiodos.parquet', index=False)
+print(df_subperiodos)
+
+# %% ANÁLISE 11 - EVENT STUDY DO PRIMEIRO DESEMBOLSO RELEVANTE
+# Evento = primeiro ano com desembolso > 0 (ou acima do P75 da série); janela t-4 ... t+5 com extremos agrupados, referência t-1
+# Estimadores: TWFE clássico e interaction-weighted (Sun & Abraham) robusto a efeitos heterogêneos entre coortes
+# Saída: tabelas longas de coeficientes (com coluna 'h') registradas no repositório de resultados
+from event_study import estudo_evento, tabela_evento
+
+repo_resultados = RepositorioResultados(RESULTS_STORE_PATH)
+
+resultados_evento = {
+    'pib': 'delta_log_pib_real',
+    'pibpc': 'delta_log_pibpc_real',
+    'va_industria': 'delta_asinh_va_industria_real',
+    'va_agropecuaria': 'delta_asinh_va_agropecuaria_real',
+}
+
+tabelas_evento = []
+for nome_y, lhs_evento in resultados_evento.items():
+    for criterio_evento in ['positivo', 'quantil']:
+        for estimador_evento in ['twfe', 'iw']:
+            res_evento = estudo_evento(df_model, lhs_evento, 'share_desembolso_real_pib_real_ano_anterior', estimador=estimador_evento, criterio=criterio_evento, quantil=0.75, cluster='uf', mapa=mapa_validade)
+            nome_evento = f'event_{nome_y}_{criterio_evento}_{estimador_evento}'
+            df_evento = tabela_evento(res_evento, model_name=nome_evento)
+            repo_resultados.registrar_coeficientes(df_evento, model_name=nome_evento, spec=res_evento.info, cov=res_evento.cov)
+            tabelas_evento.append(df_evento)
+
+df_eventos = pd.concat(tabelas_evento, ignore_index=True)
+print(df_eventos[df_eventos['model'].str.startswith('event_pib_positivo')])
+
+# %% ANÁLISE 12 - PROJEÇÕES LOCAIS (IMPULSO-RESPOSTA h = 0..6)
+# Resposta acumulada de Δlog PIB, Δlog PIBpc e VA setorial ao desembolso corrente, com FE Município+Ano e SE cluster UF+Ano
+# Horizontes com a mesma amostra compartilham o demeaning; amostras distintas rodam em paralelo
+from local_projections import projecoes_locais
+
+resultados_lp = {
+    'pib': 'delta_log_pib_real',
+    'pibpc': 'delta_log_pibpc_real',
+    'va_industria': 'delta_asinh_va_industria_real',
+    'va_agropecuaria': 'delta_asinh_va_agropecuaria_real',
+}
+
+df_irf = projecoes_locais(df_model, resultados_lp, 'share_desembolso_real_pib_real_ano_anterior', horizontes=range(0, 7), cluster='uf_ano')
+for nome_lp, df_lp in df_irf.groupby('model'):
+    repo_resultados.registrar_coeficientes(df_lp, model_name=nome_lp, spec={'lhs': df_lp['lhs'].iloc[0], 'horizontes': sorted(df_lp['h'].tolist()), 'cluster': 'uf_ano'})
+print(df_irf[['model', 'h', 'coef', 'std_err', 'p', 'nobs']])
+
+# %% ANÁLISE 13 - BATERIA DE HIPÓTESES LINEARES (TODOS OS MODELOS)
+# Zeros conjuntos, somas acumuladas por janela (bilaterais e unilaterais), leads e igualdades par a par
+# avaliadas em lote contra params/cov de cada modelo e gravadas no repositório de resultados (tabela 'tests')
+from hypothesis_tests import bateria_padrao
+
+base_a = 'share_desembolso_real_pib_real_ano_anterior'
+baterias = {
+    'model_a1_1': bateria_padrao(base_a, max_lag=3),
+    'model_a1_2': bateria_padrao(base_a, max_lag=3),
+    'model_a2_1': bateria_padrao(base_a, max_lag=3, n_leads=2),
+    'model_a2_2': bateria_padrao(base_a, max_lag=3, n_leads=2),
+    'modelb1_1': bateria_padrao('delta_log_pib_real', max_lag=2, alternativa_acumulado='menor'),
+    'modelb2_1_ind': bateria_padrao('delta_asinh_va_industria_real', max_lag=2, alternativa_acumulado='menor'),
+    'modelb2_1_agro': bateria_padrao('delta_asinh_va_agropecuaria_real', max_lag=2, alternativa_acumulado='menor'),
+}
+resultados_modelos = {
+    'model_a1_1': res_a1_1, 'model_a1_2': res_a1_2, 'model_a2_1': res_a2_1, 'model_a2_2': res_a2_2,
+    'modelb1_1': res_b1_1, 'modelb2_1_ind': res_b2_1_ind, 'modelb2_1_agro': res_b2_1_agro,
+}
+
+df_hipoteses = pd.concat([avaliar_restricoes({nome: resultados_modelos[nome]}, bateria) for nome, bateria in baterias.items()], ignore_index=True)
+RepositorioResultados(RESULTS_STORE_PATH).registrar_testes(df_hipoteses)
+print(df_hipoteses[df_hipoteses['test'].str.startswith('acumulado')])
+
+# %% ANÁLISE 14 - PPML COM EFEITOS FIXOS (DESEMBOLSO EM NÍVEL)
+# Contrapartida em nível dos modelos B: o desembolso real (com massa de zeros) é modelado por Poisson pseudo-máxima verossimilhança
+# com FE de município e ano, em vez do share (B1/B2) ou da dummy de recebimento (B3, LPM)
+# Coeficientes = semielasticidades (100 * δ = variação % do desembolso esperado por p.p. de crescimento)
+# Municípios/anos só com zeros e observações separadas pelos regressores são removidos antes da estimação (ver ppml.py)
+from ppml import ppml_painel
+
+modelos_ppml = {
+    'model_ppml_b1_1': ('desembolsos_real_pib', rhs_modelo_b1_1),
+    'model_ppml_b2_1_ind': ('desembolsos_industria_real_pib', rhs_modelo_b2_1_ind),
+    'model_ppml_b2_1_agro': ('desembolsos_agropecuaria_real_pib', rhs_modelo_b2_1_agro),
+}
+
+resultados_ppml = {}
+for nome_ppml, (lhs_ppml, rhs_ppml) in modelos_ppml.items():
+    res_ppml = ppml_painel(df_model, lhs_ppml, rhs_ppml, mapa=mapa_validade, cluster='municipio_ano')
+    resultados_ppml[nome_ppml] = res_ppml
+    print(f'{nome_ppml}: {res_ppml.nobs} obs. ({res_ppml.info["n_separadas_fe"]} separadas por FE, {res_ppml.info["n_separadas_relu"]} por regressores) - convergiu: {res_ppml.info["convergiu"]}')
+    print(pd.DataFrame({'coef': res_ppml.params, 'std_err': res_ppml.std_errors, 'p': res_ppml.pvalues}))
+    repo_resultados.registrar(res_ppml, model_name=nome_ppml, spec={**res_ppml.info, 'rhs': rhs_ppml})
+
+# Testes dos modelos em nível: ciclo conjuntamente nulo e somas acumuladas (bilaterais e unilaterais H1: < 0), no mesmo motor dos modelos lineares
+df_testes_ppml = pd.concat([
+    avaliar_restricoes({nome: res}, bateria_padrao(rhs[0], max_lag=2, alternativa_acumulado='menor'))
+    for (nome, res), (_, rhs) in zip(resultados_ppml.items(), modelos_ppml.values())
+], ignore_index=True)
+repo_resultados.registrar_testes(df_testes_ppml)
+
+# Grade de robustez em nível (mesma grade de especificações, estimador PPML)
+grade_ppml = expandir_grade(
+    {'ppml_b_pib': {'lhs': 'desembolsos_real_pib', 'base': 'delta_log_pib_real'}},
+    n_lags=range(1, 4),
+    n_leads=range(0, 2),
+    controles=('completo', 'sem_populacao'),
+    clusters=('municipio_ano', 'uf_ano'),
+)
+df_grade_ppml = rodar_grade(df_model, grade_ppml, estimador='ppml', n_workers=4, out_path=Path(REGRESSION_GRID_PATH) / 'grade_especificacoes_ppml.parquet')
+print(df_grade_ppml[df_grade_ppml['var'] == 'efeito_acumulado'])
+
+# %% ANÁLISE 15 - TRANSBORDAMENTOS ESPACIAIS E ERROS-PADRÃO DE CONLEY
+# Desembolso nos vizinhos (banda de 100 km entre centroides municipais, média dos vizinhos observados no ano) como regressor adicional do MODELO A1.1
+# e erros-padrão de Conley (kernel de Bartlett, cortes de 100/250/500 km, com 2 defasagens temporais) como alternativa ao cluster por município/ano
+# Centroides: inputs/raw/centroides_municipios.csv (codigo IBGE, latitude, longitude)
+from spatial import carregar_centroides, distancias_esparsas, matriz_pesos, defasagem_espacial, fe_conley
+
+from specification_grid import deslocar_por_ano
+from paths import RAW_DATA_PATH
+
+# O arquivo de centroides não faz parte dos dados baixados pelo data_processing.py: sem ele a análise é pulada
+caminho_centroides = Path(RAW_DATA_PATH) / 'centroides_municipios.csv'
+if caminho_centroides.exists():
+    centroides = carregar_centroides(caminho_centroides)
+    W_100km = matriz_pesos(centroides, raio_km=100, normalizar=False)
+
+    # Defasagem pelo ano (sem reordenar df_model, cujas posições são as de mapa_validade)
+    base_viz = 'share_desembolso_real_pib_real_ano_anterior'
+    df_model[f'{base_viz}_viz'] = defasagem_espacial(df_model, base_viz, W_100km, centroides)
+    df_model[f'{base_viz}_viz_lag1'] = deslocar_por_ano(df_model, f'{base_viz}_viz', 1)
+    rhs_modelo_a1_1_espacial = rhs_modelo_a1_1 + [f'{base_viz}_viz', f'{base_viz}_viz_lag1']
+
+    # Distâncias calculadas uma vez até o maior corte e reaproveitadas em todos os ajustes
+    D_conley = distancias_esparsas(centroides, raio_km=500)
+    for corte_km in [100, 250, 500]:
+        for nome_conley, rhs_conley in [('model_a1_1_conley', rhs_modelo_a1_1), ('model_a1_1_espacial_conley', rhs_modelo_a1_1_espacial)]:
+            res_conley = fe_conley(df_model, lhs_modelo_a1_1[0], rhs_conley, centroides, corte_km=corte_km, lag_tempo=2, D=D_conley)
+            print(f'{nome_conley} - Conley {corte_km} km:')
+            print(pd.DataFrame({'coef': res_conley.params, 'std_err': res_conley.std_errors, 'p': res_conley.pvalues}))
+            repo_resultados.registrar(res_conley, model_name=f'{nome_conley}_{corte_km}km', spec={**res_conley.info, 'rhs': rhs_conley})
+else:
+    print(f'ANÁLISE 15 pulada: {caminho_centroides} não encontrado (codigo IBGE, latitude, longitude)')
+
+# %% ANÁLISE 16 - COVARIÂNCIAS HAC: DRISCOLL-KRAAY E NEWEY-WEST POR MUNICÍPIO
+# Choques macro comuns (crise 2008-2010, recessão 2015-2016) induzem dependência cross-section que o cluster por município/ano não cobre por completo:
+#   'driscoll_kraay' -> HAC sobre os scores somados por ano (robusto a dependência entre municípios e autocorrelação até a banda)
+#   'newey_west'     -> HAC dentro de cada município (sem correlação entre municípios)
+# Banda pela regra de Newey-West (floor(4 (T/100)^(2/9))) e alternativa com banda 4; mesmas amostras dos modelos A1.1 e B1.1
+from fixed_effects import Absorvedor, ajustar_fe
+
+for nome_hac, lhs_hac, rhs_hac in [('model_a1_1', lhs_modelo_a1_1[0], rhs_modelo_a1_1), ('modelb1_1', lhs_modelo_b1_1[0], rhs_modelo_b1_1)]:
+    amostra_hac = mapa_validade.amostra(lhs_hac, rhs_hac).podar()
+    absorvedor_hac = Absorvedor([amostra_hac.indice.get_level_values(0).to_numpy(), amostra_hac.indice.get_level_values(1).to_numpy()])
+    M_hac = absorvedor_hac.demean(amostra_hac.matriz([lhs_hac] + rhs_hac))
+    entidade_hac, tempo_hac = absorvedor_hac.codigos
+    for cov_hac in ['driscoll_kraay', 'newey_west']:
+        for banda_hac in [None, 4]:
+            res_hac = ajustar_fe(M_hac[:, 0], M_hac[:, 1:], rhs_hac, n_efeitos=absorvedor_hac.n_efeitos, cov_type=cov_hac,
+                                 entidade=entidade_hac, tempo=tempo_hac, banda=banda_hac, info={'lhs': lhs_hac, 'banda': banda_hac})
+            sufixo_banda = 'nw' if banda_hac is None else f'b{banda_hac}'
+            print(f'{nome_hac} - {cov_hac} (banda {sufixo_banda}):')
+            print(pd.DataFrame({'coef': res_hac.params, 'std_err': res_hac.std_errors, 'p': res_hac.pvalues}))
+            repo_resultados.registrar(res_hac, model_name=f'{nome_hac}_{cov_hac}_{sufixo_banda}', spec={**res_hac.info, 'cov_type': cov_hac, 'rhs': rhs_hac})
+
+# %% ANÁLISE 17 - EFEITOS HETEROGÊNEOS POR UF E POR MACRORREGIÃO (MODELO B1.1)
+# Elasticidades do desembolso ao crescimento do PIB (β0..β2 do MODELO B1.1) específicas de cada UF (27) ou macrorregião (5),
+# com controles, FE de município e FE de ano comuns, estimadas em um único ajuste (estrutura em blocos, ver heterogeneous_effects.py)
+# TESTE DE HIPÓTESE: H₀: β(k, g) iguais em todas as UFs/regiões, por defasagem k e para β0..β2 em conjunto
+from heterogeneous_effects import efeitos_heterogeneos, coeficientes_por_grupo, testes_igualdade
+
+ciclo_b1_1 = ['delta_log_pib_real', 'delta_log_pib_real_lag1', 'delta_log_pib_real_lag2']
+controles_b1_1 = [v for v in rhs_modelo_b1_1 if v not in ciclo_b1_1]
+
+tabelas_heterogeneas = []
+for grupo_het in ['estado', 'regiao']:
+    nome_het = f'modelb1_1_het_{grupo_het}'
+    res_het = efeitos_heterogeneos(df_model, lhs_modelo_b1_1[0], ciclo_b1_1, grupo=grupo_het, comuns=controles_b1_1, cluster='municipio_ano', mapa=mapa_validade)
+    df_coef_het = coeficientes_por_grupo(res_het).assign(model=nome_het)
+    df_testes_het = testes_igualdade(res_het, nome_het)
+    print(f'{nome_het}: {res_het.nobs} obs., {len(res_het.info["grupos"])} grupos')
+    print(df_coef_het.pivot(index='grupo', columns='var', values='coef'))
+    print(df_testes_het[['test', 'df', 'stat', 'pval']])
+    repo_resultados.registrar(res_het, model_name=nome_het, spec={k: v for k, v in res_het.info.items() if k != 'poda'})
+    repo_resultados.registrar_testes(df_testes_het)
+    tabelas_heterogeneas.append(df_coef_het)
+
+pd.concat(tabelas_heterogeneas, ignore_index=True).to_parquet(Path(REGRESSION_TABLES_PATH) / 'efeitos_heterogeneos_b1_1.parquet', index=False)
+
+# %% ANÁLISE 18 - CONTROLE SINTÉTICO / SYNTHETIC DiD PARA MEGADESEMBOLSOS MUNICIPAIS
+# Casos: primeiro ano em que o desembolso industrial (inclui utilidades públicas e extrativa) supera o P99,9 do painel, com >= 5 anos pré
+# Doadores: mesma UF, população no ano anterior entre 1/3 e 3 vezes a do tratado, sem outros tratados e com o desfecho completo na janela
+# Inferência: placebo no espaço sobre todos os doadores (posto da razão RMSPE pós/pré e variância placebo do att)
+from synthetic_control import selecionar_choques, controle_sintetico_lote
+
+casos_sc = selecionar_choques(df_model, 'share_desembolso_industria_real_ano_anterior', quantil=0.999, anos_pre_min=5, anos_pos_min=2)
+print(f'Casos de megadesembolso industrial: {len(casos_sc)} (limiar = {casos_sc.attrs["limiar"]:.4f})')
+
+resumos_sc, trajetorias_sc = [], []
+for desfecho_sc in ['log_pib_real', 'asinh_va_industria_real']:
+    for metodo_sc in ['sc', 'sdid']:
+        resultados_sc, resumo_sc = controle_sintetico_lote(df_model, casos_sc, desfecho_sc, metodo=metodo_sc, anos_pos=5,
+                                                           restringir='uf', tamanho='populacao', faixa=3.0, n_workers=4)
+        resumos_sc.append(resumo_sc)
+        trajetorias_sc.extend(res.trajetoria.reset_index().assign(municipio_id=m, desfecho=desfecho_sc, metodo=metodo_sc) for m, res in resultados_sc.items())
+
+df_resumo_sc = pd.concat(resumos_sc, ignore_index=True)
+df_resumo_sc.to_parquet(Path(REGRESSION_TABLES_PATH) / 'controle_sintetico_resumo.parquet', index=False)
+if trajetorias_sc:
+    pd.concat(trajetorias_sc, ignore_index=True).to_parquet(Path(REGRESSION_TABLES_PATH) / 'controle_sintetico_trajetorias.parquet', index=False)
+print(df_resumo_sc.sort_values('p_valor_razao').head(20))
+
+# %% ANÁLISE 19 - ROBUSTEZ: TENDÊNCIAS LINEARES POR MUNICÍPIO (MODELOS A)
+# ΔlogPIB(it) = β'X(it) + γ'Z(it) + α(i) + δ(i)·t + λ(t) + ε(it): intercepto e inclinação de cada município são absorvidos
+# (soluções 2 x 2 em forma fechada, alternadas com o efeito de ano), nas mesmas amostras e com o mesmo cluster município + ano
+modelos_tendencia = {
+    'model_a1_1': amostra_a1_1,
+    'model_a1_2': amostra_a1_2,
+    'model_a2_1': amostra_a2_1,
+    'model_a2_2': amostra_a2_2,
+}
+
+resultados_tendencia = {}
+for nome_tend, amostra_tend in modelos_tendencia.items():
+    res_tend = cache_ajustes.ajustar_panelols(amostra_tend.y, amostra_tend.X, entity_effects=True, time_effects=True, tendencias_entidade=True,
+                                              cov_type='clustered', cluster_entity=True, cluster_time=True)
+    resultados_tendencia[f'{nome_tend}_tendencias'] = res_tend
+    print(f'{nome_tend} com tendências por município:')
+    print(res_tend.summary)
+    repo_resultados.registrar(res_tend, model_name=f'{nome_tend}_tendencias', spec={'lhs': amostra_tend.lhs, 'rhs': amostra_tend.rhs, 'tendencias_entidade': True})
+
+df_hipoteses_tendencia = pd.concat([avaliar_restricoes({nome: res}, bateria_padrao(base_a, max_lag=3, n_leads=2 if 'a2' in nome else 0))
+                                    for nome, res in resultados_tendencia.items()], ignore_index=True)
+repo_resultados.registrar_testes(df_hipoteses_tendencia)
+print(df_hipoteses_tendencia[df_hipoteses_tendencia['test'].str.startswith('acumulado')])
+
+# %% ANÁLISE 20 - PODER E EFEITO MÍNIMO DETECTÁVEL (MDE) COM A ESTRUTURA REAL DO PAINEL
+# Regressores, desbalanceamento e clusters (município + ano) reais; erros simulados por wild bootstrap dos resíduos (Rademacher por município),
+# AR(1) dentro do município (ρ = 0,3) e AR(1) com choque comum por UF x ano. Curvas de poder para β0 e para o efeito acumulado
+from power_simulation import SimuladorPoder
+
+modelos_poder = {
+    'model_a1_1': (amostra_a1_1, beta_names),
+    'model_a1_2': (amostra_a1_2, beta_names),
+    'modelb1_1': (amostra_b1_1, ['delta_log_pib_real', 'delta_log_pib_real_lag1', 'delta_log_pib_real_lag2']),
+}
+cenarios_erro = {
+    'wild': {'processo': 'wild'},
+    'ar1': {'processo': 'ar1', 'rho': 0.3},
+    'ar1_uf_ano': {'processo': 'ar1', 'rho': 0.3, 'sigma_uf_ano': 0.01},
+}
+
+curvas_poder, tabelas_mde = [], []
+for nome_poder, (amostra_poder, vars_poder) in modelos_poder.items():
+    simulador = SimuladorPoder(amostra_poder, vars_interesse=vars_poder, cluster='municipio_ano')
+    for nome_cenario, cenario in cenarios_erro.items():
+        simulador.simular(2000, n_workers=4, seed=42, **cenario)
+        curvas_poder.append(simulador.curva_poder().assign(model=nome_poder, cenario=nome_cenario))
+        tabelas_mde.append(simulador.mde(poder=0.8).assign(model=nome_poder, cenario=nome_cenario))
+
+df_curvas_poder = pd.concat(curvas_poder, ignore_index=True)
+df_mde = pd.concat(tabelas_mde, ignore_index=True)
+df_curvas_poder.to_parquet(Path(REGRESSION_GRID_PATH) / 'curvas_poder.parquet', index=False)
+df_mde.to_parquet(Path(REGRESSION_GRID_PATH) / 'mde.parquet', index=False)
+print(df_mde[['model', 'cenario', 'alvo', 'mde', 'mde_analitico', 'tamanho_empirico', 'estimativa']])
+
+# %% ANÁLISE 21 - CENÁRIOS CONTRAFACTUAIS DE DESEMBOLSO (COEFICIENTES ARMAZENADOS DOS MODELOS A)
+# Efeito previsto sobre ΔlogPIB de trajetórias alternativas do share de desembolso, propagadas pelas defasagens (β0..β3) com os
+# coeficientes e a covariância registrados no repositório; agregação por UF e Brasil ponderada pelo PIB real do ano anterior
+from scenarios import Cenario, MotorCenarios, grade_escalas
+
+cenarios_desembolso = [
+    Cenario('media_2010_2014_em_2015_2016', (2015, 2016), regra='media', periodo_base=(2010, 2014)),
+    Cenario('sem_desembolso_2015_2016', (2015, 2016), regra='escala', fator=0.0),
+    *grade_escalas('escala_2015_2016', (2015, 2016), np.arange(0.0, 2.01, 0.25)),
+]
 
-print(df_model.info())
\ No newline at end of file
+tabelas_cenarios = []
+for nome_cen, desfecho_cen in [('model_a1_1', 'delta_log_pib_real'), ('model_a1_2', 'delta_log_pibpc_real')]:
+    motor = MotorCenarios.de_repositorio(repo_resultados, nome_cen, df_model, desfecho=desfecho_cen)
+    for nivel_cen in ['nacional', 'uf']:
+        for bandas_cen in ['delta', 'simulacao']:
+            tabelas_cenarios.append(motor.avaliar(cenarios_desembolso, nivel=nivel_cen, bandas=bandas_cen).assign(model=nome_cen, bandas=bandas_cen))
+    tabelas_cenarios.append(motor.avaliar(cenarios_desembolso[:1], nivel='municipio').assign(model=nome_cen, bandas='delta'))
+
+df_cenarios = pd.concat(tabelas_cenarios, ignore_index=True)
+df_cenarios.to_parquet(Path(REGRESSION_TABLES_PATH) / 'cenarios_desembolso.parquet', index=False)
+print(df_cenarios[(df_cenarios['nivel'] == 'nacional') & (df_cenarios['cenario'] == 'media_2010_2014_em_2015_2016')])
@@ -0,0 +1,251 @@
+# %% REPOSITÓRIO COLUNAR DE RESULTADOS (APPEND-ONLY, PARQUET PARTICIONADO)
+# Importando as bibliotecas necessárias
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Layout em disco (particionamento hive por tabela e modelo; um arquivo por execução):
+#   {raiz}/{tabela}/model={model}/{run_id}.parquet
+# Tabelas: 'runs' (registro da execução), 'coef', 'cov' (formato longo var_i x var_j), 'stats' e 'tests'.
+# Toda linha carrega model, spec_hash e run_id; o run_id é ordenável no tempo, então "última execução" = maior run_id.
+# Uma consulta filtra por modelo (poda de partições) e devolve todas as linhas necessárias para uma tabela ou figura.
+
+ESQUEMAS = {
+    "runs": pa.schema([("model", pa.string()), ("spec_hash", pa.string()), ("run_id", pa.string()), ("timestamp", pa.string()), ("spec", pa.string())]),
+    "coef": pa.schema([("model", pa.string()), ("spec_hash", pa.string()), ("run_id", pa.string()), ("var", pa.string()),
+                       ("coef", pa.float64()), ("std_err", pa.float64()), ("t", pa.float64()), ("p", pa.float64()),
+                       ("ci_low", pa.float64()), ("ci_high", pa.float64()), ("h", pa.float64())]),
+    "cov": pa.schema([("model", pa.string()), ("spec_hash", pa.string()), ("run_id", pa.string()), ("var_i", pa.string()), ("var_j", pa.string()), ("cov", pa.float64())]),
+    "stats": pa.schema([("model", pa.string()), ("spec_hash", pa.string()), ("run_id", pa.string()), ("depvar", pa.string()), ("nobs", pa.float64()),
+                        ("entities", pa.float64()), ("time_periods", pa.float64()), ("rsquared", pa.float64()), ("rsq_within", pa.float64()),
+                        ("rsq_between", pa.float64()), ("rsq_overall", pa.float64()), ("cov_type", pa.string()), ("entity_effects", pa.bool_()),
+                        ("time_effects", pa.bool_()), ("f_stat", pa.float64()), ("f_pval", pa.float64()), ("f_df_denom", pa.float64()),
+                        ("f_df_num", pa.float64()), ("loglik", pa.float64())]),
+    "tests": pa.schema([("model", pa.string()), ("spec_hash", pa.string()), ("run_id", pa.string()), ("test", pa.string()), ("stat", pa.float64()), ("pval", pa.float64()), ("df", pa.float64()),
+                        ("estimativa", pa.float64()), ("std_err", pa.float64()), ("alternativa", pa.string())]),
+}
+
+
+def _safe(getter, default=None):
+    try:
+        return getter()
+    except Exception:
+        return default
+
+
+def _float(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def hash_spec(spec) -> str:
+    """Hash curto e estável de uma especificação (dict, dataclass com spec_id ou qualquer objeto serializável)."""
+    if hasattr(spec, "spec_id"):
+        return str(spec.spec_id)
+    conteudo = json.dumps(spec, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()[:12]
+
+
+def _cov_type(res):
+    # ResultadoFE expõe cov_type; no PanelEffectsResults o atributo é privado (_cov_type)
+    return _safe(lambda: str(res.cov_type)) or _safe(lambda: str(res._cov_type))
+
+
+def spec_do_resultado(res) -> dict:
+    """Especificação mínima inferida do resultado (variável dependente, regressores e covariância)."""
+    return {
+        "depvar": _safe(lambda: str(res.model.dependent.vars[0])) or _safe(lambda: str(res.info["lhs"])) or _safe(lambda: str(res.estatisticas["depvar"])),
+        "exog": [str(v) for v in res.params.index],
+        "cov_type": _cov_type(res),
+    }
+
+
+def tabela_coeficientes(res) -> pd.DataFrame:
+    """Coeficientes em formato longo a partir de PanelEffectsResults (linearmodels) ou ResultadoFE."""
+    params = res.params
+    se = res.std_errors
+    # CI: tenta usar res.conf_int() se existir; senão calcula por aproximação normal (1.96)
+    try:
+        ci = res.conf_int()
+        ci_low, ci_high = ci.iloc[:, 0], ci.iloc[:, 1]
+    except Exception:
+        ci_low, ci_high = params - 1.96 * se, params + 1.96 * se
+    return pd.DataFrame({
+        "var": params.index.astype(str),
+        "coef": params.values,
+        "std_err": se.values,
+        "t": res.tstats.values,
+        "p": res.pvalues.values,
+        "ci_low": ci_low.values,
+        "ci_high": ci_high.values,
+    })
+
+
+def estatisticas_resultado(res) -> dict:
+    """Estatísticas globais do ajuste (mesmas chaves do antigo *_stats.json; ausentes ficam None)."""
+    if isinstance(getattr(res, "estatisticas", None), dict):
+        # Resultado recuperado do cache de ajustes (fit_cache) já traz as estatísticas
+        return dict(res.estatisticas)
+    return {
+        "depvar": _safe(lambda: str(res.model.dependent.vars[0])) or _safe(lambda: str(res.info["lhs"])),
+        "nobs": _safe(lambda: int(res.nobs)),
+        "entities": _safe(lambda: int(res.model.dependent.dataframe.index.levels[0].shape[0])),
+        "time_periods": _safe(lambda: int(res.model.dependent.dataframe.index.levels[1].shape[0])),
+        "rsquared": _safe(lambda: float(res.rsquared)),
+        "rsq_within": _safe(lambda: float(res.rsquared_within)),
+        "rsq_between": _safe(lambda: float(res.rsquared_between)),
+        "rsq_overall": _safe(lambda: float(res.rsquared_overall)),
+        "cov_type": _cov_type(res),
+        "entity_effects": _safe(lambda: bool(getattr(res.model, "entity_effects", False))),
+        "time_effects": _safe(lambda: bool(getattr(res.model, "time_effects", False))),
+        "f_stat": _safe(lambda: float(res.f_statistic.stat)),
+        "f_pval": _safe(lambda: float(res.f_statistic.pval)),
+        "f_df_denom": _safe(lambda: int(res.f_statistic.df_denom)),
+        "f_df_num": _safe(lambda: int(res.f_statistic.df_num)),
+        "loglik": _safe(lambda: float(res.loglik)),
+    }
+
+
+class RepositorioResultados:
+    """
+    Repositório append-only de resultados de regressão (coeficientes, covariâncias, estatísticas e testes).
+    ----------
+    raiz : str | Path -> Diretório raiz do repositório (ex.: paths.RESULTS_STORE_PATH)
+    """
+
+    def __init__(self, raiz):
+        self.raiz = Path(raiz)
+        self.raiz.mkdir(parents=True, exist_ok=True)
+
+    def _gravar(self, tabela: str, df: pd.DataFrame, model: str, run_id: str, sufixo: str = "") -> None:
+        if df.empty:
+            return
+        # 'model' vem do diretório da partição e não é gravado no arquivo
+        esquema = pa.schema([f for f in ESQUEMAS[tabela] if f.name != "model"])
+        for col in esquema.names:
+            if col not in df.columns:
+                df[col] = None
+        destino = self.raiz / tabela / f"model={model}"
+        destino.mkdir(parents=True, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(df[esquema.names], schema=esquema, preserve_index=False), destino / f"{run_id}{sufixo}.parquet")
+
+    def existe(self, model: str) -> bool:
+        return (self.raiz / "runs" / f"model={model}").exists()
+
+    def registrar_coeficientes(self, df_coef: pd.DataFrame, *, model_name: str, spec=None, cov: pd.DataFrame | None = None, stats: dict | None = None, wald_tests: dict | None = None, run_id: str | None = None) -> str:
+        """
+        Registra uma execução a partir de uma tabela longa de coeficientes já montada (ex.: event study, IRF).
+        ----------
+        df_coef : pd.DataFrame -> Colunas var, coef, std_err, t, p, ci_low, ci_high (e opcionalmente h)
+        model_name : str -> Nome curto do modelo
+        spec : dict | objeto com spec_id | None -> Especificação (define o spec_hash)
+        cov : pd.DataFrame | None -> Matriz de covariância (var x var)
+        stats : dict | None -> Estatísticas globais (chaves de ESQUEMAS['stats'])
+        wald_tests : dict | None -> {nome_teste: objeto com stat, pval, df}
+        run_id : str | None -> Identificador da execução (gerado se None)
+        ----------
+        Retorna
+        str run_id
+        """
+        agora = datetime.now()
+        run_id = run_id or f"{agora:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        spec = spec if spec is not None else {"model": model_name}
+        spec_hash = hash_spec(spec)
+        chaves = {"model": model_name, "spec_hash": spec_hash, "run_id": run_id}
+
+        spec_json = json.dumps(spec if isinstance(spec, dict) else getattr(spec, "__dict__", str(spec)), sort_keys=True, default=str, ensure_ascii=False)
+        self._gravar("runs", pd.DataFrame([{**chaves, "timestamp": agora.isoformat(), "spec": spec_json}]), model_name, run_id)
+        self._gravar("coef", df_coef.drop(columns=[c for c in ("model", "spec_hash", "run_id") if c in df_coef.columns]).assign(**chaves), model_name, run_id)
+
+        if cov is not None:
+            cov_longo = cov.rename_axis(index="var_i", columns="var_j").stack().rename("cov").reset_index()
+            self._gravar("cov", cov_longo.assign(var_i=lambda d: d["var_i"].astype(str), var_j=lambda d: d["var_j"].astype(str), **chaves), model_name, run_id)
+        if stats:
+            self._gravar("stats", pd.DataFrame([{**chaves, **stats}]), model_name, run_id)
+        if wald_tests:
+            linhas = [
+                {**chaves, "test": nome, "stat": _float(getattr(wt, "stat", None)), "pval": _float(getattr(wt, "pval", None)), "df": _float(getattr(wt, "df", None))}
+                for nome, wt in wald_tests.items() if wt is not None
+            ]
+            self._gravar("tests", pd.DataFrame(linhas), model_name, run_id)
+        return run_id
+
+    def registrar(self, res, *, model_name: str, spec=None, wald_tests: dict | None = None, run_id: str | None = None) -> str:
+        """
+        Registra um resultado (PanelEffectsResults do linearmodels ou ResultadoFE): coeficientes, covariância, estatísticas e testes.
+        """
+        return self.registrar_coeficientes(
+            tabela_coeficientes(res), model_name=model_name, spec=spec if spec is not None else spec_do_resultado(res),
+            cov=_safe(lambda: pd.DataFrame(res.cov)), stats=estatisticas_resultado(res), wald_tests=wald_tests, run_id=run_id,
+        )
+
+    def registrar_testes(self, df_testes: pd.DataFrame) -> int:
+        """
+        Acrescenta testes (ex.: saída de hypothesis_tests.avaliar_restricoes) à execução mais recente de cada modelo.
+        Modelos ainda sem execução registrada são ignorados. Retorna o número de linhas gravadas.
+        """
+        runs = self.consultar("runs", models=list(df_testes["model"].unique()))
+        gravadas = 0
+        for _, run in runs.iterrows():
+            bloco = df_testes[df_testes["model"] == run["model"]].drop(columns="model").assign(spec_hash=run["spec_hash"], run_id=run["run_id"])
+            self._gravar("tests", bloco, run["model"], run["run_id"], sufixo=f"-testes-{uuid.uuid4().hex[:6]}")
+            gravadas += len(bloco)
+        return gravadas
+
+    def consultar(self, tabela: str, *, models=None, spec_hash=None, run_id=None, ultimo: bool = True, filtro=None) -> pd.DataFrame:
+        """
+        Consulta uma tabela do repositório em uma única leitura.
+        ----------
+        tabela : str -> 'runs', 'coef', 'cov', 'stats' ou 'tests'
+        models : str | list[str] | None -> Modelos desejados (poda as partições lidas)
+        spec_hash, run_id : str | list[str] | None -> Filtros adicionais
+        ultimo : bool -> Se True mantém apenas a execução mais recente de cada modelo (segundo a tabela 'runs')
+        filtro : pyarrow.compute.Expression | None -> Filtro extra (ex.: ds.field('var') == 'x')
+        ----------
+        Retorna
+        pd.DataFrame
+        """
+        base = self.raiz / tabela
+        if not base.exists():
+            return pd.DataFrame(columns=ESQUEMAS[tabela].names)
+        conjunto = ds.dataset(base, format="parquet", partitioning="hive", schema=ESQUEMAS[tabela])
+
+        # A execução mais recente de cada modelo sai da tabela 'runs' (antes do filtro): se ela não tem linhas nesta
+        # tabela ou no filtro, o modelo fica de fora, em vez de voltar linhas de execuções antigas
+        if ultimo:
+            runs = self.consultar("runs", models=models, spec_hash=spec_hash, run_id=run_id, ultimo=False)
+            if runs.empty:
+                return pd.DataFrame(columns=ESQUEMAS[tabela].names)
+            run_id = runs.groupby("model")["run_id"].max().tolist()
+
+        expr = None
+        for campo, valor in (("model", models), ("spec_hash", spec_hash), ("run_id", run_id)):
+            if valor is None:
+                continue
+            valores = [valor] if isinstance(valor, str) else list(valor)
+            cond = ds.field(campo).isin(valores)
+            expr = cond if expr is None else expr & cond
+        if filtro is not None:
+            expr = filtro if expr is None else expr & filtro
+
+        return conjunto.to_table(filter=expr).to_pandas()
+
+    def coeficientes(self, models=None, **kwargs) -> pd.DataFrame:
+        return self.consultar("coef", models=models, **kwargs)
+
+    def testes(self, models=None, **kwargs) -> pd.DataFrame:
+        return self.consultar("tests", models=models, **kwargs)
+
+    def covariancia(self, model: str, **kwargs) -> pd.DataFrame:
+        """Matriz de covariância (var x var) da execução mais recente do modelo."""
+        df = self.consultar("cov", models=model, **kwargs)
+        return df.pivot(index="var_i", columns="var_j", values="cov")
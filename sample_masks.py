@@ -0,0 +1,138 @@
+# %% AMOSTRAS DE ESTIMAÇÃO POR MÁSCARAS DE BITS (SEM CÓPIAS DO PAINEL POR MODELO)
+# Importando as bibliotecas necessárias
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from fixed_effects import podar_amostra
+
+# Cada coluna do painel ganha, uma única vez, um bitmap de validade (não-NaN) compactado com np.packbits (1 bit por linha).
+# A amostra de um modelo é o AND bit a bit dos bitmaps das suas colunas; nobs e o diagnóstico de perdas saem da
+# contagem de bits, sem materializar o DataFrame. O estimador recebe o vetor de posições (idx) e só as colunas
+# usadas são extraídas (um take por coluna), no lugar de df_model[lhs + rhs].copy().dropna().
+
+# Número de bits ligados em cada byte (contagem vetorizada de bits)
+_BITS_POR_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+
+def contar_bits(bits: np.ndarray) -> int:
+    """Número de bits ligados em um bitmap compactado."""
+    return int(_BITS_POR_BYTE[bits].sum())
+
+
+class MapaValidade:
+    """
+    Bitmaps de validade por coluna do painel.
+    ----------
+    df_model : pd.DataFrame -> Painel (qualquer índice; as posições seguem a ordem das linhas)
+    colunas : list[str] | None -> Colunas pré-computadas (padrão: todas as numéricas); as demais são calculadas sob demanda
+    """
+
+    def __init__(self, df_model: pd.DataFrame, colunas: list[str] | None = None):
+        self.df = df_model
+        self.n = len(df_model)
+        self._bits = {}
+        if colunas is None:
+            colunas = list(df_model.select_dtypes(include="number").columns)
+        for c in colunas:
+            self.bits(c)
+
+    def bits(self, coluna: str) -> np.ndarray:
+        if coluna not in self._bits:
+            self._bits[coluna] = np.packbits(self.df[coluna].notna().to_numpy())
+        return self._bits[coluna]
+
+    def invalidar(self, *colunas: str) -> None:
+        """Descarta bitmaps de colunas recriadas ou alteradas no painel."""
+        for c in colunas:
+            self._bits.pop(c, None)
+
+    def _and(self, colunas: list[str], restricao: np.ndarray | None = None) -> np.ndarray:
+        bits = np.bitwise_and.reduce([self.bits(c) for c in colunas]) if colunas else np.packbits(np.ones(self.n, dtype=bool))
+        if restricao is not None:
+            bits = bits & np.packbits(np.asarray(restricao, dtype=bool))
+        return bits
+
+    def mascara(self, colunas: list[str], *, restricao: np.ndarray | None = None) -> np.ndarray:
+        """Máscara booleana (n) da amostra completa em todas as colunas (e na restrição, se informada)."""
+        return np.unpackbits(self._and(colunas, restricao), count=self.n).astype(bool)
+
+    def nobs(self, colunas: list[str], *, restricao: np.ndarray | None = None) -> int:
+        return contar_bits(self._and(colunas, restricao))
+
+    def diagnostico(self, colunas: list[str]) -> pd.DataFrame:
+        """
+        Perdas de observações por coluna.
+        ----------
+        Retorna
+        pd.DataFrame por coluna com 'validas', 'ausentes' e 'exclusivas' (linhas que só saem da amostra por causa da coluna)
+        """
+        linhas = []
+        for c in colunas:
+            demais = self._and([o for o in colunas if o != c])
+            linhas.append({"coluna": c, "validas": contar_bits(self.bits(c)), "ausentes": self.n - contar_bits(self.bits(c)),
+                           "exclusivas": contar_bits(demais & ~self.bits(c))})
+        out = pd.DataFrame(linhas).set_index("coluna")
+        out.attrs["nobs"] = self.nobs(colunas)
+        return out
+
+    def amostra(self, lhs: list[str] | str, rhs: list[str], *, restricao: np.ndarray | None = None) -> "AmostraModelo":
+        """Amostra de estimação de um modelo (lhs + rhs completos)."""
+        lhs = [lhs] if isinstance(lhs, str) else list(lhs)
+        colunas = lhs + list(rhs)
+        idx = np.flatnonzero(self.mascara(colunas, restricao=restricao))
+        return AmostraModelo(self, lhs[0], list(rhs), idx)
+
+
+@dataclass
+class AmostraModelo:
+    """
+    Amostra de estimação definida por posições no painel (sem cópia do DataFrame).
+    ----------
+    mapa : MapaValidade -> Mapa de origem
+    lhs : str -> Variável dependente
+    rhs : list[str] -> Regressores
+    idx : np.ndarray -> Posições das linhas válidas no painel
+    relatorio : dict -> O que a poda (podar) removeu antes do ajuste
+    """
+    mapa: MapaValidade
+    lhs: str
+    rhs: list[str]
+    idx: np.ndarray = field(repr=False)
+    relatorio: dict = field(default_factory=dict)
+
+    @property
+    def nobs(self) -> int:
+        return int(self.idx.shape[0])
+
+    @property
+    def indice(self) -> pd.Index:
+        return self.mapa.df.index[self.idx]
+
+    def coluna(self, nome: str) -> np.ndarray:
+        return self.mapa.df[nome].to_numpy()[self.idx]
+
+    def matriz(self, colunas: list[str]) -> np.ndarray:
+        """Array n x k das colunas na amostra (um take por coluna, sem passar por DataFrame)."""
+        return np.column_stack([self.mapa.df[c].to_numpy(dtype=float)[self.idx] for c in colunas])
+
+    @property
+    def y(self) -> pd.Series:
+        return pd.Series(self.coluna(self.lhs), index=self.indice, name=self.lhs)
+
+    @property
+    def X(self) -> pd.DataFrame:
+        return pd.DataFrame(self.matriz(self.rhs), index=self.indice, columns=self.rhs)
+
+    def diagnostico(self) -> pd.DataFrame:
+        return self.mapa.diagnostico([self.lhs] + self.rhs)
+
+    def podar(self, *, maior_componente: bool = False) -> "AmostraModelo":
+        """
+        Amostra sem singletons de município/ano (remoção iterativa) e com a conexão município x ano verificada.
+        O relatório (fixed_effects.podar_amostra) fica em .relatorio.
+        """
+        indice = self.indice
+        manter, relatorio = podar_amostra([indice.get_level_values(0).to_numpy(), indice.get_level_values(1).to_numpy()], maior_componente=maior_componente)
+        return AmostraModelo(self.mapa, self.lhs, self.rhs, self.idx[manter], relatorio)
@@ -0,0 +1,240 @@
+# %% CENÁRIOS CONTRAFACTUAIS DE DESEMBOLSO SOBRE COEFICIENTES ARMAZENADOS (MODELOS A)
+# Importando as bibliotecas necessárias
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from covariance import codificar_grupos, matriz_indicadora
+
+# Nos modelos A, ΔlogPIB(it) = sum_k β(k) s(i,t-k) + controles + α(i) + λ(t): trocar a trajetória do share s por s' muda
+# ΔlogPIB(it) em sum_k β(k) [s'(i,t-k) - s(i,t-k)], com controles e efeitos fixos mantidos (efeito parcial).
+# O painel vira arrays densos município x ano (N x T) uma única vez; cada cenário é só a diferença D = s' - s.
+# Como a agregação (UF, Brasil) é linear, cada cenário se resume às "exposições" Z(k, grupo, ano) = média ponderada de D
+# defasado k anos, e efeito = β'Z, Var = Z'VZ (método delta) ou quantis de β_sim'Z com β_sim ~ N(β̂, V).
+# Centenas de cenários custam centenas de somas esparsas N x T, sem reajustar nada.
+
+NIVEIS_CENARIO = ("nacional", "uf", "municipio")
+
+
+@dataclass(frozen=True)
+class Cenario:
+    """
+    Trajetória alternativa do share de desembolso.
+    ----------
+    nome : str -> Identificador do cenário
+    anos : tuple -> Anos em que o share é substituído
+    regra : str -> 'media' (média do município em periodo_base), 'escala' (share x fator) ou 'trajetoria' (valores informados)
+    periodo_base : tuple | None -> (ano_inicial, ano_final) da média ('media')
+    fator : float | dict -> Multiplicador global ou por UF ('escala')
+    ufs : tuple | None -> Restringe o cenário aos municípios destas UFs
+    municipios : tuple | None -> Restringe o cenário a estes municípios
+    valores : pd.Series | None -> Share contrafactual indexado por (municipio_id, ano) ('trajetoria')
+    """
+    nome: str
+    anos: tuple
+    regra: str = "media"
+    periodo_base: tuple | None = None
+    fator: float | dict = 1.0
+    ufs: tuple | None = None
+    municipios: tuple | None = None
+    valores: pd.Series | None = None
+
+    def trajetoria(self, motor: "MotorCenarios") -> np.ndarray:
+        """Share contrafactual N x T nos arrays do motor."""
+        S = motor.S
+        S_novo = S.copy()
+        colunas = motor.colunas(self.anos)
+        linhas = np.ones(S.shape[0], dtype=bool)
+        if self.ufs is not None:
+            linhas &= np.isin(motor.uf, list(self.ufs))
+        if self.municipios is not None:
+            linhas &= np.isin(motor.entidades, list(self.municipios))
+        bloco = np.ix_(linhas, colunas)
+
+        if self.regra == "media":
+            if self.periodo_base is None:
+                raise ValueError(f"Cenário '{self.nome}': regra 'media' requer periodo_base.")
+            base = motor.colunas(range(self.periodo_base[0], self.periodo_base[1] + 1))
+            # Média ignorando anos sem share; municípios sem nenhum ano na base ficam NaN (e sem efeito)
+            n_base = (~np.isnan(S[:, base])).sum(axis=1)
+            media = np.where(n_base > 0, np.nansum(S[:, base], axis=1) / np.maximum(n_base, 1), np.nan)
+            S_novo[bloco] = np.repeat(media[linhas, None], colunas.size, axis=1)
+        elif self.regra == "escala":
+            if isinstance(self.fator, dict):
+                fator = pd.Series(motor.uf).map(self.fator).fillna(1.0).to_numpy(dtype=float)
+            else:
+                fator = np.full(S.shape[0], float(self.fator))
+            S_novo[bloco] = S[bloco] * fator[linhas, None]
+        elif self.regra == "trajetoria":
+            valores = self.valores.dropna()
+            i = pd.Index(motor.entidades).get_indexer(valores.index.get_level_values(0))
+            t = pd.Index(motor.anos).get_indexer(valores.index.get_level_values(1))
+            ok = (i >= 0) & (t >= 0) & linhas[np.maximum(i, 0)] & np.isin(t, colunas)
+            S_novo[i[ok], t[ok]] = valores.to_numpy(dtype=float)[ok]
+        else:
+            raise ValueError(f"regra não suportada: {self.regra}")
+        return S_novo
+
+
+class MotorCenarios:
+    """
+    Avalia cenários de desembolso com os coeficientes (e a covariância) de um modelo A.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com 'estado'
+    coef : pd.Series -> Coeficientes do modelo (precisam existir base e base_lag1..base_lagK)
+    cov : pd.DataFrame -> Covariância dos coeficientes
+    base : str -> Share de desembolso contemporâneo
+    pesos : str -> Variável de ponderação na agregação (PIB real do ano anterior; sem ele, o do próprio ano)
+    desfecho : str | None -> Variável dependente observada (para reportar observado e contrafactual)
+    """
+
+    def __init__(self, df_model: pd.DataFrame, coef: pd.Series, cov: pd.DataFrame, *, base: str = "share_desembolso_real_pib_real_ano_anterior", pesos: str = "pib_real", desfecho: str | None = "delta_log_pib_real"):
+        self.base = base
+        self.nomes = [base] + [f"{base}_lag{k}" for k in range(1, 50) if f"{base}_lag{k}" in coef.index]
+        self.beta = coef[self.nomes].to_numpy(dtype=float)
+        self.V = cov.loc[self.nomes, self.nomes].to_numpy(dtype=float)
+        self.n_lags = len(self.nomes)
+
+        # Arrays densos município x ano (anos consecutivos, para que a defasagem seja um deslocamento de colunas)
+        anos = df_model.index.get_level_values(1)
+        self.anos = np.arange(int(anos.min()), int(anos.max()) + 1)
+        self.entidades = np.asarray(df_model.index.get_level_values(0).unique().sort_values())
+        largo = lambda c: df_model[c].unstack(level=1).reindex(index=self.entidades, columns=self.anos).to_numpy(dtype=float)
+        self.S = largo(base)
+        P = largo(pesos)
+        P_ant = np.hstack([np.full((P.shape[0], 1), np.nan), P[:, :-1]])
+        W = np.where(np.isnan(P_ant), P, P_ant)
+        self.W = np.nan_to_num(W, nan=0.0)
+        self.Y = largo(desfecho) if desfecho is not None else None
+        if self.Y is not None:
+            # Agregados de efeito e de desfecho observado sobre o mesmo conjunto de municípios
+            self.W = np.where(np.isnan(self.Y), 0.0, self.W)
+        self.uf = df_model["estado"].groupby(level=0).first().reindex(self.entidades).astype(str).to_numpy()
+        self.info = {"base": base, "pesos": pesos, "desfecho": desfecho, "coeficientes": self.nomes}
+
+    @classmethod
+    def de_repositorio(cls, repo, model_name: str, df_model: pd.DataFrame, **kwargs) -> "MotorCenarios":
+        """Motor a partir da execução mais recente de `model_name` no RepositorioResultados."""
+        coef = repo.coeficientes(models=model_name).set_index("var")["coef"]
+        motor = cls(df_model, coef, repo.covariancia(model_name), **kwargs)
+        motor.info["model"] = model_name
+        return motor
+
+    @classmethod
+    def de_resultado(cls, res, df_model: pd.DataFrame, **kwargs) -> "MotorCenarios":
+        """Motor a partir de um resultado em memória (PanelOLS, ResultadoFE ou ResultadoEmCache)."""
+        return cls(df_model, res.params, pd.DataFrame(res.cov), **kwargs)
+
+    def colunas(self, anos) -> np.ndarray:
+        pos = pd.Index(self.anos).get_indexer(list(anos))
+        return pos[pos >= 0]
+
+    def diferenca(self, cenario: Cenario) -> np.ndarray:
+        """D = s' - s (N x T); células sem share observado ficam em zero."""
+        return np.nan_to_num(cenario.trajetoria(self) - self.S, nan=0.0)
+
+    def _grupos(self, nivel: str) -> tuple[np.ndarray, np.ndarray]:
+        if nivel == "nacional":
+            return np.zeros(len(self.entidades), dtype=np.int64), np.array(["BR"])
+        if nivel == "uf":
+            codigos, _ = codificar_grupos(self.uf)
+            return codigos, np.unique(self.uf)
+        if nivel == "municipio":
+            return np.arange(len(self.entidades)), self.entidades
+        raise ValueError(f"nivel deve ser um de {NIVEIS_CENARIO}: {nivel}")
+
+    def exposicoes(self, D: np.ndarray, nivel: str) -> np.ndarray:
+        """
+        Z (K+1 x G x T): média ponderada (pesos self.W) de D defasado k anos, por grupo e ano.
+        No nível municipal, Z(k, i, t) = D(i, t-k).
+        """
+        N, T = D.shape
+        defasados = np.zeros((self.n_lags, N, T))
+        for k in range(self.n_lags):
+            defasados[k, :, k:] = D[:, :T - k]
+        if nivel == "municipio":
+            return defasados
+        codigos, rotulos = self._grupos(nivel)
+        S = matriz_indicadora(codigos, len(rotulos))
+        massa = np.asarray(S @ self.W)
+        massa = np.where(massa > 0, massa, np.nan)
+        return np.stack([np.asarray(S @ (self.W * defasados[k])) / massa for k in range(self.n_lags)])
+
+    def observado(self, nivel: str) -> np.ndarray | None:
+        """Desfecho observado agregado (G x T) com os mesmos pesos."""
+        if self.Y is None:
+            return None
+        if nivel == "municipio":
+            return self.Y
+        codigos, rotulos = self._grupos(nivel)
+        S = matriz_indicadora(codigos, len(rotulos))
+        valido = ~np.isnan(self.Y)
+        massa = np.asarray(S @ (self.W * valido))
+        return np.asarray(S @ (self.W * np.nan_to_num(self.Y))) / np.where(massa > 0, massa, np.nan)
+
+    def avaliar(self, cenarios: list[Cenario], *, nivel: str = "nacional", bandas: str = "delta", alpha: float = 0.05, n_sim: int = 2000, seed: int = 0, janela: tuple | None = None, anos: tuple | None = None) -> pd.DataFrame:
+        """
+        Efeito previsto de cada cenário sobre o desfecho, por ano e acumulado na janela.
+        ----------
+        cenarios : list[Cenario] -> Cenários a avaliar
+        nivel : str -> 'nacional', 'uf' ou 'municipio'
+        bandas : str -> 'delta' (normal com Var = Z'VZ) ou 'simulacao' (quantis com β ~ N(β̂, V))
+        alpha : float -> Nível das bandas (1 - alpha)
+        n_sim : int -> Sorteios de β em 'simulacao' (os mesmos para todos os cenários)
+        janela : tuple | None -> (ano_inicial, ano_final) do acumulado (padrão: anos do cenário até o fim da defasagem)
+        anos : tuple | None -> Anos reportados (padrão: anos em que o cenário tem efeito)
+        ----------
+        Retorna
+        pd.DataFrame com cenario, nivel, unidade, periodo ('2015' ou '2015-2017' no acumulado), efeito, se, lower, upper,
+        observado e contrafactual (= observado + efeito)
+        """
+        if bandas not in ("delta", "simulacao"):
+            raise ValueError(f"bandas deve ser 'delta' ou 'simulacao': {bandas}")
+        _, rotulos = self._grupos(nivel)
+        obs = self.observado(nivel)
+        z = stats.norm.ppf(1 - alpha / 2)
+        betas = np.random.default_rng(seed).multivariate_normal(self.beta, self.V, size=n_sim) if bandas == "simulacao" else None
+
+        saidas = []
+        for cenario in cenarios:
+            Z = self.exposicoes(self.diferenca(cenario), nivel)                  # K+1 x G x T
+            cols = self.colunas(anos) if anos is not None else np.flatnonzero(np.any(np.nan_to_num(Z) != 0, axis=(0, 1)))
+            if cols.size == 0:
+                continue
+            ini, fim = (janela if janela is not None else (min(cenario.anos), min(max(cenario.anos) + self.n_lags - 1, int(self.anos[-1]))))
+            jan = self.colunas(range(ini, fim + 1))
+            # Blocos por ano (G x T_rep) e o acumulado da janela (G x 1)
+            Zr = np.concatenate([Z[:, :, cols], Z[:, :, jan].sum(axis=2, keepdims=True)], axis=2)
+            periodos = [str(a) for a in self.anos[cols]] + [f"{ini}-{fim}"]
+            efeito = np.einsum("k,kgt->gt", self.beta, Zr)
+            se = np.sqrt(np.maximum(np.einsum("kgt,kl,lgt->gt", Zr, self.V, Zr), 0.0))
+            if bandas == "delta":
+                lower, upper = efeito - z * se, efeito + z * se
+            else:
+                lower, upper = np.empty_like(efeito), np.empty_like(efeito)
+                for g0 in range(0, Zr.shape[1], 256):
+                    sim = np.einsum("bk,kgt->bgt", betas, Zr[:, g0:g0 + 256])
+                    lower[g0:g0 + 256], upper[g0:g0 + 256] = np.nanquantile(sim, [alpha / 2, 1 - alpha / 2], axis=0)
+            if obs is not None:
+                o = np.concatenate([obs[:, cols], np.nansum(obs[:, jan], axis=1, keepdims=True)], axis=1)
+            else:
+                o = np.full(efeito.shape, np.nan)
+
+            G, P = efeito.shape
+            saidas.append(pd.DataFrame({
+                "cenario": cenario.nome, "nivel": nivel,
+                "unidade": np.repeat(rotulos, P), "periodo": np.tile(periodos, G),
+                "efeito": efeito.ravel(), "se": se.ravel(), "lower": lower.ravel(), "upper": upper.ravel(),
+                "observado": o.ravel(), "contrafactual": (o + efeito).ravel(),
+            }))
+        out = pd.concat(saidas, ignore_index=True) if saidas else pd.DataFrame(
+            columns=["cenario", "nivel", "unidade", "periodo", "efeito", "se", "lower", "upper", "observado", "contrafactual"])
+        out.attrs.update(self.info | {"bandas": bandas, "alpha": alpha})
+        return out
+
+
+def grade_escalas(nome: str, anos: tuple, fatores, *, ufs: tuple | None = None) -> list[Cenario]:
+    """Família de cenários 'escala' (ex.: fatores 0, 0.25, ..., 2 sobre os anos informados)."""
+    return [Cenario(f"{nome}_x{f:g}", tuple(anos), regra="escala", fator=float(f), ufs=ufs) for f in fatores]
@@ -0,0 +1,220 @@
+# %% DEFASAGENS ESPACIAIS E ERROS-PADRÃO DE CONLEY (HAC ESPACIAL)
+# Importando as bibliotecas necessárias
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.spatial import cKDTree
+
+from covariance import codificar_grupos
+from fixed_effects import Absorvedor, ResultadoFE, ajustar_fe
+from paths import RAW_DATA_PATH
+
+# Os centroides municipais (lat/lon em graus) são levados à esfera unitária em 3D; a distância de corda é monotônica
+# na distância de grande círculo, então buscas por raio e k vizinhos mais próximos usam uma única KD-tree.
+# Todas as matrizes são esparsas no nível do município (N x N) e reutilizadas para todos os anos:
+#   - defasagem espacial: W @ Y, com Y (municípios x anos) -> um produto esparso por coluna/ano;
+#   - Conley: meat = sum_t S_t' K S_t, com S_t os scores do ano t posicionados por município (sem laço O(n²) em pares).
+
+RAIO_TERRA_KM = 6371.0088
+
+
+def carregar_centroides(caminho=None, *, col_codigo: str = "codigo", col_lat: str = "latitude", col_lon: str = "longitude") -> pd.DataFrame:
+    """
+    Lê o arquivo local de centroides municipais e padroniza o código IBGE com 6 dígitos (mesmo padrão de 'codigo' no painel).
+    ----------
+    caminho : str | Path | None -> CSV ou Parquet (padrão: inputs/raw/centroides_municipios.csv)
+    col_codigo, col_lat, col_lon : str -> Nomes das colunas no arquivo
+    ----------
+    Retorna
+    pd.DataFrame indexado por codigo com colunas latitude e longitude
+    """
+    caminho = Path(caminho) if caminho is not None else Path(RAW_DATA_PATH) / "centroides_municipios.csv"
+    df = pd.read_parquet(caminho) if caminho.suffix == ".parquet" else pd.read_csv(caminho, dtype={col_codigo: str})
+    codigo = df[col_codigo].astype(str).str.strip().str[:6]
+    return pd.DataFrame({"latitude": df[col_lat].astype(float).to_numpy(), "longitude": df[col_lon].astype(float).to_numpy()},
+                        index=pd.Index(codigo, name="codigo")).groupby(level=0).first()
+
+
+def coordenadas_esfera(latitude, longitude) -> np.ndarray:
+    """Coordenadas (x, y, z) na esfera unitária."""
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _corda(distancia_km: float) -> float:
+    return 2 * np.sin(distancia_km / (2 * RAIO_TERRA_KM))
+
+
+def _km(corda: np.ndarray) -> np.ndarray:
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.clip(corda / 2, 0.0, 1.0))
+
+
+def distancias_esparsas(centroides: pd.DataFrame, *, raio_km: float | None = None, k: int | None = None) -> sp.csr_matrix:
+    """
+    Distâncias de grande círculo (km) entre pares de municípios vizinhos, em matriz esparsa simétrica sem diagonal.
+    ----------
+    centroides : pd.DataFrame -> Saída de carregar_centroides (a ordem das linhas define a ordem da matriz)
+    raio_km : float | None -> Banda de distância (pares com distância <= raio_km)
+    k : int | None -> k vizinhos mais próximos (simetrizado: i~j se j está entre os k de i ou vice-versa)
+    ----------
+    Retorna
+    sp.csr_matrix N x N
+    """
+    if (raio_km is None) == (k is None):
+        raise ValueError("Informe exatamente um entre raio_km e k.")
+    coords = coordenadas_esfera(centroides["latitude"], centroides["longitude"])
+    arvore = cKDTree(coords)
+    n = coords.shape[0]
+    if raio_km is not None:
+        pares = arvore.query_pairs(_corda(raio_km), output_type="ndarray")
+        i, j = pares[:, 0], pares[:, 1]
+        d = _km(np.linalg.norm(coords[i] - coords[j], axis=1))
+        i, j, d = np.concatenate([i, j]), np.concatenate([j, i]), np.concatenate([d, d])
+    else:
+        dist, viz = arvore.query(coords, k=k + 1)
+        i = np.repeat(np.arange(n), k)
+        j = viz[:, 1:].ravel()
+        d = _km(dist[:, 1:].ravel())
+        i, j, d = np.concatenate([i, j]), np.concatenate([j, i]), np.concatenate([d, d])
+    D = sp.coo_matrix((d, (i, j)), shape=(n, n)).tocsr()
+    # Pares repetidos na simetrização do kNN são somados; volta-se à distância original
+    D.data = _km(np.linalg.norm(coords[np.repeat(np.arange(n), np.diff(D.indptr))] - coords[D.indices], axis=1))
+    return D
+
+
+def matriz_pesos(centroides: pd.DataFrame, *, raio_km: float | None = None, k: int | None = None, decaimento: float | None = None, normalizar: bool = True) -> sp.csr_matrix:
+    """
+    Matriz de pesos espaciais W (N x N) por banda de distância ou k vizinhos.
+    ----------
+    decaimento : float | None -> Se informado, pesos = d^-decaimento (inverso da distância); senão pesos binários
+    normalizar : bool -> Normalização na linha (W @ x = média dos vizinhos)
+    """
+    D = distancias_esparsas(centroides, raio_km=raio_km, k=k)
+    W = D.copy()
+    W.data = np.ones_like(W.data) if decaimento is None else np.maximum(W.data, 1e-6) ** (-decaimento)
+    if normalizar:
+        somas = np.asarray(W.sum(axis=1)).ravel()
+        W = sp.diags(np.divide(1.0, somas, out=np.zeros_like(somas), where=somas > 0)) @ W
+    return W.tocsr()
+
+
+def defasagem_espacial(df_model: pd.DataFrame, coluna: str, W: sp.csr_matrix, centroides: pd.DataFrame, *, col_codigo: str = "codigo", normalizar: bool = True) -> pd.Series:
+    """
+    Defasagem espacial W x de uma variável para todos os anos do painel.
+    A variável é pivotada em (municípios de W x anos) e multiplicada por W de uma vez; vizinhos sem dado no ano
+    ficam de fora e, com normalizar=True, os pesos são renormalizados entre os vizinhos observados.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com a coluna de código IBGE (6 dígitos)
+    coluna : str -> Variável a defasar (ex.: share_desembolso_real_pib_real_ano_anterior)
+    W : sp.csr_matrix -> Matriz de pesos na ordem de centroides (não normalizada se normalizar=True aqui)
+    centroides : pd.DataFrame -> Mesma tabela usada para montar W
+    ----------
+    Retorna
+    pd.Series alinhada a df_model (NaN para municípios sem centroide ou sem vizinhos observados)
+    """
+    pos = pd.Series(np.arange(len(centroides)), index=centroides.index)
+    linha = pos.reindex(df_model[col_codigo].astype(str).str[:6].to_numpy()).to_numpy()
+    codigos_ano, anos = codificar_grupos(df_model.index.get_level_values(1).to_numpy())
+    com_centroide = ~np.isnan(linha)
+    x = df_model[coluna].to_numpy(dtype=float)
+    observado = com_centroide & ~np.isnan(x)
+
+    Y = np.zeros((len(centroides), anos))
+    M = np.zeros((len(centroides), anos))
+    li = linha[observado].astype(int)
+    Y[li, codigos_ano[observado]] = x[observado]
+    M[li, codigos_ano[observado]] = 1.0
+
+    WY = W @ Y
+    if normalizar:
+        WM = W @ M
+        WY = np.divide(WY, WM, out=np.full_like(WY, np.nan), where=WM > 0)
+
+    out = np.full(len(df_model), np.nan)
+    out[com_centroide] = WY[linha[com_centroide].astype(int), codigos_ano[com_centroide]]
+    return pd.Series(out, index=df_model.index, name=f"{coluna}_viz")
+
+
+def meat_conley(scores: np.ndarray, linha: np.ndarray, tempo: np.ndarray, K: sp.csr_matrix, *, lag_tempo: int = 0) -> np.ndarray:
+    """
+    Meat HAC espacial (Conley, 1999) em painel: sum_t S_t' (K + I) S_t, com S_t os scores do ano t por município.
+    Com lag_tempo > 0 soma também a autocorrelação de cada município (pesos de Bartlett), como em Hsiang (2010).
+    ----------
+    scores : np.ndarray -> n x k (X_i * e_i)
+    linha : np.ndarray -> n, posição do município na matriz K
+    tempo : np.ndarray -> n, código do ano (0..T-1)
+    K : sp.csr_matrix -> N x N, pesos do kernel entre municípios distintos (diagonal nula)
+    lag_tempo : int -> Defasagens temporais incluídas
+    """
+    n_mun, T, k = K.shape[0], int(tempo.max()) + 1, scores.shape[1]
+    S = np.zeros((T, n_mun, k))
+    np.add.at(S, (tempo, linha), scores)
+    meat = np.zeros((k, k))
+    for t in range(T):
+        meat += S[t].T @ (S[t] + K @ S[t])
+    for l in range(1, lag_tempo + 1):
+        peso = 1 - l / (lag_tempo + 1)
+        for t in range(l, T):
+            cruz = S[t].T @ S[t - l]
+            meat += peso * (cruz + cruz.T)
+    return (meat + meat.T) / 2
+
+
+def cov_conley(X: np.ndarray, residuos: np.ndarray, linha: np.ndarray, tempo: np.ndarray, D: sp.csr_matrix, *, corte_km: float, kernel: str = "bartlett", lag_tempo: int = 0, xtx_inv: np.ndarray | None = None, extra_df: int = 0, debiased: bool = True) -> np.ndarray:
+    """
+    Covariância de Conley para regressões com FE (X e resíduos já livres dos efeitos fixos).
+    ----------
+    D : sp.csr_matrix -> Distâncias esparsas entre municípios (distancias_esparsas com raio_km >= corte_km)
+    corte_km : float -> Distância a partir da qual a correlação espacial é zero
+    kernel : str -> 'bartlett' (1 - d/corte) ou 'uniforme'
+    demais : -> Como em covariance.cov_clusterizada
+    ----------
+    Retorna
+    np.ndarray k x k
+    """
+    if kernel not in ("bartlett", "uniforme"):
+        raise ValueError(f"kernel não suportado: {kernel}")
+    n, k = X.shape
+    if xtx_inv is None:
+        xtx_inv = np.linalg.inv(X.T @ X)
+    K = D.copy()
+    K.data = np.where(K.data <= corte_km, 1 - K.data / corte_km if kernel == "bartlett" else 1.0, 0.0)
+    K.eliminate_zeros()
+    meat = meat_conley(X * np.asarray(residuos).reshape(-1, 1), linha, tempo, K, lag_tempo=lag_tempo)
+    escala = n / (n - extra_df - (k if debiased else 0))
+    cov = escala * (xtx_inv @ meat @ xtx_inv)
+    return (cov + cov.T) / 2
+
+
+def fe_conley(df_model: pd.DataFrame, lhs: str, rhs: list[str], centroides: pd.DataFrame, *, corte_km: float = 100.0, kernel: str = "bartlett", lag_tempo: int = 0, col_codigo: str = "codigo", D: sp.csr_matrix | None = None) -> ResultadoFE:
+    """
+    Regressão FE 2-way (município e ano) com erros-padrão de Conley.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com a coluna de código IBGE
+    lhs, rhs : -> Variável dependente e regressores
+    centroides : pd.DataFrame -> Saída de carregar_centroides
+    corte_km, kernel, lag_tempo : -> Ver cov_conley
+    D : sp.csr_matrix | None -> Distâncias já calculadas (reaproveitar entre modelos); senão calculadas até corte_km
+    ----------
+    Retorna
+    ResultadoFE com cov_type='conley' (municípios sem centroide saem da amostra)
+    """
+    dados = df_model[[lhs] + list(rhs) + [col_codigo]].dropna()
+    pos = pd.Series(np.arange(len(centroides)), index=centroides.index)
+    linha = pos.reindex(dados[col_codigo].astype(str).str[:6].to_numpy()).to_numpy()
+    dados, linha = dados[~np.isnan(linha)], linha[~np.isnan(linha)].astype(int)
+    D = D if D is not None else distancias_esparsas(centroides, raio_km=corte_km)
+
+    absorvedor = Absorvedor([dados.index.get_level_values(0).to_numpy(), dados.index.get_level_values(1).to_numpy()])
+    M = absorvedor.demean(dados[[lhs] + list(rhs)].to_numpy(dtype=float))
+    res = ajustar_fe(M[:, 0], M[:, 1:], list(rhs), n_efeitos=absorvedor.n_efeitos, cov_type="robust",
+                     info={"lhs": lhs, "corte_km": corte_km, "kernel": kernel, "lag_tempo": lag_tempo})
+    X_dm = M[:, 1:]
+    cov = cov_conley(X_dm, res.residuos, linha, absorvedor.codigos[1], D, corte_km=corte_km, kernel=kernel,
+                     lag_tempo=lag_tempo, extra_df=absorvedor.n_efeitos)
+    res.cov = pd.DataFrame(cov, index=res.params.index, columns=res.params.index)
+    res.cov_type = "conley"
+    return res
@@ -0,0 +1,331 @@
+# %% GRADE DE ESPECIFICAÇÕES (ROBUSTEZ) COM CACHES COMPARTILHADOS
+# Importando as bibliotecas necessárias
+import hashlib
+import itertools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy import stats
+
+from covariance import codificar_grupos
+from fixed_effects import Absorvedor, ajustar_fe, podar_amostra
+from ppml import ajustar_ppml
+from sample_masks import MapaValidade
+
+# Conjuntos de controles usados nos modelos A e B (regression_model.py)
+CONTROLES_PADRAO = {
+    "completo": ['log_pibpc_real_lag1', 'share_industria_lag1', 'share_agropecuaria_lag1', 'log_populacao_lag1'],
+    "sem_populacao": ['log_pibpc_real_lag1', 'share_industria_lag1', 'share_agropecuaria_lag1'],
+    "sem_controles": [],
+}
+
+# Estruturas de cluster: (1º cluster, 2º cluster) - municipio_id e ano são os níveis do índice do painel
+CLUSTERS_PADRAO = {
+    "municipio_ano": ("municipio_id", "ano"),
+    "uf_ano": ("estado", "ano"),
+}
+
+# Estimadores HAC aceitos no lugar de uma estrutura de cluster (banda pela regra de Newey-West)
+COVARIANCIAS_HAC = ("driscoll_kraay", "newey_west")
+
+
+@dataclass(frozen=True)
+class Especificacao:
+    """
+    Uma célula da grade de robustez.
+    ----------
+    modelo : str -> Rótulo do modelo (ex.: 'a1_1')
+    lhs : str -> Variável dependente
+    base : str -> Família de regressores de interesse (lags/leads gerados a partir dela)
+    n_lags : int -> Número de defasagens da família base (além do termo contemporâneo)
+    n_leads : int -> Número de leads da família base
+    controles : str -> Nome do conjunto de controles (chave de CONTROLES_PADRAO ou do dicionário informado)
+    cluster : str -> Nome da estrutura de cluster (chave de CLUSTERS_PADRAO) ou estimador HAC (COVARIANCIAS_HAC)
+    janela : tuple[int, int] | None -> Anos inicial e final da amostra (inclusive)
+    trim : float | None -> Fração aparada em cada cauda da variável dependente
+    """
+    modelo: str
+    lhs: str
+    base: str
+    n_lags: int
+    n_leads: int
+    controles: str
+    cluster: str
+    janela: tuple[int, int] | None = None
+    trim: float | None = None
+
+    @property
+    def vars_interesse(self) -> list[str]:
+        leads = [f"{self.base}_lead{k}" for k in range(self.n_leads, 0, -1)]
+        lags = [f"{self.base}_lag{k}" for k in range(1, self.n_lags + 1)]
+        return leads + [self.base] + lags
+
+    def rhs(self, conjuntos_controles: dict) -> list[str]:
+        return self.vars_interesse + list(conjuntos_controles[self.controles])
+
+    @property
+    def spec_id(self) -> str:
+        conteudo = json.dumps(asdict(self), sort_keys=True, default=str)
+        return hashlib.sha1(conteudo.encode("utf-8")).hexdigest()[:12]
+
+
+def expandir_grade(modelos: dict, *, n_lags=range(1, 6), n_leads=range(0, 4), controles=("completo",), clusters=("municipio_ano",), janelas=(None,), trims=(None,)) -> list[Especificacao]:
+    """
+    Expande o produto cartesiano das opções de robustez em uma lista de especificações.
+    ----------
+    modelos : dict -> {rotulo: {'lhs': str, 'base': str}}
+    n_lags, n_leads, controles, clusters, janelas, trims : iteráveis com as opções de cada dimensão
+    ----------
+    Retorna
+    list[Especificacao]
+    """
+    grade = []
+    for (rotulo, cfg), lag, lead, ctrl, cl, jan, trim in itertools.product(modelos.items(), n_lags, n_leads, controles, clusters, janelas, trims):
+        grade.append(Especificacao(rotulo, cfg["lhs"], cfg["base"], int(lag), int(lead), ctrl, cl, tuple(jan) if jan else None, trim))
+    return grade
+
+
+def deslocar_por_ano(df_model: pd.DataFrame, coluna: str, k: int) -> pd.Series:
+    """
+    Valor de `coluna` no ano t - k do mesmo município (k > 0: defasagem; k < 0: avanço), alinhado pelo valor do ano
+    e não pela posição: anos ausentes no painel geram NaN em vez de trazer o ano disponível mais próximo.
+    O painel deve estar indexado por (municipio_id, ano), sem repetições.
+    """
+    indice = df_model.index
+    origem = pd.MultiIndex.from_arrays([indice.get_level_values(0), indice.get_level_values(1) + k], names=indice.names)
+    return pd.Series(df_model[coluna].to_numpy(), index=origem, name=coluna).reindex(indice)
+
+
+def garantir_defasagens(df_model: pd.DataFrame, base: str, n_lags: int, n_leads: int) -> list[str]:
+    """
+    Cria (in place) as colunas {base}_lag{k} e {base}_lead{k} que ainda não existem no painel.
+    O painel deve estar indexado por (municipio_id, ano); defasagens e avanços seguem o ano (deslocar_por_ano).
+    Retorna a lista de colunas criadas.
+    """
+    criadas = []
+    for k in range(1, n_lags + 1):
+        col = f"{base}_lag{k}"
+        if col not in df_model.columns:
+            df_model[col] = deslocar_por_ano(df_model, base, k)
+            criadas.append(col)
+    for k in range(1, n_leads + 1):
+        col = f"{base}_lead{k}"
+        if col not in df_model.columns:
+            df_model[col] = deslocar_por_ano(df_model, base, -k)
+            criadas.append(col)
+    return criadas
+
+
+class CacheGrade:
+    """
+    Caches compartilhados entre especificações da grade:
+      - máscara de amostra (chave: colunas, janela, trim), pelo AND dos bitmaps de validade de sample_masks;
+      - amostras idênticas são unificadas pelo hash da própria máscara;
+      - códigos de entidade/tempo/UF do painel completo (calculados uma vez);
+      - colunas demeaned e índices de cluster por amostra.
+    """
+
+    def __init__(self, df_model: pd.DataFrame):
+        self.df = df_model
+        self.anos = df_model.index.get_level_values(1).to_numpy()
+        self.codigos = {
+            "municipio_id": codificar_grupos(df_model.index.get_level_values(0).to_numpy())[0],
+            "ano": codificar_grupos(self.anos)[0],
+            "estado": codificar_grupos(df_model["estado"].astype(str).to_numpy())[0],
+        }
+        self.mapa = MapaValidade(df_model, colunas=[])
+        self._mascaras = {}
+        self.amostras = {}
+
+    def mascara(self, spec: Especificacao, rhs: list[str]) -> str:
+        """Calcula a máscara da amostra e retorna o hash que identifica a amostra."""
+        chave = (spec.lhs, tuple(sorted(rhs)), spec.janela, spec.trim)
+        if chave in self._mascaras:
+            return self._mascaras[chave]
+
+        m = self.mapa.mascara([spec.lhs] + rhs)
+        if spec.janela is not None:
+            m &= (self.anos >= spec.janela[0]) & (self.anos <= spec.janela[1])
+        if spec.trim:
+            y = self.df[spec.lhs].to_numpy()
+            lo, hi = np.quantile(y[m], [spec.trim, 1 - spec.trim])
+            m &= (y >= lo) & (y <= hi)
+
+        # Singletons de município/ano saem antes do ajuste (não mudam os coeficientes, só os graus de liberdade)
+        posicoes = np.flatnonzero(m)
+        manter, relatorio = podar_amostra([self.codigos["municipio_id"][posicoes], self.codigos["ano"][posicoes]])
+        m[posicoes[~manter]] = False
+
+        h = hashlib.sha1(np.packbits(m).tobytes()).hexdigest()[:12]
+        self._mascaras[chave] = h
+        if h not in self.amostras:
+            self.amostras[h] = AmostraCompartilhada(self, m)
+            self.amostras[h].relatorio = relatorio
+        return h
+
+
+class AmostraCompartilhada:
+    """
+    Estado reutilizável de uma amostra: absorvedor FE, colunas demeaned e códigos de cluster.
+    """
+
+    def __init__(self, cache: CacheGrade, mascara: np.ndarray):
+        self.cache = cache
+        self.mascara = mascara
+        self.idx = np.flatnonzero(mascara)
+        self._absorvedor = None
+        self._demeaned = {}
+        self._clusters = {}
+        self.relatorio = {}
+
+    @property
+    def absorvedor(self) -> Absorvedor:
+        if self._absorvedor is None:
+            c = self.cache.codigos
+            self._absorvedor = Absorvedor([c["municipio_id"][self.idx], c["ano"][self.idx]])
+        return self._absorvedor
+
+    def demeaned(self, cols: list[str]) -> np.ndarray:
+        faltantes = [c for c in cols if c not in self._demeaned]
+        if faltantes:
+            bloco = self.absorvedor.demean(self.cache.df[faltantes].to_numpy(dtype=float)[self.idx])
+            for j, c in enumerate(faltantes):
+                self._demeaned[c] = bloco[:, j]
+        return np.column_stack([self._demeaned[c] for c in cols])
+
+    def clusters(self, estrutura: tuple[str, ...]) -> list[np.ndarray]:
+        if estrutura not in self._clusters:
+            self._clusters[estrutura] = [codificar_grupos(self.cache.codigos[c][self.idx])[0] for c in estrutura]
+        return self._clusters[estrutura]
+
+
+def _linhas_resultado(spec: Especificacao, res, tempo_spec: float, tempo_amostra: float) -> list[dict]:
+    ci = res.conf_int()
+    comuns = {
+        "spec_id": spec.spec_id, "modelo": spec.modelo, "lhs": spec.lhs, "base": spec.base,
+        "n_lags": spec.n_lags, "n_leads": spec.n_leads, "controles": spec.controles, "cluster": spec.cluster,
+        "janela": f"{spec.janela[0]}-{spec.janela[1]}" if spec.janela else "completa",
+        "trim": spec.trim if spec.trim else 0.0, "nobs": res.nobs,
+        "tempo_spec_s": tempo_spec, "tempo_amostra_s": tempo_amostra,
+    }
+    se, t, p = res.std_errors, res.tstats, res.pvalues
+    linhas = []
+    for v in spec.vars_interesse:
+        linhas.append({**comuns, "var": v, "coef": float(res.params[v]), "std_err": float(se[v]),
+                       "t": float(t[v]), "p": float(p[v]),
+                       "ci_low": float(ci.loc[v, "lower"]), "ci_high": float(ci.loc[v, "upper"])})
+
+    # Efeito acumulado (contemporâneo + lags): R b e R V R'
+    acum = [spec.base] + [f"{spec.base}_lag{k}" for k in range(1, spec.n_lags + 1)]
+    soma = float(res.params[acum].sum())
+    se_soma = float(np.sqrt(res.cov.loc[acum, acum].to_numpy().sum()))
+    t_soma = soma / se_soma
+    q = stats.t.ppf(0.975, res.df_resid)
+    linhas.append({**comuns, "var": "efeito_acumulado", "coef": soma, "std_err": se_soma, "t": t_soma,
+                   "p": float(2 * stats.t.sf(abs(t_soma), res.df_resid)),
+                   "ci_low": soma - q * se_soma, "ci_high": soma + q * se_soma})
+    return linhas
+
+
+def _rodar_amostra(amostra: AmostraCompartilhada, specs: list[Especificacao], conjuntos_controles: dict, estruturas_cluster: dict, estimador: str = "ols") -> list[dict]:
+    t0 = time.perf_counter()
+    if estimador == "ols":
+        # Demeaning feito uma única vez para a união das colunas das especificações da amostra
+        todas = sorted({c for s in specs for c in [s.lhs] + s.rhs(conjuntos_controles)})
+        amostra.demeaned(todas)
+    else:
+        # PPML: o demeaning é ponderado e refeito a cada iteração; compartilha-se a estrutura de FE e os clusters
+        amostra.absorvedor
+    tempo_amostra = (time.perf_counter() - t0) / len(specs)
+
+    linhas = []
+    for spec in specs:
+        t0 = time.perf_counter()
+        rhs = spec.rhs(conjuntos_controles)
+        if spec.cluster in COVARIANCIAS_HAC:
+            cov = {"cov_type": spec.cluster}
+        else:
+            cov = {"cov_type": "clustered", "clusters": amostra.clusters(estruturas_cluster[spec.cluster])}
+        if estimador == "ols":
+            Y = amostra.demeaned([spec.lhs] + rhs)
+            entidade, tempo = amostra.absorvedor.codigos
+            res = ajustar_fe(Y[:, 0], Y[:, 1:], rhs, n_efeitos=amostra.absorvedor.n_efeitos, entidade=entidade, tempo=tempo, **cov)
+        elif estimador == "ppml":
+            dados = amostra.cache.df[[spec.lhs] + rhs].to_numpy(dtype=float)[amostra.idx]
+            res = ajustar_ppml(dados[:, 0], dados[:, 1:], rhs, amostra.absorvedor, **cov)
+        else:
+            raise ValueError(f"estimador não suportado: {estimador}")
+        linhas.extend(_linhas_resultado(spec, res, time.perf_counter() - t0, tempo_amostra))
+    for linha in linhas:
+        linha["singletons_removidos"] = amostra.relatorio.get("singletons", 0)
+        linha["componentes"] = amostra.relatorio.get("componentes", 1)
+    return linhas
+
+
+def rodar_grade(df_model: pd.DataFrame, grade: list[Especificacao], *, conjuntos_controles: dict | None = None, estruturas_cluster: dict | None = None, estimador: str = "ols", n_workers: int = 4, out_path=None) -> pd.DataFrame:
+    """
+    Executa a grade de especificações em paralelo e devolve uma tabela longa (uma linha por spec x variável).
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com coluna 'estado'
+    grade : list[Especificacao] -> Saída de expandir_grade
+    conjuntos_controles : dict | None -> {nome: [colunas]}; padrão CONTROLES_PADRAO
+    estruturas_cluster : dict | None -> {nome: (col1, col2)}; padrão CLUSTERS_PADRAO
+    estimador : str -> 'ols' (FE 2-way linear) ou 'ppml' (Poisson com FE; lhs em nível)
+    n_workers : int -> Número de threads (cada thread processa amostras inteiras)
+    out_path : str | Path | None -> Se informado, grava os resultados em Parquet à medida que as amostras terminam
+    ----------
+    Retorna
+    pd.DataFrame tidy, pronto para gráficos de curva de especificação (spec curve)
+    """
+    conjuntos_controles = conjuntos_controles or CONTROLES_PADRAO
+    estruturas_cluster = estruturas_cluster or CLUSTERS_PADRAO
+
+    df_model = df_model.sort_index()
+    for base in {s.base for s in grade}:
+        n_lags = max(s.n_lags for s in grade if s.base == base)
+        n_leads = max(s.n_leads for s in grade if s.base == base)
+        garantir_defasagens(df_model, base, n_lags, n_leads)
+
+    # Agrupar especificações por amostra (máscara idêntica => mesmo demeaning e mesmos clusters)
+    cache = CacheGrade(df_model)
+    por_amostra = {}
+    for spec in grade:
+        h = cache.mascara(spec, spec.rhs(conjuntos_controles))
+        por_amostra.setdefault(h, []).append(spec)
+
+    writer = None
+    resultados = []
+    try:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futuros = [executor.submit(_rodar_amostra, cache.amostras[h], specs, conjuntos_controles, estruturas_cluster, estimador) for h, specs in por_amostra.items()]
+            for futuro in as_completed(futuros):
+                bloco = pd.DataFrame(futuro.result())
+                resultados.append(bloco)
+                if out_path is not None:
+                    tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(str(out_path), tabela.schema)
+                    writer.write_table(tabela.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    df_grade = pd.concat(resultados, ignore_index=True) if resultados else pd.DataFrame()
+    print(f"Grade concluída: {len(grade)} especificações em {len(por_amostra)} amostras distintas.")
+    return df_grade
+
+
+def resumo_tempos(df_grade: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tempo por especificação (ajuste + fração do demeaning compartilhado), do mais caro ao mais barato.
+    """
+    cols = ["spec_id", "modelo", "n_lags", "n_leads", "controles", "cluster", "janela", "trim", "nobs"]
+    tempos = df_grade.groupby(cols, as_index=False, dropna=False)[["tempo_spec_s", "tempo_amostra_s"]].first()
+    tempos["tempo_total_s"] = tempos["tempo_spec_s"] + tempos["tempo_amostra_s"]
+    return tempos.sort_values("tempo_total_s", ascending=False).reset_index(drop=True)
@@ -0,0 +1,367 @@
+# %% ESTATÍSTICAS SUFICIENTES POR BLOCO (ANO x UF) PARA SUBPERÍODOS E JANELAS MÓVEIS
+# Importando as bibliotecas necessárias
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from covariance import codificar_grupos, matriz_indicadora, cov_clusterizada
+from fixed_effects import ResultadoFE, montar_W, podar_amostra, resolver_concentrado
+from sample_masks import MapaValidade
+
+# Os blocos guardam W'W de W = [X, y, dummies de ano] para cada célula ano x UF, além das linhas de W ordenadas
+# por bloco. Como o efeito de município é concentrado analiticamente (ver fixed_effects.resolver_concentrado),
+# qualquer união de blocos (janela de anos, conjunto de UFs) é resolvida de forma EXATA somando blocos,
+# sem refiltrar df_model nem repetir o demeaning iterativo. Os scores de cluster da janela são obtidos das
+# mesmas linhas já ordenadas, depois de conhecidos os efeitos fixos da própria janela.
+# As linhas válidas vêm de sample_masks.MapaValidade; os singletons dependem da janela e são podados em resolver
+# (subtraindo de W'W a contribuição das linhas removidas), o que equivale a podar a amostra de cada janela.
+# Cada ano guarda um hash das suas linhas (município, ano, UF e valores de [X, y]); anos_alterados compara esses hashes
+# com df_model, o que detecta também revisões que só trocam valores entre municípios (somas e contagens iguais).
+
+# Estruturas de cluster disponíveis (mesmos nomes de specification_grid.CLUSTERS_PADRAO)
+CLUSTERS_ESTOQUE = {
+    "municipio_ano": ("municipio", "ano"),
+    "uf_ano": ("uf", "ano"),
+    "municipio": ("municipio",),
+    "uf": ("uf",),
+}
+
+
+def _ordenar_blocos(W: np.ndarray, codigos: dict, n_uf: int, *, prontos: dict | None = None):
+    """
+    Ordena as linhas de W por bloco (ano, UF) e calcula W'W de cada bloco.
+    prontos : dict | None -> {ano * n_uf + uf: W'W} de blocos já conhecidos (não recalculados)
+    """
+    chave = codigos["ano"] * n_uf + codigos["uf"]
+    bloco, n_blocos = codificar_grupos(chave)
+    ordem = np.argsort(bloco, kind="stable")
+    limites = np.searchsorted(bloco[ordem], np.arange(n_blocos + 1))
+    W = W[ordem]
+    codigos = {c: v[ordem] for c, v in codigos.items()}
+    chave = chave[ordem]
+
+    prontos = prontos or {}
+    m = W.shape[1]
+    WtW_b = np.empty((n_blocos, m, m))
+    for b in range(n_blocos):
+        pronto = prontos.get(int(chave[limites[b]]))
+        if pronto is not None:
+            WtW_b[b] = pronto
+        else:
+            Wb = W[limites[b]:limites[b + 1]]
+            WtW_b[b] = Wb.T @ Wb
+    return W, codigos, WtW_b, limites
+
+
+def _amostra_estoque(df_model: pd.DataFrame, lhs: str, rhs: list[str], mapa: MapaValidade | None) -> pd.DataFrame:
+    """Linhas com lhs, rhs e UF válidos (AND dos bitmaps de MapaValidade), só com as colunas usadas no estoque."""
+    mapa = mapa if mapa is not None else MapaValidade(df_model, colunas=[])
+    amostra = mapa.amostra(lhs, list(rhs) + ["estado"])
+    dados = pd.DataFrame(amostra.matriz(list(rhs) + [lhs]), index=amostra.indice, columns=list(rhs) + [lhs])
+    dados["estado"] = amostra.coluna("estado")
+    return dados
+
+
+def _hash_anos(dados: pd.DataFrame, lhs: str, rhs: list[str]) -> pd.Series:
+    """Hash de cada ano: soma (mod 2^64) dos hashes das linhas, independente da ordem das linhas."""
+    colunas = dados[list(rhs) + [lhs]].assign(estado=dados["estado"].astype(str))
+    h = pd.util.hash_pandas_object(colunas, index=True).to_numpy(dtype=np.uint64)
+    anos, ano = np.unique(dados.index.get_level_values(1).to_numpy(), return_inverse=True)
+    soma = np.zeros(len(anos), dtype=np.uint64)
+    np.add.at(soma, ano, h)
+    return pd.Series(soma, index=anos)
+
+
+class EstoqueSuficiente:
+    """
+    Estoque de estatísticas suficientes de um modelo FE 2-way (município + ano).
+    ----------
+    nome : str -> Nome do modelo
+    lhs : str -> Variável dependente
+    rhs : list[str] -> Regressores
+    W : np.ndarray -> Linhas de W ordenadas por bloco (ano, UF)
+    codigos : dict -> Códigos 'municipio', 'ano' e 'uf' de cada linha de W
+    rotulos : dict -> Rótulos originais correspondentes aos códigos
+    WtW_b : np.ndarray -> B x m x m, W'W de cada bloco
+    bloco_ano, bloco_uf : np.ndarray -> Códigos de ano e UF de cada bloco
+    limites : np.ndarray -> B + 1 posições de início/fim de cada bloco nas linhas de W
+    centro : np.ndarray | None -> Centro subtraído de [X, y] em W (reutilizado pelas linhas anexadas em atualizar)
+    hash_anos : np.ndarray | None -> Hash das linhas de cada ano de rotulos['ano'] (conferido em anos_alterados)
+    """
+
+    def __init__(self, nome, lhs, rhs, W, codigos, rotulos, WtW_b, bloco_ano, bloco_uf, limites, centro=None, hash_anos=None):
+        self.nome = nome
+        self.lhs = lhs
+        self.rhs = list(rhs)
+        self.k = len(self.rhs)
+        self.W = W
+        self.codigos = codigos
+        self.rotulos = rotulos
+        self.WtW_b = WtW_b
+        self.bloco_ano = bloco_ano
+        self.bloco_uf = bloco_uf
+        self.limites = limites
+        self.centro = centro
+        self.hash_anos = hash_anos
+        self.info = {}
+
+    @classmethod
+    def construir(cls, df_model: pd.DataFrame, lhs: str, rhs: list[str], *, nome: str = "modelo", mapa: MapaValidade | None = None) -> "EstoqueSuficiente":
+        """
+        Passada única sobre df_model: monta W, ordena as linhas por bloco (ano, UF) e calcula W'W de cada bloco.
+        `mapa` (MapaValidade de df_model) reaproveita os bitmaps de validade já calculados.
+        """
+        dados = _amostra_estoque(df_model, lhs, rhs, mapa)
+        rot_mun = dados.index.get_level_values(0).to_numpy()
+        rot_ano = dados.index.get_level_values(1).to_numpy()
+        rot_uf = dados["estado"].astype(str).to_numpy()
+
+        mun, _ = codificar_grupos(rot_mun)
+        ano, n_ano = codificar_grupos(rot_ano)
+        uf, n_uf = codificar_grupos(rot_uf)
+        Z = dados[rhs + [lhs]].to_numpy(dtype=float)
+        centro = Z.mean(axis=0)
+        W = montar_W(Z[:, :-1], Z[:, -1], ano, n_ano, centro=centro)
+
+        W, codigos, WtW_b, limites = _ordenar_blocos(W, {"municipio": mun, "ano": ano, "uf": uf}, n_uf)
+        primeira = limites[:-1]
+        rotulos = {"municipio": np.unique(rot_mun), "ano": np.unique(rot_ano), "uf": np.unique(rot_uf)}
+        hash_anos = _hash_anos(dados, lhs, rhs).reindex(rotulos["ano"]).to_numpy(dtype=np.uint64)
+        return cls(nome, lhs, rhs, W, codigos, rotulos, WtW_b, codigos["ano"][primeira], codigos["uf"][primeira], limites, centro, hash_anos)
+
+    def anos_alterados(self, df_model: pd.DataFrame, *, mapa: MapaValidade | None = None) -> np.ndarray:
+        """
+        Anos cujos blocos não conferem com df_model: anos novos ou removidos e anos em que as linhas válidas mudaram
+        (leads que passaram a existir com o ano novo, revisões de dados, inclusive as que só trocam valores entre municípios).
+        A conferência compara o hash das linhas de cada ano, O(n k), sem recalcular nenhum W'W.
+        """
+        if self.centro is None or self.hash_anos is None:
+            raise ValueError(f"Estoque '{self.nome}' sem centro ou hash dos anos registrado: reconstrua com EstoqueSuficiente.construir.")
+        novo = _hash_anos(_amostra_estoque(df_model, self.lhs, self.rhs, mapa), self.lhs, self.rhs)
+        antigo = pd.Series(self.hash_anos, index=self.rotulos["ano"])
+        anos = novo.index.union(antigo.index)
+        diferente = novo.reindex(anos).to_numpy() != antigo.reindex(anos).to_numpy()
+        return np.asarray(anos[diferente])
+
+    def atualizar(self, df_model: pd.DataFrame, anos=None, *, mapa: MapaValidade | None = None) -> "EstoqueSuficiente":
+        """
+        Novo estoque com os blocos de `anos` refeitos a partir de df_model; os W'W dos demais blocos são reaproveitados
+        (apenas reindexados quando surgem anos, municípios ou UFs novos). As estimativas são as mesmas de construir(df_model).
+        ----------
+        anos : iterável | None -> Anos a refazer (padrão: anos_alterados(df_model))
+        mapa : MapaValidade | None -> Bitmaps de validade de df_model (padrão: calculados sob demanda)
+        """
+        anos = self.anos_alterados(df_model, mapa=mapa) if anos is None else np.asarray(list(anos))
+        if anos.size == 0:
+            return self
+        dados = _amostra_estoque(df_model, self.lhs, self.rhs, mapa)
+        dados = dados[np.isin(dados.index.get_level_values(1), anos)]
+        hash_novos = _hash_anos(dados, self.lhs, self.rhs)
+        novos = {"municipio": dados.index.get_level_values(0).to_numpy(), "ano": dados.index.get_level_values(1).to_numpy(),
+                 "uf": dados["estado"].astype(str).to_numpy()}
+
+        # Blocos mantidos: anos fora de `anos` (anos que saíram do painel também são descartados)
+        manter_bloco = ~np.isin(self.rotulos["ano"][self.bloco_ano], anos)
+        linhas = np.concatenate([np.arange(self.limites[b], self.limites[b + 1]) for b in np.flatnonzero(manter_bloco)] or [np.empty(0, dtype=np.int64)])
+
+        # Rótulos da união (ordenados, como em construir) e recodificação dos códigos antigos
+        rotulos, codigos = {}, {}
+        for c in ("municipio", "ano", "uf"):
+            antigos = self.rotulos[c][self.codigos[c][linhas]]
+            rotulos[c] = np.union1d(antigos, novos[c])
+            codigos[c] = np.concatenate([np.searchsorted(rotulos[c], antigos), np.searchsorted(rotulos[c], novos[c])]).astype(np.int64)
+        k, n_ano, n_uf = self.k, len(rotulos["ano"]), len(rotulos["uf"])
+
+        # Linhas mantidas: [X, y] centralizados como estavam, dummies de ano na nova numeração
+        n_mant = linhas.size
+        W = np.zeros((n_mant + len(dados), k + 1 + n_ano))
+        W[:n_mant, :k + 1] = self.W[linhas, :k + 1]
+        W[np.arange(n_mant), k + 1 + codigos["ano"][:n_mant]] = 1.0
+        W[n_mant:] = montar_W(dados[self.rhs].to_numpy(), dados[self.lhs].to_numpy(), codigos["ano"][n_mant:], n_ano, centro=self.centro)
+
+        # W'W dos blocos mantidos: cada bloco tem uma única dummy de ano, que só muda de posição
+        prontos = {}
+        for b in np.flatnonzero(manter_bloco):
+            ano_b = int(np.searchsorted(rotulos["ano"], self.rotulos["ano"][self.bloco_ano[b]]))
+            uf_b = int(np.searchsorted(rotulos["uf"], self.rotulos["uf"][self.bloco_uf[b]]))
+            origem = np.append(np.arange(k + 1), k + 1 + self.bloco_ano[b])
+            destino = np.append(np.arange(k + 1), k + 1 + ano_b)
+            WtW = np.zeros((W.shape[1], W.shape[1]))
+            WtW[np.ix_(destino, destino)] = self.WtW_b[b][np.ix_(origem, origem)]
+            prontos[ano_b * n_uf + uf_b] = WtW
+
+        W, codigos, WtW_b, limites = _ordenar_blocos(W, codigos, n_uf, prontos=prontos)
+        primeira = limites[:-1]
+        hash_anos = None
+        if self.hash_anos is not None:
+            hash_mantidos = pd.Series(self.hash_anos, index=self.rotulos["ano"])
+            hash_mantidos = hash_mantidos[~np.isin(hash_mantidos.index, anos)]
+            hash_anos = pd.concat([hash_mantidos, hash_novos]).reindex(rotulos["ano"]).to_numpy(dtype=np.uint64)
+        return EstoqueSuficiente(self.nome, self.lhs, self.rhs, W, codigos, rotulos, WtW_b, codigos["ano"][primeira], codigos["uf"][primeira], limites, self.centro, hash_anos)
+
+    def salvar(self, path) -> Path:
+        """Persiste o estoque em um único arquivo .npz (arrays + metadados JSON)."""
+        path = Path(path)
+        meta = {"nome": self.nome, "lhs": self.lhs, "rhs": self.rhs}
+        extras = {} if self.centro is None else {"centro": self.centro}
+        if self.hash_anos is not None:
+            extras["hash_anos"] = self.hash_anos
+        np.savez_compressed(
+            path, meta=np.array(json.dumps(meta, ensure_ascii=False)), W=self.W, WtW_b=self.WtW_b, **extras,
+            bloco_ano=self.bloco_ano, bloco_uf=self.bloco_uf, limites=self.limites,
+            **{f"cod_{c}": v for c, v in self.codigos.items()},
+            **{f"rot_{c}": np.asarray(v).astype(str) for c, v in self.rotulos.items()},
+        )
+        return path
+
+    @classmethod
+    def carregar(cls, path) -> "EstoqueSuficiente":
+        with np.load(path, allow_pickle=False) as arq:
+            meta = json.loads(str(arq["meta"]))
+            codigos = {c: arq[f"cod_{c}"] for c in ("municipio", "ano", "uf")}
+            rotulos = {c: arq[f"rot_{c}"] for c in ("municipio", "ano", "uf")}
+            rotulos["ano"] = rotulos["ano"].astype(int)
+            centro = arq["centro"] if "centro" in arq.files else None
+            hash_anos = arq["hash_anos"] if "hash_anos" in arq.files else None
+            return cls(meta["nome"], meta["lhs"], meta["rhs"], arq["W"], codigos, rotulos, arq["WtW_b"], arq["bloco_ano"], arq["bloco_uf"], arq["limites"], centro, hash_anos)
+
+    def _blocos(self, anos=None, ufs=None) -> np.ndarray:
+        sel = np.ones(len(self.bloco_ano), dtype=bool)
+        if anos is not None:
+            sel &= np.isin(self.rotulos["ano"][self.bloco_ano], np.asarray(list(anos)))
+        if ufs is not None:
+            sel &= np.isin(self.rotulos["uf"][self.bloco_uf], np.asarray(list(ufs), dtype=str))
+        return np.flatnonzero(sel)
+
+    def resolver(self, anos=None, ufs=None, *, cluster: str = "municipio_ano", cov: bool = True) -> ResultadoFE:
+        """
+        Estima o modelo na união dos blocos selecionados.
+        ----------
+        anos : iterável | None -> Anos incluídos (None = todos)
+        ufs : iterável | None -> UFs incluídas (None = todas)
+        cluster : str -> Estrutura de cluster (chave de CLUSTERS_ESTOQUE)
+        cov : bool -> Se False retorna apenas os coeficientes (cov = NaN), útil para varreduras rápidas
+        ----------
+        Retorna
+        ResultadoFE
+        """
+        blocos = self._blocos(anos, ufs)
+        if blocos.size == 0:
+            raise ValueError("Nenhum bloco selecionado para a janela informada.")
+        linhas = np.concatenate([np.arange(self.limites[b], self.limites[b + 1]) for b in blocos])
+        k = self.k
+        n_mun = len(self.rotulos["municipio"])
+
+        # Somar blocos: W'W, E'W e contagens por município. Singletons de município/ano da janela saem como na
+        # poda dos modelos principais (AmostraModelo.podar): sua contribuição é subtraída de W'W
+        WtW = self.WtW_b[blocos].sum(axis=0)
+        manter, poda = podar_amostra([self.codigos["municipio"][linhas], self.codigos["ano"][linhas]])
+        if not manter.all():
+            fora = self.W[linhas[~manter]]
+            WtW = WtW - fora.T @ fora
+            linhas = linhas[manter]
+        Ws = self.W[linhas]
+        mun = self.codigos["municipio"][linhas]
+        EW = matriz_indicadora(mun, n_mun) @ Ws
+        cnt = np.bincount(mun, minlength=n_mun).astype(float)
+        beta, lam, anos_usados = resolver_concentrado(WtW, EW, cnt, k, efeitos_tempo=True)
+
+        n_efeitos = int((cnt > 0).sum() + len(anos_usados))
+        nobs = len(linhas)
+        nomes = self.rhs
+        if not cov:
+            nan = np.full((k, k), np.nan)
+            return ResultadoFE(pd.Series(beta, index=nomes), pd.DataFrame(nan, index=nomes, columns=nomes), nobs, nobs - k - n_efeitos, "none", np.nan, np.empty(0), n_efeitos, {"modelo": self.nome, "poda": poda})
+
+        # Variáveis da janela livres dos efeitos fixos da própria janela: z~ = z - λ_ano - α_município
+        lam_full = np.zeros((self.W.shape[1] - k - 1, k + 1))
+        lam_full[anos_usados] = lam
+        t = k + 1 + anos_usados
+        alfa = np.zeros((n_mun, k + 1))
+        ativos = cnt > 0
+        alfa[ativos] = (EW[ativos, :k + 1] - EW[np.ix_(ativos, t)] @ lam) / cnt[ativos][:, None]
+        Zt = Ws[:, :k + 1] - lam_full[self.codigos["ano"][linhas]] - alfa[mun]
+        X_dm, y_dm = Zt[:, :k], Zt[:, k]
+        residuos = y_dm - X_dm @ beta
+
+        clusters = [codificar_grupos(self.codigos[c][linhas])[0] for c in CLUSTERS_ESTOQUE[cluster]]
+        V = cov_clusterizada(X_dm, residuos, clusters, extra_df=n_efeitos)
+        tss = float(y_dm @ y_dm)
+        return ResultadoFE(
+            params=pd.Series(beta, index=nomes, name="parameter"),
+            cov=pd.DataFrame(V, index=nomes, columns=nomes),
+            nobs=nobs, df_resid=nobs - k - n_efeitos, cov_type="clustered",
+            rsquared=1 - float(residuos @ residuos) / tss if tss > 0 else 0.0,
+            residuos=residuos, n_efeitos=n_efeitos, info={"modelo": self.nome, "cluster": cluster, "poda": poda},
+        )
+
+    def subperiodos(self, periodos: list[tuple[int, int]], *, vars_interesse: list[str] | None = None, cluster: str = "municipio_ano") -> pd.DataFrame:
+        """
+        Coeficientes por subperíodo (anos inicial e final inclusive), em formato longo.
+        """
+        vars_interesse = vars_interesse or self.rhs
+        linhas = []
+        for ini, fim in periodos:
+            res = self.resolver(anos=range(ini, fim + 1), cluster=cluster)
+            ci = res.conf_int()
+            se, p = res.std_errors, res.pvalues
+            for v in vars_interesse:
+                linhas.append({"model": self.nome, "periodo": f"{ini}-{fim}", "ano_inicial": ini, "ano_final": fim, "var": v,
+                               "coef": float(res.params[v]), "std_err": float(se[v]), "p": float(p[v]),
+                               "ci_low": float(ci.loc[v, "lower"]), "ci_high": float(ci.loc[v, "upper"]), "nobs": res.nobs})
+        return pd.DataFrame(linhas)
+
+    def janelas_moveis(self, largura: int = 8, **kwargs) -> pd.DataFrame:
+        """
+        Janelas móveis de `largura` anos cobrindo todos os anos disponíveis no estoque.
+        """
+        anos = np.sort(self.rotulos["ano"]).astype(int)
+        periodos = [(int(a), int(a) + largura - 1) for a in anos if a + largura - 1 <= anos.max()]
+        return self.subperiodos(periodos, **kwargs)
+
+
+def construir_estoques(df_model: pd.DataFrame, modelos: dict, *, out_dir=None, mapa: MapaValidade | None = None) -> dict:
+    """
+    Constrói (e opcionalmente persiste) um estoque por modelo.
+    ----------
+    modelos : dict -> {nome: (lhs, rhs)}
+    out_dir : str | Path | None -> Diretório onde salvar {nome}_blocos.npz
+    mapa : MapaValidade | None -> Bitmaps de validade de df_model (padrão: calculados sob demanda)
+    ----------
+    Retorna
+    dict {nome: EstoqueSuficiente}
+    """
+    estoques = {}
+    for nome, (lhs, rhs) in modelos.items():
+        estoques[nome] = EstoqueSuficiente.construir(df_model, lhs, rhs, nome=nome, mapa=mapa)
+        if out_dir is not None:
+            estoques[nome].salvar(Path(out_dir) / f"{nome}_blocos.npz")
+    return estoques
+
+
+def atualizar_estoques(df_model: pd.DataFrame, modelos: dict, *, out_dir, mapa: MapaValidade | None = None) -> dict:
+    """
+    Versão incremental de construir_estoques: carrega {nome}_blocos.npz de out_dir e refaz apenas os blocos dos anos
+    alterados (ex.: ano novo do PIB municipal e os leads que ele completa). Estoques inexistentes, de outra especificação
+    ou sem centro ou hash dos anos registrado são construídos do zero.
+    ----------
+    Retorna
+    dict {nome: EstoqueSuficiente}; o atributo .info de cada estoque traz 'anos_refeitos' ('todos' na reconstrução)
+    """
+    estoques = {}
+    for nome, (lhs, rhs) in modelos.items():
+        path = Path(out_dir) / f"{nome}_blocos.npz"
+        anterior = EstoqueSuficiente.carregar(path) if path.exists() else None
+        if anterior is None or anterior.centro is None or anterior.hash_anos is None or anterior.lhs != lhs or anterior.rhs != list(rhs):
+            estoque = EstoqueSuficiente.construir(df_model, lhs, rhs, nome=nome, mapa=mapa)
+            estoque.info["anos_refeitos"] = "todos"
+        else:
+            anos = anterior.anos_alterados(df_model, mapa=mapa)
+            estoque = anterior.atualizar(df_model, anos, mapa=mapa)
+            estoque.info["anos_refeitos"] = [int(a) for a in anos]
+        if estoque is not anterior:
+            estoque.salvar(path)
+        estoques[nome] = estoque
+    return estoques
@@ -0,0 +1,361 @@
+# %% CONTROLE SINTÉTICO E SYNTHETIC DiD PARA CHOQUES DE DESEMBOLSO EM MUNICÍPIOS INDIVIDUAIS
+# Importando as bibliotecas necessárias
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.optimize import nnls
+
+from heterogeneous_effects import REGIOES_UF
+
+# Municípios com desembolsos pontuais muito grandes (ex.: projetos de utilidades públicas ou extrativos) são estudados caso a caso:
+#   'sc'   -> controle sintético (Abadie): pesos w >= 0, soma 1, que reproduzem a trajetória pré-tratamento do município
+#   'sdid' -> synthetic DiD (Arkhangelsky et al., 2021): pesos de unidade com intercepto e penalidade ridge + pesos de tempo
+# Os pesos saem de QPs na simplex: no 'sc' (posto <= T_pre, solução de canto) por conjunto ativo (NNLS de Lawson-Hanson com a
+# restrição de soma como linha aumentada), no 'sdid' (ridge, fortemente convexo) por gradiente projetado acelerado (FISTA).
+# O placebo no espaço trata cada doador como tratado (doadores = pool sem ele): os placebos formam um lote de QPs com os
+# mesmos dados e máscaras diferentes. No 'sdid' o lote é resolvido em conjunto (FISTA vetorizado sobre os problemas); no
+# 'sc' cada placebo é um NNLS próprio sobre a mesma matriz de doadores (montada uma vez e restrita pela máscara).
+# Vários municípios tratados rodam em paralelo (threads).
+
+METODOS_SC = ("sc", "sdid")
+
+
+def projetar_simplex(V: np.ndarray, mascara: np.ndarray | None = None) -> np.ndarray:
+    """
+    Projeção euclidiana de cada linha de V na simplex {w >= 0, sum w = 1} restrita às posições da máscara.
+    ----------
+    V : np.ndarray -> P x J
+    mascara : np.ndarray | None -> P x J booleana (False = peso fixado em zero)
+    """
+    V = np.atleast_2d(V)
+    mascara = np.ones(V.shape, dtype=bool) if mascara is None else mascara
+    u = -np.sort(-np.where(mascara, V, -np.inf), axis=1)
+    valido = np.isfinite(u)
+    css = np.cumsum(np.where(valido, u, 0.0), axis=1)
+    j = np.arange(1, V.shape[1] + 1)
+    cond = valido & (u - (css - 1) / j > 0)
+    rho = V.shape[1] - 1 - np.argmax(cond[:, ::-1], axis=1)
+    theta = (css[np.arange(V.shape[0]), rho] - 1) / (rho + 1)
+    return np.where(mascara, np.maximum(V - theta[:, None], 0.0), 0.0)
+
+
+def pesos_simplex(G: np.ndarray | None, H: np.ndarray, *, fator: np.ndarray | None = None, ridge: float = 0.0, mascara: np.ndarray | None = None, max_iter: int = 20_000, tol: float = 1e-9) -> np.ndarray:
+    """
+    Resolve em lote min_w 1/2 w'G w - h'w com w na simplex (FISTA com projeção exata e reinício adaptativo).
+    O critério de parada é o gap de Frank-Wolfe, g'w - min_j g_j >= f(w) - f*, relativo à escala média de diag(G).
+    ----------
+    G : np.ndarray | None -> J x J (Gram comum a todos os problemas) ou P x J x J (uma por problema)
+    H : np.ndarray -> P x J, termo linear de cada problema (A'b)
+    fator : np.ndarray | None -> A (T x J) com G = A'A + ridge I, no lugar de G (gradiente em O(P T J) em vez de O(P J^2))
+    ridge : float -> Penalidade somada à diagonal quando G vem pelo fator
+    mascara : np.ndarray | None -> P x J, doadores admitidos em cada problema
+    max_iter : int -> Número máximo de iterações
+    tol : float -> Gap de otimalidade relativo
+    ----------
+    Retorna
+    np.ndarray P x J com os pesos
+    """
+    H = np.atleast_2d(H)
+    P, J = H.shape
+    mascara = np.ones((P, J), dtype=bool) if mascara is None else mascara
+    if fator is not None:
+        gradiente = lambda W: (W @ fator.T) @ fator + ridge * W - H
+        L = np.linalg.norm(fator, 2) ** 2 + ridge
+        diag = np.einsum("tj,tj->j", fator, fator) + ridge
+    elif G.ndim == 3:
+        gradiente = lambda W: np.einsum("pij,pj->pi", G, W) - H
+        L = np.linalg.eigvalsh(G)[:, -1][:, None]
+        diag = np.diagonal(G, axis1=1, axis2=2)
+    else:
+        gradiente = lambda W: W @ G - H
+        L = np.linalg.eigvalsh(G)[-1]
+        diag = np.diag(G)
+    passo = 1 / np.maximum(L, np.finfo(float).tiny)
+    escala = np.maximum(diag.mean(axis=-1), np.finfo(float).tiny)
+
+    W = mascara / np.maximum(mascara.sum(axis=1, keepdims=True), 1)
+    Y, t = W, np.ones(P)
+    for it in range(max_iter):
+        grad = gradiente(Y)
+        W_novo = projetar_simplex(Y - passo * grad, mascara)
+        # Reinício: zera o momento dos problemas em que o passo contraria o gradiente (O'Donoghue e Candès, 2015)
+        t = np.where(np.einsum("pj,pj->p", grad, W_novo - W) > 0, 1.0, t)
+        t_novo = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        Y = W_novo + ((t - 1) / t_novo)[:, None] * (W_novo - W)
+        W, t = W_novo, t_novo
+        if it % 10 == 9:
+            g = gradiente(W)
+            gap = np.einsum("pj,pj->p", g, W) - np.where(mascara, g, np.inf).min(axis=1)
+            if np.all(gap <= tol * escala):
+                break
+    return W
+
+
+def pesos_sc(A: np.ndarray, B: np.ndarray, *, mascara: np.ndarray | None = None) -> np.ndarray:
+    """
+    Resolve min_w ||A w - b||² com w na simplex por NNLS (conjunto ativo) sobre [A; M 1'] w = [b; M], um problema por linha de B.
+    Exato para o controle sintético sem penalidade, em que o problema é degenerado (J > T_pre) e métodos de gradiente convergem devagar.
+    ----------
+    A : np.ndarray -> T x J, trajetórias pré-tratamento dos doadores (uma coluna por doador)
+    B : np.ndarray -> P x T, trajetória pré-tratamento de cada unidade tratada
+    mascara : np.ndarray | None -> P x J, doadores admitidos em cada problema
+    ----------
+    Retorna
+    np.ndarray P x J com os pesos
+    """
+    B = np.atleast_2d(B)
+    P, J = B.shape[0], A.shape[1]
+    mascara = np.ones((P, J), dtype=bool) if mascara is None else mascara
+    M = 1e3 * np.sqrt(max(float(np.einsum("tj,tj->j", A, A).max()), np.finfo(float).tiny))
+    W = np.zeros((P, J))
+    for p in range(P):
+        cols = np.flatnonzero(mascara[p])
+        w, _ = nnls(np.vstack([A[:, cols], np.full(cols.size, M)]), np.append(B[p], M), maxiter=50 * (cols.size + A.shape[0]))
+        W[p, cols] = w / w.sum()
+    return W
+
+
+@dataclass
+class ResultadoSC:
+    """
+    Resultado de um caso (município tratado) com o placebo no espaço.
+    ----------
+    municipio_id : str -> Município tratado
+    ano_tratamento : int -> Primeiro ano tratado
+    metodo : str -> 'sc' ou 'sdid'
+    att : float -> Média do gap (tratado - sintético) nos anos pós-tratamento
+    rmspe_pre, rmspe_pos : float -> Raiz do erro quadrático médio do gap antes e depois do tratamento
+    p_valor_razao : float -> Posto de rmspe_pos / rmspe_pre entre tratado e placebos (Abadie et al., 2010)
+    p_valor_att : float -> Posto de |att| entre tratado e placebos
+    se_placebo : float -> Desvio-padrão do att dos placebos (variância placebo do synthetic DiD)
+    pesos : pd.Series -> Pesos dos doadores (apenas os positivos)
+    pesos_tempo : pd.Series | None -> Pesos dos anos pré-tratamento (sdid)
+    trajetoria : pd.DataFrame -> Por ano: tratado, sintetico e gap
+    placebos : pd.DataFrame -> Por doador: att, rmspe_pre, rmspe_pos e razao
+    """
+    municipio_id: str
+    ano_tratamento: int
+    metodo: str
+    att: float
+    rmspe_pre: float
+    rmspe_pos: float
+    p_valor_razao: float
+    p_valor_att: float
+    se_placebo: float
+    pesos: pd.Series = field(repr=False)
+    pesos_tempo: pd.Series | None = field(repr=False, default=None)
+    trajetoria: pd.DataFrame = field(repr=False, default=None)
+    placebos: pd.DataFrame = field(repr=False, default=None)
+
+    @property
+    def razao(self) -> float:
+        return self.rmspe_pos / self.rmspe_pre if self.rmspe_pre > 0 else np.inf
+
+    @property
+    def p_valor_normal(self) -> float:
+        """p bilateral de att / se_placebo na normal."""
+        return float(2 * stats.norm.sf(abs(self.att) / self.se_placebo)) if self.se_placebo > 0 else np.nan
+
+    def resumo(self) -> dict:
+        return {"municipio_id": self.municipio_id, "ano_tratamento": self.ano_tratamento, "metodo": self.metodo, "att": self.att,
+                "rmspe_pre": self.rmspe_pre, "rmspe_pos": self.rmspe_pos, "razao": self.razao, "p_valor_razao": self.p_valor_razao,
+                "p_valor_att": self.p_valor_att, "se_placebo": self.se_placebo, "p_valor_normal": self.p_valor_normal,
+                "n_doadores": int(self.placebos.shape[0]), "n_pesos_positivos": int(self.pesos.shape[0])}
+
+
+def _gaps_sc(Y_pre: np.ndarray, Y_pos: np.ndarray, alvo_pre: np.ndarray, alvo_pos: np.ndarray, mascara: np.ndarray) -> tuple:
+    """
+    Controle sintético em lote.
+    ----------
+    Y_pre, Y_pos : np.ndarray -> J x T_pre e J x T_pos, desfecho dos doadores
+    alvo_pre, alvo_pos : np.ndarray -> P x T_pre e P x T_pos, desfecho das unidades tratadas (real ou placebo)
+    mascara : np.ndarray -> P x J, doadores admitidos para cada unidade
+    ----------
+    Retorna
+    (W, None, gap_pre, gap_pos); o segundo elemento (pesos de tempo) só existe no sdid
+    """
+    W = pesos_sc(Y_pre.T, alvo_pre, mascara=mascara)
+    return W, None, alvo_pre - W @ Y_pre, alvo_pos - W @ Y_pos
+
+
+def _gaps_sdid(Y_pre: np.ndarray, Y_pos: np.ndarray, alvo_pre: np.ndarray, alvo_pos: np.ndarray, mascara: np.ndarray) -> tuple:
+    """
+    Synthetic DiD em lote (mesmos argumentos de _gaps_sc); retorna (W, lam, gap_pre, gap_pos).
+    Penalidades: zeta = T_pos^(1/4) * sigma nas unidades e 1e-6 * sigma nos anos, sigma = desvio-padrão das
+    primeiras diferenças pré-tratamento dos doadores (um tratado por problema).
+    """
+    J, T_pre = Y_pre.shape
+    T_pos = Y_pos.shape[1]
+    sigma = float(np.std(np.diff(Y_pre, axis=1), ddof=1)) if T_pre > 1 else 1.0
+
+    # Pesos de unidade: intercepto eliminado centrando cada série no tempo
+    Yc = Y_pre - Y_pre.mean(axis=1, keepdims=True)
+    ac = alvo_pre - alvo_pre.mean(axis=1, keepdims=True)
+    eta = (T_pos ** 0.5) * sigma ** 2 * T_pre
+    W = pesos_simplex(None, ac @ Yc.T, fator=Yc.T, ridge=eta, mascara=mascara)
+
+    # Pesos de tempo: regressão da média pós dos doadores nos anos pré, com intercepto (centrando entre os doadores
+    # admitidos em cada problema); Gram por problema obtida por somas mascaradas, sem cópias do pool
+    m = mascara.astype(float)
+    n_d = m.sum(axis=1)
+    media_pos = Y_pos.mean(axis=1)
+    soma_pre = m @ Y_pre                                                       # P x T_pre
+    soma_pos = m @ media_pos                                                   # P
+    Gt = np.einsum("pj,jt,js->pts", m, Y_pre, Y_pre) - np.einsum("pt,ps->pts", soma_pre, soma_pre) / n_d[:, None, None]
+    Ht = m @ (Y_pre * media_pos[:, None]) - soma_pre * (soma_pos / n_d)[:, None]
+    Gt = Gt + (1e-6 * sigma) ** 2 * n_d[:, None, None] * np.eye(T_pre)[None]
+    lam = pesos_simplex(Gt, Ht)
+
+    # Sintético = W'Y + intercepto que iguala os níveis pré ponderados por lam
+    intercepto = np.einsum("pt,pt->p", lam, alvo_pre) - np.einsum("pt,pt->p", lam, W @ Y_pre)
+    gap_pre = alvo_pre - W @ Y_pre - intercepto[:, None]
+    gap_pos = alvo_pos - W @ Y_pos - intercepto[:, None]
+    return W, lam, gap_pre, gap_pos
+
+
+def _rmspe(gap: np.ndarray) -> np.ndarray:
+    return np.sqrt(np.mean(gap ** 2, axis=1))
+
+
+def painel_largo(df_model: pd.DataFrame, desfecho: str) -> pd.DataFrame:
+    """Desfecho em formato largo (municípios x anos) a partir do painel indexado por (municipio_id, ano)."""
+    return df_model[desfecho].unstack(level=1).sort_index(axis=1)
+
+
+def pool_doadores(df_model: pd.DataFrame, municipio_id: str, ano_tratamento: int, Y: pd.DataFrame, anos: list, *, restringir: str | None = "uf", tamanho: str | None = "populacao", faixa: float = 3.0, excluir=()) -> pd.Index:
+    """
+    Doadores admitidos para um caso: desfecho completo na janela, mesma UF ou região (restringir='uf' | 'regiao' | None)
+    e, se `tamanho` for informado, valor no ano anterior ao tratamento entre 1/faixa e faixa vezes o do tratado.
+    Municípios em `excluir` (outros tratados) ficam de fora.
+    """
+    completos = Y.index[Y[anos].notna().all(axis=1)]
+    doadores = completos.difference(pd.Index([municipio_id]).append(pd.Index(list(excluir))))
+    if restringir is not None:
+        uf = df_model["estado"].groupby(level=0).first()
+        chave = uf if restringir == "uf" else uf.map(REGIOES_UF)
+        doadores = doadores[chave.reindex(doadores).to_numpy() == chave.get(municipio_id)]
+    if tamanho is not None:
+        base = df_model[tamanho].xs(ano_tratamento - 1, level=1) if (ano_tratamento - 1) in df_model.index.get_level_values(1) else None
+        if base is not None and np.isfinite(base.get(municipio_id, np.nan)):
+            razao = base.reindex(doadores).to_numpy() / base[municipio_id]
+            doadores = doadores[(razao >= 1 / faixa) & (razao <= faixa)]
+    return doadores
+
+
+def controle_sintetico(df_model: pd.DataFrame, municipio_id: str, ano_tratamento: int, desfecho: str, *, metodo: str = "sdid", anos_pre: int | None = None, anos_pos: int | None = None, restringir: str | None = "uf", tamanho: str | None = "populacao", faixa: float = 3.0, excluir=(), Y: pd.DataFrame | None = None) -> ResultadoSC:
+    """
+    Controle sintético ou synthetic DiD de um município, com placebo no espaço sobre todos os doadores.
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano), com coluna 'estado'
+    municipio_id : str -> Município tratado
+    ano_tratamento : int -> Primeiro ano do choque
+    desfecho : str -> Variável de resultado (ex.: log_pib_real)
+    metodo : str -> 'sc' ou 'sdid'
+    anos_pre, anos_pos : int | None -> Tamanho das janelas (padrão: todos os anos disponíveis)
+    restringir, tamanho, faixa, excluir : -> Restrições do pool de doadores (ver pool_doadores)
+    Y : pd.DataFrame | None -> painel_largo(df_model, desfecho) já calculado (reaproveitar entre casos)
+    ----------
+    Retorna
+    ResultadoSC
+    """
+    if metodo not in METODOS_SC:
+        raise ValueError(f"metodo deve ser um de {METODOS_SC}: {metodo}")
+    Y = painel_largo(df_model, desfecho) if Y is None else Y
+    pre = [a for a in Y.columns if a < ano_tratamento]
+    pos = [a for a in Y.columns if a >= ano_tratamento]
+    pre = pre[-anos_pre:] if anos_pre else pre
+    pos = pos[:anos_pos] if anos_pos else pos
+    if len(pre) < 2 or not pos:
+        raise ValueError(f"Janela insuficiente para {municipio_id} em {ano_tratamento}: {len(pre)} anos pré, {len(pos)} pós.")
+    if Y.loc[municipio_id, pre + pos].isna().any():
+        raise ValueError(f"Desfecho incompleto na janela para o município tratado {municipio_id}.")
+
+    doadores = pool_doadores(df_model, municipio_id, ano_tratamento, Y, pre + pos, restringir=restringir, tamanho=tamanho, faixa=faixa, excluir=excluir)
+    J = len(doadores)
+    if J < 2:
+        raise ValueError(f"Pool de doadores com {J} município(s) para {municipio_id}.")
+    Y_pre = Y.loc[doadores, pre].to_numpy(dtype=float)
+    Y_pos = Y.loc[doadores, pos].to_numpy(dtype=float)
+
+    # Linha 0 = tratado (todos os doadores); linhas 1..J = placebos (doador j contra os demais)
+    alvo_pre = np.vstack([Y.loc[[municipio_id], pre].to_numpy(dtype=float), Y_pre])
+    alvo_pos = np.vstack([Y.loc[[municipio_id], pos].to_numpy(dtype=float), Y_pos])
+    mascara = np.vstack([np.ones((1, J), dtype=bool), ~np.eye(J, dtype=bool)])
+    resolver = _gaps_sc if metodo == "sc" else _gaps_sdid
+    W, lam, gap_pre, gap_pos = resolver(Y_pre, Y_pos, alvo_pre, alvo_pos, mascara)
+
+    att = gap_pos.mean(axis=1)
+    r_pre, r_pos = _rmspe(gap_pre), _rmspe(gap_pos)
+    razao = r_pos / np.maximum(r_pre, np.finfo(float).tiny)
+    pesos = pd.Series(W[0], index=doadores, name="peso")
+    return ResultadoSC(
+        municipio_id=municipio_id, ano_tratamento=int(ano_tratamento), metodo=metodo,
+        att=float(att[0]), rmspe_pre=float(r_pre[0]), rmspe_pos=float(r_pos[0]),
+        p_valor_razao=float(np.mean(razao >= razao[0])), p_valor_att=float(np.mean(np.abs(att) >= abs(att[0]))),
+        se_placebo=float(np.std(att[1:], ddof=1)),
+        pesos=pesos[pesos > 1e-8].sort_values(ascending=False),
+        pesos_tempo=None if lam is None else pd.Series(lam[0], index=pre, name="peso_tempo"),
+        trajetoria=pd.DataFrame({"tratado": np.concatenate([alvo_pre[0], alvo_pos[0]]),
+                                 "gap": np.concatenate([gap_pre[0], gap_pos[0]])}, index=pd.Index(pre + pos, name="ano")).assign(
+                                     sintetico=lambda d: d["tratado"] - d["gap"]),
+        placebos=pd.DataFrame({"att": att[1:], "rmspe_pre": r_pre[1:], "rmspe_pos": r_pos[1:], "razao": razao[1:]}, index=doadores),
+    )
+
+
+def selecionar_choques(df_model: pd.DataFrame, coluna: str = "share_desembolso_real_pib_real_ano_anterior", *, limiar: float | None = None, quantil: float = 0.999, anos_pre_min: int = 5, anos_pos_min: int = 2) -> pd.DataFrame:
+    """
+    Municípios com choque de desembolso: primeiro ano em que `coluna` supera o limiar (padrão: quantil do painel),
+    mantidos apenas os casos com pelo menos anos_pre_min anos antes e anos_pos_min anos a partir do choque.
+    ----------
+    Retorna
+    pd.DataFrame com municipio_id, estado, ano_tratamento e valor
+    """
+    serie = df_model[coluna]
+    limiar = float(serie.quantile(quantil)) if limiar is None else limiar
+    acima = serie[serie > limiar]
+    primeiro = acima.reset_index().sort_values(df_model.index.names[1]).groupby(df_model.index.names[0]).first()
+    anos = df_model.index.get_level_values(1)
+    casos = pd.DataFrame({"municipio_id": primeiro.index, "ano_tratamento": primeiro[df_model.index.names[1]].astype(int).to_numpy(),
+                          "valor": primeiro[coluna].to_numpy()})
+    casos["estado"] = df_model["estado"].groupby(level=0).first().reindex(casos["municipio_id"]).to_numpy()
+    validos = (casos["ano_tratamento"] - anos.min() >= anos_pre_min) & (anos.max() - casos["ano_tratamento"] + 1 >= anos_pos_min)
+    casos = casos[validos].reset_index(drop=True)
+    casos.attrs["limiar"] = limiar
+    return casos
+
+
+def controle_sintetico_lote(df_model: pd.DataFrame, casos: pd.DataFrame, desfecho: str, *, metodo: str = "sdid", excluir_tratados: bool = True, n_workers: int = 4, **kwargs) -> tuple[dict, pd.DataFrame]:
+    """
+    Roda controle_sintetico para vários municípios tratados em paralelo (o painel largo é montado uma única vez).
+    ----------
+    df_model : pd.DataFrame -> Painel indexado por (municipio_id, ano)
+    casos : pd.DataFrame -> Colunas municipio_id e ano_tratamento (ex.: selecionar_choques)
+    desfecho : str -> Variável de resultado
+    metodo : str -> 'sc' ou 'sdid'
+    excluir_tratados : bool -> Se True os demais tratados não entram como doadores
+    n_workers : int -> Número de threads (cada thread processa casos inteiros)
+    kwargs : -> Repassados a controle_sintetico (anos_pre, anos_pos, restringir, tamanho, faixa)
+    ----------
+    Retorna
+    tuple (resultados {municipio_id: ResultadoSC}, resumo em pd.DataFrame; casos que falharam vêm com a coluna 'erro')
+    """
+    Y = painel_largo(df_model, desfecho)
+    tratados = tuple(casos["municipio_id"]) if excluir_tratados else ()
+
+    def rodar(caso) -> tuple:
+        try:
+            return caso.municipio_id, controle_sintetico(df_model, caso.municipio_id, int(caso.ano_tratamento), desfecho, metodo=metodo,
+                                                         excluir=tratados, Y=Y, **kwargs), None
+        except (ValueError, KeyError, np.linalg.LinAlgError) as erro:
+            return caso.municipio_id, None, str(erro)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        saidas = list(executor.map(rodar, casos.itertuples(index=False)))
+
+    resultados = {m: res for m, res, _ in saidas if res is not None}
+    linhas = [res.resumo() if res is not None else {"municipio_id": m, "metodo": metodo, "erro": erro} for m, res, erro in saidas]
+    resumo = pd.DataFrame(linhas).assign(desfecho=desfecho)
+    return resultados, resumo
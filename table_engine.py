@@ -0,0 +1,263 @@
+# %% MOTOR DE TABELAS A PARTIR DO REPOSITÓRIO DE RESULTADOS (MARKDOWN, LATEX E HTML)
+# Importando as bibliotecas necessárias
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from results_store import RepositorioResultados
+
+# Uma tabela é declarada como uma lista de painéis (modelo + família de regressores), os horizontes exibidos e os testes
+# conjuntos reportados. A especificação é expandida em uma tabela de chaves (tabela, painel, horizonte, var) e os valores
+# vêm de uma única consulta ao repositório para todos os modelos de todas as tabelas, seguida de um merge.
+# A formatação (coeficiente com estrelas, erro-padrão entre parênteses, p-valores) é feita coluna a coluna com operações
+# vetorizadas de string, sem apply por linha. Os renderizadores montam as linhas por concatenação de colunas.
+
+HORIZONTES_PADRAO = ("Lead 2", "Lead 1", "Lag 1", "Lag 2", "Lag 3")
+TESTES_PADRAO = ("wald_betas", "wald_leads", "wald_acumulado")
+# Níveis de significância e estrelas correspondentes (do mais restrito ao menos restrito)
+NIVEIS_ESTRELAS = ((0.01, "***"), (0.05, "**"), (0.10, "*"))
+CONTEMPORANEO = "Contemporâneo"
+
+_PADRAO_HORIZONTE = re.compile(r"^(Lead|Lag) (\d+)$")
+
+
+@dataclass(frozen=True)
+class Painel:
+    """
+    Um painel da tabela.
+    ----------
+    nome : str -> Rótulo exibido (ex.: 'Painel A - Δ log PIB')
+    model : str -> Nome do modelo no repositório de resultados
+    familia : str -> Variável base cujos leads/lags são exibidos (ex.: 'share_desembolso_real_pib_real_ano_anterior')
+    """
+    nome: str
+    model: str
+    familia: str = ""
+
+
+@dataclass(frozen=True)
+class EspecTabela:
+    """
+    Especificação declarativa de uma tabela.
+    ----------
+    nome : str -> Identificador (nome dos arquivos gerados)
+    paineis : tuple[Painel, ...] -> Painéis na ordem de exibição
+    horizontes : tuple[str, ...] -> 'Lead k', 'Lag k' ou 'Contemporâneo'; vazio para tabela só de testes
+    testes : tuple[str, ...] -> Testes conjuntos reportados (p-valores)
+    titulo : str -> Título (legenda no LaTeX)
+    rotulo_paineis : str -> Cabeçalho da coluna de painéis
+    casas : int -> Casas decimais de coeficientes e erros-padrão
+    casas_p : int -> Casas decimais dos p-valores
+    """
+    nome: str
+    paineis: tuple[Painel, ...]
+    horizontes: tuple[str, ...] = HORIZONTES_PADRAO
+    testes: tuple[str, ...] = TESTES_PADRAO
+    titulo: str = ""
+    rotulo_paineis: str = "Painel"
+    casas: int = 3
+    casas_p: int = 4
+
+    @property
+    def modelos(self) -> list[str]:
+        return list(dict.fromkeys(p.model for p in self.paineis))
+
+
+def variavel_do_horizonte(familia: str, horizonte: str) -> str:
+    """Nome da variável no modelo: 'Lead 2' -> '{familia}_lead2', 'Lag 1' -> '{familia}_lag1', 'Contemporâneo' -> familia."""
+    if horizonte == CONTEMPORANEO:
+        return familia
+    achado = _PADRAO_HORIZONTE.match(horizonte)
+    if achado is None:
+        raise ValueError(f"Horizonte inválido: {horizonte!r} (use 'Lead k', 'Lag k' ou '{CONTEMPORANEO}')")
+    return f"{familia}_{achado.group(1).lower()}{achado.group(2)}"
+
+
+def _chaves(especs: list[EspecTabela]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Expande as especificações em chaves de coeficientes (tabela, painel, horizonte, model, var) e de testes."""
+    coef = [
+        (e.nome, i, p.nome, j, h, p.model, variavel_do_horizonte(p.familia, h))
+        for e in especs for i, p in enumerate(e.paineis) for j, h in enumerate(e.horizontes)
+    ]
+    testes = [
+        (e.nome, i, p.nome, p.model, t)
+        for e in especs for i, p in enumerate(e.paineis) for t in e.testes
+    ]
+    return (pd.DataFrame(coef, columns=["tabela", "ordem_painel", "painel", "ordem_h", "horizonte", "model", "var"]),
+            pd.DataFrame(testes, columns=["tabela", "ordem_painel", "painel", "model", "test"]))
+
+
+def formatar_numeros(valores, casas: int) -> np.ndarray:
+    """Números com casas fixas; ausentes viram string vazia."""
+    v = np.asarray(valores, dtype=float)
+    return np.where(np.isnan(v), "", np.char.mod(f"%.{casas}f", np.nan_to_num(v)))
+
+
+def estrelas(p) -> np.ndarray:
+    """Estrelas de significância (NIVEIS_ESTRELAS) para um vetor de p-valores."""
+    p = np.asarray(p, dtype=float)
+    return np.select([p < nivel for nivel, _ in NIVEIS_ESTRELAS], [s for _, s in NIVEIS_ESTRELAS], "")
+
+
+def formatar_coeficientes(coef, std_err, p, casas: int = 3) -> tuple[np.ndarray, np.ndarray]:
+    """Coeficiente com estrelas e erro-padrão entre parênteses (vetorizado)."""
+    txt_coef = formatar_numeros(coef, casas)
+    txt_coef = np.where(txt_coef == "", "", np.char.add(txt_coef.astype(str), estrelas(p)))
+    txt_ep = formatar_numeros(std_err, casas)
+    txt_ep = np.where(txt_ep == "", "", np.char.add(np.char.add("(", txt_ep.astype(str)), ")"))
+    return txt_coef, txt_ep
+
+
+def _esparsar(s: pd.Series) -> pd.Series:
+    """Mantém o rótulo só na primeira linha de cada bloco repetido (como o índice hierárquico do pandas)."""
+    return s.where(s.ne(s.shift()), "")
+
+
+@dataclass
+class ResultadoTabela:
+    """
+    Tabela montada.
+    ----------
+    espec : EspecTabela -> Especificação de origem
+    corpo : pd.DataFrame -> Índice (painel, horizonte); colunas Coef e EP já formatadas
+    testes : pd.DataFrame -> Índice painel; colunas p(teste) numéricas
+    valores : pd.DataFrame -> Formato longo numérico (painel, horizonte, model, var, coef, std_err, p)
+    """
+    espec: EspecTabela
+    corpo: pd.DataFrame
+    testes: pd.DataFrame
+    valores: pd.DataFrame = field(repr=False, default_factory=pd.DataFrame)
+
+    def _blocos(self) -> list[pd.DataFrame]:
+        """Tabelas de exibição (strings, índice achatado): corpo e, se houver, p-valores dos testes."""
+        blocos = []
+        if not self.corpo.empty:
+            corpo = self.corpo.reset_index()
+            corpo[corpo.columns[0]] = _esparsar(corpo[corpo.columns[0]])
+            blocos.append(corpo)
+        if not self.testes.empty:
+            testes = self.testes.reset_index()
+            for c in testes.columns[1:]:
+                testes[c] = formatar_numeros(testes[c], self.espec.casas_p)
+            blocos.append(testes)
+        return blocos
+
+    def markdown(self) -> str:
+        return "\n\n".join(para_markdown(b) for b in self._blocos())
+
+    def latex(self) -> str:
+        return "\n\n".join(para_latex(b, legenda=self.espec.titulo if i == 0 else "") for i, b in enumerate(self._blocos()))
+
+    def html(self) -> str:
+        return "\n".join(b.to_html(index=False, na_rep="", border=0) for b in self._blocos())
+
+    def salvar(self, diretorio, formatos=("md", "tex", "html")) -> list[Path]:
+        """Grava a tabela nos formatos pedidos ({diretorio}/{nome}.{ext}). Retorna os caminhos gravados."""
+        renderizadores = {"md": self.markdown, "tex": self.latex, "html": self.html}
+        diretorio = Path(diretorio)
+        diretorio.mkdir(parents=True, exist_ok=True)
+        caminhos = []
+        for ext in formatos:
+            caminho = diretorio / f"{self.espec.nome}.{ext}"
+            caminho.write_text(renderizadores[ext](), encoding="utf-8")
+            caminhos.append(caminho)
+        return caminhos
+
+
+def _linhas(df: pd.DataFrame, sep: str) -> pd.Series:
+    """Concatena as colunas de cada linha com o separador (laço nas colunas, vetorizado nas linhas)."""
+    cols = [df[c].astype(str) for c in df.columns]
+    linha = cols[0]
+    for c in cols[1:]:
+        linha = linha + sep + c
+    return linha
+
+
+def para_markdown(df: pd.DataFrame) -> str:
+    """Tabela em Markdown (pipe table) com cabeçalho a partir das colunas."""
+    df = df.fillna("").astype(str).apply(lambda s: s.str.replace("|", r"\|", regex=False))
+    cabecalho = "| " + " | ".join(map(str, df.columns)) + " |"
+    separador = "|" + "|".join([" --- "] + [" ---: "] * (df.shape[1] - 1)) + "|"
+    corpo = "| " + _linhas(df, " | ") + " |"
+    return "\n".join([cabecalho, separador, *corpo.tolist()])
+
+
+_ESCAPE_LATEX = (("\\", r"\textbackslash{}"), ("&", r"\&"), ("%", r"\%"), ("$", r"\$"), ("#", r"\#"), ("_", r"\_"), ("{", r"\{"), ("}", r"\}"))
+
+
+def _escapar_latex(s: pd.Series) -> pd.Series:
+    s = s.astype(str)
+    for de, para in _ESCAPE_LATEX:
+        s = s.str.replace(de, para, regex=False)
+    return s
+
+
+def para_latex(df: pd.DataFrame, legenda: str = "") -> str:
+    """Tabela em LaTeX (tabular com booktabs; legenda opcional em um ambiente table)."""
+    df = df.fillna("").apply(_escapar_latex)
+    cabecalho = " & ".join(_escapar_latex(pd.Series(df.columns)).tolist()) + r" \\"
+    corpo = _linhas(df, " & ") + r" \\"
+    alinhamento = "l" + "r" * (df.shape[1] - 1)
+    tabular = "\n".join([rf"\begin{{tabular}}{{{alinhamento}}}", r"\toprule", cabecalho, r"\midrule", *corpo.tolist(), r"\bottomrule", r"\end{tabular}"])
+    if not legenda:
+        return tabular
+    return "\n".join([r"\begin{table}[htbp]", r"\centering", rf"\caption{{{_escapar_latex(pd.Series([legenda])).iloc[0]}}}", tabular, r"\end{table}"])
+
+
+def montar_tabelas(repo: RepositorioResultados, especs: list[EspecTabela], *, run_id=None) -> dict[str, ResultadoTabela]:
+    """
+    Monta várias tabelas com uma consulta de coeficientes e uma de testes para todos os modelos envolvidos.
+    ----------
+    repo : RepositorioResultados -> Repositório de resultados
+    especs : list[EspecTabela] -> Especificações (nomes únicos)
+    run_id : str | list[str] | None -> Execuções específicas (padrão: a mais recente de cada modelo)
+    ----------
+    Retorna
+    dict {nome: ResultadoTabela}
+    """
+    nomes = [e.nome for e in especs]
+    if len(set(nomes)) != len(nomes):
+        raise ValueError("Nomes de tabela repetidos nas especificações")
+    chaves_coef, chaves_testes = _chaves(especs)
+    modelos = list(dict.fromkeys(m for e in especs for m in e.modelos))
+
+    # Consultas únicas (partições podadas por modelo; coeficientes filtrados pelas variáveis pedidas)
+    if len(chaves_coef):
+        coefs = repo.coeficientes(modelos, run_id=run_id, filtro=ds.field("var").isin(chaves_coef["var"].unique().tolist()))
+        valores = chaves_coef.merge(coefs[["model", "var", "coef", "std_err", "p"]].drop_duplicates(["model", "var"]), on=["model", "var"], how="left")
+        valores = valores.sort_values(["tabela", "ordem_painel", "ordem_h"], kind="stable")
+    else:
+        valores = chaves_coef.assign(coef=np.nan, std_err=np.nan, p=np.nan)
+    if len(chaves_testes):
+        testes = repo.testes(modelos, run_id=run_id)
+        pvals = chaves_testes.merge(testes[["model", "test", "pval"]].drop_duplicates(["model", "test"]), on=["model", "test"], how="left")
+    else:
+        pvals = chaves_testes.assign(pval=np.nan)
+
+    grupos_coef = dict(tuple(valores.groupby("tabela", sort=False)))
+    grupos_testes = dict(tuple(pvals.groupby("tabela", sort=False)))
+    saida = {}
+    for e in especs:
+        v = grupos_coef.get(e.nome, valores.iloc[:0])
+        coef_txt, ep_txt = formatar_coeficientes(v["coef"], v["std_err"], v["p"], casas=e.casas)
+        corpo = pd.DataFrame({"Coef": coef_txt, "EP": ep_txt}, index=pd.MultiIndex.from_arrays([v["painel"], v["horizonte"]], names=[e.rotulo_paineis, "Horizonte"]))
+
+        t = grupos_testes.get(e.nome, pvals.iloc[:0])
+        if t.empty:
+            tabela_testes = pd.DataFrame(columns=[f"p({c})" for c in e.testes]).rename_axis(e.rotulo_paineis)
+        else:
+            tabela_testes = (t.pivot(index=["ordem_painel", "painel"], columns="test", values="pval")
+                             .reindex(columns=list(e.testes)).droplevel("ordem_painel")
+                             .rename(columns=lambda c: f"p({c})").rename_axis(index=e.rotulo_paineis, columns=None))
+
+        saida[e.nome] = ResultadoTabela(e, corpo, tabela_testes, v.drop(columns=["tabela", "ordem_painel", "ordem_h"]).reset_index(drop=True))
+    return saida
+
+
+def montar_tabela(repo: RepositorioResultados, espec: EspecTabela, *, run_id=None) -> ResultadoTabela:
+    """Monta uma única tabela (ver montar_tabelas)."""
+    return montar_tabelas(repo, [espec], run_id=run_id)[espec.nome]
@@ -0,0 +1,7 @@
+# %% CONFIGURAÇÃO DOS TESTES
+# Importando as bibliotecas necessárias
+import sys
+from pathlib import Path
+
+# Os módulos do projeto ficam na raiz do repositório (sem pacote instalável)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,43 @@
+# %% TESTES - CUBO AGREGADO
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import COLUNAS_BNDES, COLUNAS_PIB, CuboAgregado
+
+# O cubo cobre a união dos anos do BNDES e do IBGE: quando o IBGE publica um ano que já tinha desembolsos (ex.: 2022),
+# a atualização incremental tem de preencher PIB e VA desse ano e reproduzir a reconstrução completa.
+
+
+def _bases(anos_pib: range, anos_bndes: range, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    ufs = ['SP', 'MG', 'BA']
+    colunas_pib = sorted({c for m in COLUNAS_PIB.values() for c in m.values()})
+    colunas_bndes = sorted({c for m in COLUNAS_BNDES.values() for c in m.values()})
+    df_pib = pd.DataFrame([(ano, uf) for ano in anos_pib for uf in ufs for _ in range(4)], columns=['ano', 'estado'])
+    for c in colunas_pib:
+        df_pib[c] = rng.uniform(10.0, 100.0, len(df_pib))
+    df_bndes = pd.DataFrame([(ano, uf) for ano in anos_bndes for uf in ufs for _ in range(3)], columns=['ano', 'uf'])
+    for c in colunas_bndes:
+        df_bndes[c] = rng.uniform(0.0, 5.0, len(df_bndes))
+    return df_pib, df_bndes
+
+
+def test_ano_novo_do_pib_ja_presente_pelo_bndes():
+    df_pib, df_bndes = _bases(range(2002, 2022), range(2002, 2024))
+    cubo = CuboAgregado.construir(df_pib, df_bndes)
+    assert 2022 in cubo.anos and 2022 not in cubo.razao('desembolsos_corrente', 'pib_corrente').index
+
+    df_pib_2022, _ = _bases(range(2022, 2023), range(2022, 2023), seed=1)
+    df_pib_novo = pd.concat([df_pib, df_pib_2022], ignore_index=True)
+    completo = CuboAgregado.construir(df_pib_novo, df_bndes)
+    for atualizado in (cubo.atualizar(df_pib_novo, df_bndes), cubo.atualizar(df_pib_novo, df_bndes, anos=[2022])):
+        np.testing.assert_array_equal(atualizado.anos, completo.anos)
+        np.testing.assert_allclose(atualizado.valores, completo.valores)
+        assert 2022 in atualizado.razao('desembolsos_corrente', 'pib_corrente').index
+
+
+def test_sem_anos_novos_mantem_cubo():
+    df_pib, df_bndes = _bases(range(2002, 2022), range(2002, 2024))
+    cubo = CuboAgregado.construir(df_pib, df_bndes)
+    assert cubo.atualizar(df_pib, df_bndes) is cubo
@@ -0,0 +1,32 @@
+# %% TESTES - EVENT STUDY
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from event_study import estudo_evento
+
+# Adoção escalonada sem nunca tratados: o 'iw' usa a última coorte como controle e a amostra inteira fica restrita
+# aos anos anteriores ao evento dela; com efeito dinâmico homogêneo os coeficientes são recuperados.
+
+
+def _painel_escalonado(seed: int = 0, por_coorte: int = 20) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    coortes = np.repeat([2003, 2005, 2007, 2009], por_coorte)
+    anos = np.arange(2000, 2012)
+    ent = np.repeat(np.arange(coortes.size), anos.size)
+    ano = np.tile(anos, coortes.size)
+    rel = ano - coortes[ent]
+    efeito = np.where(rel >= 0, 0.5 + 0.1 * np.minimum(rel, 2), 0.0)
+    y = rng.normal(size=ent.size) * 0.01 + rng.normal(size=coortes.size)[ent] + 0.2 * (ano - 2000) + efeito
+    return pd.DataFrame({"y": y, "desembolso": (rel >= 0).astype(float), "estado": "SP"},
+                        index=pd.MultiIndex.from_arrays([ent, ano], names=["municipio_id", "ano"]))
+
+
+def test_iw_ultima_coorte_restringe_amostra():
+    df = _painel_escalonado()
+    res = estudo_evento(df, "y", "desembolso", estimador="iw", janela=(-2, 2), cluster="municipio")
+    assert res.nobs == int((df.index.get_level_values("ano") < 2009).sum())
+    assert res.info["coortes"] == [2003, 2005, 2007]
+    esperado = {"evento_-2": 0.0, "evento_+0": 0.5, "evento_+1": 0.6, "evento_+2": 0.7}
+    for nome, valor in esperado.items():
+        assert abs(res.params[nome] - valor) < 0.01
@@ -0,0 +1,42 @@
+# %% TESTES - CACHE DE AJUSTES
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import pytest
+from linearmodels.panel import PanelOLS
+
+from fit_cache import CacheAjustes, ResultadoEmCache
+
+# Acerto e falha do cache devolvem o mesmo tipo (ResultadoEmCache) com os mesmos números do PanelOLS.
+
+
+def _amostra(seed: int = 0, n: int = 30, t: int = 6) -> tuple[pd.Series, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    indice = pd.MultiIndex.from_arrays([np.repeat(np.arange(n), t), np.tile(np.arange(2000, 2000 + t), n)], names=["municipio_id", "ano"])
+    X = pd.DataFrame({"x1": rng.normal(size=n * t), "x2": rng.normal(size=n * t)}, index=indice)
+    y = pd.Series(0.5 * X["x1"] - 0.2 * X["x2"] + rng.normal(size=n * t), index=indice, name="y")
+    return y, X
+
+
+@pytest.mark.parametrize("tendencias_entidade", [False, True])
+def test_acerto_e_falha_mesmo_tipo(tmp_path, tendencias_entidade):
+    y, X = _amostra()
+    cache = CacheAjustes(tmp_path / "cache")
+    falha = cache.ajustar_panelols(y, X, tendencias_entidade=tendencias_entidade, cov_type="clustered", cluster_entity=True)
+    acerto = cache.ajustar_panelols(y, X, tendencias_entidade=tendencias_entidade, cov_type="clustered", cluster_entity=True)
+    assert (cache.falhas, cache.acertos) == (1, 1)
+    assert type(falha) is type(acerto) is ResultadoEmCache
+    pd.testing.assert_series_equal(falha.params, acerto.params)
+    pd.testing.assert_frame_equal(falha.cov, acerto.cov)
+    pd.testing.assert_frame_equal(falha.conf_int(), acerto.conf_int())
+    assert falha.estatisticas == acerto.estatisticas
+
+
+def test_falha_reproduz_panelols(tmp_path):
+    y, X = _amostra()
+    res = CacheAjustes(tmp_path / "cache").ajustar_panelols(y, X, cov_type="clustered", cluster_entity=True)
+    ref = PanelOLS(y, X, entity_effects=True, time_effects=True).fit(cov_type="clustered", cluster_entity=True)
+    np.testing.assert_allclose(res.params.to_numpy(), ref.params.to_numpy())
+    np.testing.assert_allclose(res.std_errors.to_numpy(), ref.std_errors.to_numpy())
+    np.testing.assert_allclose(res.conf_int().to_numpy(), ref.conf_int().to_numpy())
+    assert res.nobs == ref.nobs
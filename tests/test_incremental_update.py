@@ -0,0 +1,55 @@
+# %% TESTES - ATUALIZAÇÃO INCREMENTAL DO PAINEL
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from incremental_update import COLUNAS_BASE, atualizar_painel, derivar_variaveis_painel, verificar_revisoes
+
+# A atualização incremental (ano novo publicado) tem de reproduzir a reconstrução completa do painel,
+# inclusive com PIB real não positivo (guardado como NaN no painel derivado).
+
+
+def _base(anos: range, n: int = 6, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    linhas = len(anos) * n
+    df = pd.DataFrame({c: rng.uniform(1.0, 100.0, linhas) for c in COLUNAS_BASE})
+    df['codigo'] = np.repeat([f'{3500000 + i}' for i in range(n)], len(anos))
+    df['codigo'] = df['codigo'].astype('string')
+    df['municipio'] = 'M' + df['codigo']
+    df['estado'] = 'SP'
+    df['ano'] = np.tile(list(anos), n)
+    df['populacao'] = rng.integers(1000, 100000, linhas).astype(float)
+    # PIB não positivo no histórico antigo e dentro da janela recalculada
+    df.loc[(df['codigo'] == '3500001') & (df['ano'] == 2005), 'pib_real'] = -3.0
+    df.loc[(df['codigo'] == '3500002') & (df['ano'] == 2009), 'pib_real'] = 0.0
+    df.loc[(df['codigo'] == '3500003') & (df['ano'] == 2010), 'pib_real'] = -1.5
+    return df
+
+
+def _ordenar(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values(['codigo', 'estado', 'ano']).reset_index(drop=True)
+
+
+def test_pib_nao_positivo_nao_conta_como_revisao():
+    base = _base(range(2002, 2012))
+    antigo = derivar_variaveis_painel(base)
+    assert verificar_revisoes(antigo, base).empty
+
+
+def test_incremental_igual_reconstrucao_completa():
+    base = _base(range(2002, 2013))
+    antigo = derivar_variaveis_painel(base[base['ano'] < 2012])
+    completo = derivar_variaveis_painel(base)
+
+    incremental, relatorio = atualizar_painel(antigo, base)
+    assert relatorio['modo'] == 'incremental'
+    assert relatorio['anos_novos'] == [2012]
+    pd.testing.assert_frame_equal(_ordenar(incremental)[completo.columns], _ordenar(completo), check_dtype=False)
+
+
+def test_revisao_de_ano_antigo_reconstroi():
+    base = _base(range(2002, 2013))
+    antigo = derivar_variaveis_painel(base[base['ano'] < 2012])
+    base.loc[base['ano'] == 2004, 'populacao'] += 1
+    _, relatorio = atualizar_painel(antigo, base)
+    assert relatorio['modo'] == 'completo'
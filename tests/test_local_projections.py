@@ -0,0 +1,21 @@
+# %% TESTES - PROJEÇÕES LOCAIS
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from local_projections import construir_saidas_futuras
+
+# As respostas em t+h seguem o ano: um ano ausente dentro de t..t+h deixa a resposta em NaN.
+
+
+def test_saidas_futuras_pelo_ano():
+    indice = pd.MultiIndex.from_tuples([(1, 2000), (1, 2001), (1, 2003), (1, 2004), (2, 2000), (2, 2001), (2, 2002)], names=["municipio_id", "ano"])
+    df = pd.DataFrame({"dy": [1.0, 2.0, 4.0, 5.0, 10.0, 20.0, 30.0]}, index=indice)
+    nomes = construir_saidas_futuras(df, "dy", range(0, 3))
+    assert nomes == ["dy_lp_h0", "dy_lp_h1", "dy_lp_h2"]
+    np.testing.assert_array_equal(df["dy_lp_h1"].to_numpy(), [3.0, np.nan, 9.0, np.nan, 30.0, 50.0, np.nan])
+    np.testing.assert_array_equal(df["dy_lp_h2"].to_numpy(), [np.nan, np.nan, np.nan, np.nan, 60.0, np.nan, np.nan])
+
+    df_pontual = df[["dy"]].copy()
+    construir_saidas_futuras(df_pontual, "dy", [2], acumulado=False)
+    np.testing.assert_array_equal(df_pontual["dy_lp_h2"].to_numpy(), [np.nan, 4.0, np.nan, np.nan, 30.0, np.nan, np.nan])
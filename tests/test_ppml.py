@@ -0,0 +1,70 @@
+# %% TESTES - PPML COM EFEITOS FIXOS
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import pytest
+
+from covariance import codificar_grupos
+from fixed_effects import Absorvedor
+from ppml import ppml_painel, separacao_fe, separacao_relu
+
+# O PPML com separação (FE + ReLU) é comparado com a máxima verossimilhança de Poisson por força bruta
+# (Newton com dummies completas de município e ano), que não tem separação por regressores nos dados simulados.
+
+
+def _painel(seed: int, entidade_zerada: bool = False, n: int = 40, t: int = 8) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ent = np.repeat(np.arange(n), t)
+    ano = np.tile(np.arange(2000, 2000 + t), n)
+    x1, x2 = rng.normal(size=n * t), rng.normal(size=n * t)
+    a, g = rng.normal(size=n) * 0.5, rng.normal(size=t) * 0.3
+    y = rng.poisson(np.exp(-1 + a[ent] + g[ano - 2000] + 0.5 * x1 - 0.3 * x2)).astype(float)
+    if entidade_zerada:
+        y[ent == 0] = 0.0
+    df = pd.DataFrame({"y": y, "x1": x1, "x2": x2, "estado": "SP"}, index=pd.MultiIndex.from_arrays([ent, ano], names=["municipio_id", "ano"]))
+    return df
+
+
+def _mle_forca_bruta(df: pd.DataFrame, rhs: list[str]) -> np.ndarray:
+    """Poisson por Newton com dummies de município e ano; municípios só com zeros saem (FE iria a -infinito)."""
+    df = df[df.groupby(level=0)["y"].transform("sum") > 0]
+    dummies = pd.get_dummies(pd.DataFrame({"m": df.index.get_level_values(0).astype(str), "a": df.index.get_level_values(1).astype(str)}))
+    X = np.column_stack([df[rhs].to_numpy(), dummies.to_numpy(dtype=float)[:, :-1]])
+    y = df["y"].to_numpy()
+    b = np.zeros(X.shape[1])
+    for _ in range(100):
+        mu = np.exp(X @ b)
+        passo = np.linalg.solve(X.T @ (X * mu[:, None]), X.T @ (y - mu))
+        b += passo
+        if np.max(np.abs(passo)) < 1e-12:
+            break
+    return b[:len(rhs)]
+
+
+@pytest.mark.parametrize("entidade_zerada", [False, True])
+@pytest.mark.parametrize("seed", range(4))
+def test_ppml_igual_mle_sem_separacao_por_regressores(seed, entidade_zerada):
+    df = _painel(seed, entidade_zerada)
+    res = ppml_painel(df, "y", ["x1", "x2"], cov_type="robust")
+    assert res.info["n_separadas_relu"] == 0
+    np.testing.assert_allclose(res.params.to_numpy(), _mle_forca_bruta(df, ["x1", "x2"]), atol=1e-6)
+    sem_separacao = ppml_painel(df, "y", ["x1", "x2"], cov_type="robust", separacao=False)
+    np.testing.assert_allclose(res.params.to_numpy(), sem_separacao.params.to_numpy(), atol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_relu_detecta_separacao_por_dummy(seed):
+    df = _painel(seed)
+    rng = np.random.default_rng(seed)
+    separadas = np.zeros(len(df), dtype=bool)
+    separadas[rng.choice(np.flatnonzero(df["y"].to_numpy() == 0), 15, replace=False)] = True
+    df["x3"] = separadas.astype(float)
+
+    # Mesma ordem de ajustar_ppml: primeiro saem os grupos de FE só com zeros, depois o ReLU
+    codigos = [codificar_grupos(df.index.get_level_values(i).to_numpy())[0] for i in (0, 1)]
+    manter = separacao_fe(df["y"].to_numpy(), codigos)
+    detectadas = separacao_relu(df["y"].to_numpy()[manter], df[["x1", "x2", "x3"]].to_numpy()[manter], Absorvedor([c[manter] for c in codigos]))
+    np.testing.assert_array_equal(detectadas, separadas[manter])
+
+    res = ppml_painel(df, "y", ["x1", "x2", "x3"], cov_type="robust")
+    np.testing.assert_allclose(res.params[["x1", "x2"]].to_numpy(), _mle_forca_bruta(df[~separadas], ["x1", "x2"]), atol=1e-6)
@@ -0,0 +1,45 @@
+# %% TESTES - REPOSITÓRIO DE RESULTADOS
+# Importando as bibliotecas necessárias
+import pandas as pd
+import pyarrow.dataset as ds
+
+from results_store import RepositorioResultados
+
+# Com ultimo=True cada modelo responde pela sua execução mais recente na tabela 'runs', mesmo quando ela não tem
+# linhas na tabela consultada (ou no filtro): linhas de execuções anteriores não podem reaparecer.
+
+
+def _coef(variaveis: list[str], valor: float) -> pd.DataFrame:
+    return pd.DataFrame({"var": variaveis, "coef": valor, "std_err": 0.1, "t": 1.0, "p": 0.5, "ci_low": valor - 0.2, "ci_high": valor + 0.2})
+
+
+def _repo(tmp_path) -> RepositorioResultados:
+    repo = RepositorioResultados(tmp_path / "resultados")
+    repo.registrar_coeficientes(_coef(["x", "z"], 1.0), model_name="m1", stats={"nobs": 100}, run_id="20240101T000000000000-aaaaaa")
+    repo.registrar_coeficientes(_coef(["x"], 2.0), model_name="m1", run_id="20240102T000000000000-bbbbbb")
+    repo.registrar_coeficientes(_coef(["x", "z"], 3.0), model_name="m2", stats={"nobs": 50}, run_id="20240101T000000000000-cccccc")
+    return repo
+
+
+def test_ultimo_usa_execucao_mais_recente_de_runs(tmp_path):
+    repo = _repo(tmp_path)
+    coefs = repo.coeficientes(["m1", "m2"])
+    assert set(coefs.loc[coefs["model"] == "m1", "run_id"]) == {"20240102T000000000000-bbbbbb"}
+    assert coefs.loc[coefs["model"] == "m1", "var"].tolist() == ["x"]
+    assert coefs.loc[coefs["model"] == "m2", "coef"].tolist() == [3.0, 3.0]
+
+
+def test_ultimo_sem_linhas_na_execucao_recente(tmp_path):
+    repo = _repo(tmp_path)
+    # A execução mais recente de m1 não tem 'z' nem estatísticas: nada de m1 volta
+    z = repo.coeficientes(["m1", "m2"], filtro=ds.field("var") == "z")
+    assert z["model"].tolist() == ["m2"]
+    stats = repo.consultar("stats")
+    assert stats["model"].tolist() == ["m2"]
+
+
+def test_ultimo_falso_e_run_id_explicito(tmp_path):
+    repo = _repo(tmp_path)
+    assert len(repo.coeficientes("m1", ultimo=False)) == 3
+    antigo = repo.coeficientes("m1", run_id="20240101T000000000000-aaaaaa")
+    assert antigo["coef"].tolist() == [1.0, 1.0]
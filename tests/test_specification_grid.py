@@ -0,0 +1,29 @@
+# %% TESTES - GRADE DE ESPECIFICAÇÕES
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from specification_grid import garantir_defasagens
+
+# Defasagens e avanços seguem o ano: um ano ausente no painel gera NaN, em vez de puxar o ano disponível mais próximo.
+
+
+def _painel_com_lacuna() -> pd.DataFrame:
+    # Município 1 sem o ano 2002; município 2 completo e fora de ordem
+    indice = pd.MultiIndex.from_tuples([(1, 2000), (1, 2001), (1, 2003), (1, 2004), (2, 2002), (2, 2000), (2, 2001)], names=["municipio_id", "ano"])
+    return pd.DataFrame({"x": [10.0, 11.0, 13.0, 14.0, 22.0, 20.0, 21.0]}, index=indice)
+
+
+def test_defasagens_e_avancos_pelo_ano():
+    df = _painel_com_lacuna()
+    criadas = garantir_defasagens(df, "x", 2, 1)
+    assert criadas == ["x_lag1", "x_lag2", "x_lead1"]
+    np.testing.assert_array_equal(df["x_lag1"].to_numpy(), [np.nan, 10.0, np.nan, 13.0, 21.0, np.nan, 20.0])
+    np.testing.assert_array_equal(df["x_lag2"].to_numpy(), [np.nan, np.nan, 11.0, np.nan, 20.0, np.nan, np.nan])
+    np.testing.assert_array_equal(df["x_lead1"].to_numpy(), [11.0, np.nan, 14.0, np.nan, np.nan, 21.0, 22.0])
+
+
+def test_colunas_existentes_nao_sao_recriadas():
+    df = _painel_com_lacuna().assign(x_lag1=-1.0)
+    assert garantir_defasagens(df, "x", 1, 0) == []
+    assert (df["x_lag1"] == -1.0).all()
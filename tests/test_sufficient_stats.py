@@ -0,0 +1,43 @@
+# %% TESTES - ESTATÍSTICAS SUFICIENTES POR BLOCO
+# Importando as bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from sufficient_stats import EstoqueSuficiente
+
+# anos_alterados confere o hash das linhas de cada ano: uma revisão que só troca valores entre municípios (contagem e
+# somas do ano iguais) tem de ser detectada, e a atualização tem de reproduzir a construção do zero.
+
+
+def _painel(n: int = 40, anos: range = range(2005, 2013), seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    indice = pd.MultiIndex.from_product([range(n), list(anos)], names=["municipio_id", "ano"])
+    df = pd.DataFrame({"x1": rng.normal(size=len(indice)), "x2": rng.normal(size=len(indice))}, index=indice)
+    df["y"] = 0.5 * df["x1"] - 0.2 * df["x2"] + rng.normal(size=len(indice))
+    df["estado"] = np.where(indice.get_level_values(0) < n // 2, "SP", "MG")
+    return df
+
+
+def test_troca_entre_municipios_e_detectada():
+    df = _painel()
+    estoque = EstoqueSuficiente.construir(df, "y", ["x1", "x2"])
+    assert estoque.anos_alterados(df).size == 0
+
+    revisado = df.copy()
+    a, b = (3, 2009), (7, 2009)
+    revisado.loc[[a, b], "x1"] = revisado.loc[[b, a], "x1"].to_numpy()
+    np.testing.assert_array_equal(estoque.anos_alterados(revisado), [2009])
+
+    atualizado = estoque.atualizar(revisado)
+    completo = EstoqueSuficiente.construir(revisado, "y", ["x1", "x2"])
+    np.testing.assert_allclose(atualizado.resolver().params, completo.resolver().params)
+    assert atualizado.anos_alterados(revisado).size == 0
+
+
+def test_hash_dos_anos_persistido(tmp_path):
+    df = _painel()
+    estoque = EstoqueSuficiente.construir(df, "y", ["x1", "x2"])
+    carregado = EstoqueSuficiente.carregar(estoque.salvar(tmp_path / "modelo_blocos.npz"))
+    np.testing.assert_array_equal(carregado.hash_anos, estoque.hash_anos)
+    df_novo = pd.concat([df, _painel(anos=range(2013, 2014), seed=1)]).sort_index()
+    np.testing.assert_array_equal(carregado.anos_alterados(df_novo), [2013])